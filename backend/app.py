@@ -33,6 +33,8 @@ def create_app(config_name=None):
     from routes.config_api import config_bp
     from routes.websocket import register_socketio_handlers
     from routes.agent_api import agent_bp
+    from routes.metrics_api import metrics_bp
+    from utils.instrumentation import instrument_socketio
     
     # 注册统一 API V2
     try:
@@ -48,7 +50,9 @@ def create_app(config_name=None):
     app.register_blueprint(webhook_bp, url_prefix='/api/webhooks')
     app.register_blueprint(config_bp, url_prefix='/api')
     app.register_blueprint(agent_bp)
+    app.register_blueprint(metrics_bp)
     register_socketio_handlers(socketio)
+    instrument_socketio(socketio)
     
     # 初始化兼容性支持
     if os.path.exists('migration_config.json'):
@@ -63,7 +67,25 @@ def create_app(config_name=None):
     
     return app
 
+def resume_task_chains(debug=False):
+    """恢复服务重启前中断的任务链
+
+    调试模式下 Werkzeug 重载器会在子进程中运行应用，只在子进程中恢复，避免任务被执行两次。
+    """
+    if debug and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        return
+    try:
+        from models.task import TaskManager
+        from services.claude_executor import get_executor
+        from services.task_chain_executor import TaskChainExecutor
+        runs = TaskChainExecutor(get_executor(), TaskManager()).resume_unfinished_chains()
+        if runs:
+            print(f"Resumed {len(runs)} unfinished task chain(s)")
+    except Exception as e:
+        print(f"Warning: failed to resume task chains: {e}")
+
 app = create_app()
 
 if __name__ == '__main__':
+    resume_task_chains(debug=True)
     socketio.run(app, debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -23,6 +23,7 @@ def create_app(config_name=None):
     from routes.repository_api import repo_bp
     from routes.config_api import config_bp
     from routes.agent_api import agent_bp
+    from routes.metrics_api import metrics_bp
     
     app.register_blueprint(api_bp, url_prefix='/api')
     app.register_blueprint(unified_bp)
@@ -30,6 +31,7 @@ def create_app(config_name=None):
     app.register_blueprint(repo_bp, url_prefix='/api')
     app.register_blueprint(config_bp, url_prefix='/api')
     app.register_blueprint(agent_bp)
+    app.register_blueprint(metrics_bp)
     
     # Create upload directory
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+FileManager 目录遍历基准测试
+
+在临时目录中生成合成文件树（默认 10 万个文件），对比:
+- 旧实现: Path.rglob + 每个条目单独 stat + 按路径逐段判断隐藏文件
+- scandir 串行 / 线程池并行遍历
+- 目录大小冷缓存 / 热缓存
+
+用法:
+    python benchmarks/bench_file_manager.py --files 100000 --workers 8
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.file_manager import FileManager
+
+
+def build_tree(root: Path, total_files: int, files_per_dir: int = 100, fanout: int = 10):
+    """生成合成文件树，包含一个隐藏目录"""
+    dirs_needed = max(1, total_files // files_per_dir)
+    created = 0
+    for d in range(dirs_needed):
+        # 三层目录结构: a/b/c
+        parts = [f"d{(d // (fanout * fanout)) % fanout}", f"d{(d // fanout) % fanout}", f"d{d}"]
+        directory = root.joinpath(*parts)
+        directory.mkdir(parents=True, exist_ok=True)
+        for f in range(files_per_dir):
+            if created >= total_files:
+                return
+            (directory / f"file_{f}.txt").write_bytes(b"x" * (f % 64))
+            created += 1
+    hidden = root / ".cache"
+    hidden.mkdir(exist_ok=True)
+    (hidden / "blob").write_bytes(b"y" * 128)
+
+
+def legacy_recursive_listing(base: Path):
+    items = []
+    for item in base.rglob("*"):
+        if any(part.startswith('.') for part in item.parts):
+            continue
+        stat = item.stat()
+        items.append((str(item.relative_to(base)), item.is_dir(),
+                      stat.st_size if item.is_file() else None))
+    return items
+
+
+def legacy_directory_size(base: Path):
+    total = 0
+    for item in base.rglob('*'):
+        if item.is_file():
+            total += item.stat().st_size
+    return total
+
+
+def timed(label: str, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed * 1000:>10.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=100_000, help='合成文件数量')
+    parser.add_argument('--workers', type=int, default=8, help='并行遍历线程数')
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix='fm-bench-'))
+    try:
+        print(f"生成 {args.files} 个文件到 {root} ...")
+        build_tree(root, args.files)
+
+        serial = FileManager(root)
+        parallel = FileManager(root, max_workers=args.workers)
+
+        print("\n递归列表")
+        legacy = timed("rglob + stat (旧实现)", lambda: legacy_recursive_listing(root))
+        items = timed("scandir 串行", lambda: serial.list_directory(recursive=True))
+        timed(f"scandir 并行 ({args.workers} 线程)", lambda: parallel.list_directory(recursive=True))
+        assert len(items) == len(legacy), (len(items), len(legacy))
+
+        print("\n文件名搜索")
+        timed("scandir 串行", lambda: serial.search_files("file_7"))
+        timed(f"scandir 并行 ({args.workers} 线程)", lambda: parallel.search_files("file_7"))
+
+        print("\n目录大小")
+        expected = timed("rglob + stat (旧实现)", lambda: legacy_directory_size(root))
+        cold = timed("scandir 冷缓存", lambda: serial.get_directory_size())
+        warm = timed("scandir 热缓存 (仅 stat 目录)", lambda: serial.get_directory_size())
+        timed(f"scandir 冷缓存并行 ({args.workers} 线程)", lambda: parallel.get_directory_size())
+        assert expected == cold == warm, (expected, cold, warm)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+TaskFileSystem 移动/任务树基准测试
+
+在临时数据库中生成一棵子树（默认 1 万个节点），对比:
+- 旧实现: LIKE 选出所有后代，再逐行 UPDATE
+- 新实现: 单条 UPDATE 改写路径前缀和深度
+- 任务树: 逐层 list_directory 递归 vs 单次范围查询
+
+用法:
+    python benchmarks/bench_task_filesystem.py --nodes 10000 --fanout 10
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models.task import TaskDB
+from models.task_filesystem import TaskFileSystem
+
+
+def build_subtree(task_fs: TaskFileSystem, root_name: str, total_nodes: int, fanout: int):
+    """按广度优先批量插入一棵子树，返回节点数"""
+    root = task_fs.create_task_folder("/", root_name)
+    now = datetime.now().isoformat()
+    rows = []
+    frontier = [(root.id, root.path, root.depth)]
+    created = 1
+
+    while frontier and created < total_nodes:
+        next_frontier = []
+        for parent_id, parent_path, parent_depth in frontier:
+            for i in range(fanout):
+                if created >= total_nodes:
+                    break
+                task_id = str(uuid.uuid4())
+                path = f"{parent_path}/n{i}"
+                rows.append((task_id, f"n{i}", path, parent_id, 1, parent_depth + 1,
+                             "", "", "pending", now, now, path))
+                next_frontier.append((task_id, path, parent_depth + 1))
+                created += 1
+        frontier = next_frontier
+
+    with task_fs.get_connection() as conn:
+        conn.executemany('''
+            INSERT INTO tasks (
+                id, task_name, task_path, parent_task_id, is_folder, depth,
+                prompt, description, status, created_at, updated_at, project_path
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+    return created
+
+
+def legacy_move(task_fs: TaskFileSystem, source_path: str, new_path: str, new_depth: int):
+    """旧实现：逐行改写子任务路径"""
+    source = task_fs.get_task_by_path(source_path)
+    with task_fs.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE tasks SET task_path = ?, depth = ? WHERE id = ?",
+                       (new_path, new_depth, source.id))
+        cursor.execute("SELECT id, task_path FROM tasks WHERE task_path LIKE ?",
+                       (f"{source_path}/%",))
+        for row in cursor.fetchall():
+            path = row['task_path'].replace(source_path, new_path, 1)
+            cursor.execute("UPDATE tasks SET task_path = ?, depth = ?, updated_at = ? WHERE id = ?",
+                           (path, len(path.strip('/').split('/')), datetime.now().isoformat(), row['id']))
+        conn.commit()
+
+
+def legacy_tree(task_fs: TaskFileSystem, path: str):
+    """旧实现：逐层 list_directory"""
+    children = []
+    for task in task_fs.list_directory(path):
+        node = task.to_dict()
+        node['children'] = legacy_tree(task_fs, task.path)
+        children.append(node)
+    return children
+
+
+def count_nodes(nodes) -> int:
+    return sum(1 + count_nodes(node.get('children', [])) for node in nodes)
+
+
+def timed(label: str, func):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed * 1000:>10.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--nodes', type=int, default=10_000, help='子树节点数量')
+    parser.add_argument('--fanout', type=int, default=10, help='每个节点的子节点数')
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix='taskfs-bench-'))
+    try:
+        db_path = str(workdir / "tasks.db")
+        TaskDB(db_path)
+        task_fs = TaskFileSystem(db_path)
+        task_fs.create_task_folder("/", "archive")
+
+        nodes = build_subtree(task_fs, "big", args.nodes, args.fanout)
+        print(f"生成 {nodes} 个节点的子树")
+
+        print("\n移动子树")
+        timed("LIKE + 逐行 UPDATE (旧实现)", lambda: legacy_move(task_fs, "/big", "/big-legacy", 1))
+        timed("单条 UPDATE /big-legacy -> /archive", lambda: task_fs.move_task("/big-legacy", "/archive", "big"))
+        timed("单条 UPDATE /archive/big -> /", lambda: task_fs.move_task("/archive/big", "/"))
+
+        print("\n任务树")
+        legacy = timed("逐层 list_directory (旧实现)", lambda: legacy_tree(task_fs, "/big"))
+        tree = timed("单次范围查询", lambda: task_fs.get_task_tree("/big"))
+        timed("版本化快照（冷）", lambda: task_fs.get_task_tree("/big", use_cache=True))
+        timed("版本化快照（热）", lambda: task_fs.get_task_tree("/big", use_cache=True))
+        assert count_nodes(tree['children']) == count_nodes(legacy) == nodes - 1
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -42,6 +42,14 @@ class Config:
     MAX_CONCURRENT_TASKS = int(os.environ.get('MAX_CONCURRENT_TASKS', '5'))
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', './uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
+    # 超过该大小的文件不再整体内联到 JSON 中，改为按行分页返回
+    MAX_INLINE_FILE_SIZE = int(os.environ.get('MAX_INLINE_FILE_SIZE', str(2 * 1024 * 1024)))
+    FILE_WINDOW_LINES = int(os.environ.get('FILE_WINDOW_LINES', '1000'))
+    # 分块上传：单个分块大小（须小于 MAX_CONTENT_LENGTH）与整个文件的大小上限
+    UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+    MAX_UPLOAD_SIZE = int(os.environ.get('MAX_UPLOAD_SIZE', str(4 * 1024 * 1024 * 1024)))
+    # 分块上传额外允许的归档/产物类型
+    ARCHIVE_EXTENSIONS = {'.zip', '.tar', '.gz', '.tgz', '.bz2', '.xz', '.7z'}
     ALLOWED_EXTENSIONS = {'.py', '.js', '.ts', '.jsx', '.tsx', '.json', '.txt', '.md', '.html', '.css'}
     
     # Socket.IO settings
@@ -54,6 +62,19 @@ class Config:
     # Project workspace
     PROJECTS_DIR = Path(os.environ.get('PROJECTS_DIR', './projects'))
     PROJECTS_DIR.mkdir(exist_ok=True)
+    # 项目搜索索引目录（每个项目一个 SQLite FTS5 索引库）
+    SEARCH_INDEX_DIR = Path(os.environ.get('SEARCH_INDEX_DIR', './search_indexes'))
+    # 分支任务使用的 git worktree 池
+    WORKTREE_ROOT = Path(os.environ.get('WORKTREE_ROOT', './worktrees'))
+    MAX_WORKTREES = int(os.environ.get('MAX_WORKTREES', '16'))
+    # 远程仓库的 bare mirror 缓存（导入和同步都从镜像增量获取）
+    REPO_MIRROR_DIR = Path(os.environ.get('REPO_MIRROR_DIR', './repo_mirrors'))
+    REPO_MIRROR_FETCH_INTERVAL = int(os.environ.get('REPO_MIRROR_FETCH_INTERVAL', '60'))
+    # 后台执行 git 操作的线程数
+    GIT_MAX_WORKERS = int(os.environ.get('GIT_MAX_WORKERS', '4'))
+    # webhook 触发的增量同步：合并请求的去抖时间和最长等待时间（秒）
+    REPO_SYNC_DEBOUNCE = float(os.environ.get('REPO_SYNC_DEBOUNCE', '2'))
+    REPO_SYNC_MAX_DELAY = float(os.environ.get('REPO_SYNC_MAX_DELAY', '30'))
     
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -50,6 +50,7 @@ CREATE TABLE IF NOT EXISTS branches (
 CREATE TABLE IF NOT EXISTS issues (
     id TEXT PRIMARY KEY,
     number INTEGER NOT NULL,
+    github_number INTEGER, -- 从 GitHub 同步的议题在 GitHub 上的编号，本地议题为空
     title TEXT NOT NULL,
     description TEXT,
     repository_id TEXT NOT NULL,
@@ -145,6 +146,7 @@ CREATE INDEX IF NOT EXISTS idx_branches_status ON branches(status);
 CREATE INDEX IF NOT EXISTS idx_issues_repository ON issues(repository_id);
 CREATE INDEX IF NOT EXISTS idx_issues_branch ON issues(branch_id);
 CREATE INDEX IF NOT EXISTS idx_issues_status ON issues(status);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_issues_github_number ON issues(repository_id, github_number);
 CREATE INDEX IF NOT EXISTS idx_commits_branch ON commits(branch_id);
 CREATE INDEX IF NOT EXISTS idx_comments_issue ON comments(issue_id);
 CREATE INDEX IF NOT EXISTS idx_pull_requests_repository ON pull_requests(repository_id);
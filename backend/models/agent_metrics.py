@@ -2,10 +2,44 @@
 Agent负荷指标模型 - 管理员工生产力指标
 """
 import sqlite3
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from contextlib import contextmanager
 import json
+from utils.instrumentation import get_registry
+
+DB_CONNECTION_SECONDS = get_registry().histogram(
+    'sqlite_connection_seconds', 'Time spent holding a SQLite connection', ['store'])
+
+# 汇总水位线名称
+ROLLUP_STATE_NAME = 'agent_metrics'
+# 排行榜快照有效期（秒），其他进程写入的数据最多延迟这么久可见
+RANKINGS_CACHE_TTL = 30
+# 快照中保留的排名条数，超过的请求直接查询数据库
+MAX_CACHED_RANKINGS = 100
+# 满负荷Agent的月度小时数
+FULL_AGENT_HOURS = 7 * 24 * 30  # 5040小时
+# 月度员工指数的基准小时数
+MONTHLY_INDEX_HOURS = 30 * 24  # 720小时
+
+# 指标数据版本号，本进程内汇总/重算后递增，用于让排行榜快照失效
+_metrics_generation = 0
+_generation_lock = threading.Lock()
+
+
+def _bump_generation():
+    global _metrics_generation
+    with _generation_lock:
+        _metrics_generation += 1
+
+
+def _next_month(month: str) -> str:
+    """'2024-12' -> '2025-01'"""
+    year, mon = (int(part) for part in month.split('-'))
+    return f"{year + 1}-01" if mon == 12 else f"{year}-{mon + 1:02d}"
+
 
 class AgentMetrics:
     """Agent负荷指标模型"""
@@ -26,7 +60,6 @@ class AgentMetrics:
         """计算Agent负荷（百分比）
         一个满负荷Agent = 7x24x30 = 5040小时/月
         """
-        FULL_AGENT_HOURS = 7 * 24 * 30  # 5040小时
         self.agent_load = (self.total_hours / FULL_AGENT_HOURS) * 100
         return self.agent_load
     
@@ -57,12 +90,13 @@ class AgentMetricsDB:
     @contextmanager
     def get_connection(self):
         """获取数据库连接的上下文管理器"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        try:
-            yield conn
-        finally:
-            conn.close()
+        with DB_CONNECTION_SECONDS.time(store='agent_metrics'):
+            conn = sqlite3.connect(self.db_path)
+            conn.row_factory = sqlite3.Row
+            try:
+                yield conn
+            finally:
+                conn.close()
     
     def _init_db(self):
         """初始化数据库表"""
@@ -93,129 +127,316 @@ class AgentMetricsDB:
                 CREATE INDEX IF NOT EXISTS idx_metrics_rank 
                 ON agent_metrics(month, rank)
             ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_metrics_month_hours
+                ON agent_metrics(month, total_hours DESC)
+            ''')
+            
+            # 使用事件表（只追加），由 rollup() 汇总到 agent_metrics / agent_metrics_totals
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS task_usage_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    event_key TEXT UNIQUE,
+                    user_id TEXT NOT NULL,
+                    month TEXT NOT NULL,
+                    hours REAL NOT NULL DEFAULT 0,
+                    tasks INTEGER NOT NULL DEFAULT 0,
+                    occurred_at TEXT NOT NULL
+                )
+            ''')
+            
+            # 累计汇总表
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS agent_metrics_totals (
+                    user_id TEXT PRIMARY KEY,
+                    total_hours REAL DEFAULT 0,
+                    total_tasks INTEGER DEFAULT 0,
+                    updated_at TEXT NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_metrics_totals_hours
+                ON agent_metrics_totals(total_hours DESC)
+            ''')
+            
+            # 汇总水位线
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS metrics_rollup_state (
+                    name TEXT PRIMARY KEY,
+                    last_event_id INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT NOT NULL
+                )
+            ''')
+            
+            # 旧数据迁移：累计表为空时从月度表生成
+            cursor.execute('''
+                INSERT INTO agent_metrics_totals (user_id, total_hours, total_tasks, updated_at)
+                SELECT user_id, SUM(total_hours), SUM(total_tasks), ?
+                FROM agent_metrics
+                WHERE NOT EXISTS (SELECT 1 FROM agent_metrics_totals)
+                GROUP BY user_id
+            ''', (datetime.now().isoformat(),))
             
             conn.commit()
     
     def update_user_metrics(self, user_id: str, month: str, hours: float, tasks: int):
-        """更新用户的月度指标"""
+        """更新用户的月度指标（记录一条使用事件并汇总）"""
+        self.record_usage_event(user_id, hours, tasks, month=month)
+        self.rollup()
+
+    def record_usage_event(self, user_id: str, hours: float, tasks: int = 1,
+                           event_key: Optional[str] = None, month: Optional[str] = None) -> bool:
+        """追加一条使用事件
+
+        只执行一条 INSERT，并发写入不会丢失增量。event_key（通常为任务 ID）用于去重，
+        同一任务被多次上报时只记录一次。返回是否新写入了事件。
+        """
+        now = datetime.now()
+        month = month or now.strftime('%Y-%m')
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            
-            # 获取当前数据
             cursor.execute('''
-                SELECT total_hours, total_tasks, cumulative_hours 
-                FROM agent_metrics 
-                WHERE user_id = ? AND month = ?
-            ''', (user_id, month))
-            
-            row = cursor.fetchone()
-            if row:
-                # 更新现有记录
-                new_hours = row['total_hours'] + hours
-                new_tasks = row['total_tasks'] + tasks
-                
-                cursor.execute('''
-                    UPDATE agent_metrics 
-                    SET total_hours = ?, total_tasks = ?, updated_at = ?
-                    WHERE user_id = ? AND month = ?
-                ''', (new_hours, new_tasks, datetime.now().isoformat(), user_id, month))
-            else:
-                # 获取累积时长
+                INSERT OR IGNORE INTO task_usage_events
+                (event_key, user_id, month, hours, tasks, occurred_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (event_key, user_id, month, hours, tasks, now.isoformat()))
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def rollup(self) -> int:
+        """把水位线之后的新事件汇总到月度表和累计表，返回处理的事件数
+
+        在 BEGIN IMMEDIATE 事务中执行，多个线程/进程同时汇总时会串行化，不会重复累加。
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                count = self._apply_pending_events(cursor)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        if count:
+            _bump_generation()
+        return count
+
+    def _apply_pending_events(self, cursor) -> int:
+        """在当前事务中汇总水位线之后的事件"""
+        cursor.execute(
+            'SELECT last_event_id FROM metrics_rollup_state WHERE name = ?',
+            (ROLLUP_STATE_NAME,)
+        )
+        row = cursor.fetchone()
+        watermark = row['last_event_id'] if row else 0
+
+        cursor.execute('''
+            SELECT MAX(id) AS last_id, COUNT(*) AS count
+            FROM task_usage_events WHERE id > ?
+        ''', (watermark,))
+        pending = cursor.fetchone()
+        if not pending['count']:
+            return 0
+        last_id = pending['last_id']
+        now = datetime.now().isoformat()
+
+        # 月度汇总
+        cursor.execute('''
+            INSERT INTO agent_metrics (user_id, month, total_hours, total_tasks, updated_at)
+            SELECT user_id, month, SUM(hours), SUM(tasks), ?
+            FROM task_usage_events
+            WHERE id > ? AND id <= ?
+            GROUP BY user_id, month
+            ON CONFLICT(user_id, month) DO UPDATE SET
+                total_hours = total_hours + excluded.total_hours,
+                total_tasks = total_tasks + excluded.total_tasks,
+                updated_at = excluded.updated_at
+        ''', (now, watermark, last_id))
+
+        # 累计汇总
+        cursor.execute('''
+            INSERT INTO agent_metrics_totals (user_id, total_hours, total_tasks, updated_at)
+            SELECT user_id, SUM(hours), SUM(tasks), ?
+            FROM task_usage_events
+            WHERE id > ? AND id <= ?
+            GROUP BY user_id
+            ON CONFLICT(user_id) DO UPDATE SET
+                total_hours = total_hours + excluded.total_hours,
+                total_tasks = total_tasks + excluded.total_tasks,
+                updated_at = excluded.updated_at
+        ''', (now, watermark, last_id))
+
+        # 受影响月份及之后的 cumulative_hours 重新计算为截至该月的累计时长
+        self._refresh_cumulative(cursor, '''
+            EXISTS (
+                SELECT 1 FROM task_usage_events e
+                WHERE e.id > ? AND e.id <= ?
+                  AND e.user_id = agent_metrics.user_id AND e.month <= agent_metrics.month
+            )
+        ''', (watermark, last_id))
+
+        self._set_watermark(cursor, last_id)
+        return pending['count']
+
+    def _set_watermark(self, cursor, last_event_id: int):
+        cursor.execute('''
+            INSERT INTO metrics_rollup_state (name, last_event_id, updated_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                last_event_id = excluded.last_event_id,
+                updated_at = excluded.updated_at
+        ''', (ROLLUP_STATE_NAME, last_event_id, datetime.now().isoformat()))
+
+    def _refresh_cumulative(self, cursor, condition: str, params: tuple = ()):
+        """把满足条件的月度记录的 cumulative_hours 更新为截至该月的累计时长"""
+        cursor.execute(f'''
+            UPDATE agent_metrics
+            SET cumulative_hours = (
+                SELECT SUM(m.total_hours) FROM agent_metrics m
+                WHERE m.user_id = agent_metrics.user_id AND m.month <= agent_metrics.month
+            )
+            WHERE {condition}
+        ''', params)
+
+    def recalculate_months(self, start_month: str, end_month: Optional[str] = None) -> int:
+        """根据 tasks 表重新计算 [start_month, end_month] 的月度指标（覆盖而不是累加）
+
+        一次分组聚合完成所有用户和月份的计算，然后批量写回 agent_metrics，
+        并重建累计表。返回写入的 (用户, 月份) 记录数。
+        """
+        # 规范化并校验月份格式（YYYY-MM）
+        start_month = datetime.strptime(start_month, '%Y-%m').strftime('%Y-%m')
+        end_month = datetime.strptime(end_month or start_month, '%Y-%m').strftime('%Y-%m')
+        if end_month < start_month:
+            raise ValueError("end_month must not be earlier than start_month")
+        range_start = f"{start_month}-01"
+        range_end = f"{_next_month(end_month)}-01"
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'tasks'")
+            if not cursor.fetchone():
+                return 0
+
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                # 先汇总已有事件并推进水位线，此后这些事件被重算结果取代
+                self._apply_pending_events(cursor)
+
                 cursor.execute('''
-                    SELECT SUM(total_hours) as cumulative 
-                    FROM agent_metrics 
-                    WHERE user_id = ?
-                ''', (user_id,))
-                
-                cumulative_row = cursor.fetchone()
-                cumulative_hours = (cumulative_row['cumulative'] or 0) + hours
-                
-                # 创建新记录
+                    SELECT user_id,
+                           strftime('%Y-%m', completed_at) AS month,
+                           SUM(seconds) / 3600.0 AS hours,
+                           COUNT(*) AS tasks
+                    FROM (
+                        SELECT user_id, completed_at,
+                               COALESCE(execution_time, json_extract(metadata, '$.execution_time')) AS seconds
+                        FROM tasks
+                        WHERE status = 'completed'
+                          AND completed_at >= ? AND completed_at < ?
+                          AND user_id IS NOT NULL
+                    )
+                    WHERE seconds > 0
+                    GROUP BY user_id, month
+                ''', (range_start, range_end))
+                now = datetime.now().isoformat()
+                rows = [(row['user_id'], row['month'], row['hours'], row['tasks'], now)
+                        for row in cursor.fetchall()]
+
+                cursor.execute(
+                    'DELETE FROM agent_metrics WHERE month >= ? AND month <= ?',
+                    (start_month, end_month)
+                )
+                cursor.executemany('''
+                    INSERT INTO agent_metrics (user_id, month, total_hours, total_tasks, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(user_id, month) DO UPDATE SET
+                        total_hours = excluded.total_hours,
+                        total_tasks = excluded.total_tasks,
+                        updated_at = excluded.updated_at
+                ''', rows)
+
+                # 重建累计表
+                cursor.execute('DELETE FROM agent_metrics_totals')
                 cursor.execute('''
-                    INSERT INTO agent_metrics 
-                    (user_id, month, total_hours, total_tasks, cumulative_hours, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (user_id, month, hours, tasks, cumulative_hours, datetime.now().isoformat()))
-            
-            conn.commit()
-    
-    def get_monthly_rankings(self, month: str) -> List[Dict]:
-        """获取月度排名"""
+                    INSERT INTO agent_metrics_totals (user_id, total_hours, total_tasks, updated_at)
+                    SELECT user_id, SUM(total_hours), SUM(total_tasks), ?
+                    FROM agent_metrics
+                    GROUP BY user_id
+                ''', (now,))
+                self._refresh_cumulative(cursor, 'month >= ?', (start_month,))
+
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        _bump_generation()
+        return len(rows)
+
+    def get_monthly_rankings(self, month: str, limit: Optional[int] = None) -> List[Dict]:
+        """获取月度排名（limit 为空时返回全部）"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             
-            # 获取所有用户的月度数据并计算排名
             cursor.execute('''
                 SELECT user_id, total_hours, total_tasks, cumulative_hours,
                        RANK() OVER (ORDER BY total_hours DESC) as rank
                 FROM agent_metrics
                 WHERE month = ?
                 ORDER BY total_hours DESC
-            ''', (month,))
-            
-            rankings = []
-            for row in cursor.fetchall():
-                metrics = AgentMetrics(
-                    user_id=row['user_id'],
-                    month=month,
-                    total_hours=row['total_hours'],
-                    total_tasks=row['total_tasks'],
-                    cumulative_hours=row['cumulative_hours'],
-                    rank=row['rank']
-                )
-                rankings.append(metrics.to_dict())
+                LIMIT ?
+            ''', (month, -1 if limit is None else limit))
             
-            return rankings
+            return [self._row_to_metrics(row, month) for row in cursor.fetchall()]
     
     def get_user_metrics(self, user_id: str, month: str) -> Optional[Dict]:
-        """获取用户的月度指标"""
+        """获取用户的月度指标（含排名）"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
-                SELECT * FROM agent_metrics
-                WHERE user_id = ? AND month = ?
+                SELECT m.user_id, m.month, m.total_hours, m.total_tasks, m.cumulative_hours, (
+                    SELECT COUNT(*) + 1 FROM agent_metrics o
+                    WHERE o.month = m.month AND o.total_hours > m.total_hours
+                ) AS rank
+                FROM agent_metrics m
+                WHERE m.user_id = ? AND m.month = ?
             ''', (user_id, month))
             
             row = cursor.fetchone()
-            if row:
-                metrics = AgentMetrics(
-                    user_id=row['user_id'],
-                    month=row['month'],
-                    total_hours=row['total_hours'],
-                    total_tasks=row['total_tasks'],
-                    cumulative_hours=row['cumulative_hours'],
-                    rank=0  # 需要单独计算
-                )
-                
-                # 计算排名
-                cursor.execute('''
-                    SELECT COUNT(*) + 1 as rank
+            return self._row_to_metrics(row, month) if row else None
+    
+    def get_user_history(self, user_id: str, start_month: str, end_month: str) -> Dict[str, Dict]:
+        """一次范围查询获取用户在 [start_month, end_month] 各月的指标和排名
+
+        返回 {month: metrics}，没有数据的月份不包含在内。
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT * FROM (
+                    SELECT user_id, month, total_hours, total_tasks, cumulative_hours,
+                           RANK() OVER (PARTITION BY month ORDER BY total_hours DESC) AS rank
                     FROM agent_metrics
-                    WHERE month = ? AND total_hours > ?
-                ''', (month, row['total_hours']))
-                
-                rank_row = cursor.fetchone()
-                metrics.rank = rank_row['rank']
-                
-                return metrics.to_dict()
+                    WHERE month >= ? AND month <= ?
+                )
+                WHERE user_id = ?
+            ''', (start_month, end_month, user_id))
             
-            return None
+            return {row['month']: self._row_to_metrics(row, row['month']) for row in cursor.fetchall()}
     
-    def get_all_time_rankings(self) -> List[Dict]:
-        """获取累积总排名"""
+    def get_all_time_rankings(self, limit: Optional[int] = None) -> List[Dict]:
+        """获取累积总排名（读取累计汇总表，limit 为空时返回全部）"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
-                SELECT user_id, 
-                       SUM(total_hours) as total_hours,
-                       SUM(total_tasks) as total_tasks,
-                       MAX(cumulative_hours) as cumulative_hours
-                FROM agent_metrics
-                GROUP BY user_id
+                SELECT user_id, total_hours, total_tasks
+                FROM agent_metrics_totals
                 ORDER BY total_hours DESC
-            ''')
+                LIMIT ?
+            ''', (-1 if limit is None else limit,))
             
             rankings = []
             rank = 1
@@ -224,12 +445,98 @@ class AgentMetricsDB:
                     'user_id': row['user_id'],
                     'total_hours': round(row['total_hours'], 2),
                     'total_tasks': row['total_tasks'],
-                    'cumulative_hours': round(row['cumulative_hours'], 2),
+                    'cumulative_hours': round(row['total_hours'], 2),
                     'rank': rank
                 })
                 rank += 1
             
             return rankings
+    
+    def _row_to_metrics(self, row, month: str) -> Dict:
+        return AgentMetrics(
+            user_id=row['user_id'],
+            month=month,
+            total_hours=row['total_hours'],
+            total_tasks=row['total_tasks'],
+            cumulative_hours=row['cumulative_hours'],
+            rank=row['rank']
+        ).to_dict()
+
+
+class RankingsCache:
+    """排行榜和仪表板指标的内存快照
+
+    快照在本进程汇总/重算指标后立即失效，否则最多保留 RANKINGS_CACHE_TTL 秒。
+    用户信息批量查询并在构建快照时附加，员工指数也一并预先计算。
+    """
+    
+    def __init__(self, db: 'AgentMetricsDB', ttl: float = RANKINGS_CACHE_TTL,
+                 max_rankings: int = MAX_CACHED_RANKINGS):
+        self.db = db
+        self.ttl = ttl
+        self.max_rankings = max_rankings
+        self._lock = threading.Lock()
+        self._snapshots: Dict[tuple, tuple] = {}  # key -> (generation, built_at, value)
+    
+    def invalidate(self):
+        """清空所有快照"""
+        with self._lock:
+            self._snapshots.clear()
+    
+    def _get(self, key: tuple, build):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._snapshots.get(key)
+            if cached and cached[0] == _metrics_generation and now - cached[1] < self.ttl:
+                return cached[2]
+        
+        generation = _metrics_generation
+        value = build()
+        with self._lock:
+            self._snapshots[key] = (generation, now, value)
+        return value
+    
+    def get_rankings(self, period: str = 'monthly', limit: int = 10,
+                     month: Optional[str] = None) -> List[Dict]:
+        """获取附带用户信息和员工指数的排行榜"""
+        month = month or datetime.now().strftime('%Y-%m')
+        if limit > self.max_rankings:
+            return self._build_rankings(period, month, limit)
+        key = ('rankings', period, month if period == 'monthly' else None)
+        return self._get(key, lambda: self._build_rankings(period, month, self.max_rankings))[:limit]
+    
+    def get_user_metrics(self, user_id: str, month: Optional[str] = None) -> Optional[Dict]:
+        """获取用户月度指标（缓存）"""
+        month = month or datetime.now().strftime('%Y-%m')
+        return self._get(('user', user_id, month), lambda: self.db.get_user_metrics(user_id, month))
+    
+    def _build_rankings(self, period: str, month: str, limit: int) -> List[Dict]:
+        from models.user import UserManager
+        
+        if period == 'monthly':
+            rankings = self.db.get_monthly_rankings(month, limit)
+        else:
+            rankings = self.db.get_all_time_rankings(limit)
+        
+        users = UserManager(self.db.db_path).get_users_by_ids([r['user_id'] for r in rankings])
+        now = datetime.now()
+        for ranking in rankings:
+            user = users.get(ranking['user_id'])
+            ranking['user_email'] = user.email if user else 'unknown@example.com'
+            if not user:
+                continue
+            ranking['email'] = user.email
+            ranking['username'] = user.username
+            
+            # 计算员工指数
+            if period == 'monthly':
+                # 月度指数 = 月度时间 / (30天 * 24小时)
+                ranking['employee_index'] = round(ranking['total_hours'] / MONTHLY_INDEX_HOURS, 4)
+            else:
+                # 累计指数 = 累计时间 / 注册以来的小时数
+                days_since_creation = (now - user.created_at).days + 1
+                ranking['employee_index'] = round(ranking['total_hours'] / (days_since_creation * 24), 4)
+        return rankings
 
 
 class AgentMetricsManager:
@@ -238,26 +545,27 @@ class AgentMetricsManager:
     def __init__(self, db_path: str = None):
         self.db = AgentMetricsDB(db_path)
     
-    def update_task_metrics(self, user_id: str, execution_time: float):
-        """当任务完成时更新指标"""
+    def update_task_metrics(self, user_id: str, execution_time: float, task_id: str = None):
+        """当任务完成时更新指标
+
+        记录一条使用事件（task_id 用于去重）后立即汇总。
+        """
         if not user_id or not execution_time:
             return
         
-        # 获取当前月份
-        current_month = datetime.now().strftime('%Y-%m')
-        
         # 将秒转换为小时
         hours = execution_time / 3600
         
-        # 更新数据库
-        self.db.update_user_metrics(user_id, current_month, hours, 1)
+        if self.db.record_usage_event(user_id, hours, 1, event_key=task_id):
+            self.db.rollup()
     
     def get_dashboard_metrics(self, user_id: str) -> Dict:
-        """获取仪表板显示的指标"""
+        """获取仪表板显示的指标（读取排行榜快照）"""
         current_month = datetime.now().strftime('%Y-%m')
+        cache = get_rankings_cache(self.db)
         
         # 获取用户当月指标
-        user_metrics = self.db.get_user_metrics(user_id, current_month)
+        user_metrics = cache.get_user_metrics(user_id, current_month)
         
         if not user_metrics:
             # 如果没有数据，返回默认值
@@ -272,52 +580,31 @@ class AgentMetricsManager:
             }
         
         # 获取公司排名（前10）
-        monthly_rankings = self.db.get_monthly_rankings(current_month)[:10]
+        monthly_rankings = cache.get_rankings('monthly', 10, current_month)
         
         return {
             'user_metrics': user_metrics,
             'monthly_rankings': monthly_rankings,
-            'full_agent_hours': 7 * 24 * 30  # 5040小时
+            'full_agent_hours': FULL_AGENT_HOURS
         }
     
-    def calculate_monthly_metrics(self):
-        """计算所有用户的月度指标（定时任务调用）"""
-        from models.task import TaskManager
-        from models.user import UserManager
-        
-        task_manager = TaskManager()
-        user_manager = UserManager()
-        
-        current_month = datetime.now().strftime('%Y-%m')
-        month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0)
-        
-        # 获取所有用户
-        users = user_manager.list_users()
-        
-        for user in users:
-            # 获取用户本月完成的任务
-            tasks = task_manager.get_all_tasks()
-            
-            total_hours = 0.0
-            total_tasks = 0
-            
-            for task in tasks:
-                # 检查任务是否属于该用户且在本月完成
-                if (hasattr(task, 'user_id') and task.user_id == user.id and 
-                    task.status == 'completed' and task.completed_at):
-                    
-                    # 检查完成时间是否在本月
-                    if isinstance(task.completed_at, str):
-                        completed_time = datetime.fromisoformat(task.completed_at)
-                    else:
-                        completed_time = task.completed_at
-                    
-                    if completed_time >= month_start:
-                        # 累加执行时间
-                        if task.execution_time:
-                            total_hours += task.execution_time / 3600
-                            total_tasks += 1
-            
-            # 更新数据库
-            if total_tasks > 0:
-                self.db.update_user_metrics(user.id, current_month, total_hours, total_tasks)
\ No newline at end of file
+    def calculate_monthly_metrics(self, start_month: str = None, end_month: str = None) -> int:
+        """根据任务记录重新计算月度指标（定时任务调用）
+
+        默认只重算当月；传入 start_month/end_month（YYYY-MM）可回填任意月份区间。
+        """
+        start_month = start_month or datetime.now().strftime('%Y-%m')
+        return self.db.recalculate_months(start_month, end_month or start_month)
+
+
+# Global rankings cache instances (one per database file)
+rankings_caches: Dict[str, RankingsCache] = {}
+
+
+def get_rankings_cache(db: Optional[AgentMetricsDB] = None) -> RankingsCache:
+    """获取指定数据库的排行榜快照缓存"""
+    db = db or AgentMetricsDB()
+    cache = rankings_caches.get(db.db_path)
+    if cache is None:
+        cache = rankings_caches.setdefault(db.db_path, RankingsCache(db))
+    return cache
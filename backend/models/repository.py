@@ -238,12 +238,11 @@ class RepositoryManager:
         if not repo:
             raise ValueError(f"Repository {repository_id} not found")
             
-        # 在 Git 中创建分支
+        # 在 Git 中创建分支（不切换主工作区，任务执行时再租用该分支的 worktree）
         try:
-            repo_path = Path(repo.local_path)
-            subprocess.run(['git', 'checkout', base_branch], cwd=repo_path, check=True)
-            subprocess.run(['git', 'checkout', '-b', name], cwd=repo_path, check=True)
-        except subprocess.CalledProcessError as e:
+            from services.worktree_manager import WorktreeManager, WorktreeError
+            WorktreeManager.create_branch(Path(repo.local_path), name, base_branch)
+        except (WorktreeError, OSError) as e:
             logger.error(f"Failed to create git branch: {e}")
             
         # 保存到数据库
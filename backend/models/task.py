@@ -4,6 +4,13 @@ from datetime import datetime
 from typing import Dict, List, Optional
 import sqlite3
 from contextlib import contextmanager
+from models.task_hierarchy import TaskHierarchy
+from utils.instrumentation import get_registry
+
+DB_CONNECTION_SECONDS = get_registry().histogram(
+    'sqlite_connection_seconds', 'Time spent holding a SQLite connection', ['store'])
+TASK_CACHE_LOOKUPS = get_registry().counter(
+    'task_manager_cache_lookups_total', 'TaskManager.get_task cache lookups', ['result'])
 
 class TaskDB:
     """SQLite数据库管理器，用于持久化任务数据"""
@@ -11,16 +18,18 @@ class TaskDB:
     def __init__(self, db_path: str = "tasks.db"):
         self.db_path = db_path
         self._init_db()
+        self.hierarchy = TaskHierarchy(db_path)
     
     @contextmanager
     def get_connection(self):
         """获取数据库连接的上下文管理器"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        try:
-            yield conn
-        finally:
-            conn.close()
+        with DB_CONNECTION_SECONDS.time(store='tasks'):
+            conn = sqlite3.connect(self.db_path)
+            conn.row_factory = sqlite3.Row
+            try:
+                yield conn
+            finally:
+                conn.close()
     
     def _init_db(self):
         """初始化数据库表"""
@@ -82,6 +91,12 @@ class TaskDB:
             if 'user_id' not in columns:
                 cursor.execute('ALTER TABLE tasks ADD COLUMN user_id TEXT')
             
+            # 月度指标按用户、状态和完成时间范围聚合
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_tasks_user_status_completed
+                ON tasks(user_id, status, completed_at)
+            ''')
+            
             conn.commit()
     
     def save_task(self, task: 'Task'):
@@ -96,6 +111,7 @@ class TaskDB:
             
             metadata = json.dumps({
                 'files_changed': getattr(task, 'files_changed', []),
+                'diff_stats': getattr(task, 'diff_stats', None),
                 'execution_time': getattr(task, 'execution_time', None),
                 'exit_code': getattr(task, 'exit_code', None),
                 'error': getattr(task, 'error', None),
@@ -151,6 +167,8 @@ class TaskDB:
                     metadata
                 ))
             
+            # 同一事务中维护层级闭包表
+            self.hierarchy.sync_node(task.id, getattr(task, 'parent_task_id', None), cursor=cursor)
             conn.commit()
     
     def get_task(self, task_id: str) -> Optional[Dict]:
@@ -196,8 +214,11 @@ class TaskDB:
                 DELETE FROM tasks 
                 WHERE created_at < datetime('now', '-{} days')
             '''.format(days))
+            deleted = cursor.rowcount
+            if deleted:
+                self.hierarchy.prune(cursor=cursor)
             conn.commit()
-            return cursor.rowcount
+            return deleted
     
     def _row_to_dict(self, row) -> Dict:
         """将数据库行转换为字典"""
@@ -237,8 +258,15 @@ class TaskManager:
             task.created_at = task_data['created_at']
             task.completed_at = task_data.get('completed_at')
             task.files_changed = task_data.get('files_changed', [])
+            task.diff_stats = task_data.get('diff_stats')
             task.execution_time = task_data.get('execution_time')
             
+            # 恢复父子任务相关属性，否则再次保存时会丢失层级关系
+            task.parent_task_id = task_data.get('parent_task_id')
+            task.context = task_data.get('context')
+            task.sequence_order = task_data.get('sequence_order', 0)
+            task.task_type = task_data.get('task_type', 'single')
+            
             self.cache[task.id] = task
     
     def add_task(self, task: 'Task'):
@@ -263,7 +291,9 @@ class TaskManager:
         """获取任务"""
         # 先检查缓存
         if task_id in self.cache:
+            TASK_CACHE_LOOKUPS.inc(result='hit')
             return self.cache[task_id]
+        TASK_CACHE_LOOKUPS.inc(result='miss')
         
         # 从数据库加载
         task_data = self.db.get_task(task_id)
@@ -291,6 +321,7 @@ class TaskManager:
             task.created_at = task_data.get('created_at')
             task.completed_at = task_data.get('completed_at')
             task.files_changed = task_data.get('files_changed', [])
+            task.diff_stats = task_data.get('diff_stats')
             task.execution_time = task_data.get('execution_time')
             task.exit_code = task_data.get('exit_code')
             task.error = task_data.get('error')
@@ -344,6 +375,7 @@ class TaskManager:
                         task.files_changed = []
                 else:
                     task.files_changed = files_changed or []
+                task.diff_stats = task_data.get('diff_stats')
                     
                 task.execution_time = task_data.get('execution_time')
                 task.exit_code = task_data.get('exit_code')
@@ -396,6 +428,8 @@ class Task:
         self.started_at = None
         self.completed_at = None
         self.files_changed = []
+        # 文件级增删行数（任务完成时计算并持久化）
+        self.diff_stats = None
         self.execution_time = None
         self.process = None
         self.exit_code = None
@@ -430,6 +464,7 @@ class Task:
             'completed_at': format_datetime(self.completed_at),
             'started_at': format_datetime(getattr(self, 'started_at', None)),
             'files_changed': self.files_changed,
+            'diff_stats': getattr(self, 'diff_stats', None),
             'execution_time': self.execution_time,
             'exit_code': getattr(self, 'exit_code', None),
             'error': getattr(self, 'error', None),
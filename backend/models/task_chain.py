@@ -0,0 +1,176 @@
+"""
+任务链 DAG 状态模型 - 持久化任务链的依赖关系、执行策略和每个节点的执行状态
+"""
+import json
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# 节点状态
+NODE_PENDING = 'pending'
+NODE_RUNNING = 'running'
+NODE_COMPLETED = 'completed'
+NODE_FAILED = 'failed'
+NODE_SKIPPED = 'skipped'
+
+# 失败策略
+FAIL_FAST = 'fail_fast'     # 任一节点最终失败后不再调度新节点
+CONTINUE = 'continue'       # 只跳过失败节点的下游节点，其他分支继续
+RETRY = 'retry'             # 失败后重试，重试耗尽后按 fail_fast 处理
+FAILURE_POLICIES = (FAIL_FAST, CONTINUE, RETRY)
+
+
+class TaskChainDB:
+    """任务链状态数据库管理器"""
+
+    def __init__(self, db_path: str = "tasks.db"):
+        self.db_path = db_path
+        self._init_db()
+
+    @contextmanager
+    def get_connection(self):
+        """获取数据库连接的上下文管理器"""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        """初始化任务链表"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS task_chains (
+                    id TEXT PRIMARY KEY,
+                    project_path TEXT NOT NULL,
+                    max_parallel INTEGER NOT NULL DEFAULT 1,
+                    failure_policy TEXT NOT NULL DEFAULT 'fail_fast',
+                    max_retries INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    completed_at TIMESTAMP
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS task_chain_nodes (
+                    chain_id TEXT NOT NULL,
+                    task_id TEXT NOT NULL,
+                    prompt TEXT NOT NULL,
+                    depends_on TEXT NOT NULL DEFAULT '[]',
+                    sequence_order INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    started_at TIMESTAMP,
+                    finished_at TIMESTAMP,
+                    PRIMARY KEY (chain_id, task_id),
+                    FOREIGN KEY (chain_id) REFERENCES task_chains(id)
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_task_chains_status
+                ON task_chains(status)
+            ''')
+            conn.commit()
+
+    def create_chain(self, chain_id: str, project_path: str, nodes: List[Dict],
+                     max_parallel: int = 1, failure_policy: str = FAIL_FAST,
+                     max_retries: int = 0):
+        """创建任务链及其全部节点
+
+        nodes: [{'task_id', 'prompt', 'depends_on': [task_id, ...], 'sequence_order'}]
+        """
+        now = datetime.now().isoformat()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO task_chains
+                (id, project_path, max_parallel, failure_policy, max_retries, status, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (chain_id, project_path, max_parallel, failure_policy, max_retries,
+                  NODE_PENDING, now, now))
+            cursor.executemany('''
+                INSERT INTO task_chain_nodes (chain_id, task_id, prompt, depends_on, sequence_order, status)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [
+                (chain_id, node['task_id'], node['prompt'], json.dumps(node.get('depends_on', [])),
+                 node.get('sequence_order', 0), NODE_PENDING)
+                for node in nodes
+            ])
+            conn.commit()
+
+    def get_chain(self, chain_id: str) -> Optional[Dict]:
+        """获取任务链及节点状态"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM task_chains WHERE id = ?', (chain_id,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+
+            chain = dict(row)
+            cursor.execute('''
+                SELECT * FROM task_chain_nodes
+                WHERE chain_id = ?
+                ORDER BY sequence_order
+            ''', (chain_id,))
+            chain['nodes'] = []
+            for node_row in cursor.fetchall():
+                node = dict(node_row)
+                node['depends_on'] = json.loads(node['depends_on'] or '[]')
+                chain['nodes'].append(node)
+            return chain
+
+    def update_node(self, chain_id: str, task_id: str, **fields):
+        """更新节点状态字段"""
+        if not fields:
+            return
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f'UPDATE task_chain_nodes SET {assignments} WHERE chain_id = ? AND task_id = ?',
+                (*fields.values(), chain_id, task_id)
+            )
+            conn.commit()
+
+    def update_nodes_status(self, chain_id: str, task_ids: List[str], status: str):
+        """批量更新节点状态（例如跳过下游节点）"""
+        if not task_ids:
+            return
+        now = datetime.now().isoformat()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany('''
+                UPDATE task_chain_nodes SET status = ?, finished_at = ?
+                WHERE chain_id = ? AND task_id = ?
+            ''', [(status, now, chain_id, task_id) for task_id in task_ids])
+            conn.commit()
+
+    def update_chain_status(self, chain_id: str, status: str):
+        """更新任务链整体状态"""
+        now = datetime.now().isoformat()
+        finished = status in (NODE_COMPLETED, NODE_FAILED)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE task_chains SET status = ?, updated_at = ?,
+                    completed_at = CASE WHEN ? THEN ? ELSE completed_at END
+                WHERE id = ?
+            ''', (status, now, finished, now, chain_id))
+            conn.commit()
+
+    def get_unfinished_chains(self) -> List[str]:
+        """获取未结束的任务链 ID（用于服务重启后恢复）"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id FROM task_chains
+                WHERE status IN ('pending', 'running')
+                ORDER BY created_at
+            ''')
+            return [row['id'] for row in cursor.fetchall()]
@@ -3,11 +3,17 @@
 """
 import json
 import os
+import threading
+import time
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 import sqlite3
 from contextlib import contextmanager
+from models.task_hierarchy import TaskHierarchy
+
+# 任务树快照的最长缓存时间（秒），用于兜住其他模块直接写 tasks 表的情况
+TREE_SNAPSHOT_TTL = 5.0
 
 class TaskNode:
     """任务节点 - 类似文件系统中的文件/文件夹"""
@@ -83,9 +89,15 @@ class TaskNode:
 class TaskFileSystem:
     """任务文件系统管理器"""
     
-    def __init__(self, db_path: str = "tasks.db"):
+    def __init__(self, db_path: str = "tasks.db", snapshot_ttl: float = TREE_SNAPSHOT_TTL):
         self.db_path = db_path
+        self.snapshot_ttl = snapshot_ttl
+        # 每次通过本管理器修改任务结构时递增，用于使任务树快照失效
+        self.version = 0
+        self._snapshots: Dict[Tuple[str, int], Tuple[int, float, Dict]] = {}
+        self._snapshot_lock = threading.Lock()
         self._init_db()
+        self.hierarchy = TaskHierarchy(db_path)
     
     @contextmanager
     def get_connection(self):
@@ -98,9 +110,43 @@ class TaskFileSystem:
             conn.close()
     
     def _init_db(self):
-        """初始化数据库（执行迁移脚本）"""
-        # 这里应该执行 filesystem_structure.sql
-        pass
+        """初始化数据库：补齐文件系统字段和路径索引（对应 filesystem_structure.sql）"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'tasks'")
+            if not cursor.fetchone():
+                # tasks 表由 TaskDB 创建
+                return
+            
+            cursor.execute("PRAGMA table_info(tasks)")
+            columns = {row[1] for row in cursor.fetchall()}
+            
+            if 'task_path' not in columns:
+                cursor.execute('ALTER TABLE tasks ADD COLUMN task_path TEXT')
+            
+            if 'task_name' not in columns:
+                cursor.execute('ALTER TABLE tasks ADD COLUMN task_name TEXT')
+            
+            if 'is_folder' not in columns:
+                cursor.execute('ALTER TABLE tasks ADD COLUMN is_folder BOOLEAN DEFAULT 1')
+            
+            if 'depth' not in columns:
+                cursor.execute('ALTER TABLE tasks ADD COLUMN depth INTEGER DEFAULT 0')
+            
+            if 'description' not in columns:
+                cursor.execute('ALTER TABLE tasks ADD COLUMN description TEXT')
+            
+            # 子树查询依赖 task_path 上的范围扫描
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_task_path ON tasks(task_path)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_task_parent ON tasks(parent_task_id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_task_depth ON tasks(depth)')
+            conn.commit()
+    
+    def _bump_version(self):
+        """任务结构发生变化，使所有任务树快照失效"""
+        with self._snapshot_lock:
+            self.version += 1
+            self._snapshots.clear()
     
     def create_task_folder(self, parent_path: str, name: str, prompt: str = "", description: str = "") -> TaskNode:
         """创建任务文件夹"""
@@ -144,8 +190,10 @@ class TaskFileSystem:
                 task.created_at.isoformat(), task.updated_at.isoformat(),
                 task.path  # 使用task_path作为project_path
             ))
+            self.hierarchy.add_node(task.id, task.parent_id, cursor=cursor)
             conn.commit()
         
+        self._bump_version()
         return task
     
     def get_task_by_path(self, path: str) -> Optional[TaskNode]:
@@ -184,34 +232,90 @@ class TaskFileSystem:
             
             return tasks
     
-    def get_task_tree(self, root_path: str = "/", max_depth: int = -1) -> Dict:
-        """获取任务树结构"""
-        def build_tree(path: str, current_depth: int = 0) -> List[Dict]:
-            if max_depth >= 0 and current_depth >= max_depth:
-                return []
-            
-            children = []
-            for task in self.list_directory(path):
-                task_dict = task.to_dict()
-                if task.is_folder:
-                    task_dict['children'] = build_tree(task.path, current_depth + 1)
-                children.append(task_dict)
-            
-            return children
+    def get_task_tree(self, root_path: str = "/", max_depth: int = -1,
+                      use_cache: bool = False) -> Dict:
+        """获取任务树结构
         
-        if root_path == "/":
-            return {
-                'name': 'Workspace',
-                'path': '/',
-                'children': build_tree("/")
-            }
-        else:
-            root_task = self.get_task_by_path(root_path)
-            if root_task:
+        整棵子树通过一次 task_path 前缀范围查询取出（走 idx_task_path），
+        max_depth 在 SQL 中限制，然后在内存中 O(N) 组装。
+        use_cache=True 时返回带版本号的快照，任务结构变化后自动失效。
+        """
+        if not use_cache:
+            return self._load_task_tree(root_path, max_depth)
+        
+        key = (root_path, max_depth)
+        with self._snapshot_lock:
+            version = self.version
+            cached = self._snapshots.get(key)
+        if cached and cached[0] == version and time.monotonic() - cached[1] < self.snapshot_ttl:
+            return cached[2]
+        
+        tree = self._load_task_tree(root_path, max_depth)
+        with self._snapshot_lock:
+            # 加载期间结构可能已变化，只缓存与当前版本一致的结果
+            if self.version == version:
+                self._snapshots[key] = (version, time.monotonic(), tree)
+        return tree
+    
+    def _load_task_tree(self, root_path: str, max_depth: int) -> Optional[Dict]:
+        """单次查询加载子树并组装"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            
+            if root_path == "/":
+                root_dict = {
+                    'name': 'Workspace',
+                    'path': '/',
+                    'children': []
+                }
+                root_id = None
+                root_depth = 0
+                prefix = "/"
+            else:
+                cursor.execute('SELECT * FROM tasks WHERE task_path = ?', (root_path,))
+                row = cursor.fetchone()
+                if not row:
+                    return None
+                root_task = self._row_to_task_node(row)
                 root_dict = root_task.to_dict()
-                root_dict['children'] = build_tree(root_path)
+                root_dict['children'] = []
+                root_id = root_task.id
+                root_depth = root_task.depth
+                prefix = root_path.rstrip('/') + '/'
+            
+            if max_depth == 0:
                 return root_dict
-            return None
+            
+            # '0' 是 '/' 之后的下一个字符，[prefix, prefix 的后继) 恰好覆盖所有后代路径
+            query = 'SELECT * FROM tasks WHERE task_path >= ? AND task_path < ?'
+            params = [prefix, prefix[:-1] + '0']
+            if max_depth > 0:
+                query += ' AND depth <= ?'
+                params.append(root_depth + max_depth)
+            query += ' ORDER BY task_name'
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+        
+        nodes: Dict[str, Dict] = {}
+        ordered = []
+        for row in rows:
+            task = self._row_to_task_node(row)
+            task_dict = task.to_dict()
+            if task.is_folder:
+                task_dict['children'] = []
+            nodes[task.id] = task_dict
+            ordered.append(task_dict)
+        
+        # 按 parent_task_id 挂接，行已按名称排序，因此每层子节点保持有序
+        for task_dict in ordered:
+            parent_id = task_dict['parent_id']
+            is_top = task_dict['depth'] == 1 if root_id is None else parent_id == root_id
+            if is_top:
+                root_dict['children'].append(task_dict)
+            elif parent_id in nodes and 'children' in nodes[parent_id]:
+                nodes[parent_id]['children'].append(task_dict)
+        
+        return root_dict
     
     def move_task(self, source_path: str, dest_parent_path: str, new_name: Optional[str] = None) -> bool:
         """移动任务（类似 mv 命令）"""
@@ -219,6 +323,10 @@ class TaskFileSystem:
         if not source_task:
             return False
         
+        # 不能移动到自身或自己的子树中
+        if dest_parent_path == source_task.path or dest_parent_path.startswith(source_task.path + '/'):
+            raise ValueError("Cannot move a task into itself or one of its subtasks.")
+        
         # 构建新路径
         name = new_name or source_task.name
         if dest_parent_path == "/":
@@ -233,7 +341,12 @@ class TaskFileSystem:
             new_depth = dest_parent.depth + 1
             new_parent_id = dest_parent.id
         
-        # 更新数据库
+        if new_path != source_task.path:
+            existing = self.get_task_by_path(new_path)
+            if existing and existing.id != source_task.id:
+                return False
+        
+        # 更新数据库（任务本身和整棵子树在同一事务中完成）
         with self.get_connection() as conn:
             cursor = conn.cursor()
             
@@ -248,30 +361,38 @@ class TaskFileSystem:
                 WHERE id = ?
             ''', (new_path, name, new_parent_id, new_depth, datetime.now().isoformat(), source_task.id))
             
-            # 如果是文件夹，需要递归更新所有子任务的路径
+            # 如果是文件夹，需要更新所有子任务的路径
             if source_task.is_folder:
-                self._update_children_paths(cursor, source_task.path, new_path)
+                self._update_children_paths(cursor, source_task.path, new_path, new_depth)
+            
+            if new_parent_id != source_task.parent_id:
+                self.hierarchy.move_node(source_task.id, new_parent_id, cursor=cursor)
             
             conn.commit()
         
+        self._bump_version()
         return True
     
-    def _update_children_paths(self, cursor, old_parent_path: str, new_parent_path: str):
-        """递归更新子任务路径"""
-        cursor.execute(
-            "SELECT id, task_path, depth FROM tasks WHERE task_path LIKE ?",
-            (f"{old_parent_path}/%",)
-        )
+    def _update_children_paths(self, cursor, old_parent_path: str, new_parent_path: str,
+                               new_parent_depth: int):
+        """用一条 UPDATE 改写整棵子树的路径前缀和深度
         
-        for row in cursor.fetchall():
-            old_path = row['task_path']
-            new_path = old_path.replace(old_parent_path, new_parent_path, 1)
-            new_depth = len(new_path.strip('/').split('/'))
-            
-            cursor.execute(
-                "UPDATE tasks SET task_path = ?, depth = ?, updated_at = ? WHERE id = ?",
-                (new_path, new_depth, datetime.now().isoformat(), row['id'])
-            )
+        前缀用范围条件 [old/, old0) 匹配（走 idx_task_path），只替换开头的前缀；
+        深度由新父节点深度加上相对路径中的 '/' 个数得出。
+        """
+        offset = len(old_parent_path) + 1
+        cursor.execute('''
+            UPDATE tasks SET
+                task_path = ? || substr(task_path, ?),
+                depth = ? + length(substr(task_path, ?)) - length(replace(substr(task_path, ?), '/', '')),
+                updated_at = ?
+            WHERE task_path >= ? AND task_path < ?
+        ''', (
+            new_parent_path, offset,
+            new_parent_depth, offset, offset,
+            datetime.now().isoformat(),
+            old_parent_path + '/', old_parent_path + '0'
+        ))
     
     def delete_task(self, path: str, recursive: bool = False) -> bool:
         """删除任务（类似 rm 命令）"""
@@ -290,14 +411,16 @@ class TaskFileSystem:
             if recursive and task.is_folder:
                 # 递归删除所有子任务
                 cursor.execute(
-                    "DELETE FROM tasks WHERE task_path LIKE ? OR id = ?",
-                    (f"{path}/%", task.id)
+                    "DELETE FROM tasks WHERE (task_path >= ? AND task_path < ?) OR id = ?",
+                    (f"{task.path}/", f"{task.path}0", task.id)
                 )
             else:
                 cursor.execute("DELETE FROM tasks WHERE id = ?", (task.id,))
             
+            self.hierarchy.delete_subtree(task.id, cursor=cursor)
             conn.commit()
         
+        self._bump_version()
         return True
     
     def _row_to_task_node(self, row) -> TaskNode:
@@ -0,0 +1,279 @@
+"""
+任务层级闭包表 - 为 parent_task_id 构成的任务树维护 (祖先, 后代, 距离) 关系，
+使祖先、后代查询以及子树状态汇总都只需要一次索引查询
+"""
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# 子树状态汇总的优先级：任一子任务失败即为失败，其次是运行中
+ROLLUP_STATUS_PRIORITY = ('failed', 'running', 'pending', 'cancelled', 'completed')
+# 重建闭包表时的最大深度，防止数据中存在环导致递归不终止
+MAX_HIERARCHY_DEPTH = 1000
+
+
+class TaskHierarchy:
+    """任务层级闭包表管理器
+
+    task_closure 中每个任务有一条 (自身, 自身, 0) 记录，以及到每个祖先的一条记录。
+    写操作都接受可选的 cursor 参数，以便与调用方对 tasks 表的修改在同一事务中提交。
+    """
+
+    def __init__(self, db_path: str = "tasks.db"):
+        self.db_path = db_path
+        self._init_db()
+
+    @contextmanager
+    def get_connection(self):
+        """获取数据库连接的上下文管理器"""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _cursor(self, cursor=None):
+        """复用调用方的 cursor，或者打开新连接并在结束时提交"""
+        if cursor is not None:
+            yield cursor
+            return
+        with self.get_connection() as conn:
+            own_cursor = conn.cursor()
+            yield own_cursor
+            conn.commit()
+
+    def _init_db(self):
+        """初始化闭包表；已有任务但闭包表为空时自动回填"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS task_closure (
+                    ancestor_id TEXT NOT NULL,
+                    descendant_id TEXT NOT NULL,
+                    depth INTEGER NOT NULL,
+                    PRIMARY KEY (ancestor_id, descendant_id)
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_task_closure_descendant
+                ON task_closure(descendant_id, depth)
+            ''')
+
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'tasks'")
+            if cursor.fetchone():
+                # 插入任务时需要按 parent_task_id 查找先于父任务插入的子任务
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_task_parent ON tasks(parent_task_id)')
+                cursor.execute('SELECT EXISTS (SELECT 1 FROM task_closure)')
+                is_empty = not cursor.fetchone()[0]
+                cursor.execute('SELECT EXISTS (SELECT 1 FROM tasks)')
+                if is_empty and cursor.fetchone()[0]:
+                    self._rebuild(cursor)
+
+            conn.commit()
+
+    def rebuild(self) -> int:
+        """根据 tasks.parent_task_id 重建整个闭包表，返回记录数"""
+        with self._cursor() as cursor:
+            return self._rebuild(cursor)
+
+    def _rebuild(self, cursor) -> int:
+        cursor.execute('DELETE FROM task_closure')
+        cursor.execute('''
+            WITH RECURSIVE closure(ancestor_id, descendant_id, depth) AS (
+                SELECT id, id, 0 FROM tasks
+                UNION ALL
+                SELECT c.ancestor_id, t.id, c.depth + 1
+                FROM closure c
+                JOIN tasks t ON t.parent_task_id = c.descendant_id
+                WHERE c.depth < ?
+            )
+            INSERT OR IGNORE INTO task_closure (ancestor_id, descendant_id, depth)
+            SELECT ancestor_id, descendant_id, depth FROM closure
+        ''', (MAX_HIERARCHY_DEPTH,))
+        cursor.execute('SELECT COUNT(*) FROM task_closure')
+        return cursor.fetchone()[0]
+
+    def _link_subtree(self, cursor, node_id: str, parent_id: str):
+        """把 node 的整棵子树挂到 parent 的所有祖先（含 parent 自身）下"""
+        cursor.execute('''
+            INSERT OR IGNORE INTO task_closure (ancestor_id, descendant_id, depth)
+            SELECT a.ancestor_id, d.descendant_id, a.depth + d.depth + 1
+            FROM task_closure a, task_closure d
+            WHERE a.descendant_id = ? AND d.ancestor_id = ?
+        ''', (parent_id, node_id))
+
+    def _unlink_subtree(self, cursor, node_id: str):
+        """断开 node 子树与其外部祖先的关系，子树内部关系保留"""
+        cursor.execute('''
+            DELETE FROM task_closure
+            WHERE descendant_id IN (SELECT descendant_id FROM task_closure WHERE ancestor_id = ?)
+              AND ancestor_id NOT IN (SELECT descendant_id FROM task_closure WHERE ancestor_id = ?)
+        ''', (node_id, node_id))
+
+    def add_node(self, task_id: str, parent_id: Optional[str] = None, cursor=None):
+        """登记新任务
+
+        允许乱序插入：父任务尚未登记时先只记录自身，父任务登记时会把
+        已存在的子任务（按 tasks.parent_task_id 查找）连同其子树一起挂上。
+        """
+        with self._cursor(cursor) as cur:
+            cur.execute(
+                'INSERT OR IGNORE INTO task_closure (ancestor_id, descendant_id, depth) VALUES (?, ?, 0)',
+                (task_id, task_id)
+            )
+            if parent_id:
+                self._link_subtree(cur, task_id, parent_id)
+
+            cur.execute('''
+                SELECT t.id FROM tasks t
+                WHERE t.parent_task_id = ?
+                  AND EXISTS (
+                      SELECT 1 FROM task_closure s
+                      WHERE s.ancestor_id = t.id AND s.descendant_id = t.id
+                  )
+                  AND NOT EXISTS (
+                      SELECT 1 FROM task_closure c
+                      WHERE c.ancestor_id = ? AND c.descendant_id = t.id
+                  )
+            ''', (task_id, task_id))
+            for row in cur.fetchall():
+                self._link_subtree(cur, row[0], task_id)
+
+    def move_node(self, task_id: str, new_parent_id: Optional[str] = None, cursor=None):
+        """把任务（连同子树）移动到新的父任务下"""
+        with self._cursor(cursor) as cur:
+            if new_parent_id:
+                cur.execute(
+                    'SELECT 1 FROM task_closure WHERE ancestor_id = ? AND descendant_id = ?',
+                    (task_id, new_parent_id)
+                )
+                if cur.fetchone():
+                    raise ValueError("Cannot move a task into itself or one of its subtasks.")
+
+            self._unlink_subtree(cur, task_id)
+            if new_parent_id:
+                self._link_subtree(cur, task_id, new_parent_id)
+
+    def sync_node(self, task_id: str, parent_id: Optional[str] = None, cursor=None):
+        """保存任务后调用：新任务则登记，父任务变化则移动，否则不做任何事"""
+        with self._cursor(cursor) as cur:
+            cur.execute(
+                'SELECT ancestor_id, depth FROM task_closure WHERE descendant_id = ? AND depth <= 1',
+                (task_id,)
+            )
+            rows = {row[1]: row[0] for row in cur.fetchall()}
+            if 0 not in rows:
+                self.add_node(task_id, parent_id, cursor=cur)
+            elif rows.get(1) != parent_id:
+                self.move_node(task_id, parent_id, cursor=cur)
+
+    def delete_subtree(self, task_id: str, cursor=None) -> List[str]:
+        """删除任务及其所有后代的闭包记录，返回被删除的任务 ID"""
+        with self._cursor(cursor) as cur:
+            cur.execute('SELECT descendant_id FROM task_closure WHERE ancestor_id = ?', (task_id,))
+            removed = [row[0] for row in cur.fetchall()]
+            cur.execute('''
+                DELETE FROM task_closure
+                WHERE descendant_id IN (SELECT descendant_id FROM task_closure WHERE ancestor_id = ?)
+            ''', (task_id,))
+            return removed
+
+    def prune(self, cursor=None) -> int:
+        """清理已不存在的任务的闭包记录（例如批量删除旧任务之后）"""
+        with self._cursor(cursor) as cur:
+            cur.execute('''
+                DELETE FROM task_closure
+                WHERE descendant_id NOT IN (SELECT id FROM tasks)
+                   OR ancestor_id NOT IN (SELECT id FROM tasks)
+            ''')
+            return cur.rowcount
+
+    def get_ancestor_ids(self, task_id: str) -> List[str]:
+        """祖先 ID 列表，从根到直接父任务"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT ancestor_id FROM task_closure
+                WHERE descendant_id = ? AND depth > 0
+                ORDER BY depth DESC
+            ''', (task_id,))
+            return [row[0] for row in cursor.fetchall()]
+
+    def get_ancestors(self, task_id: str) -> List[Dict]:
+        """祖先任务（从根到直接父任务），用于面包屑导航"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT t.*, c.depth AS distance
+                FROM task_closure c
+                JOIN tasks t ON t.id = c.ancestor_id
+                WHERE c.descendant_id = ? AND c.depth > 0
+                ORDER BY c.depth DESC
+            ''', (task_id,))
+            return [self._row_to_summary(row) for row in cursor.fetchall()]
+
+    def get_descendants(self, task_id: str, max_depth: Optional[int] = None) -> List[Dict]:
+        """所有后代任务，按距离和顺序排列；max_depth 限制相对深度"""
+        query = '''
+            SELECT t.*, c.depth AS distance
+            FROM task_closure c
+            JOIN tasks t ON t.id = c.descendant_id
+            WHERE c.ancestor_id = ? AND c.depth > 0
+        '''
+        params = [task_id]
+        if max_depth is not None and max_depth >= 0:
+            query += ' AND c.depth <= ?'
+            params.append(max_depth)
+        query += ' ORDER BY c.depth, t.sequence_order, t.created_at'
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            return [self._row_to_summary(row) for row in cursor.fetchall()]
+
+    def get_rollup(self, task_id: str) -> Dict:
+        """子树状态汇总（不含任务自身）"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT t.status AS status, COUNT(*) AS count, MAX(c.depth) AS max_depth
+                FROM task_closure c
+                JOIN tasks t ON t.id = c.descendant_id
+                WHERE c.ancestor_id = ? AND c.depth > 0
+                GROUP BY t.status
+            ''', (task_id,))
+            rows = cursor.fetchall()
+
+        by_status = {row['status']: row['count'] for row in rows}
+        total = sum(by_status.values())
+        status = None
+        for candidate in ROLLUP_STATUS_PRIORITY:
+            if by_status.get(candidate):
+                status = candidate
+                break
+        if status == 'completed' and by_status['completed'] != total:
+            status = 'pending'
+
+        return {
+            'task_id': task_id,
+            'total': total,
+            'by_status': by_status,
+            'max_depth': max((row['max_depth'] for row in rows), default=0),
+            'progress': round(by_status.get('completed', 0) / total, 4) if total else None,
+            'status': status
+        }
+
+    def _row_to_summary(self, row) -> Dict:
+        keys = row.keys()
+        return {
+            'id': row['id'],
+            'name': row['task_name'] if 'task_name' in keys and row['task_name'] else (row['prompt'] or '')[:30],
+            'path': row['task_path'] if 'task_path' in keys else None,
+            'parent_id': row['parent_task_id'],
+            'status': row['status'],
+            'task_type': row['task_type'] if 'task_type' in keys else None,
+            'sequence_order': row['sequence_order'] if 'sequence_order' in keys else 0,
+            'distance': row['distance']
+        }
@@ -0,0 +1,295 @@
+"""
+任务时序指标存储 - 按分钟聚合的吞吐量和延迟指标，使用数组直方图支持任意时间窗口的分位数查询
+"""
+import math
+import sqlite3
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 指标名称
+QUEUE_WAIT = 'queue_wait'          # 入队到开始执行（秒）
+START_LATENCY = 'start_latency'    # 开始执行到首行输出（秒）
+RUN_DURATION = 'run_duration'      # 执行时长（秒）
+OUTPUT_BYTES = 'output_bytes'      # 输出字节数
+METRICS = (QUEUE_WAIT, START_LATENCY, RUN_DURATION, OUTPUT_BYTES)
+
+# 直方图桶：第 0 桶为 <= HISTOGRAM_MIN，之后按 HISTOGRAM_GROWTH 指数增长（相对误差约 10%）
+HISTOGRAM_MIN = 0.001
+HISTOGRAM_GROWTH = 1.2
+HISTOGRAM_BUCKETS = 200
+
+DEFAULT_PERCENTILES = (50, 95, 99)
+# 时序数据默认保留天数
+DEFAULT_RETENTION_DAYS = 30
+
+_LOG_GROWTH = math.log(HISTOGRAM_GROWTH)
+
+
+def bucket_index(value: float) -> int:
+    """值所在的直方图桶"""
+    if value <= HISTOGRAM_MIN:
+        return 0
+    index = int(math.log(value / HISTOGRAM_MIN) / _LOG_GROWTH) + 1
+    return min(index, HISTOGRAM_BUCKETS - 1)
+
+
+def bucket_bounds(index: int) -> Tuple[float, float]:
+    """桶的 (下界, 上界)"""
+    if index == 0:
+        return 0.0, HISTOGRAM_MIN
+    return (HISTOGRAM_MIN * HISTOGRAM_GROWTH ** (index - 1),
+            HISTOGRAM_MIN * HISTOGRAM_GROWTH ** index)
+
+
+def empty_histogram() -> array:
+    return array('I', [0]) * HISTOGRAM_BUCKETS
+
+
+def histogram_from_bytes(data: Optional[bytes]) -> array:
+    histogram = array('I')
+    if data:
+        histogram.frombytes(data)
+    if len(histogram) != HISTOGRAM_BUCKETS:
+        return empty_histogram()
+    return histogram
+
+
+def histogram_percentile(histogram: array, total: int, percentile: float,
+                         minimum: float, maximum: float) -> Optional[float]:
+    """在合并后的直方图上估算分位数（桶内线性插值，并限制在实际最小/最大值之间）"""
+    if not total:
+        return None
+    target = total * percentile / 100.0
+    seen = 0
+    for index, count in enumerate(histogram):
+        if not count:
+            continue
+        if seen + count >= target:
+            low, high = bucket_bounds(index)
+            value = low + (high - low) * max(0.0, target - seen) / count
+            return min(max(value, minimum), maximum)
+        seen += count
+    return maximum
+
+
+def _minute(ts: datetime) -> int:
+    return int(ts.timestamp() // 60)
+
+
+class TaskTimeSeriesDB:
+    """任务时序指标数据库管理器"""
+
+    def __init__(self, db_path: str = "tasks.db"):
+        self.db_path = db_path
+        self._init_db()
+
+    @contextmanager
+    def get_connection(self):
+        """获取数据库连接的上下文管理器"""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        """初始化时序表"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            # 每分钟每个 (指标, 项目, 用户) 一行，histogram 为 uint32 数组
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS task_metric_buckets (
+                    metric TEXT NOT NULL,
+                    minute INTEGER NOT NULL,
+                    project_path TEXT NOT NULL DEFAULT '',
+                    user_id TEXT NOT NULL DEFAULT '',
+                    count INTEGER NOT NULL DEFAULT 0,
+                    total REAL NOT NULL DEFAULT 0,
+                    min_value REAL,
+                    max_value REAL,
+                    histogram BLOB NOT NULL,
+                    PRIMARY KEY (metric, minute, project_path, user_id)
+                )
+            ''')
+            # 每分钟的任务结果计数
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS task_outcome_buckets (
+                    minute INTEGER NOT NULL,
+                    project_path TEXT NOT NULL DEFAULT '',
+                    user_id TEXT NOT NULL DEFAULT '',
+                    status TEXT NOT NULL,
+                    exit_code INTEGER NOT NULL DEFAULT 0,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (minute, project_path, user_id, status, exit_code)
+                )
+            ''')
+            conn.commit()
+
+    def record_task(self, values: Dict[str, float], status: str, exit_code: Optional[int] = None,
+                    project_path: Optional[str] = None, user_id: Optional[str] = None,
+                    timestamp: Optional[datetime] = None):
+        """记录一个任务的各项指标和结果（同一事务内合并到当前分钟的桶）
+
+        values: {metric: value}，值为 None 的指标会被忽略。
+        """
+        minute = _minute(timestamp or datetime.now())
+        project_path = project_path or ''
+        user_id = user_id or ''
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                for metric, value in values.items():
+                    if value is None:
+                        continue
+                    value = max(0.0, float(value))
+                    cursor.execute('''
+                        SELECT histogram FROM task_metric_buckets
+                        WHERE metric = ? AND minute = ? AND project_path = ? AND user_id = ?
+                    ''', (metric, minute, project_path, user_id))
+                    row = cursor.fetchone()
+                    histogram = histogram_from_bytes(row['histogram'] if row else None)
+                    histogram[bucket_index(value)] += 1
+                    cursor.execute('''
+                        INSERT INTO task_metric_buckets
+                        (metric, minute, project_path, user_id, count, total, min_value, max_value, histogram)
+                        VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?)
+                        ON CONFLICT(metric, minute, project_path, user_id) DO UPDATE SET
+                            count = count + 1,
+                            total = total + excluded.total,
+                            min_value = MIN(min_value, excluded.min_value),
+                            max_value = MAX(max_value, excluded.max_value),
+                            histogram = excluded.histogram
+                    ''', (metric, minute, project_path, user_id, value, value, value,
+                          histogram.tobytes()))
+
+                cursor.execute('''
+                    INSERT INTO task_outcome_buckets (minute, project_path, user_id, status, exit_code, count)
+                    VALUES (?, ?, ?, ?, ?, 1)
+                    ON CONFLICT(minute, project_path, user_id, status, exit_code) DO UPDATE SET
+                        count = count + 1
+                ''', (minute, project_path, user_id, status,
+                      exit_code if exit_code is not None else 0))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def _filters(self, start: datetime, end: datetime, project_path: Optional[str],
+                 user_id: Optional[str]) -> Tuple[str, list]:
+        clauses = ['minute >= ?', 'minute < ?']
+        params = [_minute(start), _minute(end) + (1 if end.second or end.microsecond else 0)]
+        if project_path is not None:
+            clauses.append('project_path = ?')
+            params.append(project_path)
+        if user_id is not None:
+            clauses.append('user_id = ?')
+            params.append(user_id)
+        return ' AND '.join(clauses), params
+
+    def get_percentiles(self, metric: str, start: datetime, end: datetime,
+                        project_path: Optional[str] = None, user_id: Optional[str] = None,
+                        percentiles: Iterable[float] = DEFAULT_PERCENTILES,
+                        step_minutes: Optional[int] = None) -> Dict:
+        """查询时间窗口内某指标的分位数
+
+        step_minutes 为空时返回整个窗口的汇总；否则额外返回按 step_minutes 分段的序列。
+        """
+        where, params = self._filters(start, end, project_path, user_id)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT minute, count, total, min_value, max_value, histogram
+                FROM task_metric_buckets
+                WHERE metric = ? AND {where}
+                ORDER BY minute
+            ''', [metric] + params)
+            rows = cursor.fetchall()
+
+        percentiles = list(percentiles)
+        result = {
+            'metric': metric,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            **self._summarize(rows, percentiles)
+        }
+        if step_minutes:
+            step = max(1, int(step_minutes))
+            groups: Dict[int, list] = {}
+            for row in rows:
+                groups.setdefault(row['minute'] - row['minute'] % step, []).append(row)
+            result['series'] = [
+                {'timestamp': datetime.fromtimestamp(bucket * 60).isoformat(),
+                 **self._summarize(group, percentiles)}
+                for bucket, group in sorted(groups.items())
+            ]
+        return result
+
+    def _summarize(self, rows, percentiles: List[float]) -> Dict:
+        histogram = empty_histogram()
+        count = 0
+        total = 0.0
+        minimum = None
+        maximum = None
+        for row in rows:
+            for index, value in enumerate(histogram_from_bytes(row['histogram'])):
+                if value:
+                    histogram[index] += value
+            count += row['count']
+            total += row['total']
+            minimum = row['min_value'] if minimum is None else min(minimum, row['min_value'])
+            maximum = row['max_value'] if maximum is None else max(maximum, row['max_value'])
+
+        summary = {
+            'count': count,
+            'mean': total / count if count else None,
+            'min': minimum,
+            'max': maximum,
+        }
+        for percentile in percentiles:
+            key = f"p{percentile:g}"
+            summary[key] = histogram_percentile(histogram, count, percentile, minimum, maximum)
+        return summary
+
+    def get_outcomes(self, start: datetime, end: datetime,
+                     project_path: Optional[str] = None, user_id: Optional[str] = None) -> Dict:
+        """时间窗口内按状态/退出码统计的任务数和吞吐量（任务/分钟）"""
+        where, params = self._filters(start, end, project_path, user_id)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT status, exit_code, SUM(count) AS count
+                FROM task_outcome_buckets
+                WHERE {where}
+                GROUP BY status, exit_code
+                ORDER BY count DESC
+            ''', params)
+            outcomes = [dict(row) for row in cursor.fetchall()]
+
+        total = sum(outcome['count'] for outcome in outcomes)
+        minutes = max(1.0, (end - start).total_seconds() / 60)
+        by_status: Dict[str, int] = {}
+        for outcome in outcomes:
+            by_status[outcome['status']] = by_status.get(outcome['status'], 0) + outcome['count']
+        return {
+            'total': total,
+            'throughput_per_minute': total / minutes,
+            'by_status': by_status,
+            'by_exit_code': outcomes
+        }
+
+    def prune(self, retention_days: int = DEFAULT_RETENTION_DAYS) -> int:
+        """删除超过保留期的时序数据"""
+        cutoff = _minute(datetime.now() - timedelta(days=retention_days))
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM task_metric_buckets WHERE minute < ?', (cutoff,))
+            deleted = cursor.rowcount
+            cursor.execute('DELETE FROM task_outcome_buckets WHERE minute < ?', (cutoff,))
+            deleted += cursor.rowcount
+            conn.commit()
+            return deleted
@@ -228,6 +228,34 @@ class UserManager:
             )
         return None
         
+    def get_users_by_ids(self, user_ids: List[str]) -> Dict[str, User]:
+        """批量获取用户，返回 {user_id: User}"""
+        if not user_ids:
+            return {}
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        placeholders = ','.join('?' * len(user_ids))
+        cursor.execute(f'''
+            SELECT id, email, username, password_hash, is_admin, created_at, last_login, claude_token
+            FROM users WHERE id IN ({placeholders})
+        ''', list(user_ids))
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return {
+            row[0]: User(
+                id=row[0],
+                email=row[1],
+                username=row[2],
+                password_hash=row[3],
+                is_admin=bool(row[4]),
+                created_at=datetime.fromisoformat(row[5]),
+                last_login=datetime.fromisoformat(row[6]) if row[6] else None,
+                claude_token=row[7] if len(row) > 7 else None
+            )
+            for row in rows
+        }
+        
     def update_last_login(self, user_id: str):
         """更新最后登录时间"""
         conn = sqlite3.connect(self.db_path)
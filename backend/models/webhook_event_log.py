@@ -0,0 +1,252 @@
+"""
+Webhook 事件日志 - 处理过的 webhook 事件按月分表存储
+
+- 每月一张表 webhook_events_YYYYMM；超过保留期的月份整表 DROP，不需要逐行删除
+- 列表只读取摘要等小字段；完整 payload 用 zlib 压缩存储，按 ID 单独读取
+- 压缩（compact）：超过 PAYLOAD_RETENTION_DAYS 的事件清空 payload，只保留摘要
+- 列表按 (processed_at, delivery_id) 倒序做 keyset 分页，可按仓库和事件类型过滤，
+  每种过滤条件都有对应的索引，翻页耗时与总行数无关
+"""
+import base64
+import json
+import sqlite3
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+PARTITION_PREFIX = 'webhook_events_'
+PARTITION_GLOB = PARTITION_PREFIX + '[0-9][0-9][0-9][0-9][0-9][0-9]'
+# 旧版单表（migrations/add_webhook_events.sql）
+LEGACY_TABLE = 'webhook_events'
+
+# 超过该天数的事件只保留摘要
+PAYLOAD_RETENTION_DAYS = 30
+# 保留的月份数（含当月）
+RETENTION_MONTHS = 12
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+MAX_SUMMARY_LENGTH = 200
+
+LIST_COLUMNS = ('delivery_id, repository_id, event_type, summary, processed_at, '
+                'payload IS NOT NULL AS has_payload')
+
+
+def partition_name(ts: datetime) -> str:
+    return f"{PARTITION_PREFIX}{ts:%Y%m}"
+
+
+def encode_cursor(processed_at: str, delivery_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{processed_at}|{delivery_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """解析分页游标，格式错误时抛出 ValueError"""
+    try:
+        processed_at, delivery_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|', 1)
+        datetime.fromisoformat(processed_at)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return processed_at, delivery_id
+
+
+class WebhookEventLog:
+    """按月分表的 webhook 事件日志"""
+
+    def __init__(self, db_path: str = "tasks.db"):
+        self.db_path = db_path
+
+    @contextmanager
+    def get_connection(self):
+        """获取数据库连接的上下文管理器"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _ensure_partition(self, conn: sqlite3.Connection, name: str):
+        """创建月分表及其索引（已存在时不做任何事）"""
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {name} (
+                delivery_id TEXT PRIMARY KEY,
+                repository_id TEXT NOT NULL,
+                event_type TEXT NOT NULL,
+                summary TEXT NOT NULL DEFAULT '',
+                payload BLOB,
+                processed_at TEXT NOT NULL
+            )
+        ''')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{name}_time ON {name}(processed_at, delivery_id)')
+        conn.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_{name}_repo
+            ON {name}(repository_id, processed_at, delivery_id)
+        ''')
+        conn.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_{name}_type
+            ON {name}(event_type, processed_at, delivery_id)
+        ''')
+
+    @staticmethod
+    def _partitions(conn: sqlite3.Connection) -> List[str]:
+        """所有月分表，最新的在前"""
+        rows = conn.execute('''
+            SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ?
+            ORDER BY name DESC
+        ''', (PARTITION_GLOB,)).fetchall()
+        return [row['name'] for row in rows]
+
+    def record(self, delivery_id: str, repository_id: str, event_type: str, summary: str,
+               payload: Optional[Dict] = None, processed_at: Optional[datetime] = None) -> bool:
+        """写入事件；同一投递已记录过时返回 False（重试是幂等的）"""
+        processed_at = processed_at or datetime.now()
+        name = partition_name(processed_at)
+        previous = partition_name(processed_at.replace(day=1) - timedelta(days=1))
+        blob = zlib.compress(json.dumps(payload).encode()) if payload is not None else None
+
+        with self.get_connection() as conn:
+            partitions = self._partitions(conn)
+            # 跨月重试：上个月的分表中已有该投递
+            if previous in partitions and conn.execute(
+                    f'SELECT 1 FROM {previous} WHERE delivery_id = ?', (delivery_id,)).fetchone():
+                return False
+            if name not in partitions:
+                self._ensure_partition(conn, name)
+            cursor = conn.execute(f'''
+                INSERT OR IGNORE INTO {name}
+                (delivery_id, repository_id, event_type, summary, payload, processed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (delivery_id, repository_id, event_type, (summary or '')[:MAX_SUMMARY_LENGTH],
+                  blob, processed_at.isoformat(timespec='microseconds')))
+            conn.commit()
+            return cursor.rowcount == 1
+
+    def list_events(self, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                    repository_id: Optional[str] = None,
+                    event_type: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """按处理时间倒序列出事件（不含 payload），返回 (事件, 下一页游标)"""
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        conditions, params = [], []
+        if repository_id:
+            conditions.append('repository_id = ?')
+            params.append(repository_id)
+        if event_type:
+            conditions.append('event_type = ?')
+            params.append(event_type)
+        newest = None
+        if cursor:
+            processed_at, delivery_id = decode_cursor(cursor)
+            # 第一项是可以走索引的范围条件
+            conditions.append('processed_at <= ? AND (processed_at < ? OR delivery_id < ?)')
+            params += [processed_at, processed_at, delivery_id]
+            newest = partition_name(datetime.fromisoformat(processed_at))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        events: List[Dict] = []
+        with self.get_connection() as conn:
+            for name in self._partitions(conn):
+                # 游标之后的月份不可能有更早的事件
+                if newest and name > newest:
+                    continue
+                rows = conn.execute(f'''
+                    SELECT {LIST_COLUMNS} FROM {name} {where}
+                    ORDER BY processed_at DESC, delivery_id DESC
+                    LIMIT ?
+                ''', params + [limit - len(events)]).fetchall()
+                events += [self._row_to_event(row) for row in rows]
+                if len(events) >= limit:
+                    break
+
+        next_cursor = None
+        if len(events) >= limit:
+            last = events[-1]
+            next_cursor = encode_cursor(last['processed_at'], last['id'])
+        return events, next_cursor
+
+    def get_event(self, delivery_id: str) -> Optional[Dict]:
+        """读取单个事件（含解压后的 payload）"""
+        with self.get_connection() as conn:
+            for name in self._partitions(conn):
+                row = conn.execute(f'SELECT {LIST_COLUMNS}, payload FROM {name} WHERE delivery_id = ?',
+                                   (delivery_id,)).fetchone()
+                if row:
+                    event = self._row_to_event(row)
+                    event['payload'] = json.loads(zlib.decompress(row['payload'])) if row['payload'] else None
+                    return event
+        return None
+
+    def compact(self, payload_retention_days: int = PAYLOAD_RETENTION_DAYS) -> int:
+        """清空超过保留期的 payload，只保留摘要，返回处理的事件数"""
+        cutoff = datetime.now() - timedelta(days=payload_retention_days)
+        cutoff_text = cutoff.isoformat(timespec='microseconds')
+        compacted = 0
+        with self.get_connection() as conn:
+            for name in self._partitions(conn):
+                if name > partition_name(cutoff):
+                    continue
+                cursor = conn.execute(f'''
+                    UPDATE {name} SET payload = NULL
+                    WHERE processed_at < ? AND payload IS NOT NULL
+                ''', (cutoff_text,))
+                compacted += cursor.rowcount
+            conn.commit()
+        return compacted
+
+    def prune(self, retention_months: int = RETENTION_MONTHS) -> int:
+        """删除保留期之前的月分表，返回删除的表数"""
+        month = datetime.now().replace(day=1)
+        for _ in range(retention_months - 1):
+            month = (month - timedelta(days=1)).replace(day=1)
+        oldest = partition_name(month)
+        with self.get_connection() as conn:
+            expired = [name for name in self._partitions(conn) if name < oldest]
+            for name in expired:
+                conn.execute(f'DROP TABLE {name}')
+            conn.commit()
+        return len(expired)
+
+    def import_legacy(self, batch_size: int = 1000) -> int:
+        """把旧版 webhook_events 单表中的记录搬到月分表，完成后删除旧表"""
+        moved = 0
+        with self.get_connection() as conn:
+            exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                  (LEGACY_TABLE,)).fetchone()
+            if not exists:
+                return 0
+            while True:
+                rows = conn.execute(f'''
+                    SELECT id, repository_id, event_type, payload, processed_at
+                    FROM {LEGACY_TABLE} LIMIT ?
+                ''', (batch_size,)).fetchall()
+                if not rows:
+                    break
+                for row in rows:
+                    processed_at = datetime.fromisoformat(row['processed_at'])
+                    name = partition_name(processed_at)
+                    self._ensure_partition(conn, name)
+                    conn.execute(f'''
+                        INSERT OR IGNORE INTO {name}
+                        (delivery_id, repository_id, event_type, summary, payload, processed_at)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', (row['id'], row['repository_id'], row['event_type'], row['event_type'],
+                          zlib.compress(row['payload'].encode()) if row['payload'] else None,
+                          processed_at.isoformat(timespec='microseconds')))
+                conn.executemany(f'DELETE FROM {LEGACY_TABLE} WHERE id = ?',
+                                 [(row['id'],) for row in rows])
+                conn.commit()
+                moved += len(rows)
+            conn.execute(f'DROP TABLE {LEGACY_TABLE}')
+            conn.commit()
+        return moved
+
+    @staticmethod
+    def _row_to_event(row: sqlite3.Row) -> Dict:
+        return {
+            'id': row['delivery_id'],
+            'repository_id': row['repository_id'],
+            'event_type': row['event_type'],
+            'summary': row['summary'],
+            'processed_at': row['processed_at'],
+            'has_payload': bool(row['has_payload'])
+        }
@@ -0,0 +1,178 @@
+"""
+Webhook 收件箱 - 接收到的 webhook 先按 X-GitHub-Delivery 去重落库，再由后台工作线程处理
+
+同一仓库的事件按接收顺序依次处理：仓库有事件正在处理、或有更早的事件等待（重试）时，
+后面的事件不会被领取。
+"""
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+PENDING = 'pending'
+PROCESSING = 'processing'
+DONE = 'done'
+FAILED = 'failed'
+
+# 已完成事件的默认保留天数
+DEFAULT_RETENTION_DAYS = 7
+
+
+class WebhookInbox:
+    """webhook 收件箱数据库管理器"""
+
+    def __init__(self, db_path: str = "tasks.db"):
+        self.db_path = db_path
+        self._init_db()
+
+    @contextmanager
+    def get_connection(self):
+        """获取数据库连接的上下文管理器"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        """初始化收件箱表"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS webhook_inbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    delivery_id TEXT NOT NULL UNIQUE,
+                    event_type TEXT NOT NULL,
+                    repo_key TEXT NOT NULL DEFAULT '',
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    received_at TIMESTAMP NOT NULL,
+                    claimed_at REAL,
+                    processed_at TIMESTAMP
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_webhook_inbox_status_repo
+                ON webhook_inbox(status, repo_key, id)
+            ''')
+            conn.commit()
+
+    def enqueue(self, delivery_id: str, event_type: str, repo_key: str, payload: str) -> bool:
+        """写入收件箱，重复投递时返回 False"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT OR IGNORE INTO webhook_inbox
+                (delivery_id, event_type, repo_key, payload, status, next_attempt_at, received_at)
+                VALUES (?, ?, ?, ?, ?, 0, ?)
+            ''', (delivery_id, event_type, repo_key or '', payload, PENDING, datetime.now().isoformat()))
+            conn.commit()
+            return cursor.rowcount == 1
+
+    def claim(self, limit: int) -> List[Dict]:
+        """领取最多 limit 个可以处理的事件（每个仓库最多一个，且是该仓库最早的未完成事件）"""
+        if limit <= 0:
+            return []
+        now = time.time()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                cursor.execute('''
+                    SELECT w.id, w.delivery_id, w.event_type, w.repo_key, w.payload, w.attempts
+                    FROM webhook_inbox w
+                    WHERE w.status = ? AND w.next_attempt_at <= ?
+                      AND NOT EXISTS (
+                          SELECT 1 FROM webhook_inbox p
+                          WHERE p.repo_key = w.repo_key
+                            AND (p.status = ? OR (p.status = ? AND p.id < w.id))
+                      )
+                    ORDER BY w.id
+                    LIMIT ?
+                ''', (PENDING, now, PROCESSING, PENDING, limit))
+                events = [dict(row) for row in cursor.fetchall()]
+                cursor.executemany('''
+                    UPDATE webhook_inbox SET status = ?, claimed_at = ?, attempts = attempts + 1
+                    WHERE id = ?
+                ''', [(PROCESSING, now, event['id']) for event in events])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        for event in events:
+            event['attempts'] += 1
+        return events
+
+    def complete(self, event_id: int):
+        """标记处理完成"""
+        with self.get_connection() as conn:
+            conn.execute('''
+                UPDATE webhook_inbox SET status = ?, last_error = NULL, processed_at = ?
+                WHERE id = ?
+            ''', (DONE, datetime.now().isoformat(), event_id))
+            conn.commit()
+
+    def fail(self, event_id: int, error: str, retry_in: Optional[float]):
+        """记录失败；retry_in 为 None 时不再重试"""
+        with self.get_connection() as conn:
+            if retry_in is None:
+                conn.execute('''
+                    UPDATE webhook_inbox SET status = ?, last_error = ?, processed_at = ?
+                    WHERE id = ?
+                ''', (FAILED, error, datetime.now().isoformat(), event_id))
+            else:
+                conn.execute('''
+                    UPDATE webhook_inbox SET status = ?, last_error = ?, next_attempt_at = ?
+                    WHERE id = ?
+                ''', (PENDING, error, time.time() + retry_in, event_id))
+            conn.commit()
+
+    def requeue_stale(self, older_than: float = 0) -> int:
+        """把领取后超过 older_than 秒仍未完成的事件放回队列（进程重启后恢复）"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE webhook_inbox SET status = ?
+                WHERE status = ? AND claimed_at <= ?
+            ''', (PENDING, PROCESSING, time.time() - older_than))
+            conn.commit()
+            return cursor.rowcount
+
+    def retry(self, delivery_ids: Iterable[str]) -> int:
+        """手动重试失败的事件"""
+        delivery_ids = list(delivery_ids)
+        if not delivery_ids:
+            return 0
+        placeholders = ','.join('?' * len(delivery_ids))
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                UPDATE webhook_inbox SET status = ?, attempts = 0, next_attempt_at = 0
+                WHERE status = ? AND delivery_id IN ({placeholders})
+            ''', [PENDING, FAILED] + delivery_ids)
+            conn.commit()
+            return cursor.rowcount
+
+    def get_stats(self) -> Dict[str, int]:
+        """各状态的事件数"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT status, COUNT(*) AS count FROM webhook_inbox GROUP BY status')
+            stats = {PENDING: 0, PROCESSING: 0, DONE: 0, FAILED: 0}
+            stats.update({row['status']: row['count'] for row in cursor.fetchall()})
+            return stats
+
+    def prune(self, retention_days: int = DEFAULT_RETENTION_DAYS) -> int:
+        """删除超过保留期的已完成事件（失败事件保留以便排查）"""
+        cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM webhook_inbox WHERE status = ? AND processed_at < ?',
+                           (DONE, cutoff))
+            conn.commit()
+            return cursor.rowcount
@@ -6,7 +6,7 @@ from functools import wraps
 from datetime import datetime
 import logging
 
-from models.agent_metrics import AgentMetricsManager, AgentMetricsDB
+from models.agent_metrics import AgentMetricsManager, AgentMetricsDB, get_rankings_cache
 from models.user import UserManager
 
 agent_bp = Blueprint('agent', __name__)
@@ -22,6 +22,7 @@ def login_required(f):
 # 初始化管理器
 metrics_manager = AgentMetricsManager()
 metrics_db = AgentMetricsDB()
+rankings_cache = get_rankings_cache(metrics_db)
 user_manager = UserManager()
 
 @agent_bp.route('/api/agent/metrics', methods=['GET'])
@@ -55,29 +56,7 @@ def get_rankings():
     limit = int(request.args.get('limit', 10))
     
     try:
-        if period == 'monthly':
-            current_month = datetime.now().strftime('%Y-%m')
-            rankings = metrics_db.get_monthly_rankings(current_month)[:limit]
-        else:  # cumulative
-            rankings = metrics_db.get_all_time_rankings()[:limit]
-        
-        # 添加用户信息
-        for ranking in rankings:
-            user = user_manager.get_user_by_id(ranking['user_id'])
-            if user:
-                ranking['email'] = user.email
-                ranking['username'] = user.username
-                
-                # 计算员工指数
-                if period == 'monthly':
-                    # 月度指数 = 月度时间 / (30天 * 24小时)
-                    monthly_hours = 30 * 24  # 720小时
-                    ranking['employee_index'] = round(ranking['total_hours'] / monthly_hours, 4)
-                else:
-                    # 累计指数需要知道用户注册了多少天
-                    days_since_creation = (datetime.now() - user.created_at).days + 1
-                    total_hours = days_since_creation * 24
-                    ranking['employee_index'] = round(ranking['total_hours'] / total_hours, 4)
+        rankings = rankings_cache.get_rankings(period, limit)
         
         return jsonify({
             'period': period,
@@ -101,21 +80,23 @@ def get_user_history(user_id):
     months = int(request.args.get('months', 6))
     
     try:
-        history = []
+        # 从当前月份往前推 months 个月
         current_date = datetime.now()
-        
+        month_strs = []
         for i in range(months):
-            # 计算月份
             year = current_date.year
             month = current_date.month - i
-            if month <= 0:
+            while month <= 0:
                 year -= 1
                 month += 12
-            
-            month_str = f"{year}-{month:02d}"
-            
-            # 获取该月数据
-            metrics = metrics_db.get_user_metrics(user_id, month_str)
+            month_strs.append(f"{year}-{month:02d}")
+        
+        # 一次范围查询获取全部月份
+        metrics_by_month = metrics_db.get_user_history(user_id, month_strs[-1], month_strs[0]) if month_strs else {}
+        
+        history = []
+        for month_str in month_strs:
+            metrics = metrics_by_month.get(month_str)
             if metrics:
                 history.append({
                     'month': month_str,
@@ -192,14 +173,21 @@ def update_metrics():
     if not current_user.is_admin:
         return jsonify({'error': 'Admin access required'}), 403
     
+    data = request.get_json(silent=True) or {}
+    
     try:
-        # 触发指标计算
-        metrics_manager.calculate_monthly_metrics()
+        # 触发指标计算（可选 start_month/end_month 回填历史月份）
+        updated = metrics_manager.calculate_monthly_metrics(
+            data.get('start_month'), data.get('end_month')
+        )
         
         return jsonify({
             'success': True,
-            'message': 'Metrics updated successfully'
+            'message': 'Metrics updated successfully',
+            'updated_rows': updated
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logging.error(f"Error updating metrics: {str(e)}")
         return jsonify({'error': str(e)}), 500
\ No newline at end of file
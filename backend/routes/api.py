@@ -1,9 +1,11 @@
-from flask import Blueprint, jsonify, request, send_file, session
+from flask import Blueprint, current_app, jsonify, request, send_file, session
 from werkzeug.utils import secure_filename
 import os
 from pathlib import Path
 from services.claude_executor import get_executor
-from services.task_chain_executor import TaskChainExecutor
+from services.task_chain_executor import (
+    TaskChainExecutor, DEFAULT_MAX_PARALLEL, MAX_PARALLEL_LIMIT, MAX_RETRIES_LIMIT
+)
 from services.local_launcher import LocalLauncher
 from services.script_generator import TaskScriptGenerator
 from utils.validators import validate_project_path, validate_prompt
@@ -361,6 +363,50 @@ def project_details(project_name):
     
     return jsonify(project_info), 200
 
+@api_bp.route('/projects/<project_name>/search', methods=['GET'])
+def search_project(project_name):
+    """Search file names and contents in a project."""
+    from config import Config
+    from services.search_index import get_search_manager
+    project_path = Config.PROJECTS_DIR / secure_filename(project_name)
+    
+    if not project_path.exists():
+        return jsonify({'error': 'Project not found'}), 404
+    
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    project_manager = ProjectManager()
+    project = project_manager.get_project_by_path(str(project_path))
+    if not project:
+        return jsonify({'error': 'Project not found in database'}), 404
+    
+    permission_manager = ProjectPermissionManager()
+    if not permission_manager.check_permission(project.id, user_id, 'view'):
+        return jsonify({'error': 'You do not have permission to view this project'}), 403
+    
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Query is required'}), 400
+    
+    mode = request.args.get('mode', 'all')
+    if mode not in ('all', 'name', 'content'):
+        return jsonify({'error': 'Invalid search mode'}), 400
+    
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 200)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    
+    try:
+        result = get_search_manager().search(project_path, query, mode=mode, limit=limit)
+        result['query'] = query
+        result['mode'] = mode
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @api_bp.route('/tasks', methods=['GET'])
 def list_tasks():
     """Get all tasks."""
@@ -472,6 +518,21 @@ def get_task(task_id):
     
     return jsonify(task.to_dict()), 200
 
+@api_bp.route('/tasks/<task_id>/changes', methods=['GET'])
+def get_task_changes(task_id):
+    """Get the files a task changed and their diff stats (computed when the task finished)."""
+    executor = get_executor()
+    task = executor.get_task(task_id)
+    
+    if not task:
+        return jsonify({'error': 'Task not found'}), 404
+    
+    return jsonify({
+        'task_id': task.id,
+        'files_changed': task.files_changed or [],
+        'diff_stats': getattr(task, 'diff_stats', None)
+    }), 200
+
 @api_bp.route('/tasks/<task_id>/cancel', methods=['POST'])
 def cancel_task(task_id):
     """Cancel a running task."""
@@ -523,10 +584,123 @@ def upload_file():
     except Exception as e:
         return jsonify({'error': f'Failed to save file: {str(e)}'}), 500
 
+@api_bp.route('/files/uploads', methods=['POST'])
+def init_chunked_upload():
+    """Start a chunked, resumable upload.
+    
+    Body: ``{project, path, filename, size, sha256?, chunk_size?}``. When a file
+    with the same sha256 already exists in the same project it is copied on the
+    server and the upload completes immediately. Other projects are never used
+    as a source, so a known hash cannot pull in content the caller cannot read.
+    """
+    from config import Config
+    from services.upload_manager import UploadError, get_upload_manager
+    data = request.get_json() or {}
+    
+    project_name = data.get('project')
+    filename = data.get('filename')
+    if not project_name:
+        return jsonify({'error': 'Project name is required'}), 400
+    if not filename:
+        return jsonify({'error': 'Filename is required'}), 400
+    
+    file_ext = Path(filename).suffix
+    if file_ext not in Config.ALLOWED_EXTENSIONS and file_ext not in Config.ARCHIVE_EXTENSIONS:
+        return jsonify({'error': f'File type {file_ext} not allowed'}), 400
+    
+    try:
+        size = int(data.get('size'))
+        chunk_size = int(data['chunk_size']) if data.get('chunk_size') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid file size'}), 400
+    
+    project_path = Config.PROJECTS_DIR / secure_filename(project_name)
+    if not project_path.exists():
+        return jsonify({'error': 'Project not found'}), 404
+    
+    save_path = project_path / secure_filename(data.get('path', '')) / secure_filename(filename)
+    
+    try:
+        result = get_upload_manager().init_upload(
+            save_path, size,
+            sha256=data.get('sha256'),
+            chunk_size=chunk_size,
+            dedupe_within=project_path
+        )
+        if result['status'] == 'completed':
+            result['path'] = str(save_path.relative_to(Config.PROJECTS_DIR))
+        return jsonify(result), 201
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Failed to start upload: {str(e)}'}), 500
+
+@api_bp.route('/files/uploads/<upload_id>', methods=['GET', 'DELETE'])
+def chunked_upload_status(upload_id):
+    """Get upload progress (missing chunks) or abort the upload."""
+    from services.upload_manager import UploadError, get_upload_manager
+    manager = get_upload_manager()
+    
+    try:
+        if request.method == 'DELETE':
+            manager.abort(upload_id)
+            return jsonify({'message': 'Upload aborted'}), 200
+        return jsonify(manager.get_status(upload_id)), 200
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/files/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+def put_upload_chunk(upload_id, index):
+    """Upload one chunk as the raw request body.
+    
+    The optional ``X-Chunk-SHA256`` header is verified against the received bytes.
+    """
+    from services.upload_manager import UploadError, get_upload_manager
+    
+    try:
+        result = get_upload_manager().put_chunk(
+            upload_id, index, request.stream,
+            checksum=request.headers.get('X-Chunk-SHA256')
+        )
+        return jsonify(result), 200
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Failed to save chunk: {str(e)}'}), 500
+
+@api_bp.route('/files/uploads/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload(upload_id):
+    """Verify the assembled file and move it into the project."""
+    from config import Config
+    from services.upload_manager import UploadError, get_upload_manager
+    
+    try:
+        result = get_upload_manager().complete(upload_id)
+        result['path'] = str(Path(result['path']).relative_to(Config.PROJECTS_DIR))
+        return jsonify(result), 201
+    except UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Failed to complete upload: {str(e)}'}), 500
+
 @api_bp.route('/files/<path:file_path>', methods=['GET', 'PUT'])
 def get_file_content(file_path):
-    """Get or update file content."""
+    """Get or update file content.
+    
+    GET supports:
+    - ``download=true`` / ``raw=true`` or a ``Range`` header: streamed response
+      with HTTP Range and conditional request support
+    - ``start_line``/``max_lines`` (or ``offset``): paged line window for the editor
+    - otherwise the whole content as JSON; large files fall back to the first window
+      with ``truncated`` set
+    
+    JSON reads include the ``etag``; a PUT with an ``If-Match`` header that no
+    longer matches the file is rejected with 412.
+    """
     from config import Config
+    from services.file_manager import FileManager
     
     full_path = Config.PROJECTS_DIR / file_path
     
@@ -543,30 +717,42 @@ def get_file_content(file_path):
         if not full_path.is_file():
             return jsonify({'error': 'Not a file'}), 400
         
-        # Return file content
         try:
+            file_manager = FileManager(Config.PROJECTS_DIR)
+            etag = file_manager.get_etag(file_path)
+            
+            # 流式返回，由 send_file 处理 Range / If-None-Match / If-Range
             if request.args.get('download') == 'true':
-                return send_file(str(full_path), as_attachment=True)
+                return send_file(str(full_path), as_attachment=True,
+                                 conditional=True, etag=etag)
+            if request.args.get('raw') == 'true' or request.range:
+                return send_file(str(full_path), conditional=True, etag=etag)
+            
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+                response.set_etag(etag)
+                return response
+            
+            windowed = 'start_line' in request.args or 'offset' in request.args
+            size = full_path.stat().st_size
+            
+            if windowed or size > Config.MAX_INLINE_FILE_SIZE:
+                result = file_manager.read_line_window(
+                    file_path,
+                    start_line=request.args.get('start_line', 0, type=int),
+                    max_lines=request.args.get('max_lines', Config.FILE_WINDOW_LINES, type=int),
+                    offset=request.args.get('offset', type=int)
+                )
+                result['truncated'] = not windowed and result['has_more']
             else:
-                # Try multiple encodings
-                encodings = ['utf-8', 'gbk', 'gb2312', 'latin-1']
-                content = None
-                
-                for encoding in encodings:
-                    try:
-                        content = full_path.read_text(encoding=encoding)
-                        break
-                    except UnicodeDecodeError:
-                        continue
-                
-                if content is None:
-                    # If all encodings fail, read as binary and try to decode
-                    content = full_path.read_bytes().decode('utf-8', errors='ignore')
-                return jsonify({
-                    'path': file_path,
-                    'content': content,
-                    'size': full_path.stat().st_size
-                }), 200
+                result = file_manager.read_text(file_path)
+            result['path'] = file_path
+            result['etag'] = etag
+            
+            response = jsonify(result)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response, 200
         except Exception as e:
             return jsonify({'error': f'Failed to read file: {str(e)}'}), 500
             
@@ -576,18 +762,28 @@ def get_file_content(file_path):
             data = request.get_json()
             if not data or 'content' not in data:
                 return jsonify({'error': 'Content is required'}), 400
+            
+            # Optimistic concurrency: refuse to overwrite a file changed since it was read
+            if request.if_match:
+                current = FileManager(Config.PROJECTS_DIR).get_etag(file_path) if full_path.is_file() else None
+                if current is None or not request.if_match.contains(current):
+                    return jsonify({'error': 'File has changed since it was loaded'}), 412
                 
             # Create parent directories if needed
             full_path.parent.mkdir(parents=True, exist_ok=True)
             
             # Write content
             full_path.write_text(data['content'], encoding='utf-8')
+            etag = FileManager(Config.PROJECTS_DIR).get_etag(file_path)
             
-            return jsonify({
+            response = jsonify({
                 'message': 'File saved successfully',
                 'path': file_path,
-                'size': full_path.stat().st_size
-            }), 200
+                'size': full_path.stat().st_size,
+                'etag': etag
+            })
+            response.set_etag(etag)
+            return response, 200
             
         except Exception as e:
             return jsonify({'error': f'Failed to save file: {str(e)}'}), 500
@@ -644,6 +840,19 @@ def create_task_chain():
     if error_msg:
         return jsonify({'error': error_msg}), 400
     
+    # Numeric options are stored in INTEGER columns and compared while the chain runs
+    try:
+        max_parallel = int(data.get('max_parallel', DEFAULT_MAX_PARALLEL))
+        max_retries = data.get('max_retries')
+        if max_retries is not None:
+            max_retries = int(max_retries)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'max_parallel and max_retries must be integers'}), 400
+    if not 1 <= max_parallel <= MAX_PARALLEL_LIMIT:
+        return jsonify({'error': f'max_parallel must be between 1 and {MAX_PARALLEL_LIMIT}'}), 400
+    if max_retries is not None and not 0 <= max_retries <= MAX_RETRIES_LIMIT:
+        return jsonify({'error': f'max_retries must be between 0 and {MAX_RETRIES_LIMIT}'}), 400
+    
     try:
         executor = get_executor()
         task_manager = TaskManager()
@@ -659,12 +868,25 @@ def create_task_chain():
             if error_msg:
                 return jsonify({'error': f'Invalid prompt: {error_msg}'}), 400
         
+        # Optional DAG: tasks[i].depends_on lists indexes into ``tasks``
+        # (index 0 is the parent, which every child depends on implicitly)
+        dependencies = None
+        if any('depends_on' in task for task in tasks[1:]):
+            dependencies = [
+                [index - 1 for index in task.get('depends_on', []) if index != 0]
+                for task in tasks[1:]
+            ]
+        
         # Create task chain
         parent_task = chain_executor.create_task_chain(
             parent_prompt=parent_prompt,
             child_prompts=child_prompts,
             project_path=project_path,
-            user_id=session.get('user_id')
+            user_id=session.get('user_id'),
+            dependencies=dependencies,
+            max_parallel=max_parallel,
+            failure_policy=data.get('failure_policy', 'fail_fast'),
+            max_retries=max_retries
         )
         
         # Execute the chain
@@ -677,11 +899,25 @@ def create_task_chain():
             'task_chain': parent_task.to_dict()
         }), 201
         
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         import logging
         logging.error(f"Error creating task chain: {str(e)}")
         return jsonify({'error': f'Failed to create task chain: {str(e)}'}), 500
 
+@api_bp.route('/task-chains/<chain_id>', methods=['GET'])
+def get_task_chain(chain_id):
+    """Get the persisted DAG state of a task chain."""
+    try:
+        from models.task_chain import TaskChainDB
+        chain = TaskChainDB().get_chain(chain_id)
+        if not chain:
+            return jsonify({'error': 'Task chain not found'}), 404
+        return jsonify(chain), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @api_bp.route('/tasks/<task_id>/children', methods=['GET'])
 def get_task_children(task_id):
     """Get children of a task."""
@@ -709,6 +945,32 @@ def get_task_children(task_id):
         logging.error(f"Error getting task children: {str(e)}")
         return jsonify({'error': f'Failed to get task children: {str(e)}'}), 500
 
+@api_bp.route('/tasks/<task_id>/hierarchy', methods=['GET'])
+def get_task_hierarchy(task_id):
+    """Get ancestors, descendants and a status rollup of a task subtree."""
+    try:
+        from models.task_hierarchy import TaskHierarchy
+        hierarchy = TaskHierarchy()
+        max_depth = request.args.get('max_depth', -1, type=int)
+        
+        rollup = hierarchy.get_rollup(task_id)
+        ancestors = hierarchy.get_ancestors(task_id)
+        descendants = hierarchy.get_descendants(task_id, max_depth)
+        if not ancestors and not descendants and not TaskManager().get_task(task_id):
+            return jsonify({'error': 'Task not found'}), 404
+        
+        return jsonify({
+            'task_id': task_id,
+            'ancestors': ancestors,
+            'descendants': descendants,
+            'rollup': rollup
+        }), 200
+        
+    except Exception as e:
+        import logging
+        logging.error(f"Error getting task hierarchy: {str(e)}")
+        return jsonify({'error': f'Failed to get task hierarchy: {str(e)}'}), 500
+
 @api_bp.route('/tasks/<task_id>/add-child', methods=['POST'])
 def add_child_task(task_id):
     """Add a child task to an existing task."""
@@ -821,7 +1083,7 @@ def update_local_result(task_id):
             try:
                 from models.agent_metrics import AgentMetricsManager
                 metrics_manager = AgentMetricsManager()
-                metrics_manager.update_task_metrics(task.user_id, task.execution_time)
+                metrics_manager.update_task_metrics(task.user_id, task.execution_time, task_id=task.id)
             except Exception as e:
                 import logging
                 logging.error(f"Failed to update agent metrics: {str(e)}")
@@ -1009,7 +1271,6 @@ def debug_session():
 def get_agent_metrics():
     """获取当前用户的Agent指标"""
     from models.agent_metrics import AgentMetricsManager
-    from models.user import UserManager
     
     user_id = session.get('user_id')
     if not user_id:
@@ -1017,19 +1278,10 @@ def get_agent_metrics():
     
     try:
         metrics_manager = AgentMetricsManager()
-        user_manager = UserManager()
         
-        # 获取仪表板指标
+        # 获取仪表板指标（排行榜快照已包含用户邮箱信息）
         dashboard_data = metrics_manager.get_dashboard_metrics(user_id)
         
-        # 为排行榜添加用户邮箱信息
-        for ranking in dashboard_data['monthly_rankings']:
-            user = user_manager.get_user_by_id(ranking['user_id'])
-            if user:
-                ranking['user_email'] = user.email
-            else:
-                ranking['user_email'] = 'unknown@example.com'
-        
         return jsonify(dashboard_data), 200
         
     except Exception as e:
@@ -1038,6 +1290,47 @@ def get_agent_metrics():
         return jsonify({'error': str(e)}), 500
 
 
+@api_bp.route('/metrics/tasks', methods=['GET'])
+def get_task_timeseries():
+    """查询任务时序指标的分位数（非管理员只能查看自己的任务）
+
+    参数: metric, start/end (ISO 时间，默认最近 1 小时), project_path, user_id, step (分钟)
+    """
+    from datetime import timedelta
+    from models.task_timeseries import METRICS, RUN_DURATION
+    
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    metric = request.args.get('metric', RUN_DURATION)
+    if metric not in METRICS:
+        return jsonify({'error': f'Unknown metric: {metric}', 'metrics': list(METRICS)}), 400
+    
+    try:
+        end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else datetime.now()
+        start = (datetime.fromisoformat(request.args['start']) if request.args.get('start')
+                 else end - timedelta(hours=1))
+        step = request.args.get('step', type=int)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query_user = request.args.get('user_id')
+    if not session.get('is_admin', False):
+        query_user = user_id
+    project_path = request.args.get('project_path')
+    
+    try:
+        timeseries = get_executor().timeseries
+        result = timeseries.get_percentiles(
+            metric, start, end, project_path=project_path, user_id=query_user, step_minutes=step
+        )
+        result['outcomes'] = timeseries.get_outcomes(start, end, project_path=project_path, user_id=query_user)
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 # 管理员端点
 @api_bp.route('/admin/tasks', methods=['GET'])
 def admin_list_all_tasks():
@@ -0,0 +1,36 @@
+"""
+运行时指标 API - 以 Prometheus 文本格式导出执行器、数据库和请求指标
+"""
+import time
+from flask import Blueprint, Response, g, request
+
+from utils.instrumentation import get_registry
+
+metrics_bp = Blueprint('metrics', __name__)
+
+HTTP_REQUESTS = get_registry().counter(
+    'http_requests_total', 'HTTP requests handled', ['method', 'endpoint', 'status'])
+HTTP_REQUEST_SECONDS = get_registry().histogram(
+    'http_request_duration_seconds', 'HTTP request latency', ['method', 'endpoint'])
+
+
+@metrics_bp.before_app_request
+def start_request_timer():
+    g.metrics_request_start = time.perf_counter()
+
+
+@metrics_bp.after_app_request
+def record_request(response):
+    start = g.pop('metrics_request_start', None)
+    # 使用端点名而不是路径作为标签，避免标签基数随 URL 参数增长
+    endpoint = request.endpoint or 'unmatched'
+    if start is not None and endpoint != 'metrics.metrics':
+        HTTP_REQUESTS.inc(method=request.method, endpoint=endpoint, status=str(response.status_code))
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method, endpoint=endpoint)
+    return response
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """导出全部指标（Prometheus 文本格式 0.0.4）"""
+    return Response(get_registry().render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
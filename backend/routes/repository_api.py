@@ -4,14 +4,19 @@ GitHub 风格的仓库管理 API
 from flask import Blueprint, jsonify, request, session
 from models.repository import RepositoryManager, Repository, Branch, Issue
 from services.claude_executor import get_executor
+from services.git_service import get_git_service
 from services.github_integration import GitHubIntegration
+from services.github_sync import GitHubSyncEngine
+from services.worktree_manager import get_worktree_manager, WorktreeError
 from utils.decorators import login_required
 import logging
+import uuid
 
 logger = logging.getLogger(__name__)
 
 repo_bp = Blueprint('repository', __name__)
 repo_manager = RepositoryManager()
+git_service = get_git_service()
 
 
 @repo_bp.route('/repos', methods=['GET'])
@@ -182,38 +187,60 @@ def execute_branch(branch_id):
             if not branch_row:
                 return jsonify({'error': 'Branch not found'}), 404
                 
-        # 切换到分支
+        # 只在内存中占用分支：被其他任务占用时立即返回 409，不在请求线程中等待
         repo_path = branch_row['local_path']
         branch_name = branch_row['name']
-        
-        import subprocess
+        base_branch = branch_row['base_branch']
+        prompt = branch_row['description']
+        user_id = session.get('user_id')
+        worktrees = get_worktree_manager()
         try:
-            subprocess.run(['git', 'checkout', branch_name], cwd=repo_path, check=True)
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Failed to checkout branch: {e}")
-            
-        # 执行任务
-        executor = get_executor()
-        task_id = executor.execute(
-            prompt=branch_row['description'],
-            project_path=repo_path,
-            user_id=session.get('user_id')
-        )
+            worktrees.reserve(repo_path, branch_name, timeout=0)
+        except WorktreeError as e:
+            return jsonify({'error': str(e)}), 409
+        
+        task_id = str(uuid.uuid4())
+        
+        def release_worktree(task):
+            worktrees.release(repo_path, branch_name)
+        
+        def run_execute():
+            # 创建 worktree（git worktree add）在后台作业中执行，不同分支的任务可以并行
+            try:
+                worktree_path = worktrees.prepare(repo_path, branch_name, base_branch=base_branch)
+                get_executor().execute(
+                    prompt=prompt,
+                    project_path=worktree_path,
+                    completion_callback=release_worktree,
+                    user_id=user_id,
+                    task_id=task_id
+                )
+            except Exception:
+                worktrees.release(repo_path, branch_name)
+                raise
+            
+            # 更新分支状态
+            with repo_manager.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE branches 
+                    SET status = 'in_progress', updated_at = datetime('now')
+                    WHERE id = ?
+                ''', (branch_id,))
+                conn.commit()
+            return {'task_id': task_id, 'branch_id': branch_id, 'worktree_path': worktree_path}
         
-        # 更新分支状态
-        with repo_manager.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE branches 
-                SET status = 'in_progress', updated_at = datetime('now')
-                WHERE id = ?
-            ''', (branch_id,))
-            conn.commit()
+        try:
+            job = git_service.submit(repo_path, 'execute', run_execute, lock=False)
+        except Exception:
+            worktrees.release(repo_path, branch_name)
+            raise
             
         return jsonify({
             'message': 'Task execution started',
             'task_id': task_id,
-            'branch_id': branch_id
+            'branch_id': branch_id,
+            'job_id': job.id
         }), 202
         
     except Exception as e:
@@ -356,7 +383,7 @@ def import_repository():
 @repo_bp.route('/repos/<repo_id>/sync', methods=['POST'])
 @login_required
 def sync_repository(repo_id):
-    """同步仓库与 GitHub"""
+    """同步仓库与 GitHub（后台作业）"""
     try:
         repo = repo_manager.get_repository(repo_id)
         if not repo:
@@ -369,28 +396,30 @@ def sync_repository(repo_id):
         parts = repo.github_url.rstrip('/').split('/')
         owner = parts[-2]
         repo_name = parts[-1].replace('.git', '')
-        
-        # 初始化 GitHub 集成
-        github = GitHubIntegration()
-        
-        # 同步统计信息
-        stats = github.sync_repository_stats(owner, repo_name)
-        
-        # 同步分支
-        branches = github.list_branches(owner, repo_name)
-        
-        # 同步议题
-        issues = github.list_issues(owner, repo_name)
-        
-        # 更新本地数据
-        # TODO: 更新数据库中的分支和议题信息
-        
-        return jsonify({
-            'message': 'Repository synced successfully',
-            'stats': stats,
-            'branches_count': len(branches),
-            'issues_count': len(issues)
-        }), 200
+        local_path = repo.local_path
+
+        def run_sync():
+            github = GitHubIntegration()
+
+            # 同步本地代码
+            synced = github.sync_repository(local_path) if local_path else False
+            if local_path:
+                git_service.invalidate(local_path)
+
+            # 增量同步分支和议题到本地表
+            if not github.token:
+                return {'code_synced': synced, 'branches': None, 'issues': None}
+            stats = GitHubSyncEngine(github.client).sync_repository(repo, owner, repo_name)
+            return {
+                'code_synced': synced,
+                'branches': stats['branches'],
+                'issues': stats['issues'],
+                'branches_count': stats['branches']['total'],
+                'issues_count': stats['issues']['created'] + stats['issues']['updated']
+            }
+
+        job = git_service.submit(local_path or repo.github_url, 'sync', run_sync, lock=bool(local_path))
+        return _job_accepted(job, 'Repository sync started')
         
     except Exception as e:
         logger.error(f"Error syncing repository: {str(e)}")
@@ -400,7 +429,7 @@ def sync_repository(repo_id):
 @repo_bp.route('/repos/<repo_id>/commit', methods=['POST'])
 @login_required
 def commit_changes(repo_id):
-    """提交代码更改"""
+    """提交代码更改（后台作业）"""
     try:
         data = request.get_json()
         message = data.get('message')
@@ -416,39 +445,34 @@ def commit_changes(repo_id):
         if not repo.local_path:
             return jsonify({'error': 'Repository has no local path'}), 400
             
-        import subprocess
-        
-        # 切换到指定分支
-        subprocess.run(['git', 'checkout', branch], 
-                      cwd=repo.local_path, check=True, capture_output=True)
-        
-        # 添加所有更改
-        subprocess.run(['git', 'add', '.'], 
-                      cwd=repo.local_path, check=True, capture_output=True)
-        
-        # 提交更改
+        user_id = session.get('user_id')
         user_email = session.get('user_email', 'claude.task@sparticle.com')
-        subprocess.run(['git', 'commit', '-m', message, '--author', f'ClaudeTask <{user_email}>'], 
-                      cwd=repo.local_path, check=True, capture_output=True)
-        
-        # 记录提交到数据库
-        with repo_manager.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO commits (repository_id, branch_name, message, author_id, sha)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (repo_id, branch, message, session.get('user_id'), 'pending'))
-            conn.commit()
-        
-        return jsonify({
-            'message': 'Changes committed successfully',
-            'commit_message': message,
-            'branch': branch
-        }), 201
+        local_path = repo.local_path
+
+        def run_commit():
+            # 在分支的 worktree 中提交，不切换主工作区。先租用 worktree 再加仓库锁：
+            # 分支被任务占用时立即失败，不会持锁等待而阻塞该仓库的其他 git 作业
+            with get_worktree_manager().lease(local_path, branch, timeout=0) as worktree_path:
+                with git_service.lock(local_path):
+                    sha = git_service.commit(worktree_path, message,
+                                             author=f'ClaudeTask <{user_email}>')
+            git_service.invalidate(local_path)
+            if not sha:
+                return {'committed': False, 'branch': branch}
+
+            # 记录提交到数据库
+            with repo_manager.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO commits (repository_id, branch_name, message, author_id, sha)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (repo_id, branch, message, user_id, sha))
+                conn.commit()
+            return {'committed': True, 'sha': sha, 'branch': branch, 'commit_message': message}
+
+        job = git_service.submit(local_path, 'commit', run_commit, lock=False)
+        return _job_accepted(job, 'Commit started')
         
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Git command failed: {e}")
-        return jsonify({'error': f'Git error: {e.stderr.decode() if e.stderr else str(e)}'}), 500
     except Exception as e:
         logger.error(f"Error committing changes: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -457,9 +481,9 @@ def commit_changes(repo_id):
 @repo_bp.route('/repos/<repo_id>/push', methods=['POST'])
 @login_required
 def push_to_remote(repo_id):
-    """推送到远程仓库"""
+    """推送到远程仓库（后台作业）"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         branch = data.get('branch', 'main')
         
         repo = repo_manager.get_repository(repo_id)
@@ -472,19 +496,13 @@ def push_to_remote(repo_id):
         if not repo.github_url:
             return jsonify({'error': 'Repository is not linked to GitHub'}), 400
             
-        # 初始化 GitHub 集成
-        github = GitHubIntegration()
-        
-        # 推送更改
-        success = github.push_changes(repo.local_path, branch)
-        
-        if success:
-            return jsonify({
-                'message': 'Changes pushed successfully',
-                'branch': branch
-            }), 200
-        else:
-            return jsonify({'error': 'Failed to push changes'}), 500
+        local_path = repo.local_path
+
+        def run_push():
+            return {'branch': branch, 'output': git_service.push(local_path, branch)}
+
+        job = git_service.submit(local_path, 'push', run_push)
+        return _job_accepted(job, 'Push started')
             
     except Exception as e:
         logger.error(f"Error pushing to remote: {str(e)}")
@@ -494,9 +512,9 @@ def push_to_remote(repo_id):
 @repo_bp.route('/repos/<repo_id>/pull', methods=['POST'])
 @login_required
 def pull_from_remote(repo_id):
-    """从远程仓库拉取更新"""
+    """从远程仓库拉取更新（后台作业）"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         branch = data.get('branch', 'main')
         
         repo = repo_manager.get_repository(repo_id)
@@ -509,36 +527,65 @@ def pull_from_remote(repo_id):
         if not repo.github_url:
             return jsonify({'error': 'Repository is not linked to GitHub'}), 400
             
-        import subprocess
-        
-        # 切换到指定分支
-        subprocess.run(['git', 'checkout', branch], 
-                      cwd=repo.local_path, check=True, capture_output=True)
-        
-        # 拉取更新
-        result = subprocess.run(['git', 'pull', 'origin', branch], 
-                               cwd=repo.local_path, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            return jsonify({
-                'message': 'Updates pulled successfully',
-                'branch': branch,
-                'output': result.stdout
-            }), 200
-        else:
-            return jsonify({
-                'error': 'Failed to pull updates',
-                'output': result.stderr
-            }), 500
+        local_path = repo.local_path
+
+        def run_pull():
+            # 在分支的 worktree 中拉取更新，不切换主工作区（与提交相同，先租用 worktree 再加仓库锁）
+            with get_worktree_manager().lease(local_path, branch, timeout=0) as worktree_path:
+                with git_service.lock(local_path):
+                    output = git_service.pull(worktree_path, branch)
+            git_service.invalidate(local_path)
+            return {'branch': branch, 'output': output}
+
+        job = git_service.submit(local_path, 'pull', run_pull, lock=False)
+        return _job_accepted(job, 'Pull started')
             
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Git command failed: {e}")
-        return jsonify({'error': f'Git error: {e.stderr.decode() if e.stderr else str(e)}'}), 500
     except Exception as e:
         logger.error(f"Error pulling from remote: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
+@repo_bp.route('/repos/<repo_id>/status', methods=['GET'])
+@login_required
+def get_repository_status(repo_id):
+    """获取仓库的 git 状态（读取缓存，过期时在后台刷新）"""
+    try:
+        repo = repo_manager.get_repository(repo_id)
+        if not repo:
+            return jsonify({'error': 'Repository not found'}), 404
+            
+        if not repo.local_path:
+            return jsonify({'error': 'Repository has no local path'}), 400
+            
+        status, job = git_service.get_cached_status(repo.local_path)
+        response = {'status': status, 'refreshing': job is not None}
+        if job:
+            response['job_id'] = job.id
+        return jsonify(response), 200 if status is not None else 202
+        
+    except Exception as e:
+        logger.error(f"Error getting repository status: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@repo_bp.route('/git/jobs/<job_id>', methods=['GET'])
+@login_required
+def get_git_job(job_id):
+    """查询后台 git 作业的状态"""
+    job = git_service.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict()), 200
+
+
+def _job_accepted(job, message):
+    return jsonify({
+        'message': message,
+        'job_id': job.id,
+        'status': job.status
+    }), 202
+
+
 @repo_bp.route('/branches/<branch_id>/pr', methods=['POST'])
 @login_required
 def create_pull_request(branch_id):
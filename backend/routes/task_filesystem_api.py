@@ -17,13 +17,73 @@ def get_task_tree():
     try:
         path = request.args.get('path', '/')
         max_depth = request.args.get('max_depth', -1, type=int)
+        use_cache = request.args.get('cached', 'false').lower() == 'true'
         
-        tree = task_fs.get_task_tree(path, max_depth)
+        tree = task_fs.get_task_tree(path, max_depth, use_cache=use_cache)
         return jsonify(tree), 200
     except Exception as e:
         logger.error(f"Error getting task tree: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@task_fs_bp.route('/ancestors', methods=['GET'])
+def get_task_ancestors():
+    """获取任务的所有祖先（面包屑）"""
+    try:
+        path = request.args.get('path')
+        if not path:
+            return jsonify({'error': 'Path is required'}), 400
+        
+        task = task_fs.get_task_by_path(path)
+        if not task:
+            return jsonify({'error': 'Task not found'}), 404
+        
+        return jsonify({
+            'path': path,
+            'ancestors': task_fs.hierarchy.get_ancestors(task.id)
+        }), 200
+    except Exception as e:
+        logger.error(f"Error getting task ancestors: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@task_fs_bp.route('/descendants', methods=['GET'])
+def get_task_descendants():
+    """获取任务的所有后代及子树状态汇总"""
+    try:
+        path = request.args.get('path')
+        if not path:
+            return jsonify({'error': 'Path is required'}), 400
+        max_depth = request.args.get('max_depth', -1, type=int)
+        
+        task = task_fs.get_task_by_path(path)
+        if not task:
+            return jsonify({'error': 'Task not found'}), 404
+        
+        return jsonify({
+            'path': path,
+            'descendants': task_fs.hierarchy.get_descendants(task.id, max_depth),
+            'rollup': task_fs.hierarchy.get_rollup(task.id)
+        }), 200
+    except Exception as e:
+        logger.error(f"Error getting task descendants: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@task_fs_bp.route('/rollup', methods=['GET'])
+def get_task_rollup():
+    """获取子树状态汇总"""
+    try:
+        path = request.args.get('path')
+        if not path:
+            return jsonify({'error': 'Path is required'}), 400
+        
+        task = task_fs.get_task_by_path(path)
+        if not task:
+            return jsonify({'error': 'Task not found'}), 404
+        
+        return jsonify(task_fs.hierarchy.get_rollup(task.id)), 200
+    except Exception as e:
+        logger.error(f"Error getting task rollup: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @task_fs_bp.route('/list', methods=['GET'])
 def list_directory():
     """列出目录内容"""
@@ -113,6 +173,8 @@ def move_task():
         else:
             return jsonify({'error': 'Failed to move task'}), 400
             
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error moving task: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -5,7 +5,6 @@ from flask import Blueprint, request, jsonify, session
 import logging
 from functools import wraps
 from datetime import datetime
-import subprocess
 import os
 import json
 from pathlib import Path
@@ -17,6 +16,9 @@ from models.branch import BranchManager
 from executors.factory import ExecutorFactory
 from models.config import ConfigManager
 from models.agent_metrics import AgentMetricsManager
+from services.worktree_manager import get_worktree_manager
+from services.git_service import get_git_service
+from services.change_tracker import WorkspaceSnapshot, compute_changes, summarize_changes
 
 unified_bp = Blueprint('unified', __name__)
 
@@ -37,6 +39,8 @@ class UnifiedWorkflow:
         self.executor_factory = ExecutorFactory()
         self.config_manager = ConfigManager()
         self.metrics_manager = AgentMetricsManager()
+        self.worktrees = get_worktree_manager()
+        self.git = get_git_service()
         
     def create_and_execute(self, repo_id, task_data, user_id):
         """一键创建分支并执行任务"""
@@ -62,14 +66,23 @@ class UnifiedWorkflow:
                 'auto_pr': task_data.get('auto_pr', False)
             }
             
-            # 3. 切换到分支
+            # 3. 租用新分支的 worktree（从当前 HEAD 创建分支，不切换主工作区）
             repo = self.repo_manager.get_repository(repo_id)
             repo_path = self._get_repo_path(repo)
+            with self.worktrees.lease(repo_path, branch_name, base_branch='HEAD') as worktree_path:
+                return self._execute_in_worktree(
+                    Path(worktree_path), branch, repo, task_data,
+                    execution_config, user_id
+                )
             
-            # 创建并切换到新分支
-            subprocess.run(['git', 'checkout', '-b', branch_name], 
-                         cwd=repo_path, capture_output=True)
-            
+        except Exception as e:
+            logging.error(f"Error in create_and_execute: {str(e)}")
+            return None, str(e)
+    
+    def _execute_in_worktree(self, repo_path, branch, repo, task_data,
+                             execution_config, user_id):
+        """在分支的 worktree 中执行任务并处理结果"""
+        try:
             # 4. 执行任务
             executor = self.executor_factory.create(
                 execution_config['executor_type'],
@@ -83,11 +96,15 @@ class UnifiedWorkflow:
             import time
             start_time = time.time()
             
-            # 执行
+            # 执行（前后各取一次快照，得到任务实际修改的文件）
+            snapshot = WorkspaceSnapshot.take(repo_path)
             result = executor.execute(
                 prompt=execution_config['prompt'],
                 files=execution_config['files']
             )
+            changes = compute_changes(snapshot)
+            result['files_changed'] = [change['path'] for change in changes]
+            result['diff_stats'] = summarize_changes(changes)
             
             # 计算执行时间
             execution_time = time.time() - start_time
@@ -97,8 +114,8 @@ class UnifiedWorkflow:
                 # 自动提交更改
                 if execution_config['auto_commit'] and result.get('files_changed'):
                     commit_msg = f"Complete task: {task_data['title']}\n\n{result.get('summary', '')}"
-                    subprocess.run(['git', 'add', '.'], cwd=repo_path)
-                    subprocess.run(['git', 'commit', '-m', commit_msg], cwd=repo_path)
+                    result['commit_sha'] = self.git.commit(repo_path, commit_msg,
+                                                           paths=result['files_changed'])
                 
                 # 更新分支状态
                 self.branch_manager.update_branch_status(
@@ -201,7 +218,8 @@ def quick_task(repo_id):
         'execution': {
             'status': result.get('status'),
             'summary': result.get('summary'),
-            'files_changed': result.get('files_changed', [])
+            'files_changed': result.get('files_changed', []),
+            'diff_stats': result.get('diff_stats')
         },
         'pull_request': result.get('pull_request')
     })
@@ -2,11 +2,17 @@
 GitHub Webhook API 路由
 """
 import os
-import json
+import uuid
+import hashlib
 import logging
+from collections.abc import Mapping
 from flask import Blueprint, request, jsonify
-from services.github_webhook import GitHubWebhookHandler
+from services.github_webhook import GitHubWebhookHandler, WebhookPayload, summarize_result
 from models.repository import RepositoryManager
+from models.webhook_event_log import DEFAULT_PAGE_SIZE, WebhookEventLog
+from models.webhook_inbox import WebhookInbox
+from services.webhook_dispatcher import WebhookDispatcher
+from services.repo_sync import changed_refs, get_repo_sync
 
 logger = logging.getLogger(__name__)
 
@@ -16,11 +22,27 @@ webhook_bp = Blueprint('webhook', __name__)
 webhook_secret = os.getenv('GITHUB_WEBHOOK_SECRET')
 webhook_handler = GitHubWebhookHandler(webhook_secret)
 repo_manager = RepositoryManager()
+webhook_inbox = WebhookInbox()
+event_log = WebhookEventLog()
+webhook_dispatcher = WebhookDispatcher(
+    webhook_inbox, lambda *args: process_delivery(*args),
+    workers=int(os.getenv('WEBHOOK_WORKERS', '4'))
+)
+
+
+@webhook_bp.record_once
+def start_webhook_dispatcher(state):
+    """注册蓝图时启动后台处理（同时处理重启前未完成的事件）"""
+    webhook_dispatcher.start()
 
 
 @webhook_bp.route('/github', methods=['POST'])
 def github_webhook():
-    """接收 GitHub Webhook 事件"""
+    """接收 GitHub Webhook 事件
+
+    用原始请求体验证签名后写入收件箱（按 X-GitHub-Delivery 去重）并立即确认，由后台线程池处理。
+    验证通过前不解析 JSON；仓库 webhook 的排序键直接取自请求头，不需要解析 payload。
+    """
     # 获取事件类型
     event_type = request.headers.get('X-GitHub-Event')
     if not event_type:
@@ -29,91 +51,149 @@ def github_webhook():
     # 获取签名
     signature = request.headers.get('X-Hub-Signature-256')
     
-    # 获取请求体
+    # 原始请求体只读取一次，签名与 GitHub 发送的字节逐字节对应
+    body = request.get_data()
+    if not webhook_handler.verify_signature(body, signature):
+        logger.warning(f"Invalid webhook signature for event: {event_type}")
+        return jsonify({'error': 'Invalid signature', 'status': 'rejected'}), 400
+    
     try:
-        payload = request.get_json()
-    except Exception as e:
+        repo_key = _ordering_key(body)
+        payload_text = body.decode('utf-8')
+    except ValueError as e:
         logger.error(f"Failed to parse webhook payload: {str(e)}")
         return jsonify({'error': 'Invalid JSON payload'}), 400
     
-    # 处理 webhook
-    result = webhook_handler.process_webhook(event_type, payload, signature)
+    # 没有投递 ID 时（例如手动重放）按内容去重
+    delivery_id = request.headers.get('X-GitHub-Delivery') or hashlib.sha256(body).hexdigest()
     
-    # 根据事件类型执行相应的操作
-    if result['status'] == 'processed':
-        process_webhook_result(event_type, payload, result)
+    queued = webhook_inbox.enqueue(delivery_id, event_type, repo_key, payload_text)
+    if queued:
+        webhook_dispatcher.notify()
     
     # GitHub 期望收到 2xx 响应
-    return jsonify(result), 200 if result['status'] in ['processed', 'ignored'] else 400
+    return jsonify({
+        'status': 'queued' if queued else 'duplicate',
+        'event': event_type,
+        'delivery_id': delivery_id
+    }), 202
 
 
-def process_webhook_result(event_type: str, payload: dict, result: dict):
-    """处理 webhook 结果，更新本地数据"""
-    try:
-        repository = payload.get('repository', {})
-        repo_full_name = repository.get('full_name', '')
+def _ordering_key(body: bytes) -> str:
+    """同一仓库的事件按顺序处理所用的键"""
+    if request.headers.get('X-GitHub-Hook-Installation-Target-Type') == 'repository':
+        target_id = request.headers.get('X-GitHub-Hook-Installation-Target-ID')
+        if target_id:
+            return f"repository:{target_id}"
+    # 组织级 webhook 等：从 payload 中读取仓库名
+    return WebhookPayload(body).field('repository', 'full_name', default='') or ''
+
+
+def process_delivery(delivery_id: str, event_type: str, payload: WebhookPayload):
+    """后台处理一个 webhook 事件，失败时抛出异常由调度器重试"""
+    result = webhook_handler.handle_event(event_type, payload)
+    if result['status'] == 'error':
+        raise RuntimeError(result['error'])
+    
+    # 根据事件类型执行相应的操作
+    if result['status'] == 'processed':
+        process_webhook_result(event_type, payload, result, delivery_id)
+
+
+def process_webhook_result(event_type: str, payload: Mapping, result: dict, delivery_id: str = None):
+    """处理 webhook 结果，更新本地数据
+
+    所有写入都是幂等的（事件日志以投递 ID 为主键），重试不会产生重复数据。
+    """
+    repository = payload.get('repository', {})
+    repo_full_name = repository.get('full_name', '')
+    
+    if not repo_full_name:
+        return
+    
+    # 查找对应的本地仓库
+    github_url = repository.get('html_url', '')
+    
+    with repo_manager.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, local_path FROM repositories 
+            WHERE github_url = ? OR github_url = ?
+        ''', (github_url, github_url + '.git'))
         
-        if not repo_full_name:
+        repo_row = cursor.fetchone()
+        if not repo_row:
+            logger.info(f"No local repository found for {github_url}")
             return
         
-        # 查找对应的本地仓库
-        github_url = repository.get('html_url', '')
+        repo_id = repo_row['id']
         
-        with repo_manager.get_connection() as conn:
-            cursor = conn.cursor()
+        # 根据事件类型更新数据
+        if event_type == 'push':
+            # 更新最后推送时间
             cursor.execute('''
-                SELECT id, local_path FROM repositories 
-                WHERE github_url = ? OR github_url = ?
-            ''', (github_url, github_url + '.git'))
-            
-            repo_row = cursor.fetchone()
-            if not repo_row:
-                logger.info(f"No local repository found for {github_url}")
-                return
+                UPDATE repositories 
+                SET updated_at = datetime('now')
+                WHERE id = ?
+            ''', (repo_id,))
             
-            repo_id = repo_row['id']
-            
-            # 根据事件类型更新数据
-            if event_type == 'push':
-                # 更新最后推送时间
+        elif event_type == 'pull_request':
+            pr_data = result['result']
+            if pr_data['action'] in ['opened', 'closed', 'reopened']:
+                # 更新 PR 状态
                 cursor.execute('''
-                    UPDATE repositories 
-                    SET updated_at = datetime('now')
-                    WHERE id = ?
-                ''', (repo_id,))
-                
-                # 记录推送事件
-                cursor.execute('''
-                    INSERT INTO webhook_events 
-                    (repository_id, event_type, payload, processed_at)
-                    VALUES (?, ?, ?, datetime('now'))
-                ''', (repo_id, event_type, json.dumps(result['result'])))
-                
-            elif event_type == 'pull_request':
-                pr_data = result['result']
-                if pr_data['action'] in ['opened', 'closed', 'reopened']:
-                    # 更新 PR 状态
-                    cursor.execute('''
-                        UPDATE pull_requests 
-                        SET status = ?, updated_at = datetime('now')
-                        WHERE repository_id = ? AND github_pr_number = ?
-                    ''', (pr_data['pr_state'], repo_id, pr_data['pr_number']))
-                    
-            elif event_type == 'issues':
-                issue_data = result['result']
-                # TODO: 更新议题状态
-                logger.info(f"Issue {issue_data['action']}: #{issue_data['issue_number']}")
-                
-            elif event_type == 'create' and result['result']['ref_type'] == 'branch':
-                # 新分支创建
-                branch_name = result['result']['ref_name']
-                logger.info(f"New branch created: {branch_name}")
-                # TODO: 同步新分支到本地
+                    UPDATE pull_requests 
+                    SET status = ?, updated_at = datetime('now')
+                    WHERE repository_id = ? AND github_pr_number = ?
+                ''', (pr_data['pr_state'], repo_id, pr_data['pr_number']))
                 
-            conn.commit()
+        elif event_type == 'issues':
+            issue_data = result['result']
+            # TODO: 更新议题状态
+            logger.info(f"Issue {issue_data['action']}: #{issue_data['issue_number']}")
             
+        elif event_type == 'create' and result['result']['ref_type'] == 'branch':
+            # 新分支创建
+            branch_name = result['result']['ref_name']
+            logger.info(f"New branch created: {branch_name}")
+            
+        conn.commit()
+    
+    # 记录到事件日志（列表显示摘要，完整结果按 ID 读取）
+    event_log.record(delivery_id or uuid.uuid4().hex, repo_id, event_type,
+                     summarize_result(event_type, result['result']), result['result'])
+    
+    # push/create/delete 只获取受影响的引用；同一仓库的连续事件合并为一次同步
+    updated, deleted = changed_refs(event_type, result['result'])
+    if updated or deleted:
+        get_repo_sync().request(repo_id, updated, deleted)
+
+
+@webhook_bp.route('/github/inbox', methods=['GET'])
+def webhook_inbox_stats():
+    """收件箱各状态的事件数"""
+    try:
+        return jsonify({
+            'inbox': webhook_inbox.get_stats(),
+            'in_flight': webhook_dispatcher.in_flight
+        }), 200
     except Exception as e:
-        logger.error(f"Error processing webhook result: {str(e)}")
+        logger.error(f"Error getting webhook inbox stats: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+@webhook_bp.route('/github/inbox/retry', methods=['POST'])
+def retry_webhook_deliveries():
+    """重新处理失败的投递"""
+    try:
+        data = request.get_json(silent=True) or {}
+        retried = webhook_inbox.retry(data.get('delivery_ids', []))
+        if retried:
+            webhook_dispatcher.notify()
+        return jsonify({'retried': retried}), 200
+    except Exception as e:
+        logger.error(f"Error retrying webhook deliveries: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
 
 @webhook_bp.route('/github/test', methods=['POST'])
@@ -136,32 +216,55 @@ def test_github_webhook():
 
 @webhook_bp.route('/github/events', methods=['GET'])
 def list_webhook_events():
-    """列出最近的 webhook 事件"""
+    """列出最近的 webhook 事件（只含摘要）
+
+    查询参数：limit、cursor（上一页返回的 next_cursor）、repository_id、event_type
+    """
     try:
-        limit = request.args.get('limit', 50, type=int)
+        try:
+            events, next_cursor = event_log.list_events(
+                limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+                cursor=request.args.get('cursor'),
+                repository_id=request.args.get('repository_id'),
+                event_type=request.args.get('event_type')
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        with repo_manager.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT we.*, r.name as repo_name
-                FROM webhook_events we
-                LEFT JOIN repositories r ON we.repository_id = r.id
-                ORDER BY we.processed_at DESC
-                LIMIT ?
-            ''', (limit,))
-            
-            events = []
-            for row in cursor.fetchall():
-                events.append({
-                    'id': row['id'],
-                    'repository': row['repo_name'],
-                    'event_type': row['event_type'],
-                    'payload': json.loads(row['payload']) if row['payload'] else None,
-                    'processed_at': row['processed_at']
-                })
-            
-        return jsonify({'events': events}), 200
+        _attach_repository_names(events)
+        return jsonify({'events': events, 'next_cursor': next_cursor}), 200
         
     except Exception as e:
         logger.error(f"Error listing webhook events: {str(e)}")
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+
+@webhook_bp.route('/github/events/<event_id>', methods=['GET'])
+def get_webhook_event(event_id):
+    """获取单个 webhook 事件（含完整结果）"""
+    try:
+        event = event_log.get_event(event_id)
+        if not event:
+            return jsonify({'error': 'Event not found'}), 404
+        
+        _attach_repository_names([event])
+        return jsonify({'event': event}), 200
+        
+    except Exception as e:
+        logger.error(f"Error getting webhook event: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+
+def _attach_repository_names(events):
+    """一次查询补充本页事件的仓库名"""
+    repo_ids = sorted({event['repository_id'] for event in events})
+    names = {}
+    if repo_ids:
+        with repo_manager.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT id, name FROM repositories WHERE id IN ({','.join('?' * len(repo_ids))})
+            ''', repo_ids)
+            names = {row['id']: row['name'] for row in cursor.fetchall()}
+    for event in events:
+        event['repository'] = names.get(event['repository_id'])
\ No newline at end of file
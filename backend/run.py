@@ -8,7 +8,7 @@ import sys
 # Add the backend directory to Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app import app, socketio
+from app import app, socketio, resume_task_chains
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
@@ -18,4 +18,5 @@ if __name__ == '__main__':
     print(f"Debug mode: {debug}")
     print(f"Async mode: threading")
     
+    resume_task_chains(debug=debug)
     socketio.run(app, debug=debug, host='0.0.0.0', port=port)
\ No newline at end of file
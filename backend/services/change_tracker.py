@@ -0,0 +1,204 @@
+"""
+任务文件变更检测 - 执行前后各取一次工作区快照，比较得出任务修改了哪些文件
+
+- git 仓库：记录 HEAD 和 `git status --porcelain -z` 中每个条目的 stat 签名；
+  干净的文件不需要逐个 stat，任务提交的更改通过两次 HEAD 之间的 diff 得到
+- 普通目录：基于 scandir 的 (size, mtime) 清单
+- 局限：快照覆盖整个目录，同一目录中并行运行的任务（如任务链的并行节点）的修改无法区分，
+  执行器会在这种情况下把 diff_stats 标记为 ambiguous
+"""
+import os
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from services.fs_walker import DEFAULT_IGNORED_DIRS, ScandirWalker
+
+# 超过该文件数时不再统计增删行数（只列出文件）
+MAX_STAT_FILES = 500
+# 统计新文件行数时读取的最大字节数
+MAX_COUNT_BYTES = 1024 * 1024
+GIT_TIMEOUT = 60
+
+
+def _git(root: Union[str, Path], args: List[str], check: bool = True) -> Optional[str]:
+    result = subprocess.run(['git', '--no-optional-locks'] + args, cwd=str(root),
+                            capture_output=True, text=True, timeout=GIT_TIMEOUT)
+    if result.returncode != 0:
+        if check:
+            raise RuntimeError(f"git {' '.join(args)} failed: {result.stderr.strip()}")
+        return None
+    return result.stdout
+
+
+def _signature(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _count_lines(path: Path) -> Optional[int]:
+    """新文件的行数；二进制文件返回 None"""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read(MAX_COUNT_BYTES)
+    except OSError:
+        return None
+    if b'\0' in data:
+        return None
+    return data.count(b'\n') + (1 if data and not data.endswith(b'\n') else 0)
+
+
+class WorkspaceSnapshot:
+    """某一时刻的工作区状态"""
+
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+        self.is_git = False
+        self.head: Optional[str] = None
+        # path -> 签名（git 仓库中只包含 status 列出的条目）
+        self.entries: Dict[str, Tuple] = {}
+
+    @classmethod
+    def take(cls, root: Union[str, Path]) -> 'WorkspaceSnapshot':
+        snapshot = cls(root)
+        toplevel = _git(root, ['rev-parse', '--show-toplevel'], check=False)
+        if toplevel is not None and Path(toplevel.strip()).resolve() == snapshot.root.resolve():
+            snapshot._take_git()
+        else:
+            snapshot._take_manifest()
+        return snapshot
+
+    def _take_git(self):
+        self.is_git = True
+        head = _git(self.root, ['rev-parse', '--verify', '--quiet', 'HEAD'], check=False)
+        self.head = head.strip() if head else None
+        output = _git(self.root, ['status', '--porcelain', '-z', '--untracked-files=all'])
+        records = output.split('\0')
+        i = 0
+        while i < len(records):
+            record = records[i]
+            i += 1
+            if len(record) < 4:
+                continue
+            xy, path = record[:2], record[3:]
+            if 'R' in xy or 'C' in xy:
+                # 重命名条目后紧跟原路径
+                original = records[i]
+                i += 1
+                self.entries[original] = ('D', None)
+            self.entries[path] = (xy, _signature(self.root / path))
+
+    def _take_manifest(self):
+        walker = ScandirWalker(show_hidden=True, ignore_dirs=DEFAULT_IGNORED_DIRS)
+        for entry in walker.walk(self.root):
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            path = os.path.relpath(entry.path, self.root).replace(os.sep, '/')
+            self.entries[path] = (stat.st_size, stat.st_mtime_ns)
+
+
+def compute_changes(before: WorkspaceSnapshot,
+                    after: Optional[WorkspaceSnapshot] = None) -> List[Dict]:
+    """比较两个快照，返回 [{'path', 'status', 'additions', 'deletions'}]
+
+    status 为 A（新增）、M（修改）或 D（删除）。git 仓库的增删行数相对任务开始时的 HEAD。
+    """
+    after = after or WorkspaceSnapshot.take(before.root)
+    if before.is_git != after.is_git:
+        # 任务执行中初始化或删除了仓库，退化为按文件比较
+        return [{'path': path, 'status': 'M', 'additions': None, 'deletions': None}
+                for path in sorted(set(before.entries) | set(after.entries))]
+    if after.is_git:
+        return _git_changes(before, after)
+    return _manifest_changes(before, after)
+
+
+def _manifest_changes(before: WorkspaceSnapshot, after: WorkspaceSnapshot) -> List[Dict]:
+    changes = []
+    for path in sorted(set(before.entries) | set(after.entries)):
+        old, new = before.entries.get(path), after.entries.get(path)
+        if old == new:
+            continue
+        status = 'A' if old is None else 'D' if new is None else 'M'
+        additions = _count_lines(after.root / path) if status == 'A' else None
+        changes.append({'path': path, 'status': status, 'additions': additions,
+                        'deletions': None})
+    return changes
+
+
+def _git_changes(before: WorkspaceSnapshot, after: WorkspaceSnapshot) -> List[Dict]:
+    root = after.root
+    statuses: Dict[str, str] = {}
+
+    # 任务提交的更改
+    if before.head and after.head and before.head != after.head:
+        output = _git(root, ['diff', '--no-renames', '--name-status', '-z',
+                             before.head, after.head], check=False) or ''
+        fields = output.split('\0')
+        for status, path in zip(fields[0::2], fields[1::2]):
+            if path:
+                statuses[path] = status[:1]
+
+    # 工作区中状态或内容发生变化的条目
+    for path in set(before.entries) | set(after.entries):
+        old, new = before.entries.get(path), after.entries.get(path)
+        if old == new:
+            continue
+        if not (root / path).exists():
+            statuses[path] = 'D'
+        elif path in statuses:
+            continue
+        elif old is None:
+            # 开始时是干净的：新出现的未跟踪/新增条目是新文件，否则是修改了已跟踪文件
+            statuses[path] = 'A' if new[0] == '??' or new[0][0] == 'A' else 'M'
+        else:
+            # 开始时文件不存在（例如已删除）则视为新增
+            statuses[path] = 'A' if old[1] is None else 'M'
+
+    if not statuses:
+        return []
+    paths = sorted(statuses)
+    numstat = _numstat(root, before.head, paths) if len(paths) <= MAX_STAT_FILES else {}
+
+    changes = []
+    for path in paths:
+        additions, deletions = numstat.get(path, (None, None))
+        if path not in numstat and statuses[path] == 'A' and len(paths) <= MAX_STAT_FILES:
+            additions, deletions = _count_lines(root / path), 0
+        changes.append({'path': path, 'status': statuses[path],
+                        'additions': additions, 'deletions': deletions})
+    return changes
+
+
+def _numstat(root: Path, base: Optional[str], paths: List[str]) -> Dict[str, Tuple]:
+    """已跟踪文件相对 base 的增删行数（二进制文件为 None）"""
+    if not base:
+        return {}
+    # 调用方保证 paths 不超过 MAX_STAT_FILES，可以直接放在命令行上
+    output = _git(root, ['diff', '--no-renames', '--numstat', '-z', base, '--'] + paths,
+                  check=False) or ''
+    stats = {}
+    for record in output.split('\0'):
+        parts = record.split('\t', 2)
+        if len(parts) != 3:
+            continue
+        added, deleted, path = parts
+        stats[path] = (None, None) if added == '-' else (int(added), int(deleted))
+    return stats
+
+
+def summarize_changes(changes: List[Dict]) -> Dict:
+    """汇总增删行数，作为任务的 diff_stats 持久化"""
+    return {
+        'files': changes,
+        'files_count': len(changes),
+        'additions': sum(change['additions'] or 0 for change in changes),
+        'deletions': sum(change['deletions'] or 0 for change in changes)
+    }
@@ -1,4 +1,5 @@
 import os
+import logging
 import subprocess
 import threading
 import queue
@@ -8,6 +9,22 @@ from datetime import datetime
 from typing import Dict, Optional, Callable
 from pathlib import Path
 from models.task import Task, TaskManager
+from models.task_timeseries import (
+    TaskTimeSeriesDB, QUEUE_WAIT, START_LATENCY, RUN_DURATION, OUTPUT_BYTES
+)
+from services.change_tracker import WorkspaceSnapshot, compute_changes, summarize_changes
+from utils.instrumentation import get_registry
+
+logger = logging.getLogger(__name__)
+
+TASKS_FINISHED = get_registry().counter(
+    'claude_executor_tasks_total', 'Tasks finished by the executor', ['status'])
+TASK_RUN_SECONDS = get_registry().histogram(
+    'claude_executor_task_run_seconds', 'Task run time in the executor',
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800))
+TASK_QUEUE_SECONDS = get_registry().histogram(
+    'claude_executor_task_queue_seconds', 'Time tasks wait in the executor queue',
+    buckets=(0.01, 0.1, 0.5, 1, 5, 15, 30, 60, 300, 900))
 
 class ClaudeExecutor:
     """Service for executing Claude Code commands and managing tasks."""
@@ -16,9 +33,18 @@ class ClaudeExecutor:
         self.claude_path = claude_path or os.environ.get('CLAUDE_CODE_PATH', 'claude')
         self.max_concurrent = max_concurrent
         self.task_manager = TaskManager(db_path=db_path)
+        self.timeseries = TaskTimeSeriesDB(db_path)
         self.active_tasks: Dict[str, 'Task'] = {}
         self.task_queue = queue.Queue()
         self.output_callbacks: Dict[str, Callable] = {}
+        self.busy_workers = 0
+        self._busy_lock = threading.Lock()
+        # Workspace of every task between its before/after snapshots, and the
+        # tasks whose snapshot window overlapped another task in the same tree
+        self._snapshot_paths: Dict[str, Path] = {}
+        self._overlapping: set = set()
+        self._snapshot_lock = threading.Lock()
+        self._register_gauges()
         
         # Start worker threads
         self.workers = []
@@ -27,11 +53,30 @@ class ClaudeExecutor:
             worker.start()
             self.workers.append(worker)
     
+    def _register_gauges(self):
+        """Expose queue and worker saturation on the metrics registry."""
+        metrics = get_registry()
+        metrics.gauge('claude_executor_queue_length',
+                      'Tasks waiting in the executor queue').set_function(self.task_queue.qsize)
+        metrics.gauge('claude_executor_workers',
+                      'Executor worker threads').set_function(lambda: self.max_concurrent)
+        metrics.gauge('claude_executor_busy_workers',
+                      'Executor workers currently running a task').set_function(lambda: self.busy_workers)
+        metrics.gauge('claude_executor_active_tasks',
+                      'Tasks tracked in active_tasks').set_function(lambda: len(self.active_tasks))
+        metrics.gauge('claude_executor_output_callbacks',
+                      'Registered output callbacks').set_function(lambda: len(self.output_callbacks))
+    
     def execute(self, prompt: str, project_path: str, 
                 output_callback: Optional[Callable] = None,
                 completion_callback: Optional[Callable] = None,
-                user_id: Optional[str] = None) -> str:
-        """Execute Claude Code with given prompt and project path."""
+                user_id: Optional[str] = None,
+                task_id: Optional[str] = None) -> str:
+        """Execute Claude Code with given prompt and project path.
+        
+        When ``task_id`` refers to an existing task (e.g. a node of a task
+        chain), that task is re-run in place instead of creating a new one.
+        """
         import logging
         logger = logging.getLogger(__name__)
         
@@ -39,16 +84,33 @@ class ClaudeExecutor:
         if not user_id:
             logger.warning(f"No user_id provided for task in project: {project_path}")
         
-        task_id = str(uuid.uuid4())
-        task = Task(
-            id=task_id,
-            prompt=prompt,
-            project_path=project_path,
-            user_id=user_id
-        )
+        task = self.task_manager.get_task(task_id) if task_id else None
+        if task is None:
+            task_id = task_id or str(uuid.uuid4())
+            task = Task(
+                id=task_id,
+                prompt=prompt,
+                project_path=project_path,
+                user_id=user_id
+            )
+            self.task_manager.add_task(task)
+        else:
+            # 重新执行已有任务（重试时清除上一次的结果）
+            task.prompt = prompt
+            task.status = 'pending'
+            task.output = ''
+            task.error = None
+            task.error_message = None
+            task.completed_at = None
+            task.execution_time = None
+            task.files_changed = []
+            task.diff_stats = None
+            task.process = None
+            if user_id:
+                task.user_id = user_id
+            self.task_manager.update_task(task)
         
         self.active_tasks[task_id] = task
-        self.task_manager.add_task(task)
         
         if output_callback:
             self.output_callbacks[task_id] = output_callback
@@ -56,6 +118,8 @@ class ClaudeExecutor:
         if completion_callback:
             task.completion_callback = completion_callback
             
+        task.queued_at = datetime.now()
+        task.first_output_at = None
         self.task_queue.put(task)
         return task_id
     
@@ -66,7 +130,13 @@ class ClaudeExecutor:
             if task is None:
                 break
                 
-            self._run_task(task)
+            with self._busy_lock:
+                self.busy_workers += 1
+            try:
+                self._run_task(task)
+            finally:
+                with self._busy_lock:
+                    self.busy_workers -= 1
             self.task_queue.task_done()
     
     def _run_task(self, task: 'Task'):
@@ -78,6 +148,7 @@ class ClaudeExecutor:
         task.status = 'running'
         task.started_at = datetime.now()
         self.task_manager.update_task(task)
+        snapshot = self._take_snapshot(task)
         
         try:
             # Build command
@@ -154,6 +225,8 @@ class ClaudeExecutor:
             ]
             
             for line in process.stdout:
+                if not output_lines:
+                    task.first_output_at = datetime.now()
                 output_lines.append(line)
                 
                 # 检测可能的交互提示
@@ -220,6 +293,7 @@ class ClaudeExecutor:
                 self.output_callbacks[task.id](task.id, f"Error: {str(e)}")
         
         finally:
+            self._record_changes(task, snapshot)
             task.completed_at = datetime.utcnow()
             self.task_manager.update_task(task)
             
@@ -228,18 +302,102 @@ class ClaudeExecutor:
                 try:
                     from models.agent_metrics import AgentMetricsManager
                     metrics_manager = AgentMetricsManager()
-                    metrics_manager.update_task_metrics(task.user_id, task.execution_time)
+                    metrics_manager.update_task_metrics(task.user_id, task.execution_time, task_id=task.id)
                 except Exception as e:
                     logger.error(f"Failed to update agent metrics: {str(e)}")
             
-            if hasattr(task, 'completion_callback') and task.completion_callback:
-                task.completion_callback(task)
+            try:
+                self._record_timeseries(task)
+            except Exception as e:
+                logger.error(f"Failed to record task timeseries: {str(e)}")
             
-            # Cleanup
+            # Cleanup（先于完成回调，回调中可能以同一 task_id 重新提交任务）
             self.output_callbacks.pop(task.id, None)
             # 从活动任务中移除（但保留在数据库中）
             if task.id in self.active_tasks:
                 del self.active_tasks[task.id]
+            
+            if hasattr(task, 'completion_callback') and task.completion_callback:
+                task.completion_callback(task)
+    
+    def _take_snapshot(self, task: 'Task') -> Optional[WorkspaceSnapshot]:
+        """Snapshot the project directory before the task runs.
+        
+        The before/after diff covers the whole directory, so it cannot tell
+        which of several tasks running in the same tree (e.g. parallel nodes
+        of a task chain) made an edit. Overlapping runs are tracked here and
+        their results flagged as ambiguous in ``_record_changes``.
+        """
+        if not task.project_path or not os.path.isdir(task.project_path):
+            return None
+        self._register_snapshot(task)
+        try:
+            return WorkspaceSnapshot.take(task.project_path)
+        except Exception as e:
+            logger.warning(f"Failed to snapshot {task.project_path}: {str(e)}")
+            return None
+    
+    def _record_changes(self, task: 'Task', snapshot: Optional[WorkspaceSnapshot]):
+        """Fill in files_changed and diff_stats from the pre-execution snapshot.
+        
+        When another task ran in the same tree at any point during this one,
+        the changes may include the other task's edits: they are still
+        recorded, but ``diff_stats['ambiguous']`` is set.
+        """
+        ambiguous = self._unregister_snapshot(task)
+        if snapshot is None:
+            return
+        try:
+            changes = compute_changes(snapshot)
+            task.files_changed = [change['path'] for change in changes]
+            task.diff_stats = summarize_changes(changes)
+            if ambiguous:
+                task.diff_stats['ambiguous'] = True
+        except Exception as e:
+            logger.warning(f"Failed to compute changes for task {task.id}: {str(e)}")
+    
+    def _register_snapshot(self, task: 'Task'):
+        """Record the task's workspace and flag any run overlapping it."""
+        path = Path(task.project_path).resolve()
+        with self._snapshot_lock:
+            for other_id, other_path in self._snapshot_paths.items():
+                # Nested trees overlap too (a task in the repo root sees edits in a subdirectory)
+                if other_id != task.id and (path == other_path or path in other_path.parents
+                                            or other_path in path.parents):
+                    self._overlapping.update((task.id, other_id))
+            self._snapshot_paths[task.id] = path
+    
+    def _unregister_snapshot(self, task: 'Task') -> bool:
+        """Forget the task's workspace; return whether another run overlapped it."""
+        with self._snapshot_lock:
+            self._snapshot_paths.pop(task.id, None)
+            ambiguous = task.id in self._overlapping
+            self._overlapping.discard(task.id)
+            return ambiguous
+    
+    def _record_timeseries(self, task: 'Task'):
+        """Record queue wait, start latency, duration and output size for a finished task."""
+        started_at = getattr(task, 'started_at', None)
+        queued_at = getattr(task, 'queued_at', None)
+        first_output_at = getattr(task, 'first_output_at', None)
+        
+        TASKS_FINISHED.inc(status=task.status)
+        if started_at and queued_at:
+            TASK_QUEUE_SECONDS.observe((started_at - queued_at).total_seconds())
+        if task.execution_time:
+            TASK_RUN_SECONDS.observe(task.execution_time)
+        
+        values = {
+            QUEUE_WAIT: (started_at - queued_at).total_seconds() if started_at and queued_at else None,
+            START_LATENCY: (first_output_at - started_at).total_seconds() if started_at and first_output_at else None,
+            RUN_DURATION: task.execution_time or (
+                (datetime.now() - started_at).total_seconds() if started_at else None),
+            OUTPUT_BYTES: len((task.output or '').encode('utf-8')),
+        }
+        self.timeseries.record_task(
+            values, task.status, getattr(task, 'exit_code', None),
+            project_path=task.project_path, user_id=getattr(task, 'user_id', None)
+        )
     
     def cancel_task(self, task_id: str) -> bool:
         """Cancel a running task."""
@@ -0,0 +1,211 @@
+"""
+任务上下文构建 - 在任务运行时逐行收集摘要和关键信息（固定内存和字节预算），
+完成后把精简的上下文记录持久化，子任务构建提示时无需再扫描完整输出
+"""
+import json
+import logging
+import sqlite3
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 摘要保留的开头/结尾行数
+SUMMARY_HEAD_LINES = 2
+SUMMARY_TAIL_LINES = 3
+# 关键信息最多保留的行数
+MAX_SALIENT_LINES = 10
+# 单行最多保留的字符数
+MAX_LINE_CHARS = 300
+# 单个任务上下文记录的字节预算
+CONTEXT_BYTE_BUDGET = 4 * 1024
+# 子任务提示中上游上下文的总字节预算
+PROMPT_CONTEXT_BUDGET = 16 * 1024
+
+SALIENT_KEYWORDS = ('created', 'wrote')
+ERROR_KEYWORDS = ('error', 'failed')
+
+
+def _clip(line: str, limit: int = MAX_LINE_CHARS) -> str:
+    return line if len(line) <= limit else line[:limit] + '…'
+
+
+def _fit(lines: List[str], budget: int, keep_last: bool = True) -> List[str]:
+    """按字节预算截取行，默认保留最后的行"""
+    result = []
+    used = 0
+    for line in (reversed(lines) if keep_last else lines):
+        size = len(line.encode('utf-8')) + 1
+        if used + size > budget:
+            break
+        result.append(line)
+        used += size
+    return list(reversed(result)) if keep_last else result
+
+
+class ContextCollector:
+    """流式上下文收集器
+
+    只保留开头几行、结尾几行和最近的关键行，内存占用与输出长度无关。
+    """
+
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        # 输出不超过 head + tail 行时摘要就是完整输出，因此开头多保留几行
+        self._head: List[str] = []
+        self._tail = deque(maxlen=SUMMARY_TAIL_LINES)
+        self._salient = deque(maxlen=MAX_SALIENT_LINES)
+        self.line_count = 0
+        self.byte_count = 0
+
+    def feed(self, line: str):
+        """处理一行输出"""
+        line = line.rstrip('\n')
+        self.line_count += 1
+        self.byte_count += len(line.encode('utf-8', errors='replace')) + 1
+
+        clipped = _clip(line)
+        if len(self._head) < SUMMARY_HEAD_LINES + SUMMARY_TAIL_LINES:
+            self._head.append(clipped)
+        self._tail.append(clipped)
+
+        lowered = line.lower()
+        if any(keyword in lowered for keyword in SALIENT_KEYWORDS):
+            self._salient.append(clipped.strip())
+        elif any(keyword in lowered for keyword in ERROR_KEYWORDS):
+            self._salient.append(f"错误: {clipped.strip()}")
+
+    def feed_text(self, text: str):
+        """处理一段完整输出（执行器没有逐行回调时使用）"""
+        for line in text.strip().split('\n'):
+            self.feed(line)
+
+    def summary(self) -> str:
+        """开头两行 + 结尾三行的摘要"""
+        if self.line_count == 0:
+            return "无输出"
+        if self.line_count <= SUMMARY_HEAD_LINES + SUMMARY_TAIL_LINES:
+            return "\n".join(self._head)
+        return "\n".join(self._head[:SUMMARY_HEAD_LINES] + ["..."] + list(self._tail))
+
+    def salient(self) -> List[str]:
+        return list(self._salient)
+
+    def to_record(self) -> Dict:
+        """生成不超过字节预算的上下文记录"""
+        summary = self.summary()
+        summary_bytes = len(summary.encode('utf-8'))
+        salient = _fit(self.salient(), max(0, CONTEXT_BYTE_BUDGET - summary_bytes))
+        return {
+            'task_id': self.task_id,
+            'summary': summary,
+            'salient': salient,
+            'line_count': self.line_count,
+            'byte_count': self.byte_count
+        }
+
+
+def record_from_output(task_id: str, output: Optional[str]) -> Dict:
+    """从完整输出生成上下文记录"""
+    collector = ContextCollector(task_id)
+    if output:
+        collector.feed_text(output)
+    return collector.to_record()
+
+
+def format_upstream_context(records: Iterable[Dict],
+                            budget: int = PROMPT_CONTEXT_BUDGET) -> List[str]:
+    """把上游任务的上下文记录格式化为提示片段，超出预算时保留最近的记录
+
+    records 中每项需包含 'label'（例如 "子任务 2"）。
+    """
+    sections = []
+    for record in records:
+        lines = [f"\n{record['label']} 结果摘要:", record.get('summary') or "无输出"]
+        if record.get('salient'):
+            lines.append("关键信息:")
+            lines.extend(record['salient'])
+        sections.append("\n".join(lines))
+
+    kept = _fit(sections, budget)
+    omitted = len(sections) - len(kept)
+    if omitted:
+        kept.insert(0, f"\n（省略了更早的 {omitted} 个子任务的结果摘要）")
+    return kept
+
+
+class TaskContextStore:
+    """任务上下文记录的持久化存储"""
+
+    def __init__(self, db_path: str = "tasks.db"):
+        self.db_path = db_path
+        self._init_db()
+
+    @contextmanager
+    def get_connection(self):
+        """获取数据库连接的上下文管理器"""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        """初始化上下文表"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS task_context (
+                    task_id TEXT PRIMARY KEY,
+                    summary TEXT NOT NULL,
+                    salient TEXT NOT NULL DEFAULT '[]',
+                    line_count INTEGER NOT NULL DEFAULT 0,
+                    byte_count INTEGER NOT NULL DEFAULT 0,
+                    updated_at TIMESTAMP NOT NULL
+                )
+            ''')
+            conn.commit()
+
+    def save(self, record: Dict):
+        """保存（覆盖）任务的上下文记录"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO task_context (task_id, summary, salient, line_count, byte_count, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(task_id) DO UPDATE SET
+                    summary = excluded.summary,
+                    salient = excluded.salient,
+                    line_count = excluded.line_count,
+                    byte_count = excluded.byte_count,
+                    updated_at = excluded.updated_at
+            ''', (
+                record['task_id'], record['summary'], json.dumps(record['salient'], ensure_ascii=False),
+                record['line_count'], record['byte_count'], datetime.now().isoformat()
+            ))
+            conn.commit()
+
+    def get(self, task_id: str) -> Optional[Dict]:
+        """获取单个任务的上下文记录"""
+        return self.get_many([task_id]).get(task_id)
+
+    def get_many(self, task_ids: List[str]) -> Dict[str, Dict]:
+        """批量获取上下文记录"""
+        if not task_ids:
+            return {}
+        placeholders = ','.join('?' * len(task_ids))
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f'SELECT * FROM task_context WHERE task_id IN ({placeholders})',
+                list(task_ids)
+            )
+            records = {}
+            for row in cursor.fetchall():
+                record = dict(row)
+                record['salient'] = json.loads(record['salient'] or '[]')
+                records[record['task_id']] = record
+            return records
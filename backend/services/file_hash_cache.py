@@ -0,0 +1,225 @@
+"""
+文件哈希缓存服务 - 单次读取同时计算多种摘要，并按 (inode, size, mtime_ns) 持久化缓存
+"""
+import hashlib
+import logging
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# 缓存中保存的摘要算法
+DIGEST_ALGORITHMS = ('md5', 'sha256')
+# 普通读取的缓冲区大小
+HASH_BUFFER_SIZE = 1024 * 1024
+# 超过该大小的文件使用 mmap 读取
+MMAP_THRESHOLD = 16 * 1024 * 1024
+# mtime 距今小于该时间的文件不缓存，避免同一时间片内被再次修改而缓存失效不了
+RACY_WINDOW_NS = 2 * 1_000_000_000
+
+
+def compute_digests(path: Union[str, Path],
+                    algorithms: Iterable[str] = DIGEST_ALGORITHMS) -> Dict[str, str]:
+    """单次读取文件，同时计算多个摘要"""
+    hashers = {name: hashlib.new(name) for name in algorithms}
+
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for hasher in hashers.values():
+                    hasher.update(mapped)
+        else:
+            buffer = bytearray(HASH_BUFFER_SIZE)
+            view = memoryview(buffer)
+            while True:
+                read = f.readinto(buffer)
+                if not read:
+                    break
+                for hasher in hashers.values():
+                    hasher.update(view[:read])
+
+    return {name: hasher.hexdigest() for name, hasher in hashers.items()}
+
+
+class FileHashCache:
+    """文件摘要缓存
+
+    内存 LRU + 可选的 SQLite 持久化。缓存键为 (device, inode, size, mtime_ns)，
+    文件未变化时直接命中，不再读取文件内容。
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_entries: int = 10000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._memory: 'OrderedDict[Tuple[int, int, int, int], Dict[str, str]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        if self.db_path:
+            self._init_db()
+
+    @contextmanager
+    def get_connection(self):
+        """获取数据库连接的上下文管理器"""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        """初始化哈希缓存表"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS file_hashes (
+                    device INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    path TEXT NOT NULL,
+                    md5 TEXT NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (device, inode)
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_file_hashes_sha256
+                ON file_hashes(sha256)
+            ''')
+            conn.commit()
+
+    @staticmethod
+    def _cache_key(stat: os.stat_result) -> Tuple[int, int, int, int]:
+        return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def get_digests(self, path: Union[str, Path]) -> Dict[str, str]:
+        """获取文件的 md5 和 sha256，未变化的文件直接命中缓存"""
+        path = Path(path)
+        stat = path.stat()
+        key = self._cache_key(stat)
+
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return dict(cached)
+
+        digests = self._load(key) if self.db_path else None
+        if digests is None:
+            with self._lock:
+                self.misses += 1
+            digests = compute_digests(path)
+
+            # 刚刚修改过的文件可能在同一时间片内再次被修改，不做持久化
+            if self.db_path and time.time_ns() - stat.st_mtime_ns > RACY_WINDOW_NS:
+                self._store(key, path, digests)
+        else:
+            with self._lock:
+                self.hits += 1
+
+        self._remember(key, digests)
+        return dict(digests)
+
+    def find_by_digest(self, sha256: str,
+                       within: Optional[Union[str, Path]] = None) -> Optional[Path]:
+        """按 sha256 查找内容相同且仍然有效的文件（用于上传去重、同步）"""
+        if not self.db_path:
+            return None
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT device, inode, size, mtime_ns, path FROM file_hashes
+                WHERE sha256 = ?
+            ''', (sha256,))
+            rows = cursor.fetchall()
+
+        root = Path(within).resolve() if within else None
+        for row in rows:
+            candidate = Path(row['path'])
+            if root is not None:
+                try:
+                    # 解析符号链接，防止通过链接引用范围外的文件
+                    candidate.resolve().relative_to(root)
+                except ValueError:
+                    continue
+            try:
+                stat = candidate.stat()
+            except OSError:
+                continue
+            # 只返回缓存记录仍然与磁盘一致的文件
+            if self._cache_key(stat) == (row['device'], row['inode'], row['size'], row['mtime_ns']):
+                return candidate
+
+        return None
+
+    def record(self, path: Union[str, Path], digests: Dict[str, str]):
+        """登记已知摘要的文件（例如上传时边写边算出的摘要）"""
+        path = Path(path)
+        stat = path.stat()
+        key = self._cache_key(stat)
+        self._remember(key, digests)
+        if self.db_path:
+            self._store(key, path, digests)
+
+    def _remember(self, key: Tuple[int, int, int, int], digests: Dict[str, str]):
+        with self._lock:
+            self._memory[key] = dict(digests)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _load(self, key: Tuple[int, int, int, int]) -> Optional[Dict[str, str]]:
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT md5, sha256 FROM file_hashes
+                    WHERE device = ? AND inode = ? AND size = ? AND mtime_ns = ?
+                ''', key)
+                row = cursor.fetchone()
+                if row:
+                    return {'md5': row['md5'], 'sha256': row['sha256']}
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to read hash cache: {e}")
+        return None
+
+    def _store(self, key: Tuple[int, int, int, int], path: Path, digests: Dict[str, str]):
+        try:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT OR REPLACE INTO file_hashes
+                    (device, inode, size, mtime_ns, path, md5, sha256, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (*key, str(path.resolve()), digests['md5'], digests['sha256'],
+                      datetime.now().isoformat()))
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to write hash cache: {e}")
+
+
+# Global hash cache instance
+hash_cache = None
+
+def get_hash_cache() -> FileHashCache:
+    """Get or create the global persistent hash cache."""
+    global hash_cache
+    if hash_cache is None:
+        hash_cache = FileHashCache(db_path="tasks.db")
+    return hash_cache
@@ -5,14 +5,65 @@ from pathlib import Path
 from typing import List, Dict, Optional, Union
 from datetime import datetime
 import mimetypes
-import hashlib
+import codecs
+import fnmatch
+from itertools import islice
+from services.file_hash_cache import FileHashCache, compute_digests, get_hash_cache
+from services.fs_walker import ScandirWalker, DirectorySizeCache
+
+# Number of bytes sampled from the start of a file to guess its encoding
+ENCODING_SAMPLE_SIZE = 64 * 1024
+# Candidate encodings tried (in order) after BOM detection
+FALLBACK_ENCODINGS = ('utf-8', 'gbk')
+
+
+def detect_encoding(sample: bytes, at_eof: bool = False) -> str:
+    """Guess the text encoding of a byte sample taken from the start of a file.
+
+    The sample may end in the middle of a multi-byte character, so an
+    incremental decoder is used and only finalised when the sample covers
+    the whole file.
+    """
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    
+    for encoding in FALLBACK_ENCODINGS:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            decoder.decode(sample, final=at_eof)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    
+    # latin-1 can decode any byte sequence
+    return 'latin-1'
+
+
+def file_etag(stat: os.stat_result) -> str:
+    """Build a cheap validator for a file from its stat data."""
+    return f"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"
+
 
 class FileManager:
     """Service for managing project files and directories."""
     
-    def __init__(self, base_path: Union[str, Path]):
+    def __init__(self, base_path: Union[str, Path],
+                 hash_cache: Optional[FileHashCache] = None,
+                 ignore_dirs: Optional[List[str]] = None,
+                 max_workers: int = 0):
         self.base_path = Path(base_path).resolve()
         self.base_path.mkdir(parents=True, exist_ok=True)
+        # Digests are cached by (inode, size, mtime_ns). Routes build a
+        # FileManager per request, so default to the shared persistent cache.
+        self.hash_cache = hash_cache or get_hash_cache()
+        # Directories pruned from recursive listings and searches
+        self.ignore_dirs = frozenset(ignore_dirs or ())
+        # >1 fans recursive walks out across top-level subtrees
+        self.max_workers = max_workers
+        self.size_cache = DirectorySizeCache(
+            ScandirWalker(show_hidden=True, max_workers=max_workers))
     
     def _validate_path(self, path: Union[str, Path]) -> Path:
         """Validate and resolve path within base directory."""
@@ -36,21 +87,42 @@ class FileManager:
         if not dir_path.is_dir():
             raise NotADirectoryError(f"Not a directory: {path}")
         
-        items = []
-        
+        walker = self._walker(show_hidden)
         if recursive:
-            for item in dir_path.rglob("*"):
-                if not show_hidden and any(part.startswith('.') for part in item.parts):
-                    continue
-                items.append(self._get_file_info(item))
+            entries = walker.entries(dir_path)
         else:
-            for item in dir_path.iterdir():
-                if not show_hidden and item.name.startswith('.'):
-                    continue
-                items.append(self._get_file_info(item))
+            entries = walker.walk(dir_path, max_depth=1)
         
+        items = [self._get_entry_info(entry) for entry in entries]
         return sorted(items, key=lambda x: (not x['is_directory'], x['name']))
     
+    def _walker(self, show_hidden: bool = False) -> ScandirWalker:
+        """Create a scandir walker honouring the manager's prune settings."""
+        return ScandirWalker(show_hidden=show_hidden,
+                             ignore_dirs=self.ignore_dirs,
+                             max_workers=self.max_workers)
+    
+    def _get_entry_info(self, entry: os.DirEntry) -> Dict:
+        """Get file/directory information from a cached scandir entry."""
+        stat = entry.stat(follow_symlinks=True)
+        is_dir = entry.is_dir()
+        is_file = entry.is_file()
+        
+        info = {
+            'name': entry.name,
+            'path': os.path.relpath(entry.path, self.base_path),
+            'is_directory': is_dir,
+            'size': stat.st_size if is_file else None,
+            'modified': datetime.fromtimestamp(stat.st_mtime).isoformat(),
+            'created': datetime.fromtimestamp(stat.st_ctime).isoformat(),
+        }
+        
+        if is_file:
+            info['mime_type'] = mimetypes.guess_type(entry.name)[0]
+            info['extension'] = os.path.splitext(entry.name)[1]
+        
+        return info
+    
     def _get_file_info(self, path: Path) -> Dict:
         """Get file/directory information."""
         stat = path.stat()
@@ -79,6 +151,7 @@ class FileManager:
             raise FileExistsError(f"Directory already exists: {path}")
         
         dir_path.mkdir(parents=True)
+        self._invalidate(dir_path)
         return self._get_file_info(dir_path)
     
     def delete(self, path: str, recursive: bool = False) -> bool:
@@ -99,6 +172,7 @@ class FileManager:
         else:
             target_path.unlink()
         
+        self._invalidate(target_path)
         return True
     
     def move(self, source: str, destination: str) -> Dict:
@@ -116,6 +190,7 @@ class FileManager:
         dest_path.parent.mkdir(parents=True, exist_ok=True)
         
         shutil.move(str(source_path), str(dest_path))
+        self._invalidate(source_path, dest_path)
         return self._get_file_info(dest_path)
     
     def copy(self, source: str, destination: str) -> Dict:
@@ -137,6 +212,7 @@ class FileManager:
         else:
             shutil.copy2(str(source_path), str(dest_path))
         
+        self._invalidate(dest_path)
         return self._get_file_info(dest_path)
     
     def read_file(self, path: str, encoding: str = 'utf-8') -> str:
@@ -155,6 +231,96 @@ class FileManager:
             # Try binary read for non-text files
             return file_path.read_bytes().hex()
     
+    def sniff_encoding(self, path: str) -> str:
+        """Detect file encoding from a small prefix sample."""
+        file_path = self._validate_path(path)
+        
+        with file_path.open('rb') as f:
+            sample = f.read(ENCODING_SAMPLE_SIZE)
+            at_eof = not f.read(1)
+        
+        return detect_encoding(sample, at_eof)
+    
+    def read_text(self, path: str) -> Dict:
+        """Read a text file in a single pass using the detected encoding."""
+        file_path = self._validate_path(path)
+        
+        if not file_path.exists():
+            raise FileNotFoundError(f"File not found: {path}")
+        
+        if not file_path.is_file():
+            raise ValueError(f"Not a file: {path}")
+        
+        data = file_path.read_bytes()
+        encoding = detect_encoding(data[:ENCODING_SAMPLE_SIZE],
+                                   len(data) <= ENCODING_SAMPLE_SIZE)
+        
+        return {
+            'content': data.decode(encoding, errors='replace'),
+            'encoding': encoding,
+            'size': len(data)
+        }
+    
+    def read_line_window(self, path: str, start_line: int = 0,
+                         max_lines: int = 1000,
+                         offset: Optional[int] = None) -> Dict:
+        """Read a window of lines without loading the whole file.
+        
+        ``offset`` is the ``next_offset`` cursor returned by a previous call
+        and lets the next page seek directly instead of rescanning from the
+        start of the file. ``start_line`` is only used for numbering when an
+        offset is given.
+        """
+        file_path = self._validate_path(path)
+        
+        if not file_path.exists():
+            raise FileNotFoundError(f"File not found: {path}")
+        
+        if not file_path.is_file():
+            raise ValueError(f"Not a file: {path}")
+        
+        start_line = max(start_line, 0)
+        max_lines = max(max_lines, 1)
+        encoding = self.sniff_encoding(path)
+        size = file_path.stat().st_size
+        
+        if encoding == 'utf-16':
+            # UTF-16 newlines are two bytes wide, so byte cursors are not
+            # supported; fall back to decoding from the beginning.
+            with file_path.open('r', encoding=encoding, errors='replace', newline='') as f:
+                lines = list(islice(f, start_line, start_line + max_lines + 1))
+            has_more = len(lines) > max_lines
+            lines = lines[:max_lines]
+            next_offset = None
+        else:
+            with file_path.open('rb') as f:
+                if offset is not None:
+                    f.seek(min(max(offset, 0), size))
+                    skip = 0
+                else:
+                    skip = start_line
+                raw_lines = list(islice(f, skip, skip + max_lines))
+                next_offset = f.tell()
+                has_more = next_offset < size
+            
+            lines = [line.decode(encoding, errors='replace') for line in raw_lines]
+        
+        return {
+            'path': str(file_path.relative_to(self.base_path)),
+            'encoding': encoding,
+            'start_line': start_line,
+            'end_line': start_line + len(lines),
+            'lines': [line.rstrip('\r\n') for line in lines],
+            'content': ''.join(lines),
+            'has_more': has_more,
+            'next_offset': next_offset if has_more else None,
+            'size': size
+        }
+    
+    def get_etag(self, path: str) -> str:
+        """Get the entity tag for a file."""
+        return file_etag(self._validate_path(path).stat())
+    
     def write_file(self, path: str, content: str, 
                    encoding: str = 'utf-8', 
                    create_dirs: bool = True) -> Dict:
@@ -165,6 +331,7 @@ class FileManager:
             file_path.parent.mkdir(parents=True, exist_ok=True)
         
         file_path.write_text(content, encoding=encoding)
+        self._invalidate(file_path)
         return self._get_file_info(file_path)
     
     def append_file(self, path: str, content: str, 
@@ -178,6 +345,7 @@ class FileManager:
         with file_path.open('a', encoding=encoding) as f:
             f.write(content)
         
+        self._invalidate(file_path)
         return self._get_file_info(file_path)
     
     def get_file_stats(self, path: str) -> Dict:
@@ -199,37 +367,35 @@ class FileManager:
         })
         
         if file_path.is_file():
-            # Calculate file hash
-            info['md5'] = self._calculate_file_hash(file_path, 'md5')
-            info['sha256'] = self._calculate_file_hash(file_path, 'sha256')
+            # Single pass for both digests, skipped entirely for unchanged files
+            info.update(self.hash_cache.get_digests(file_path))
         
         return info
     
     def _calculate_file_hash(self, path: Path, algorithm: str = 'md5') -> str:
         """Calculate file hash."""
-        hash_func = hashlib.new(algorithm)
-        
-        with path.open('rb') as f:
-            for chunk in iter(lambda: f.read(4096), b''):
-                hash_func.update(chunk)
-        
-        return hash_func.hexdigest()
+        return compute_digests(path, (algorithm,))[algorithm]
     
     def search_files(self, pattern: str, 
                     path: str = "",
-                    case_sensitive: bool = False) -> List[Dict]:
+                    case_sensitive: bool = False,
+                    show_hidden: bool = False) -> List[Dict]:
         """Search for files matching pattern."""
         search_path = self._validate_path(path)
         
         if not search_path.exists():
             raise FileNotFoundError(f"Search path not found: {path}")
         
-        results = []
-        glob_pattern = f"**/*{pattern}*" if not case_sensitive else pattern
+        if case_sensitive:
+            matches = lambda name: fnmatch.fnmatchcase(name, pattern)
+        else:
+            glob_pattern = f"*{pattern.lower()}*"
+            matches = lambda name: fnmatch.fnmatchcase(name.lower(), glob_pattern)
         
-        for item in search_path.rglob(glob_pattern):
-            if item.is_file():
-                results.append(self._get_file_info(item))
+        results = []
+        for entry in self._walker(show_hidden).entries(search_path):
+            if entry.is_file() and matches(entry.name):
+                results.append(self._get_entry_info(entry))
         
         return results
     
@@ -243,12 +409,12 @@ class FileManager:
         if not dir_path.is_dir():
             raise NotADirectoryError(f"Not a directory: {path}")
         
-        total_size = 0
-        for item in dir_path.rglob('*'):
-            if item.is_file():
-                total_size += item.stat().st_size
-        
-        return total_size
+        return self.size_cache.get_size(dir_path)
+    
+    def _invalidate(self, *paths: Path):
+        """Drop cached directory sizes affected by a change to ``paths``."""
+        for changed in paths:
+            self.size_cache.invalidate(changed, stop_at=self.base_path)
     
     def export_directory_tree(self, path: str = "", 
                             max_depth: Optional[int] = None) -> Dict:
@@ -0,0 +1,144 @@
+"""
+基于 os.scandir 的目录遍历 - 复用 DirEntry 缓存的类型/stat 信息，
+在进入子目录前剪枝隐藏目录和忽略目录，可选按子树并行遍历
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# 常见的无需遍历的目录（依赖、构建产物、缓存）
+DEFAULT_IGNORED_DIRS = frozenset({
+    '.git', 'node_modules', '__pycache__', '.venv', 'venv',
+    'dist', 'build', '.mypy_cache', '.pytest_cache', '.idea', '.vscode'
+})
+
+
+class ScandirWalker:
+    """目录遍历器"""
+
+    def __init__(self, show_hidden: bool = False,
+                 ignore_dirs: Iterable[str] = (),
+                 max_workers: int = 0):
+        self.show_hidden = show_hidden
+        self.ignore_dirs = frozenset(ignore_dirs)
+        self.max_workers = max_workers
+
+    def _skip(self, entry: os.DirEntry) -> bool:
+        if not self.show_hidden and entry.name.startswith('.'):
+            return True
+        return entry.name in self.ignore_dirs and entry.is_dir(follow_symlinks=False)
+
+    def _scan(self, path: Union[str, Path]) -> List[os.DirEntry]:
+        try:
+            with os.scandir(path) as it:
+                return [entry for entry in it if not self._skip(entry)]
+        except (PermissionError, FileNotFoundError, NotADirectoryError):
+            return []
+
+    def walk(self, root: Union[str, Path],
+             max_depth: Optional[int] = None) -> Iterator[os.DirEntry]:
+        """深度优先遍历，产出 root 下所有（未被剪枝的）条目"""
+        stack: List[Tuple[str, int]] = [(str(root), 0)]
+        while stack:
+            current, depth = stack.pop()
+            for entry in self._scan(current):
+                yield entry
+                if entry.is_dir(follow_symlinks=False) and (
+                        max_depth is None or depth + 1 < max_depth):
+                    stack.append((entry.path, depth + 1))
+
+    def entries(self, root: Union[str, Path]) -> List[os.DirEntry]:
+        """获取 root 下所有条目；max_workers > 1 时按顶层子树并行遍历"""
+        if self.max_workers <= 1:
+            return list(self.walk(root))
+
+        top_level = self._scan(root)
+        subdirs = [entry for entry in top_level if entry.is_dir(follow_symlinks=False)]
+        results = list(top_level)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for subtree in pool.map(lambda entry: list(self.walk(entry.path)), subdirs):
+                results.extend(subtree)
+
+        return results
+
+
+class DirectorySizeCache:
+    """目录大小缓存
+
+    每个目录缓存 (mtime_ns, 直属文件大小合计, 子目录列表)。目录 mtime 只在直属条目
+    增删改名时变化，因此热缓存下计算总大小只需每个目录一次 stat。
+    文件原地改写不会改变目录 mtime，写入方需要调用 invalidate()。
+    """
+
+    def __init__(self, walker: Optional[ScandirWalker] = None):
+        # 大小统计默认包含隐藏文件
+        self.walker = walker or ScandirWalker(show_hidden=True)
+        self._entries: Dict[str, Tuple[int, int, List[str]]] = {}
+        self._lock = threading.Lock()
+
+    def get_size(self, path: Union[str, Path]) -> int:
+        """获取目录总大小"""
+        path = str(path)
+        own_size, subdirs = self._own_size(path)
+        total = own_size
+
+        if self.walker.max_workers > 1 and len(subdirs) > 1:
+            with ThreadPoolExecutor(max_workers=self.walker.max_workers) as pool:
+                total += sum(pool.map(self._subtree_size, subdirs))
+        else:
+            total += sum(self._subtree_size(subdir) for subdir in subdirs)
+
+        return total
+
+    def _subtree_size(self, path: str) -> int:
+        total = 0
+        stack = [path]
+        while stack:
+            own_size, subdirs = self._own_size(stack.pop())
+            total += own_size
+            stack.extend(subdirs)
+        return total
+
+    def _own_size(self, path: str) -> Tuple[int, List[str]]:
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return 0, []
+
+        with self._lock:
+            cached = self._entries.get(path)
+        if cached and cached[0] == mtime_ns:
+            return cached[1], cached[2]
+
+        own_size = 0
+        subdirs = []
+        for entry in self.walker._scan(path):
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                try:
+                    own_size += entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    continue
+
+        with self._lock:
+            self._entries[path] = (mtime_ns, own_size, subdirs)
+        return own_size, subdirs
+
+    def invalidate(self, path: Union[str, Path], stop_at: Optional[Union[str, Path]] = None):
+        """使 path 所在目录及其上级目录的缓存失效"""
+        current = Path(path)
+        stop = Path(stop_at) if stop_at else None
+        with self._lock:
+            while True:
+                self._entries.pop(str(current), None)
+                if current == stop or current.parent == current:
+                    break
+                current = current.parent
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,320 @@
+"""
+Git 操作服务 - 在有界线程池中执行 git 命令，按仓库加锁，并缓存 status/分支/HEAD 信息
+
+请求线程只提交作业并返回作业 ID（或读取缓存的状态），不会等待 git 命令。
+状态缓存在写操作后失效；此外每次读取时比较 HEAD、index 和当前分支引用的 mtime，
+文件变化（包括在服务外执行的 git 操作）会使缓存失效；工作区文件的修改在 STATUS_TTL 秒内可见。
+"""
+import logging
+import subprocess
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 4
+# 状态缓存的最长有效期（秒），用于感知工作区文件的修改
+STATUS_TTL = 5
+# 内存中保留的作业数量（超过时丢弃最早完成的作业）
+MAX_JOBS = 1000
+# git 命令超时（秒）
+GIT_TIMEOUT = 600
+
+
+class GitError(Exception):
+    """git 命令执行失败"""
+
+    def __init__(self, args: List[str], returncode: int, stderr: str):
+        self.args_list = args
+        self.returncode = returncode
+        self.stderr = stderr
+        super().__init__(f"git {' '.join(args)} failed: {stderr.strip()}")
+
+
+class GitJob:
+    """后台 git 作业"""
+
+    def __init__(self, repo_path: str, operation: str):
+        self.id = str(uuid.uuid4())
+        self.repo_path = repo_path
+        self.operation = operation
+        self.status = 'pending'
+        self.result = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._done = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'operation': self.operation,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+def _git(repo_path: Union[str, Path], args: List[str], check: bool = True,
+         timeout: float = GIT_TIMEOUT, input: Optional[str] = None) -> subprocess.CompletedProcess:
+    result = subprocess.run(['git'] + args, cwd=str(repo_path), input=input, capture_output=True,
+                            text=True, timeout=timeout)
+    if check and result.returncode != 0:
+        raise GitError(args, result.returncode, result.stderr or result.stdout)
+    return result
+
+
+class _StatusEntry:
+    def __init__(self, status: Dict, fingerprint: Tuple, git_dirs: Tuple[Path, Path]):
+        self.status = status
+        self.fingerprint = fingerprint
+        self.git_dirs = git_dirs
+        self.fetched_at = time.monotonic()
+
+
+def parse_status(output: str) -> Dict:
+    """解析 `git status --porcelain=v2 --branch` 的输出"""
+    status = {'branch': None, 'head': None, 'upstream': None, 'ahead': 0, 'behind': 0,
+              'staged': [], 'modified': [], 'untracked': [], 'conflicted': []}
+    for line in output.splitlines():
+        if line.startswith('# branch.oid '):
+            oid = line[len('# branch.oid '):]
+            status['head'] = None if oid == '(initial)' else oid
+        elif line.startswith('# branch.head '):
+            head = line[len('# branch.head '):]
+            status['branch'] = None if head == '(detached)' else head
+        elif line.startswith('# branch.upstream '):
+            status['upstream'] = line[len('# branch.upstream '):]
+        elif line.startswith('# branch.ab '):
+            ahead, behind = line[len('# branch.ab '):].split()
+            status['ahead'], status['behind'] = int(ahead), -int(behind)
+        elif line.startswith(('1 ', '2 ')):
+            fields = line.split(' ', 8 if line[0] == '1' else 9)
+            xy = fields[1]
+            path = fields[-1].split('\t')[0]
+            if xy[0] != '.':
+                status['staged'].append(path)
+            if xy[1] != '.':
+                status['modified'].append(path)
+        elif line.startswith('u '):
+            status['conflicted'].append(line.split(' ', 10)[-1])
+        elif line.startswith('? '):
+            status['untracked'].append(line[2:])
+    status['dirty'] = bool(status['staged'] or status['modified']
+                           or status['untracked'] or status['conflicted'])
+    return status
+
+
+class GitService:
+    """按仓库串行化的 git 操作和状态缓存"""
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, status_ttl: float = STATUS_TTL,
+                 max_jobs: int = MAX_JOBS):
+        self.status_ttl = status_ttl
+        self.max_jobs = max_jobs
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='git')
+        self._guard = threading.Lock()
+        self._locks: Dict[str, threading.RLock] = {}
+        self._jobs: 'OrderedDict[str, GitJob]' = OrderedDict()
+        self._status: Dict[str, _StatusEntry] = {}
+        # 正在后台刷新状态的仓库 -> 作业
+        self._refreshing: Dict[str, GitJob] = {}
+
+    @staticmethod
+    def _key(repo_path: Union[str, Path]) -> str:
+        return str(Path(repo_path).resolve())
+
+    def lock(self, repo_path: Union[str, Path]) -> threading.RLock:
+        """仓库的操作锁（同一线程可重入）"""
+        with self._guard:
+            return self._locks.setdefault(self._key(repo_path), threading.RLock())
+
+    def run(self, repo_path: Union[str, Path], args: List[str], check: bool = True,
+            timeout: float = GIT_TIMEOUT, input: Optional[str] = None) -> subprocess.CompletedProcess:
+        """在仓库锁内同步执行 git 命令（供后台作业使用）"""
+        with self.lock(repo_path):
+            return _git(repo_path, args, check=check, timeout=timeout, input=input)
+
+    def submit(self, repo_path: Union[str, Path], operation: str, fn: Callable, *args,
+               lock: bool = True, **kwargs) -> GitJob:
+        """提交后台作业，立即返回
+
+        lock 为 True 时作业在仓库锁内执行，同一仓库的写操作依次进行。
+        """
+        job = GitJob(self._key(repo_path), operation)
+        with self._guard:
+            self._jobs[job.id] = job
+            self._trim_jobs()
+        self._pool.submit(self._run_job, job, fn, args, kwargs, lock)
+        return job
+
+    def _run_job(self, job: GitJob, fn: Callable, args, kwargs, lock: bool):
+        job.status = 'running'
+        job.started_at = datetime.now()
+        try:
+            if lock:
+                with self.lock(job.repo_path):
+                    job.result = fn(*args, **kwargs)
+            else:
+                job.result = fn(*args, **kwargs)
+            job.status = 'completed'
+        except Exception as e:
+            logger.error(f"Git job {job.operation} failed for {job.repo_path}: {e}")
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished_at = datetime.now()
+            job._done.set()
+
+    def _trim_jobs(self):
+        excess = len(self._jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done][:excess]:
+            del self._jobs[job_id]
+
+    def get_job(self, job_id: str) -> Optional[GitJob]:
+        with self._guard:
+            return self._jobs.get(job_id)
+
+    def commit(self, repo_path: Union[str, Path], message: str,
+               author: Optional[str] = None, paths: Optional[List[str]] = None) -> Optional[str]:
+        """暂存更改并提交，返回提交 SHA；没有可提交的更改时返回 None
+
+        paths 为空时暂存全部更改，否则只暂存（包括删除）这些文件。
+        """
+        with self.lock(repo_path):
+            try:
+                if paths:
+                    self.run(repo_path, ['add', '-A', '--pathspec-from-file=-', '--pathspec-file-nul'],
+                             input='\0'.join(paths))
+                else:
+                    self.run(repo_path, ['add', '.'])
+                if self.run(repo_path, ['diff', '--cached', '--quiet'], check=False).returncode == 0:
+                    return None
+                args = ['commit', '-m', message]
+                if author:
+                    args += ['--author', author]
+                self.run(repo_path, args)
+                return self.run(repo_path, ['rev-parse', 'HEAD']).stdout.strip()
+            finally:
+                self.invalidate(repo_path)
+
+    def push(self, repo_path: Union[str, Path], branch: str, remote: str = 'origin') -> str:
+        try:
+            return self.run(repo_path, ['push', remote, branch]).stderr
+        finally:
+            self.invalidate(repo_path)
+
+    def pull(self, repo_path: Union[str, Path], branch: str, remote: str = 'origin') -> str:
+        try:
+            return self.run(repo_path, ['pull', remote, branch]).stdout
+        finally:
+            self.invalidate(repo_path)
+
+    def invalidate(self, repo_path: Union[str, Path]):
+        with self._guard:
+            self._status.pop(self._key(repo_path), None)
+
+    def _git_dirs(self, repo_path: str) -> Tuple[Path, Path]:
+        result = _git(repo_path, ['rev-parse', '--absolute-git-dir', '--git-common-dir'])
+        git_dir, common_dir = result.stdout.splitlines()[:2]
+        common = Path(common_dir)
+        return Path(git_dir), common if common.is_absolute() else (Path(repo_path) / common).resolve()
+
+    @staticmethod
+    def _fingerprint(git_dirs: Tuple[Path, Path]) -> Tuple:
+        """HEAD、index、packed-refs 和当前分支引用文件的 mtime"""
+        git_dir, common_dir = git_dirs
+        paths = [git_dir / 'HEAD', git_dir / 'index', common_dir / 'packed-refs']
+        try:
+            head = (git_dir / 'HEAD').read_text().strip()
+        except OSError:
+            head = ''
+        if head.startswith('ref: '):
+            paths.append(common_dir / head[len('ref: '):])
+        stamps = [head]
+        for path in paths:
+            try:
+                stamps.append(path.stat().st_mtime_ns)
+            except OSError:
+                stamps.append(None)
+        return tuple(stamps)
+
+    def _is_fresh(self, entry: _StatusEntry) -> bool:
+        if time.monotonic() - entry.fetched_at > self.status_ttl:
+            return False
+        return self._fingerprint(entry.git_dirs) == entry.fingerprint
+
+    def status(self, repo_path: Union[str, Path]) -> Dict:
+        """读取（必要时刷新）仓库状态；会执行 git 命令，供后台作业使用
+
+        只读操作，不获取仓库锁（git status 使用 --no-optional-locks，不会写 index）。
+        """
+        key = self._key(repo_path)
+        with self._guard:
+            entry = self._status.get(key)
+        if entry and self._is_fresh(entry):
+            return entry.status
+
+        git_dirs = entry.git_dirs if entry else self._git_dirs(key)
+        # 先取指纹再读状态：读取期间发生的变化会在下次比较时被发现
+        fingerprint = self._fingerprint(git_dirs)
+        output = _git(key, ['--no-optional-locks', 'status', '--porcelain=v2', '--branch'])
+        status = parse_status(output.stdout)
+        status['checked_at'] = datetime.now().isoformat()
+
+        with self._guard:
+            self._status[key] = _StatusEntry(status, fingerprint, git_dirs)
+        return status
+
+    def get_cached_status(self, repo_path: Union[str, Path]) -> Tuple[Optional[Dict], Optional[GitJob]]:
+        """不阻塞地读取状态
+
+        返回 (缓存的状态, 刷新作业)：缓存有效时作业为 None；缓存过期或不存在时在后台刷新，
+        同时返回旧状态（可能为 None）和刷新作业。
+        """
+        key = self._key(repo_path)
+        with self._guard:
+            entry = self._status.get(key)
+        if entry and self._is_fresh(entry):
+            return entry.status, None
+
+        with self._guard:
+            job = self._refreshing.get(key)
+            if job is None or job.done:
+                job = GitJob(key, 'status')
+                self._jobs[job.id] = job
+                self._trim_jobs()
+                self._refreshing[key] = job
+                self._pool.submit(self._run_job, job, self.status, (key,), {}, False)
+        return (entry.status if entry else None), job
+
+
+# Global git service
+git_service = None
+
+def get_git_service() -> GitService:
+    """Get or create the global git service."""
+    global git_service
+    if git_service is None:
+        from config import Config
+        git_service = GitService(max_workers=Config.GIT_MAX_WORKERS)
+    return git_service
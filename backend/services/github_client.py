@@ -0,0 +1,362 @@
+"""
+GitHub REST API 客户端 - 连接池复用、自动分页、ETag 条件请求和按速率限制退避
+
+- 所有请求共用一个 requests.Session（keep-alive 连接池），都带超时
+- paginate() 按 Link 头逐页获取，以生成器形式返回条目
+- GET 响应按 URL 缓存 ETag 和内容，再次请求时带 If-None-Match，304 直接使用缓存
+  （GitHub 不把 304 计入速率限制）
+- 根据 X-RateLimit-Remaining/Reset 和 Retry-After 等待；等待时间过长时抛出 RateLimitExceeded
+- 5xx 和连接错误按指数退避重试（只重试 GET 等幂等请求）
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+API_BASE = 'https://api.github.com'
+# 请求超时（连接, 读取）秒
+REQUEST_TIMEOUT = (10, 30)
+POOL_SIZE = 10
+# 5xx / 连接错误的最大重试次数，第 n 次重试前等待 RETRY_BACKOFF * 2 ** (n - 1) 秒
+MAX_RETRIES = 3
+RETRY_BACKOFF = 1.0
+# 因速率限制最多等待的秒数，超过时直接报错，不阻塞调用方
+MAX_RATE_LIMIT_WAIT = 60
+PER_PAGE = 100
+# 超过该天数未更新的持久化 ETag 缓存由每日维护任务删除
+ETAG_CACHE_RETENTION_DAYS = 30
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS')
+
+
+class GitHubAPIError(Exception):
+    """GitHub API 返回错误状态"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"GitHub API error {status_code}: {message}")
+        self.status_code = status_code
+
+
+class RateLimitExceeded(GitHubAPIError):
+    """速率限制耗尽，且距离重置时间超过允许的等待时间"""
+
+    def __init__(self, reset_at: float):
+        super().__init__(403, f"rate limit exceeded until {datetime.fromtimestamp(reset_at).isoformat()}")
+        self.reset_at = reset_at
+
+
+class ETagCache:
+    """GET 响应缓存：URL -> (ETag, 内容, Link 头)
+
+    内存 LRU + 可选的 SQLite 持久化（重启后仍可发送条件请求）。
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_entries: int = 2000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._memory: 'OrderedDict[str, Tuple[str, str, Optional[str]]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+        if self.db_path:
+            self._init_db()
+
+    @contextmanager
+    def get_connection(self):
+        """获取数据库连接的上下文管理器"""
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        """初始化 ETag 缓存表"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS github_etag_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    etag TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    link TEXT,
+                    updated_at TEXT NOT NULL
+                )
+            ''')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_github_etag_cache_updated ON github_etag_cache(updated_at)')
+            conn.commit()
+
+    def get(self, key: str) -> Optional[Tuple[str, str, Optional[str]]]:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+        if not self.db_path:
+            return None
+        try:
+            with self.get_connection() as conn:
+                row = conn.execute('SELECT etag, body, link FROM github_etag_cache WHERE cache_key = ?',
+                                   (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to read ETag cache: {e}")
+            return None
+        if row is None:
+            return None
+        entry = (row['etag'], row['body'], row['link'])
+        self._remember(key, entry)
+        return entry
+
+    def set(self, key: str, etag: str, body: str, link: Optional[str] = None):
+        entry = (etag, body, link)
+        self._remember(key, entry)
+        if not self.db_path:
+            return
+        try:
+            with self.get_connection() as conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO github_etag_cache (cache_key, etag, body, link, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (key, etag, body, link, datetime.now().isoformat()))
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to write ETag cache: {e}")
+
+    def prune(self, retention_days: int = ETAG_CACHE_RETENTION_DAYS) -> int:
+        """删除超过保留期未更新的持久化缓存，返回删除的条数（被删的 URL 下次重新完整请求）"""
+        if not self.db_path:
+            return 0
+        cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat()
+        with self.get_connection() as conn:
+            cursor = conn.execute('DELETE FROM github_etag_cache WHERE updated_at < ?', (cutoff,))
+            conn.commit()
+            return cursor.rowcount
+
+    def _remember(self, key: str, entry: Tuple[str, str, Optional[str]]):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+
+class GitHubResponse:
+    """API 响应（304 时 data 来自缓存，from_cache 为 True）"""
+
+    def __init__(self, status_code: int, data: Any, headers: Dict[str, str], links: Dict[str, str],
+                 from_cache: bool = False):
+        self.status_code = status_code
+        self.data = data
+        self.headers = headers
+        self.links = links
+        self.from_cache = from_cache
+
+
+def parse_link_header(value: Optional[str]) -> Dict[str, str]:
+    """Link: <url>; rel="next", <url>; rel="last" -> {'next': url, 'last': url}"""
+    if not value:
+        return {}
+    return {link['rel']: link['url'] for link in requests.utils.parse_header_links(value)
+            if 'rel' in link and 'url' in link}
+
+
+class GitHubClient:
+    """带连接池、分页、ETag 缓存和速率限制退避的 GitHub API 客户端"""
+
+    def __init__(self, token: Optional[str] = None, api_base: str = API_BASE,
+                 cache: Optional[ETagCache] = None, timeout=REQUEST_TIMEOUT,
+                 max_retries: int = MAX_RETRIES, retry_backoff: float = RETRY_BACKOFF,
+                 max_rate_limit_wait: float = MAX_RATE_LIMIT_WAIT, pool_size: int = POOL_SIZE,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.token = token
+        self.api_base = api_base.rstrip('/')
+        self.cache = cache if cache is not None else ETagCache()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_rate_limit_wait = max_rate_limit_wait
+        self.sleep = sleep
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Accept': 'application/vnd.github.v3+json',
+            'User-Agent': 'claude-task-manager'
+        })
+        if token:
+            self.session.headers['Authorization'] = f'token {token}'
+
+        # 不同 token 看到的内容不同（私有仓库），缓存键区分 token
+        self._cache_scope = hashlib.sha256((token or '').encode()).hexdigest()[:12]
+        self._rate_lock = threading.Lock()
+        self.rate_limit: Dict[str, Optional[float]] = {'limit': None, 'remaining': None, 'reset': None}
+
+    def close(self):
+        self.session.close()
+
+    def _url(self, path: str) -> str:
+        return path if path.startswith(('http://', 'https://')) else f"{self.api_base}/{path.lstrip('/')}"
+
+    def get(self, path: str, params: Optional[Dict] = None, use_cache: bool = True) -> GitHubResponse:
+        return self.request('GET', path, params=params, use_cache=use_cache)
+
+    def post(self, path: str, json_data: Optional[Dict] = None) -> GitHubResponse:
+        return self.request('POST', path, json_data=json_data)
+
+    def delete(self, path: str) -> GitHubResponse:
+        return self.request('DELETE', path)
+
+    def request(self, method: str, path: str, params: Optional[Dict] = None,
+                json_data: Optional[Dict] = None, use_cache: bool = True) -> GitHubResponse:
+        """发送请求；状态码 >= 400 时抛出 GitHubAPIError"""
+        prepared = requests.PreparedRequest()
+        prepared.prepare_url(self._url(path), params)
+        url = prepared.url
+
+        cache_key = f"{self._cache_scope}:{url}" if method == 'GET' and use_cache else None
+        cached = self.cache.get(cache_key) if cache_key else None
+        headers = {'If-None-Match': cached[0]} if cached else {}
+
+        response = self._send(method, url, headers=headers, json=json_data)
+        links = parse_link_header(response.headers.get('Link'))
+
+        if response.status_code == 304 and cached:
+            return GitHubResponse(304, json.loads(cached[1]), dict(response.headers),
+                                  parse_link_header(cached[2]), from_cache=True)
+        if response.status_code >= 400:
+            try:
+                message = response.json().get('message', response.text)
+            except ValueError:
+                message = response.text
+            raise GitHubAPIError(response.status_code, message)
+
+        data = response.json() if response.content else None
+        etag = response.headers.get('ETag')
+        if cache_key and etag and response.status_code == 200:
+            self.cache.set(cache_key, etag, response.text, response.headers.get('Link'))
+        return GitHubResponse(response.status_code, data, dict(response.headers), links)
+
+    def paginate(self, path: str, params: Optional[Dict] = None,
+                 per_page: int = PER_PAGE) -> Iterator[Dict]:
+        """逐页获取列表接口的所有条目（按需请求下一页）"""
+        params = dict(params or {})
+        params.setdefault('per_page', per_page)
+        response = self.get(path, params=params)
+        while True:
+            yield from response.data or []
+            next_url = response.links.get('next')
+            if not next_url:
+                return
+            response = self.get(next_url)
+
+    def _send(self, method: str, url: str, **kwargs) -> requests.Response:
+        attempt = 0
+        while True:
+            self._wait_for_rate_limit()
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if method not in IDEMPOTENT_METHODS or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                logger.warning(f"GitHub request {method} {url} failed ({e}), retry {attempt}")
+                self.sleep(self.retry_backoff * 2 ** (attempt - 1))
+                continue
+
+            self._update_rate_limit(response.headers)
+
+            wait = self._rate_limit_wait(response)
+            if wait is not None:
+                if wait > self.max_rate_limit_wait or attempt >= self.max_retries:
+                    raise RateLimitExceeded(time.time() + wait)
+                # 被速率限制拒绝的请求没有执行，POST 也可以安全重发
+                attempt += 1
+                logger.warning(f"GitHub rate limit hit, waiting {wait:.0f}s")
+                self._sleep_until_reset(wait)
+                continue
+
+            if response.status_code >= 500 and method in IDEMPOTENT_METHODS and attempt < self.max_retries:
+                attempt += 1
+                logger.warning(f"GitHub request {method} {url} returned {response.status_code}, "
+                               f"retry {attempt}")
+                self.sleep(self.retry_backoff * 2 ** (attempt - 1))
+                continue
+            return response
+
+    def _update_rate_limit(self, headers):
+        if 'X-RateLimit-Remaining' not in headers:
+            return
+        with self._rate_lock:
+            try:
+                self.rate_limit = {
+                    'limit': int(headers.get('X-RateLimit-Limit', 0)),
+                    'remaining': int(headers['X-RateLimit-Remaining']),
+                    'reset': float(headers.get('X-RateLimit-Reset', 0))
+                }
+            except ValueError:
+                pass
+
+    def _rate_limit_wait(self, response: requests.Response) -> Optional[float]:
+        """被速率限制拒绝时返回需要等待的秒数，否则返回 None"""
+        if response.status_code not in (403, 429):
+            return None
+        retry_after = response.headers.get('Retry-After')
+        if retry_after is not None:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                return None
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            try:
+                return max(0.0, float(response.headers.get('X-RateLimit-Reset', 0)) - time.time())
+            except ValueError:
+                return None
+        return None
+
+    def _wait_for_rate_limit(self):
+        """额度已用完时等到重置后再发请求"""
+        with self._rate_lock:
+            remaining = self.rate_limit['remaining']
+            reset = self.rate_limit['reset']
+        if remaining != 0 or not reset:
+            return
+        wait = reset - time.time()
+        if wait <= 0:
+            return
+        if wait > self.max_rate_limit_wait:
+            raise RateLimitExceeded(reset)
+        logger.info(f"GitHub rate limit exhausted, waiting {wait:.0f}s for reset")
+        self._sleep_until_reset(wait)
+
+    def _sleep_until_reset(self, wait: float):
+        self.sleep(wait)
+        # 额度已重置，下一个响应会带回新的剩余次数
+        with self._rate_lock:
+            self.rate_limit['remaining'] = None
+
+
+# Global GitHub client
+github_client = None
+_client_lock = threading.Lock()
+
+def get_github_client(token: Optional[str] = None) -> GitHubClient:
+    """Get or create the global GitHub client (recreated when the token changes)."""
+    global github_client
+    with _client_lock:
+        if github_client is None or github_client.token != token:
+            if github_client is not None:
+                github_client.close()
+            github_client = GitHubClient(token, cache=ETagCache(db_path="tasks.db"))
+        return github_client
@@ -6,11 +6,12 @@ import re
 import json
 import subprocess
 import logging
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 from urllib.parse import urlparse
-import requests
 
 from models.config import ConfigManager
+from services.github_client import GitHubAPIError, get_github_client
+from services.repo_mirror_cache import MirrorError, get_mirror_cache
 
 logger = logging.getLogger(__name__)
 
@@ -20,11 +21,8 @@ class GitHubIntegration:
     def __init__(self):
         self.config_manager = ConfigManager()
         self.token = self._get_github_token()
-        self.headers = {
-            'Authorization': f'token {self.token}',
-            'Accept': 'application/vnd.github.v3+json'
-        } if self.token else {}
-        self.api_base = 'https://api.github.com'
+        # 共享的 API 客户端（连接池、分页、ETag 缓存、速率限制）
+        self.client = get_github_client(self.token)
     
     def _get_github_token(self) -> Optional[str]:
         """获取 GitHub Token"""
@@ -93,17 +91,14 @@ class GitHubIntegration:
                 }
             
             # 调用 GitHub API 获取详细信息
-            api_url = f"{self.api_base}/repos/{repo_info['full_name']}"
-            response = requests.get(api_url, headers=self.headers)
-            
-            if response.status_code == 404:
-                raise ValueError(f"Repository not found: {repo_info['full_name']}")
-            elif response.status_code == 401:
-                raise ValueError("GitHub token is invalid or expired")
-            elif response.status_code != 200:
-                raise ValueError(f"GitHub API error: {response.status_code}")
-            
-            data = response.json()
+            try:
+                data = self.client.get(f"repos/{repo_info['full_name']}").data
+            except GitHubAPIError as e:
+                if e.status_code == 404:
+                    raise ValueError(f"Repository not found: {repo_info['full_name']}")
+                elif e.status_code == 401:
+                    raise ValueError("GitHub token is invalid or expired")
+                raise ValueError(f"GitHub API error: {e.status_code}")
             
             return {
                 'name': data['name'],
@@ -121,52 +116,48 @@ class GitHubIntegration:
             logger.error(f"Error importing repository: {str(e)}")
             raise
     
-    def clone_repository(self, github_url: str, local_path: str) -> bool:
-        """克隆仓库到本地"""
+    def _auth_url(self, github_url: str) -> str:
+        """带 token 的克隆地址（只用于 git 命令行）"""
+        if self.token and github_url.startswith('https://'):
+            return github_url.replace('https://', f'https://{self.token}@')
+        return github_url
+
+    def clone_repository(self, github_url: str, local_path: str, depth: Optional[int] = None,
+                         partial: bool = False) -> bool:
+        """克隆仓库到本地
+
+        通过本地 bare mirror 缓存克隆：首次导入时创建镜像，之后只增量 fetch；
+        目标目录已是同一仓库的副本时直接从镜像更新，不再删除重新克隆。
+        depth 为浅克隆深度，partial 为只获取提交和树的部分克隆。
+        """
         try:
-            # 确保父目录存在
-            os.makedirs(os.path.dirname(local_path), exist_ok=True)
-            
-            # 如果目录已存在，先删除
-            if os.path.exists(local_path):
-                import shutil
-                shutil.rmtree(local_path)
-            
-            # 构建克隆命令
-            clone_url = github_url
-            if self.token and github_url.startswith('https://'):
-                # 添加 token 到 URL 中进行认证
-                clone_url = github_url.replace('https://', f'https://{self.token}@')
-            
-            # 执行克隆
-            cmd = ['git', 'clone', clone_url, local_path]
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode != 0:
-                logger.error(f"Git clone failed: {result.stderr}")
-                return False
-            
+            get_mirror_cache().clone(github_url, local_path, auth_url=self._auth_url(github_url),
+                                     depth=depth, partial=partial)
             logger.info(f"Successfully cloned repository to {local_path}")
             return True
-            
+
+        except MirrorError as e:
+            logger.error(f"Git clone failed: {str(e)}")
+            return False
         except Exception as e:
             logger.error(f"Error cloning repository: {str(e)}")
             return False
     
+    def iter_branches(self, owner: str, repo: str) -> Iterator[Dict]:
+        """逐页获取仓库的分支"""
+        return self.client.paginate(f"repos/{owner}/{repo}/branches")
+    
+    def iter_issues(self, owner: str, repo: str, state: str = 'open') -> Iterator[Dict]:
+        """逐页获取仓库的 Issues"""
+        return self.client.paginate(f"repos/{owner}/{repo}/issues", params={'state': state})
+    
     def list_branches(self, owner: str, repo: str) -> List[Dict]:
         """列出仓库的所有分支"""
         if not self.token:
             return []
             
         try:
-            api_url = f"{self.api_base}/repos/{owner}/{repo}/branches"
-            response = requests.get(api_url, headers=self.headers)
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error(f"Failed to list branches: {response.status_code}")
-                return []
+            return list(self.iter_branches(owner, repo))
                 
         except Exception as e:
             logger.error(f"Error listing branches: {str(e)}")
@@ -178,15 +169,7 @@ class GitHubIntegration:
             return []
             
         try:
-            api_url = f"{self.api_base}/repos/{owner}/{repo}/issues"
-            params = {'state': state}
-            response = requests.get(api_url, headers=self.headers, params=params)
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error(f"Failed to list issues: {response.status_code}")
-                return []
+            return list(self.iter_issues(owner, repo, state))
                 
         except Exception as e:
             logger.error(f"Error listing issues: {str(e)}")
@@ -199,8 +182,6 @@ class GitHubIntegration:
             return None
             
         try:
-            api_url = f"{self.api_base}/repos/{owner}/{repo}/hooks"
-            
             config = {
                 'url': webhook_url,
                 'content_type': 'json',
@@ -214,15 +195,13 @@ class GitHubIntegration:
                 'config': config
             }
             
-            response = requests.post(api_url, headers=self.headers, json=data)
-            
-            if response.status_code == 201:
-                logger.info(f"Webhook created successfully for {owner}/{repo}")
-                return response.json()
-            else:
-                logger.error(f"Failed to create webhook: {response.status_code} - {response.text}")
-                return None
+            webhook = self.client.post(f"repos/{owner}/{repo}/hooks", json_data=data).data
+            logger.info(f"Webhook created successfully for {owner}/{repo}")
+            return webhook
                 
+        except GitHubAPIError as e:
+            logger.error(f"Failed to create webhook: {str(e)}")
+            return None
         except Exception as e:
             logger.error(f"Error creating webhook: {str(e)}")
             return None
@@ -230,6 +209,14 @@ class GitHubIntegration:
     def sync_repository(self, local_path: str) -> bool:
         """同步本地仓库与远程仓库"""
         try:
+            # 有镜像时从镜像增量同步
+            try:
+                if get_mirror_cache().pull(local_path):
+                    logger.info(f"Successfully synced repository at {local_path} from mirror")
+                    return True
+            except MirrorError as e:
+                logger.warning(f"Mirror sync failed, falling back to git pull: {str(e)}")
+
             # 拉取最新代码
             cmd = ['git', 'pull', 'origin']
             result = subprocess.run(cmd, cwd=local_path, capture_output=True, text=True)
@@ -253,8 +240,6 @@ class GitHubIntegration:
             return None
             
         try:
-            api_url = f"{self.api_base}/repos/{owner}/{repo}/pulls"
-            
             data = {
                 'title': title,
                 'body': body,
@@ -262,15 +247,13 @@ class GitHubIntegration:
                 'base': base
             }
             
-            response = requests.post(api_url, headers=self.headers, json=data)
-            
-            if response.status_code == 201:
-                logger.info(f"Pull request created successfully")
-                return response.json()
-            else:
-                logger.error(f"Failed to create PR: {response.status_code} - {response.text}")
-                return None
+            pr = self.client.post(f"repos/{owner}/{repo}/pulls", json_data=data).data
+            logger.info(f"Pull request created successfully")
+            return pr
                 
+        except GitHubAPIError as e:
+            logger.error(f"Failed to create PR: {str(e)}")
+            return None
         except Exception as e:
             logger.error(f"Error creating pull request: {str(e)}")
             return None
@@ -0,0 +1,242 @@
+"""
+GitHub 分支/议题同步 - 分页拉取远程状态，与本地行对比后在一个事务内批量写入
+
+- 议题按 since=上次同步的最大 updated_at 增量拉取（GitHub 的 issues 接口按更新时间过滤），
+  只写入标题、描述、状态真正变化的议题
+- 同步的议题按 issues.github_number 与 GitHub 议题对应；本地编号 number 另行分配，
+  本地创建的议题（子任务）不会被同号的 GitHub 议题覆盖
+- 分支接口不支持 since：每次分页拉取全部分支（未变化的页由 ETag 缓存返回 304），
+  与上次同步的 {分支名: SHA} 快照对比，得到新增、更新和远程已删除的分支
+- 网络请求在事务外完成；所有写入和游标更新在同一个 BEGIN IMMEDIATE 事务中提交，
+  同步中途失败不会留下只更新了一半的数据
+"""
+import json
+import logging
+import sqlite3
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from models.repository import Repository
+from services.github_client import GitHubClient
+
+logger = logging.getLogger(__name__)
+
+BRANCHES = 'branches'
+ISSUES = 'issues'
+# SQLite 单条语句的参数个数有限，IN 查询分批执行
+QUERY_CHUNK_SIZE = 500
+SYNCED_DESCRIPTION = '从 GitHub 同步'
+
+
+def _chunks(items: List, size: int = QUERY_CHUNK_SIZE) -> Iterable[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class GitHubSyncEngine:
+    """把 GitHub 上的分支和议题批量同步到 branches/issues 表"""
+
+    def __init__(self, client: GitHubClient, db_path: str = "tasks.db"):
+        self.client = client
+        self.db_path = db_path
+        self._init_db()
+
+    @contextmanager
+    def get_connection(self):
+        """获取数据库连接的上下文管理器"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        """初始化同步游标表，并为 issues 表添加 GitHub 议题编号列"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'issues'")
+            if cursor.fetchone():
+                columns = {row['name'] for row in cursor.execute('PRAGMA table_info(issues)')}
+                if 'github_number' not in columns:
+                    cursor.execute('ALTER TABLE issues ADD COLUMN github_number INTEGER')
+                cursor.execute('''
+                    CREATE UNIQUE INDEX IF NOT EXISTS idx_issues_github_number
+                    ON issues(repository_id, github_number)
+                ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS github_sync_cursors (
+                    repository_id TEXT NOT NULL,
+                    resource TEXT NOT NULL,
+                    value TEXT,
+                    synced_at TEXT NOT NULL,
+                    PRIMARY KEY (repository_id, resource)
+                )
+            ''')
+            conn.commit()
+
+    def get_cursor(self, repository_id: str, resource: str) -> Optional[str]:
+        with self.get_connection() as conn:
+            row = conn.execute('''
+                SELECT value FROM github_sync_cursors WHERE repository_id = ? AND resource = ?
+            ''', (repository_id, resource)).fetchone()
+            return row['value'] if row else None
+
+    def reset(self, repository_id: str):
+        """清除游标，下次同步重新拉取全部数据"""
+        with self.get_connection() as conn:
+            conn.execute('DELETE FROM github_sync_cursors WHERE repository_id = ?', (repository_id,))
+            conn.commit()
+
+    def fetch_branches(self, owner: str, repo: str) -> Dict[str, str]:
+        """远程分支 {名称: SHA}"""
+        return {branch['name']: branch.get('commit', {}).get('sha', '')
+                for branch in self.client.paginate(f"repos/{owner}/{repo}/branches")}
+
+    def fetch_issues(self, owner: str, repo: str,
+                     since: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """自 since 以来更新过的议题（不含 PR），以及其中（含 PR）最新的 updated_at"""
+        params = {'state': 'all', 'sort': 'updated', 'direction': 'asc'}
+        if since:
+            params['since'] = since
+        issues, newest = [], since
+        for issue in self.client.paginate(f"repos/{owner}/{repo}/issues", params=params):
+            # ISO 8601 UTC 时间戳按字符串比较即按时间比较
+            if not newest or issue['updated_at'] > newest:
+                newest = issue['updated_at']
+            if 'pull_request' not in issue:
+                issues.append(issue)
+        return issues, newest
+
+    def sync_repository(self, repo: Repository, owner: str, name: str) -> Dict:
+        """同步一个仓库的分支和议题，返回各类变化的数量"""
+        since = self.get_cursor(repo.id, ISSUES)
+        snapshot = json.loads(self.get_cursor(repo.id, BRANCHES) or '{}')
+
+        remote_branches = self.fetch_branches(owner, name)
+        remote_issues, newest = self.fetch_issues(owner, name, since)
+
+        with self.get_connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                branch_stats = self._apply_branches(conn, repo, snapshot, remote_branches)
+                issue_stats = self._apply_issues(conn, repo, remote_issues)
+
+                now = datetime.now().isoformat()
+                cursors = [(repo.id, BRANCHES, json.dumps(remote_branches, sort_keys=True), now)]
+                if newest:
+                    cursors.append((repo.id, ISSUES, newest, now))
+                conn.executemany('''
+                    INSERT INTO github_sync_cursors (repository_id, resource, value, synced_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(repository_id, resource) DO UPDATE SET
+                        value = excluded.value, synced_at = excluded.synced_at
+                ''', cursors)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+        logger.info(f"Synced {repo.name} from GitHub: branches {branch_stats}, issues {issue_stats}")
+        return {BRANCHES: branch_stats, ISSUES: issue_stats}
+
+    def _apply_branches(self, conn: sqlite3.Connection, repo: Repository,
+                        snapshot: Dict[str, str], remote: Dict[str, str]) -> Dict[str, int]:
+        local = {row['name']: row['status'] for row in conn.execute(
+            'SELECT name, status FROM branches WHERE repository_id = ?', (repo.id,))}
+        now = datetime.now().isoformat()
+
+        created = [name for name in remote if name not in local]
+        updated = [name for name, sha in remote.items()
+                   if name in local and snapshot.get(name) not in (None, sha)]
+        # 只处理上次同步时在远程存在、现在消失的分支；本地新建尚未推送的分支不受影响
+        removed = [name for name in snapshot
+                   if name not in remote and local.get(name) not in (None, 'merged', 'closed')]
+
+        conn.executemany('''
+            INSERT INTO branches (
+                id, name, repository_id, base_branch, description,
+                status, created_by, created_at, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(str(uuid.uuid4()), name, repo.id, repo.default_branch, SYNCED_DESCRIPTION,
+               'draft', repo.owner_id, now, now) for name in created])
+        conn.executemany('''
+            UPDATE branches SET updated_at = ? WHERE repository_id = ? AND name = ?
+        ''', [(now, repo.id, name) for name in updated])
+        conn.executemany('''
+            UPDATE branches SET status = 'closed', updated_at = ? WHERE repository_id = ? AND name = ?
+        ''', [(now, repo.id, name) for name in removed])
+
+        return {'created': len(created), 'updated': len(updated), 'removed': len(removed),
+                'total': len(remote)}
+
+    def _apply_issues(self, conn: sqlite3.Connection, repo: Repository,
+                      remote: List[Dict]) -> Dict[str, int]:
+        # 同一议题在分页过程中被更新时可能出现两次，保留最新的
+        latest = {}
+        for issue in remote:
+            latest[issue['number']] = issue
+        numbers = list(latest)
+
+        # 只按 github_number 匹配，本地编号与 GitHub 编号无关
+        local = {}
+        for chunk in _chunks(numbers):
+            rows = conn.execute(f'''
+                SELECT id, github_number, title, description, status, closed_at FROM issues
+                WHERE repository_id = ? AND github_number IN ({','.join('?' * len(chunk))})
+            ''', [repo.id] + chunk)
+            local.update({row['github_number']: row for row in rows})
+
+        # 新议题接在本地最大编号之后（与 RepositoryManager.create_issue 的编号方式一致）
+        next_number = conn.execute('''
+            SELECT COALESCE(MAX(number), 0) + 1 FROM issues WHERE repository_id = ?
+        ''', (repo.id,)).fetchone()[0]
+
+        inserts, updates, labels = [], [], {}
+        for github_number, issue in latest.items():
+            row = local.get(github_number)
+            status = self._issue_status(issue, row['status'] if row else None)
+            values = (issue.get('title') or '', issue.get('body') or '', status, issue.get('closed_at'))
+            if row and (row['title'], row['description'] or '', row['status'], row['closed_at']) == values:
+                continue
+            if row:
+                issue_id = row['id']
+                updates.append(values + (issue.get('updated_at'), issue_id))
+            else:
+                issue_id = str(uuid.uuid4())
+                inserts.append((issue_id, next_number, github_number, values[0], values[1], repo.id,
+                                status, 'medium', repo.owner_id, issue.get('created_at'),
+                                issue.get('updated_at'), values[3]))
+                next_number += 1
+            labels[issue_id] = [(issue_id, label['name'], f"#{label.get('color', '0366d6')}")
+                                for label in issue.get('labels', []) if label.get('name')]
+
+        conn.executemany('''
+            INSERT INTO issues (
+                id, number, github_number, title, description, repository_id, status, priority,
+                created_by, created_at, updated_at, closed_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', inserts)
+        conn.executemany('''
+            UPDATE issues SET title = ?, description = ?, status = ?, closed_at = ?, updated_at = ?
+            WHERE id = ?
+        ''', updates)
+        for chunk in _chunks(list(labels)):
+            conn.execute(f'DELETE FROM issue_labels WHERE issue_id IN ({",".join("?" * len(chunk))})',
+                         chunk)
+        conn.executemany('INSERT OR REPLACE INTO issue_labels (issue_id, label, color) VALUES (?, ?, ?)',
+                         [label for rows in labels.values() for label in rows])
+
+        return {'created': len(inserts), 'updated': len(updates),
+                'unchanged': len(latest) - len(inserts) - len(updates)}
+
+    @staticmethod
+    def _issue_status(issue: Dict, local_status: Optional[str]) -> str:
+        """远程关闭即关闭；远程打开时保留本地的进行中/已解决状态"""
+        if issue.get('state') == 'closed':
+            return 'closed'
+        if local_status in ('in_progress', 'resolved'):
+            return local_status
+        return 'open'
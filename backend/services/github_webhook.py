@@ -6,12 +6,56 @@ import hmac
 import hashlib
 import json
 import logging
-from typing import Dict, Optional
+from collections.abc import Mapping
+from typing import Dict, Iterator, Optional, Union
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
 
+class WebhookPayload(Mapping):
+    """延迟解析的 webhook payload
+
+    签名验证只需要原始字节；第一次读取字段时才解析 JSON（只解析一次），
+    被忽略的事件完全不需要解析。
+    """
+
+    def __init__(self, raw: Union[bytes, str]):
+        self.raw = raw
+        self._data: Optional[Dict] = None
+
+    @property
+    def parsed(self) -> bool:
+        return self._data is not None
+
+    @property
+    def data(self) -> Dict:
+        if self._data is None:
+            data = json.loads(self.raw)
+            if not isinstance(data, dict):
+                raise ValueError('Webhook payload must be a JSON object')
+            self._data = data
+        return self._data
+
+    def field(self, *path, default=None):
+        """按路径读取嵌套字段，例如 field('repository', 'full_name')"""
+        value = self.data
+        for key in path:
+            if not isinstance(value, dict) or key not in value:
+                return default
+            value = value[key]
+        return value
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __iter__(self) -> Iterator:
+        return iter(self.data)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+
 class GitHubWebhookHandler:
     """处理 GitHub Webhook 事件"""
     
@@ -39,10 +83,12 @@ class GitHubWebhookHandler:
             'fork': self.handle_fork
         }
     
-    def verify_signature(self, payload: bytes, signature: str) -> bool:
-        """验证 GitHub Webhook 签名"""
+    def verify_signature(self, payload: bytes, signature: Optional[str]) -> bool:
+        """验证 GitHub Webhook 签名（payload 为原始请求体字节）"""
         if not self.webhook_secret:
             return True  # 如果没有设置密钥，跳过验证
+        if not signature:
+            return False
             
         expected_signature = 'sha256=' + hmac.new(
             self.webhook_secret.encode('utf-8'),
@@ -52,23 +98,30 @@ class GitHubWebhookHandler:
         
         return hmac.compare_digest(expected_signature, signature)
     
-    def process_webhook(self, event_type: str, payload: Dict, 
+    def process_webhook(self, event_type: str, body: bytes, 
                        signature: Optional[str] = None) -> Dict:
-        """处理 Webhook 事件"""
+        """验证并处理 Webhook 事件（body 为原始请求体，验证通过后才解析）"""
         # 验证签名
-        if signature and not self.verify_signature(
-            json.dumps(payload, separators=(',', ':')).encode('utf-8'), 
-            signature
-        ):
+        if not self.verify_signature(body, signature):
             logger.warning(f"Invalid webhook signature for event: {event_type}")
             return {'error': 'Invalid signature', 'status': 'rejected'}
         
+        return self.handle_event(event_type, WebhookPayload(body))
+    
+    def handle_event(self, event_type: str, payload: Mapping) -> Dict:
+        """调用事件对应的处理器（签名已验证）
+
+        payload 可以是 dict 或 WebhookPayload；没有处理器的事件不会解析 payload。
+        """
         # 记录事件
         logger.info(f"Processing GitHub webhook event: {event_type}")
         
         # 调用对应的处理器
         handler = self.event_handlers.get(event_type)
         if handler:
+            if isinstance(payload, WebhookPayload):
+                # 在处理器之外解析：无法解析的 payload 抛出 ValueError，不作为处理失败重试
+                payload.data
             try:
                 result = handler(payload)
                 return {
@@ -106,6 +159,8 @@ class GitHubWebhookHandler:
         result = {
             'repository': repository.get('full_name'),
             'branch': branch,
+            'ref': ref,
+            'deleted': bool(payload.get('deleted')),
             'pusher': pusher.get('name'),
             'commits_count': len(commits),
             'commits': []
@@ -125,7 +180,7 @@ class GitHubWebhookHandler:
         
         logger.info(f"Push event: {result['commits_count']} commits to {result['repository']}/{branch}")
         
-        # TODO: 触发仓库同步
+        # 受影响的引用由 webhook_api 交给 RepoSyncScheduler，合并后增量同步
         return result
     
     def handle_pull_request(self, payload: Dict) -> Dict:
@@ -206,7 +261,7 @@ class GitHubWebhookHandler:
         
         logger.info(f"Create event: {ref_type} '{ref}' in {result['repository']}")
         
-        # TODO: 如果是分支创建，同步到本地
+        # 新分支/标签由 webhook_api 交给 RepoSyncScheduler 同步到本地
         return result
     
     def handle_delete(self, payload: Dict) -> Dict:
@@ -224,7 +279,7 @@ class GitHubWebhookHandler:
         
         logger.info(f"Delete event: {ref_type} '{ref}' in {result['repository']}")
         
-        # TODO: 如果是分支删除，更新本地状态
+        # 删除的分支/标签由 webhook_api 交给 RepoSyncScheduler 从本地移除
         return result
     
     def handle_repository(self, payload: Dict) -> Dict:
@@ -288,4 +343,23 @@ class GitHubWebhookHandler:
         }
         
         logger.info(f"Fork event: {result['fork_owner']} forked {result['repository']}")
-        return result
\ No newline at end of file
+        return result
+
+def summarize_result(event_type: str, result: Dict) -> str:
+    """事件列表中显示的一行摘要（完整结果按 ID 单独读取）"""
+    if event_type == 'push':
+        target = result.get('branch') or result.get('ref') or ''
+        if result.get('deleted'):
+            return f"{result.get('pusher')} deleted {target}"
+        return f"{result.get('pusher')} pushed {result.get('commits_count', 0)} commits to {target}"
+    if event_type == 'pull_request':
+        return f"PR #{result.get('pr_number')} {result.get('action')}: {result.get('pr_title') or ''}"
+    if event_type == 'issues':
+        return f"Issue #{result.get('issue_number')} {result.get('action')}: {result.get('issue_title') or ''}"
+    if event_type == 'issue_comment':
+        return f"Comment {result.get('action')} on #{result.get('issue_number')} by {result.get('user')}"
+    if event_type in ('create', 'delete'):
+        verb = 'created' if event_type == 'create' else 'deleted'
+        return f"{result.get('pusher')} {verb} {result.get('ref_type')} {result.get('ref_name')}"
+    action = result.get('action')
+    return f"{event_type} {action}" if action else event_type
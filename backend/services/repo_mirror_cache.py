@@ -0,0 +1,210 @@
+"""
+仓库镜像缓存 - 按远程 URL 维护本地 bare mirror，克隆和同步都从镜像增量获取
+
+- 首次导入时 `git clone --mirror`，之后只做增量 `git fetch`
+- 工作副本默认以 `--shared` 方式从镜像克隆（通过 alternates 共享对象，几乎不占额外空间）
+- 可选浅克隆（--depth）和部分克隆（--filter=blob:none）
+- 镜像关闭了自动 gc，避免删除共享克隆仍引用的对象
+"""
+import hashlib
+import logging
+import re
+import shutil
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# 同一镜像两次 fetch 之间的最小间隔（秒），间隔内的克隆直接使用镜像
+DEFAULT_FETCH_INTERVAL = 60
+# git 命令超时（秒）
+GIT_TIMEOUT = 1800
+PARTIAL_CLONE_FILTER = 'blob:none'
+
+
+class MirrorError(Exception):
+    """镜像创建、更新或克隆失败"""
+
+
+def _redact(text: str) -> str:
+    """去掉 URL 中的凭据，避免写入日志"""
+    return re.sub(r'(https?://)[^/@\s]+@', r'\1', text)
+
+
+def _git(args: List[str], cwd: Optional[Union[str, Path]] = None,
+         check: bool = True) -> subprocess.CompletedProcess:
+    result = subprocess.run(['git'] + args, cwd=str(cwd) if cwd else None,
+                            capture_output=True, text=True, timeout=GIT_TIMEOUT)
+    if check and result.returncode != 0:
+        raise MirrorError(_redact(f"git {' '.join(args)} failed: {result.stderr.strip()}"))
+    return result
+
+
+def normalize_url(url: str) -> str:
+    """镜像键：去掉凭据、结尾的 / 和 .git"""
+    url = _redact(url.strip()).rstrip('/')
+    return url[:-4] if url.endswith('.git') else url
+
+
+class RepoMirrorCache:
+    """按远程 URL 管理 bare mirror 并从镜像创建工作副本"""
+
+    def __init__(self, cache_dir: Union[str, Path], fetch_interval: float = DEFAULT_FETCH_INTERVAL):
+        self.cache_dir = Path(cache_dir)
+        self.fetch_interval = fetch_interval
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._last_fetch: Dict[str, float] = {}
+
+    def _lock(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def mirror_path(self, url: str) -> Path:
+        key = normalize_url(url)
+        name = re.sub(r'[^A-Za-z0-9._-]', '_', key.rsplit('/', 1)[-1]) or 'repo'
+        return self.cache_dir / f"{name}-{hashlib.sha1(key.encode()).hexdigest()[:12]}.git"
+
+    def has_mirror(self, url: str) -> bool:
+        return (self.mirror_path(url) / 'HEAD').exists()
+
+    def ensure_mirror(self, url: str, auth_url: Optional[str] = None, partial: bool = False,
+                      force_fetch: bool = False) -> Path:
+        """创建或增量更新镜像，返回镜像路径
+
+        auth_url 为带凭据的地址，只在命令行中使用，不会写入镜像配置。
+        """
+        key = normalize_url(url)
+        path = self.mirror_path(url)
+        source = auth_url or url
+
+        with self._lock(key):
+            if not (path / 'HEAD').exists():
+                if path.exists():
+                    shutil.rmtree(path)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                args = ['clone', '--mirror', '--quiet']
+                if partial:
+                    args.append(f'--filter={PARTIAL_CLONE_FILTER}')
+                _git(args + [source, str(path)])
+                _git(['remote', 'set-url', 'origin', key], path)
+                # 共享克隆依赖镜像中的对象，镜像不能自动 gc
+                _git(['config', 'gc.auto', '0'], path)
+                _git(['config', 'uploadpack.allowFilter', 'true'], path)
+                logger.info(f"Created mirror for {key} at {path}")
+            elif force_fetch or time.monotonic() - self._last_fetch.get(key, 0) >= self.fetch_interval:
+                _git(['fetch', '--quiet', '--prune', source, '+refs/*:refs/*'], path)
+                logger.info(f"Fetched mirror for {key}")
+            self._last_fetch[key] = time.monotonic()
+        return path
+
+    def fetch_refs(self, url: str, updated: List[str], deleted: List[str] = (),
+                   auth_url: Optional[str] = None) -> Optional[Path]:
+        """只更新镜像中的指定引用（完整引用名，如 refs/heads/main），没有镜像时返回 None
+
+        用于 webhook 推送后的增量同步：只协商变化的引用，不扫描整个远程。
+        """
+        key = normalize_url(url)
+        path = self.mirror_path(url)
+        with self._lock(key):
+            if not (path / 'HEAD').exists():
+                return None
+            if updated:
+                _git(['fetch', '--quiet', auth_url or url] + [f'+{ref}:{ref}' for ref in updated], path)
+            for ref in deleted:
+                _git(['update-ref', '-d', ref], path, check=False)
+        return path
+
+    def clone(self, url: str, local_path: Union[str, Path], auth_url: Optional[str] = None,
+              branch: Optional[str] = None, depth: Optional[int] = None,
+              partial: bool = False) -> Path:
+        """从镜像创建（或增量更新）工作副本
+
+        - 默认：--shared 克隆，对象通过 alternates 共享
+        - depth：从镜像浅克隆，副本独立于镜像
+        - partial：镜像和副本都只获取提交和树，文件内容按需从远程拉取
+        已有同一远程的工作副本时只从镜像 fetch 并重置到远程分支，不再重新克隆。
+        """
+        local_path = Path(local_path)
+        mirror = self.ensure_mirror(url, auth_url=auth_url, partial=partial)
+        origin_url = auth_url or url
+        # 部分克隆的镜像缺少文件内容，共享克隆无法按需补全，只能同样以部分克隆方式获取
+        partial = partial or self._is_partial(mirror)
+
+        if self._is_clone_of(local_path, url):
+            self._refresh_clone(local_path, mirror, branch)
+            return local_path
+
+        if local_path.exists():
+            shutil.rmtree(local_path)
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+
+        args = ['clone', '--quiet']
+        if branch:
+            args += ['--branch', branch]
+        if depth:
+            args += ['--depth', str(int(depth)), mirror.resolve().as_uri()]
+        elif partial:
+            args += [f'--filter={PARTIAL_CLONE_FILTER}', mirror.resolve().as_uri()]
+        else:
+            args += ['--shared', str(mirror.resolve())]
+        _git(args + [str(local_path)])
+
+        # 工作副本的 origin 指向真实远程（push/pull 与直接克隆时一致）
+        _git(['remote', 'set-url', 'origin', origin_url], local_path)
+        logger.info(f"Cloned {normalize_url(url)} to {local_path} from mirror")
+        return local_path
+
+    def _is_partial(self, mirror: Path) -> bool:
+        result = _git(['config', '--get', 'remote.origin.promisor'], mirror, check=False)
+        return result.stdout.strip() == 'true'
+
+    def _is_clone_of(self, local_path: Path, url: str) -> bool:
+        if not (local_path / '.git').exists():
+            return False
+        result = _git(['remote', 'get-url', 'origin'], local_path, check=False)
+        return result.returncode == 0 and normalize_url(result.stdout) == normalize_url(url)
+
+    def _refresh_clone(self, local_path: Path, mirror: Path, branch: Optional[str]):
+        """从镜像更新已有工作副本，并把分支重置到远程状态（与重新克隆的结果一致）"""
+        mirror_uri = mirror.resolve().as_uri()
+        _git(['fetch', '--quiet', '--prune', mirror_uri, '+refs/heads/*:refs/remotes/origin/*'], local_path)
+        if not branch:
+            head = _git(['symbolic-ref', '--short', 'HEAD'], mirror, check=False)
+            branch = head.stdout.strip() or 'main'
+        _git(['checkout', '--quiet', '-B', branch, f'origin/{branch}'], local_path)
+        _git(['reset', '--quiet', '--hard', f'origin/{branch}'], local_path)
+        _git(['clean', '-fdq'], local_path)
+
+    def pull(self, local_path: Union[str, Path], auth_url: Optional[str] = None) -> bool:
+        """通过镜像同步工作副本的当前分支（fast-forward），没有镜像时返回 False"""
+        local_path = Path(local_path)
+        result = _git(['remote', 'get-url', 'origin'], local_path, check=False)
+        if result.returncode != 0:
+            return False
+        url = result.stdout.strip()
+        if not self.has_mirror(url):
+            return False
+
+        mirror = self.ensure_mirror(url, auth_url=auth_url or url, force_fetch=True)
+        branch = _git(['symbolic-ref', '--short', 'HEAD'], local_path).stdout.strip()
+        _git(['fetch', '--quiet', '--prune', mirror.resolve().as_uri(),
+              '+refs/heads/*:refs/remotes/origin/*'], local_path)
+        _git(['merge', '--ff-only', '--quiet', f'origin/{branch}'], local_path)
+        return True
+
+
+# Global mirror cache
+mirror_cache = None
+
+def get_mirror_cache() -> RepoMirrorCache:
+    """Get or create the global repository mirror cache."""
+    global mirror_cache
+    if mirror_cache is None:
+        from config import Config
+        mirror_cache = RepoMirrorCache(Config.REPO_MIRROR_DIR,
+                                       fetch_interval=Config.REPO_MIRROR_FETCH_INTERVAL)
+    return mirror_cache
@@ -0,0 +1,272 @@
+"""
+仓库增量同步 - webhook 的 push/create/delete 事件触发，只获取受影响的引用
+
+- 同一仓库的同步请求在 debounce 秒内合并为一次（连续推送时最多推迟 max_delay 秒）
+- 同一引用先更新后删除（或相反）时以最后一次为准
+- 同步作业在 GitService 的仓库锁内执行：更新镜像和工作副本中的这些引用，
+  当前分支干净时 fast-forward，然后更新 branches 表并让状态缓存、搜索索引失效
+"""
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from models.repository import Repository, RepositoryManager
+from services.git_service import GitJob, GitService, get_git_service
+from services.repo_mirror_cache import RepoMirrorCache, get_mirror_cache
+
+logger = logging.getLogger(__name__)
+
+# 最后一次请求后等待的秒数，期间的请求合并为一次同步
+DEBOUNCE_SECONDS = 2.0
+# 第一次请求后最多等待的秒数（持续推送时也会定期同步）
+MAX_DELAY_SECONDS = 30.0
+
+HEADS = 'refs/heads/'
+TAGS = 'refs/tags/'
+
+
+def ref_name(ref_type: str, name: str) -> Optional[str]:
+    """create/delete 事件的 ref_type + 短名 -> 完整引用名"""
+    if ref_type == 'branch':
+        return HEADS + name
+    if ref_type == 'tag':
+        return TAGS + name
+    return None
+
+
+class _PendingSync:
+    def __init__(self, now: float):
+        self.first_at = now
+        self.due_at = now
+        # 完整引用名 -> True（更新）/ False（删除）
+        self.refs: Dict[str, bool] = {}
+
+
+class RepoSyncScheduler:
+    """按仓库合并、去抖同步请求，到期后调用 handler(repo_id, updated, deleted)"""
+
+    def __init__(self, handler: Callable[[str, List[str], List[str]], None],
+                 debounce: float = DEBOUNCE_SECONDS, max_delay: float = MAX_DELAY_SECONDS):
+        self.handler = handler
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._pending: Dict[str, _PendingSync] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def start(self):
+        with self._cond:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, daemon=True, name='repo-sync')
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join()
+
+    def request(self, repo_id: str, updated: Iterable[str] = (), deleted: Iterable[str] = ()):
+        """登记需要同步的引用"""
+        now = time.monotonic()
+        with self._cond:
+            pending = self._pending.get(repo_id)
+            if pending is None:
+                pending = self._pending[repo_id] = _PendingSync(now)
+            for ref in updated:
+                pending.refs[ref] = True
+            for ref in deleted:
+                pending.refs[ref] = False
+            pending.due_at = min(now + self.debounce, pending.first_at + self.max_delay)
+            self._cond.notify()
+
+    def pending(self) -> Dict[str, Dict[str, bool]]:
+        with self._cond:
+            return {repo_id: dict(pending.refs) for repo_id, pending in self._pending.items()}
+
+    def flush(self):
+        """立即处理所有等待中的请求"""
+        with self._cond:
+            batch = list(self._pending.items())
+            self._pending.clear()
+        for repo_id, pending in batch:
+            self._dispatch(repo_id, pending)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+                now = time.monotonic()
+                due = [repo_id for repo_id, pending in self._pending.items() if pending.due_at <= now]
+                batch = [(repo_id, self._pending.pop(repo_id)) for repo_id in due]
+                if not batch:
+                    next_due = min((p.due_at for p in self._pending.values()), default=None)
+                    self._cond.wait(None if next_due is None else next_due - now)
+                    continue
+            for repo_id, pending in batch:
+                self._dispatch(repo_id, pending)
+
+    def _dispatch(self, repo_id: str, pending: _PendingSync):
+        updated = sorted(ref for ref, present in pending.refs.items() if present)
+        deleted = sorted(ref for ref, present in pending.refs.items() if not present)
+        try:
+            self.handler(repo_id, updated, deleted)
+        except Exception as e:
+            logger.error(f"Failed to start sync for repository {repo_id}: {e}")
+
+
+class RepoRefSync:
+    """把远程引用的变化同步到镜像、工作副本和 branches 表"""
+
+    def __init__(self, repo_manager: RepositoryManager, git: GitService,
+                 mirrors: RepoMirrorCache, auth_url: Optional[Callable[[str], str]] = None):
+        self.repo_manager = repo_manager
+        self.git = git
+        self.mirrors = mirrors
+        self.auth_url = auth_url or (lambda url: url)
+
+    def submit(self, repo_id: str, updated: List[str], deleted: List[str]) -> Optional[GitJob]:
+        """提交同步作业（与该仓库的其他 git 操作串行执行）"""
+        repo = self.repo_manager.get_repository(repo_id)
+        if not repo:
+            logger.info(f"Skipping sync for unknown repository {repo_id}")
+            return None
+        return self.git.submit(repo.local_path or repo.id, 'sync_refs', self.sync,
+                               repo, updated, deleted)
+
+    def sync(self, repo: Repository, updated: List[str], deleted: List[str]) -> Dict:
+        result = {
+            'repository_id': repo.id,
+            'updated': updated,
+            'deleted': deleted,
+            'fast_forwarded': False
+        }
+
+        source = None
+        if repo.github_url:
+            auth_url = self.auth_url(repo.github_url)
+            mirror = self.mirrors.fetch_refs(repo.github_url, updated, deleted, auth_url=auth_url)
+            source = mirror.resolve().as_uri() if mirror else auth_url
+
+        local_path = Path(repo.local_path) if repo.local_path else None
+        if local_path and (local_path / '.git').exists():
+            result['fast_forwarded'] = self._sync_clone(local_path, source or 'origin',
+                                                        updated, deleted)
+            self.git.invalidate(local_path)
+            if result['fast_forwarded']:
+                from services.search_index import get_search_manager
+                get_search_manager().schedule_update(local_path, force=True)
+
+        self._update_branches(repo, updated, deleted)
+        logger.info(f"Synced {len(updated)} updated and {len(deleted)} deleted refs "
+                    f"for repository {repo.name}")
+        return result
+
+    def _sync_clone(self, local_path: Path, source: str, updated: List[str],
+                    deleted: List[str]) -> bool:
+        """更新工作副本的远程跟踪引用，返回当前分支是否已 fast-forward"""
+        if updated:
+            self.git.run(local_path, ['fetch', '--quiet', '--no-tags', source] +
+                         [f'+{ref}:{self._local_ref(ref)}' for ref in updated])
+        for ref in deleted:
+            self.git.run(local_path, ['update-ref', '-d', self._local_ref(ref)], check=False)
+
+        head = self.git.run(local_path, ['symbolic-ref', '--quiet', 'HEAD'], check=False).stdout.strip()
+        if head not in updated:
+            return False
+        # 有未提交更改时不动工作区，留给手动同步处理
+        if self.git.run(local_path, ['status', '--porcelain', '--untracked-files=no']).stdout.strip():
+            logger.info(f"Skipping fast-forward of dirty working copy {local_path}")
+            return False
+        merged = self.git.run(local_path, ['merge', '--ff-only', '--quiet', self._local_ref(head)],
+                              check=False)
+        if merged.returncode != 0:
+            logger.warning(f"Cannot fast-forward {local_path} to {head}: {merged.stderr.strip()}")
+            return False
+        return True
+
+    @staticmethod
+    def _local_ref(ref: str) -> str:
+        # 分支放到远程跟踪引用下，标签保持原名
+        if ref.startswith(HEADS):
+            return 'refs/remotes/origin/' + ref[len(HEADS):]
+        return ref
+
+    def _update_branches(self, repo: Repository, updated: List[str], deleted: List[str]):
+        """新分支写入 branches 表，已删除的分支标记为 closed"""
+        updated = [ref[len(HEADS):] for ref in updated if ref.startswith(HEADS)]
+        deleted = [ref[len(HEADS):] for ref in deleted if ref.startswith(HEADS)]
+        if not updated and not deleted:
+            return
+
+        now = datetime.now().isoformat()
+        with self.repo_manager.get_connection() as conn:
+            cursor = conn.cursor()
+            names = updated + deleted
+            placeholders = ','.join('?' * len(names))
+            cursor.execute(f'''
+                SELECT name FROM branches WHERE repository_id = ? AND name IN ({placeholders})
+            ''', [repo.id] + names)
+            existing = {row['name'] for row in cursor.fetchall()}
+
+            cursor.executemany('''
+                INSERT INTO branches (
+                    id, name, repository_id, base_branch, description,
+                    status, created_by, created_at, updated_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(str(uuid.uuid4()), name, repo.id, repo.default_branch, '从 GitHub 同步',
+                   'draft', repo.owner_id, now, now)
+                  for name in updated if name not in existing])
+            if updated:
+                cursor.execute(f'''
+                    UPDATE branches SET updated_at = ?
+                    WHERE repository_id = ? AND name IN ({','.join('?' * len(updated))})
+                ''', [now, repo.id] + updated)
+            if deleted:
+                cursor.execute(f'''
+                    UPDATE branches SET status = 'closed', updated_at = ?
+                    WHERE repository_id = ? AND name IN ({','.join('?' * len(deleted))})
+                      AND status != 'merged'
+                ''', [now, repo.id] + deleted)
+            conn.commit()
+
+
+def changed_refs(event_type: str, result: Dict) -> Tuple[List[str], List[str]]:
+    """从 webhook 处理结果中取出需要同步的引用 (updated, deleted)"""
+    if event_type == 'push':
+        ref = result.get('ref')
+        if not ref:
+            return [], []
+        return ([], [ref]) if result.get('deleted') else ([ref], [])
+    if event_type in ('create', 'delete'):
+        ref = ref_name(result.get('ref_type'), result.get('ref_name') or '')
+        if not ref:
+            return [], []
+        return ([ref], []) if event_type == 'create' else ([], [ref])
+    return [], []
+
+
+# Global repository sync scheduler
+repo_sync = None
+
+def get_repo_sync() -> RepoSyncScheduler:
+    """Get or create the global repository sync scheduler."""
+    global repo_sync
+    if repo_sync is None:
+        from config import Config
+        from services.github_integration import GitHubIntegration
+        ref_sync = RepoRefSync(RepositoryManager(), get_git_service(), get_mirror_cache(),
+                               auth_url=lambda url: GitHubIntegration()._auth_url(url))
+        repo_sync = RepoSyncScheduler(ref_sync.submit, debounce=Config.REPO_SYNC_DEBOUNCE,
+                                      max_delay=Config.REPO_SYNC_MAX_DELAY)
+        repo_sync.start()
+    return repo_sync
@@ -0,0 +1,310 @@
+"""
+项目搜索索引 - 基于 SQLite FTS5 (trigram) 的文件名与内容全文检索
+
+每个项目一个索引库，后台构建，按 (mtime_ns, size) 增量更新，
+搜索请求只查询索引，不再遍历项目目录。
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+from services.file_manager import ENCODING_SAMPLE_SIZE, detect_encoding
+from services.fs_walker import DEFAULT_IGNORED_DIRS, ScandirWalker
+
+logger = logging.getLogger(__name__)
+
+# 超过该大小的文件只索引文件名
+MAX_INDEXED_FILE_SIZE = 1024 * 1024
+# 每个事务写入的文件数
+INDEX_BATCH_SIZE = 500
+# 距上次更新超过该秒数时，搜索会触发一次后台增量更新
+REFRESH_INTERVAL = 30
+# trigram 分词器要求的最短查询长度
+MIN_TRIGRAM_QUERY = 3
+
+
+def _is_binary(sample: bytes) -> bool:
+    return b'\x00' in sample[:8192]
+
+
+class ProjectSearchIndex:
+    """单个项目的搜索索引"""
+
+    def __init__(self, project_path: Union[str, Path], index_path: Union[str, Path]):
+        self.project_path = Path(project_path).resolve()
+        self.index_path = str(index_path)
+        self.walker = ScandirWalker(show_hidden=False, ignore_dirs=DEFAULT_IGNORED_DIRS)
+        self._write_lock = threading.Lock()
+        self.last_updated: Optional[float] = None
+        self._init_db()
+
+    @contextmanager
+    def get_connection(self):
+        """获取数据库连接的上下文管理器"""
+        conn = sqlite3.connect(self.index_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        """初始化索引表"""
+        Path(self.index_path).parent.mkdir(parents=True, exist_ok=True)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS indexed_files (
+                    id INTEGER PRIMARY KEY,
+                    path TEXT NOT NULL UNIQUE,
+                    mtime_ns INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    content_indexed INTEGER NOT NULL DEFAULT 0,
+                    indexed_at TEXT NOT NULL
+                )
+            ''')
+            # rowid 与 indexed_files.id 对应
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS file_fts USING fts5(
+                    name, path, content, tokenize='trigram'
+                )
+            ''')
+            conn.commit()
+
+    def update(self) -> Dict:
+        """增量更新索引：只重新读取 mtime/size 变化的文件"""
+        with self._write_lock:
+            started = time.time()
+            stats = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT id, path, mtime_ns, size FROM indexed_files')
+                known = {row['path']: (row['id'], row['mtime_ns'], row['size'])
+                         for row in cursor.fetchall()}
+
+                seen = set()
+                pending = 0
+                for entry in self.walker.walk(self.project_path):
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    try:
+                        stat = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+
+                    rel_path = os.path.relpath(entry.path, self.project_path)
+                    seen.add(rel_path)
+                    previous = known.get(rel_path)
+                    if previous and previous[1] == stat.st_mtime_ns and previous[2] == stat.st_size:
+                        stats['unchanged'] += 1
+                        continue
+
+                    if previous:
+                        cursor.execute('DELETE FROM file_fts WHERE rowid = ?', (previous[0],))
+                        cursor.execute('DELETE FROM indexed_files WHERE id = ?', (previous[0],))
+                        stats['updated'] += 1
+                    else:
+                        stats['added'] += 1
+
+                    content = self._read_content(entry.path, stat.st_size)
+                    cursor.execute('''
+                        INSERT INTO indexed_files (path, mtime_ns, size, content_indexed, indexed_at)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', (rel_path, stat.st_mtime_ns, stat.st_size, content is not None,
+                          datetime.now().isoformat()))
+                    cursor.execute(
+                        'INSERT INTO file_fts (rowid, name, path, content) VALUES (?, ?, ?, ?)',
+                        (cursor.lastrowid, entry.name, rel_path, content or '')
+                    )
+
+                    pending += 1
+                    if pending >= INDEX_BATCH_SIZE:
+                        conn.commit()
+                        pending = 0
+
+                removed = [(file_id,) for path, (file_id, _, _) in known.items() if path not in seen]
+                if removed:
+                    cursor.executemany('DELETE FROM file_fts WHERE rowid = ?', removed)
+                    cursor.executemany('DELETE FROM indexed_files WHERE id = ?', removed)
+                    stats['removed'] = len(removed)
+
+                conn.commit()
+
+            self.last_updated = time.time()
+            stats['duration'] = round(self.last_updated - started, 3)
+            logger.info(f"Search index updated for {self.project_path}: {stats}")
+            return stats
+
+    def _read_content(self, path: str, size: int) -> Optional[str]:
+        """读取可索引的文本内容，二进制或过大的文件返回 None"""
+        if size > MAX_INDEXED_FILE_SIZE:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        if _is_binary(data):
+            return None
+        encoding = detect_encoding(data[:ENCODING_SAMPLE_SIZE], len(data) <= ENCODING_SAMPLE_SIZE)
+        return data.decode(encoding, errors='replace')
+
+    def search(self, query: str, mode: str = 'all', limit: int = 50) -> List[Dict]:
+        """搜索文件名和/或内容
+
+        mode: 'all' | 'name' | 'content'
+        """
+        query = query.strip()
+        if not query:
+            return []
+
+        if len(query) < MIN_TRIGRAM_QUERY:
+            return self._search_short(query, mode, limit)
+
+        # 作为短语查询，trigram 分词下等价于子串匹配
+        phrase = '"' + query.replace('"', '""') + '"'
+        if mode == 'name':
+            match = f'{{name path}} : {phrase}'
+        elif mode == 'content':
+            match = f'content : {phrase}'
+        else:
+            match = phrase
+
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            # 文件名命中权重最高，其次路径，最后内容
+            cursor.execute('''
+                SELECT f.path, f.size, f.mtime_ns, file_fts.name AS name,
+                       bm25(file_fts, 10.0, 5.0, 1.0) AS score,
+                       snippet(file_fts, 2, '<mark>', '</mark>', '…', 16) AS snippet
+                FROM file_fts
+                JOIN indexed_files f ON f.id = file_fts.rowid
+                WHERE file_fts MATCH ?
+                ORDER BY score
+                LIMIT ?
+            ''', (match, limit))
+            return [self._row_to_result(row) for row in cursor.fetchall()]
+
+    def _search_short(self, query: str, mode: str, limit: int) -> List[Dict]:
+        """trigram 无法处理少于 3 个字符的查询，退化为文件名 LIKE 匹配"""
+        if mode == 'content':
+            return []
+        pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT f.path, f.size, f.mtime_ns, file_fts.name AS name,
+                       0.0 AS score, '' AS snippet
+                FROM indexed_files f
+                JOIN file_fts ON file_fts.rowid = f.id
+                WHERE f.path LIKE ? ESCAPE '\\'
+                ORDER BY length(f.path)
+                LIMIT ?
+            ''', (pattern, limit))
+            return [self._row_to_result(row) for row in cursor.fetchall()]
+
+    def _row_to_result(self, row) -> Dict:
+        return {
+            'path': row['path'],
+            'name': row['name'],
+            'size': row['size'],
+            'modified': datetime.fromtimestamp(row['mtime_ns'] / 1e9).isoformat(),
+            'score': round(-row['score'], 4) if row['score'] else 0.0,
+            'snippet': row['snippet'] or ''
+        }
+
+    def get_status(self) -> Dict:
+        """获取索引状态"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) AS files, COALESCE(SUM(content_indexed), 0) AS contents FROM indexed_files')
+            row = cursor.fetchone()
+        return {
+            'files': row['files'],
+            'content_indexed': row['contents'],
+            'last_updated': datetime.fromtimestamp(self.last_updated).isoformat() if self.last_updated else None
+        }
+
+
+class SearchIndexManager:
+    """管理所有项目的索引，并在后台线程池中构建/刷新"""
+
+    def __init__(self, index_dir: Union[str, Path], max_workers: int = 2,
+                 refresh_interval: int = REFRESH_INTERVAL):
+        self.index_dir = Path(index_dir)
+        self.refresh_interval = refresh_interval
+        self._indexes: Dict[str, ProjectSearchIndex] = {}
+        self._running: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='search-index')
+
+    def get_index(self, project_path: Union[str, Path]) -> ProjectSearchIndex:
+        """获取项目索引（不存在则创建）"""
+        key = str(Path(project_path).resolve())
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None:
+                index_name = Path(key).name + '-' + hashlib.md5(key.encode('utf-8')).hexdigest()[:8] + '.db'
+                index = ProjectSearchIndex(key, self.index_dir / index_name)
+                self._indexes[key] = index
+            return index
+
+    def schedule_update(self, project_path: Union[str, Path], force: bool = False):
+        """在后台刷新索引；已在更新或刚更新过时跳过"""
+        index = self.get_index(project_path)
+        key = str(index.project_path)
+        with self._lock:
+            future = self._running.get(key)
+            if future is not None and not future.done():
+                return future
+            if not force and index.last_updated and time.time() - index.last_updated < self.refresh_interval:
+                return None
+            future = self._pool.submit(self._safe_update, index)
+            self._running[key] = future
+            return future
+
+    def _safe_update(self, index: ProjectSearchIndex):
+        try:
+            return index.update()
+        except Exception as e:
+            logger.error(f"Failed to update search index for {index.project_path}: {e}")
+            return None
+
+    def is_indexing(self, project_path: Union[str, Path]) -> bool:
+        key = str(Path(project_path).resolve())
+        with self._lock:
+            future = self._running.get(key)
+            return future is not None and not future.done()
+
+    def search(self, project_path: Union[str, Path], query: str,
+               mode: str = 'all', limit: int = 50) -> Dict:
+        """搜索项目，同时按需触发后台增量更新"""
+        index = self.get_index(project_path)
+        self.schedule_update(project_path)
+        return {
+            'results': index.search(query, mode=mode, limit=limit),
+            'indexing': self.is_indexing(project_path),
+            'index': index.get_status()
+        }
+
+
+# Global search index manager
+search_manager = None
+
+def get_search_manager() -> SearchIndexManager:
+    """Get or create the global search index manager."""
+    global search_manager
+    if search_manager is None:
+        from config import Config
+        search_manager = SearchIndexManager(Config.SEARCH_INDEX_DIR)
+    return search_manager
@@ -1,8 +1,11 @@
 """
-任务链执行器 - 支持父子任务的连续执行
+任务链执行器 - 将父子任务按依赖关系组成 DAG，
+就绪节点在并行度上限内并发执行，支持失败策略和持久化的节点状态
 """
 import logging
-from typing import List, Optional
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
 import sys
 from pathlib import Path
 
@@ -10,21 +13,106 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from models.task import Task, TaskManager
+from services.context_builder import (
+    ContextCollector, TaskContextStore, format_upstream_context, record_from_output
+)
+from models.task_chain import (
+    TaskChainDB, FAILURE_POLICIES, FAIL_FAST, CONTINUE, RETRY,
+    NODE_PENDING, NODE_RUNNING, NODE_COMPLETED, NODE_FAILED, NODE_SKIPPED
+)
 
 logger = logging.getLogger(__name__)
 
+# 单个任务链默认的最大并行节点数
+DEFAULT_MAX_PARALLEL = 4
+# RETRY 策略未指定重试次数时的默认值
+DEFAULT_RETRIES = 2
+# 请求中允许的并行节点数和重试次数上限
+MAX_PARALLEL_LIMIT = 16
+MAX_RETRIES_LIMIT = 10
+
+
+class ChainRun:
+    """一次任务链执行的内存状态（与 task_chain_nodes 表同步）"""
+    
+    def __init__(self, chain: Dict, parent_task: Task):
+        self.chain_id = chain['id']
+        self.parent_task = parent_task
+        self.max_parallel = max(1, chain['max_parallel'])
+        self.failure_policy = chain['failure_policy']
+        self.max_retries = chain['max_retries']
+        self.nodes: Dict[str, Dict] = {node['task_id']: node for node in chain['nodes']}
+        self.order: List[str] = [node['task_id'] for node in chain['nodes']]
+        # 已完成节点的精简上下文记录，以及运行中节点的流式收集器
+        self.contexts: Dict[str, Dict] = {}
+        self.collectors: Dict[str, ContextCollector] = {}
+        self.running = 0
+        self.stopped = False
+        self.finished = threading.Event()
+        self.lock = threading.RLock()
+    
+    def dependents(self, task_id: str) -> List[str]:
+        """所有（传递）下游节点"""
+        result = []
+        frontier = [task_id]
+        seen = set()
+        while frontier:
+            current = frontier.pop()
+            for other_id in self.order:
+                if other_id not in seen and current in self.nodes[other_id]['depends_on']:
+                    seen.add(other_id)
+                    result.append(other_id)
+                    frontier.append(other_id)
+        return result
+    
+    def upstream(self, task_id: str) -> List[str]:
+        """所有（传递）上游节点，按链中顺序排列"""
+        seen = set()
+        frontier = list(self.nodes[task_id]['depends_on'])
+        while frontier:
+            current = frontier.pop()
+            if current not in seen:
+                seen.add(current)
+                frontier.extend(self.nodes[current]['depends_on'])
+        return [other_id for other_id in self.order if other_id in seen]
+
+
 class TaskChainExecutor:
-    """执行任务链，支持上下文传递和自动执行子任务"""
+    """执行任务链，支持上下文传递、依赖调度和并发执行子任务"""
     
-    def __init__(self, executor, task_manager: TaskManager):
+    def __init__(self, executor, task_manager: TaskManager, chain_db: Optional[TaskChainDB] = None):
         self.executor = executor
         self.task_manager = task_manager
+        self.chain_db = chain_db or TaskChainDB(task_manager.db.db_path)
+        self.context_store = TaskContextStore(self.chain_db.db_path)
+        self._runs: Dict[str, ChainRun] = {}
         
     def create_task_chain(self, parent_prompt: str, child_prompts: List[str], 
-                         project_path: str, user_id: Optional[str] = None) -> Task:
-        """创建任务链"""
+                         project_path: str, user_id: Optional[str] = None,
+                         dependencies: Optional[List[List[int]]] = None,
+                         max_parallel: int = DEFAULT_MAX_PARALLEL,
+                         failure_policy: str = FAIL_FAST,
+                         max_retries: Optional[int] = None) -> Task:
+        """创建任务链
+        
+        dependencies[i] 为第 i 个子任务依赖的其他子任务下标（从 0 开始）。
+        所有子任务都隐式依赖父任务；不传 dependencies 时子任务按顺序依次依赖前一个。
+        """
         import uuid
         
+        if failure_policy not in FAILURE_POLICIES:
+            raise ValueError(f"Unknown failure policy: {failure_policy}")
+        if max_retries is None:
+            max_retries = DEFAULT_RETRIES if failure_policy == RETRY else 0
+        # 这两个值写入 INTEGER 列并参与比较，类型错误会让任务链卡在 running
+        if not isinstance(max_parallel, int) or not 1 <= max_parallel <= MAX_PARALLEL_LIMIT:
+            raise ValueError(f"max_parallel must be an integer between 1 and {MAX_PARALLEL_LIMIT}")
+        if not isinstance(max_retries, int) or not 0 <= max_retries <= MAX_RETRIES_LIMIT:
+            raise ValueError(f"max_retries must be an integer between 0 and {MAX_RETRIES_LIMIT}")
+        if dependencies is None:
+            dependencies = [[i - 1] if i > 0 else [] for i in range(len(child_prompts))]
+        self._validate_dependencies(dependencies, len(child_prompts))
+        
         # 如果没有 user_id，尝试从项目路径推断并创建用户
         if not user_id:
             from utils.user_inference import infer_user_from_project_path, construct_email
@@ -66,10 +154,16 @@ class TaskChainExecutor:
         parent_task.task_type = 'parent'
         
         # 创建子任务
+        child_ids = [str(uuid.uuid4()) for _ in child_prompts]
+        nodes = [{
+            'task_id': parent_id,
+            'prompt': parent_prompt,
+            'depends_on': [],
+            'sequence_order': 0
+        }]
         for i, child_prompt in enumerate(child_prompts):
-            child_id = str(uuid.uuid4())
             child_task = Task(
-                id=child_id,
+                id=child_ids[i],
                 prompt=child_prompt,
                 project_path=project_path,
                 parent_task_id=parent_id,
@@ -78,155 +172,299 @@ class TaskChainExecutor:
             child_task.task_type = 'child'
             child_task.sequence_order = i + 1
             parent_task.children.append(child_task)
-            
-            # 保存子任务到数据库
-            self.task_manager.add_task(child_task)
+            nodes.append({
+                'task_id': child_task.id,
+                'prompt': child_prompt,
+                'depends_on': [parent_id] + [child_ids[j] for j in dependencies[i]],
+                'sequence_order': i + 1
+            })
         
-        # 保存父任务
+        # 先保存父任务，子任务保存时即可登记到层级中
         self.task_manager.add_task(parent_task)
+        for child_task in parent_task.children:
+            self.task_manager.add_task(child_task)
+        
+        self.chain_db.create_chain(
+            parent_id, project_path, nodes,
+            max_parallel=max_parallel,
+            failure_policy=failure_policy,
+            max_retries=max_retries
+        )
+        parent_task.chain_id = parent_id
         
         return parent_task
     
-    def execute_chain(self, parent_task: Task):
-        """执行任务链"""
+    @staticmethod
+    def _validate_dependencies(dependencies: List[List[int]], count: int):
+        """校验依赖下标合法且不存在环"""
+        if len(dependencies) != count:
+            raise ValueError("Dependencies must be given for every child task")
+        
+        indegree = [0] * count
+        for i, deps in enumerate(dependencies):
+            for j in deps:
+                if not isinstance(j, int) or j < 0 or j >= count or j == i:
+                    raise ValueError(f"Invalid dependency {j} for child task {i}")
+            indegree[i] = len(set(deps))
+        
+        # Kahn 拓扑排序检测环
+        ready = [i for i in range(count) if indegree[i] == 0]
+        visited = 0
+        while ready:
+            current = ready.pop()
+            visited += 1
+            for i, deps in enumerate(dependencies):
+                if current in deps:
+                    indegree[i] -= 1
+                    if indegree[i] == 0:
+                        ready.append(i)
+        if visited != count:
+            raise ValueError("Task chain dependencies contain a cycle")
+    
+    def execute_chain(self, parent_task: Task) -> ChainRun:
+        """执行任务链：调度所有依赖已满足的节点"""
         logger.info(f"开始执行任务链: {parent_task.id}")
         
-        # 设置完成回调
-        original_callback = parent_task.completion_callback
-        parent_task.completion_callback = lambda task: self._on_parent_complete(task, original_callback)
+        chain = self.chain_db.get_chain(parent_task.id)
+        if chain is None:
+            raise ValueError(f"Task chain not found: {parent_task.id}")
         
-        # 执行父任务
-        self.executor.execute(
-            parent_task.prompt,
-            parent_task.project_path,
-            output_callback=self._create_output_callback(parent_task.id),
-            completion_callback=parent_task.completion_callback
-        )
+        run = ChainRun(chain, parent_task)
+        self._runs[run.chain_id] = run
+        self.chain_db.update_chain_status(run.chain_id, NODE_RUNNING)
+        self._dispatch_ready(run)
+        return run
+    
+    def resume_chain(self, chain_id: str) -> Optional[ChainRun]:
+        """服务重启后恢复任务链：已完成的节点保留，中断的节点重新执行"""
+        chain = self.chain_db.get_chain(chain_id)
+        parent_task = self.task_manager.get_task(chain_id)
+        if chain is None or parent_task is None:
+            return None
+        
+        run = ChainRun(chain, parent_task)
+        completed = []
+        for task_id, node in run.nodes.items():
+            if node['status'] == NODE_RUNNING:
+                node['status'] = NODE_PENDING
+                self.chain_db.update_node(chain_id, task_id, status=NODE_PENDING)
+            elif node['status'] == NODE_COMPLETED:
+                completed.append(task_id)
+        
+        # 上下文记录已持久化，无需重新读取完整输出；旧数据缺失时才从输出补建
+        run.contexts = self.context_store.get_many(completed)
+        for task_id in completed:
+            if task_id not in run.contexts:
+                task = self.task_manager.get_task(task_id)
+                record = record_from_output(task_id, task.output if task else '')
+                self.context_store.save(record)
+                run.contexts[task_id] = record
+        
+        logger.info(f"恢复任务链: {chain_id}")
+        self._runs[chain_id] = run
+        self.chain_db.update_chain_status(chain_id, NODE_RUNNING)
+        self._dispatch_ready(run)
+        return run
+    
+    def resume_unfinished_chains(self) -> List[ChainRun]:
+        """服务启动时恢复所有未结束的任务链；无法恢复的（父任务已不存在）标记为失败"""
+        runs = []
+        for chain_id in self.chain_db.get_unfinished_chains():
+            try:
+                run = self.resume_chain(chain_id)
+            except Exception as e:
+                logger.error(f"恢复任务链失败 {chain_id}: {e}")
+                run = None
+            if run is None:
+                self.chain_db.update_chain_status(chain_id, NODE_FAILED)
+            else:
+                runs.append(run)
+        return runs
+    
+    def _dispatch_ready(self, run: ChainRun):
+        """在并行度上限内启动所有就绪节点；没有可运行的节点时结束任务链"""
+        with run.lock:
+            if not run.stopped:
+                for task_id in run.order:
+                    if run.running >= run.max_parallel:
+                        break
+                    node = run.nodes[task_id]
+                    if node['status'] != NODE_PENDING:
+                        continue
+                    if all(run.nodes[dep]['status'] == NODE_COMPLETED for dep in node['depends_on']):
+                        self._start_node(run, task_id)
+            
+            if run.running == 0 and not run.finished.is_set():
+                self._finish(run)
     
-    def _on_parent_complete(self, parent_task: Task, original_callback=None):
-        """父任务完成后的处理"""
-        logger.info(f"父任务完成: {parent_task.id}, 状态: {parent_task.status}")
-        
-        # 调用原始回调
-        if original_callback:
-            original_callback(parent_task)
-        
-        # 如果父任务失败，不执行子任务
-        if parent_task.status != 'completed':
-            logger.warning(f"父任务失败，跳过子任务执行")
-            return
-        
-        # 获取并执行子任务
-        children = sorted(parent_task.children, key=lambda t: t.sequence_order)
-        if children:
-            self._execute_next_child(parent_task, children, 0)
-    
-    def _execute_next_child(self, parent_task: Task, children: List[Task], index: int):
-        """执行下一个子任务"""
-        if index >= len(children):
-            logger.info(f"所有子任务执行完成")
-            return
-        
-        child_task = children[index]
-        logger.info(f"执行子任务 {index + 1}/{len(children)}: {child_task.id}")
-        
-        # 构建包含上下文的提示
-        contextual_prompt = self._build_contextual_prompt(child_task, parent_task)
-        child_task.prompt = contextual_prompt
-        child_task.context = self._extract_context(parent_task)
-        
-        # 设置完成回调以执行下一个子任务
-        child_task.completion_callback = lambda task: self._on_child_complete(
-            task, parent_task, children, index
+    def _start_node(self, run: ChainRun, task_id: str):
+        """启动单个节点"""
+        node = run.nodes[task_id]
+        node['status'] = NODE_RUNNING
+        node['attempts'] += 1
+        run.running += 1
+        self.chain_db.update_node(
+            run.chain_id, task_id,
+            status=NODE_RUNNING,
+            attempts=node['attempts'],
+            started_at=datetime.now().isoformat()
         )
         
-        # 执行子任务
+        if task_id == run.chain_id:
+            prompt = node['prompt']
+        else:
+            prompt = self._build_contextual_prompt(node, run)
+        
+        collector = ContextCollector(task_id)
+        run.collectors[task_id] = collector
+        
+        logger.info(f"执行任务链节点 {node['sequence_order']}/{len(run.order) - 1}: "
+                    f"{task_id} (第 {node['attempts']} 次)")
+        
         self.executor.execute(
-            child_task.prompt,
-            child_task.project_path,
-            output_callback=self._create_output_callback(child_task.id),
-            completion_callback=child_task.completion_callback
+            prompt,
+            run.parent_task.project_path,
+            output_callback=self._create_output_callback(task_id, collector),
+            completion_callback=lambda task: self._on_node_complete(run, task_id, task),
+            user_id=getattr(run.parent_task, 'user_id', None),
+            task_id=task_id
         )
     
-    def _on_child_complete(self, child_task: Task, parent_task: Task, 
-                          children: List[Task], current_index: int):
-        """子任务完成后的处理"""
-        logger.info(f"子任务完成: {child_task.id}, 状态: {child_task.status}")
+    def _on_node_complete(self, run: ChainRun, task_id: str, task: Task):
+        """节点完成后的处理，在执行器的工作线程中调用
+        
+        处理出错时节点按失败处理并停止任务链，不能让任务链停留在 running。
+        """
+        with run.lock:
+            run.running -= 1
+            try:
+                self._apply_node_result(run, task_id, task)
+            except Exception as e:
+                logger.error(f"Error handling completion of chain node {task_id}: {str(e)}")
+                self._fail_node(run, task_id, str(e))
+            
+            try:
+                self._dispatch_ready(run)
+            except Exception as e:
+                logger.error(f"Error dispatching task chain {run.chain_id}: {str(e)}")
+    
+    def _apply_node_result(self, run: ChainRun, task_id: str, task: Task):
+        """按节点执行结果更新状态：完成、重试或按失败策略处理"""
+        node = run.nodes[task_id]
+        now = datetime.now().isoformat()
+        logger.info(f"任务链节点完成: {task_id}, 状态: {task.status}")
+        record = self._save_context(run, task_id, task)
         
-        # 更新父任务的上下文
-        if hasattr(parent_task, 'context_summary'):
-            parent_task.context_summary += f"\n\n子任务 {current_index + 1} 结果摘要:\n"
-            parent_task.context_summary += self._summarize_output(child_task.output)
+        if task.status == NODE_COMPLETED:
+            node['status'] = NODE_COMPLETED
+            run.contexts[task_id] = record
+            self.chain_db.update_node(run.chain_id, task_id,
+                                      status=NODE_COMPLETED, error=None, finished_at=now)
+        elif node['attempts'] <= run.max_retries and not run.stopped:
+            logger.warning(f"任务链节点失败，准备重试: {task_id}")
+            node['status'] = NODE_PENDING
+            self.chain_db.update_node(run.chain_id, task_id, status=NODE_PENDING,
+                                      error=task.error_message or task.error)
         else:
-            parent_task.context_summary = self._summarize_output(child_task.output)
+            node['status'] = NODE_FAILED
+            self.chain_db.update_node(run.chain_id, task_id, status=NODE_FAILED,
+                                      error=task.error_message or task.error, finished_at=now)
+            self._handle_failure(run, task_id)
+    
+    def _fail_node(self, run: ChainRun, task_id: str, error: str):
+        """节点结果处理出错：节点标记为失败，停止调度剩余节点"""
+        run.stopped = True
+        skipped = [other_id for other_id in run.order
+                   if run.nodes[other_id]['status'] == NODE_PENDING]
+        for other_id in skipped:
+            run.nodes[other_id]['status'] = NODE_SKIPPED
+        if task_id in run.nodes:
+            run.nodes[task_id]['status'] = NODE_FAILED
+        try:
+            self.chain_db.update_node(run.chain_id, task_id, status=NODE_FAILED, error=error,
+                                      finished_at=datetime.now().isoformat())
+            self.chain_db.update_nodes_status(run.chain_id, skipped, NODE_SKIPPED)
+        except Exception as e:
+            logger.error(f"Failed to persist failure of chain node {task_id}: {str(e)}")
+    
+    def _save_context(self, run: ChainRun, task_id: str, task: Task) -> Dict:
+        """持久化节点运行期间收集的上下文记录"""
+        collector = run.collectors.pop(task_id, None) or ContextCollector(task_id)
+        if collector.line_count == 0 and task.output:
+            # 执行器没有逐行回调输出时，从完整输出补建一次
+            collector.feed_text(task.output)
+        record = collector.to_record()
+        try:
+            self.context_store.save(record)
+        except Exception as e:
+            logger.error(f"Failed to save context for task {task_id}: {str(e)}")
+        return record
+    
+    def _handle_failure(self, run: ChainRun, task_id: str):
+        """按失败策略跳过节点"""
+        if run.failure_policy == CONTINUE:
+            skipped = [other_id for other_id in run.dependents(task_id)
+                       if run.nodes[other_id]['status'] == NODE_PENDING]
+            logger.warning(f"任务链节点失败，跳过 {len(skipped)} 个下游节点")
+        else:
+            run.stopped = True
+            skipped = [other_id for other_id in run.order
+                       if run.nodes[other_id]['status'] == NODE_PENDING]
+            logger.warning(f"任务链节点失败，停止调度剩余 {len(skipped)} 个节点")
         
-        # 执行下一个子任务
-        self._execute_next_child(parent_task, children, current_index + 1)
+        for other_id in skipped:
+            run.nodes[other_id]['status'] = NODE_SKIPPED
+        self.chain_db.update_nodes_status(run.chain_id, skipped, NODE_SKIPPED)
     
-    def _build_contextual_prompt(self, child_task: Task, parent_task: Task) -> str:
-        """构建包含上下文的提示"""
+    def _finish(self, run: ChainRun):
+        """所有节点都已结束"""
+        statuses = [node['status'] for node in run.nodes.values()]
+        if all(status == NODE_COMPLETED for status in statuses):
+            status = NODE_COMPLETED
+            logger.info(f"任务链执行完成: {run.chain_id}")
+        else:
+            status = NODE_FAILED
+            logger.warning(f"任务链执行失败: {run.chain_id}")
+        
+        self.chain_db.update_chain_status(run.chain_id, status)
+        run.finished.set()
+        self._runs.pop(run.chain_id, None)
+    
+    def _build_contextual_prompt(self, node: Dict, run: ChainRun) -> str:
+        """构建包含上下文的提示：父任务及所有上游节点的精简上下文
+        
+        只使用持久化的上下文记录，开销与上游任务的输出长度无关。
+        """
         context_parts = []
         
         # 添加父任务信息
         context_parts.append(f"基于之前的任务继续执行：")
-        context_parts.append(f"初始任务：{parent_task.prompt}")
+        context_parts.append(f"初始任务：{run.nodes[run.chain_id]['prompt']}")
         
         # 添加父任务输出摘要
-        if parent_task.output:
-            summary = self._summarize_output(parent_task.output)
-            context_parts.append(f"初始任务结果摘要：{summary}")
+        parent_context = run.contexts.get(run.chain_id)
+        if parent_context and parent_context['line_count']:
+            context_parts.append(f"初始任务结果摘要：{parent_context['summary']}")
         
-        # 添加之前子任务的上下文
-        if hasattr(parent_task, 'context_summary'):
-            context_parts.append(parent_task.context_summary)
+        # 添加上游子任务的上下文（超出预算时保留最近的）
+        upstream = [
+            {**run.contexts.get(upstream_id, {}), 'label': f"子任务 {run.nodes[upstream_id]['sequence_order']}"}
+            for upstream_id in run.upstream(node['task_id'])
+            if upstream_id != run.chain_id
+        ]
+        context_parts.extend(format_upstream_context(upstream))
         
         # 添加当前任务
-        context_parts.append(f"\n当前任务：{child_task.prompt}")
+        context_parts.append(f"\n当前任务：{node['prompt']}")
         context_parts.append("\n请基于上述上下文继续执行当前任务。不要重复已完成的工作。")
         
         return "\n".join(context_parts)
     
-    def _extract_context(self, task: Task) -> str:
-        """从任务输出中提取关键上下文"""
-        if not task.output:
-            return ""
-        
-        context_info = []
-        
-        # 提取创建的文件
-        lines = task.output.split('\n')
-        for line in lines:
-            if 'created' in line.lower() or 'wrote' in line.lower():
-                context_info.append(line.strip())
-            elif 'error' in line.lower() or 'failed' in line.lower():
-                context_info.append(f"错误: {line.strip()}")
-        
-        return "\n".join(context_info[-10:])  # 只保留最近的10条信息
-    
-    def _summarize_output(self, output: str) -> str:
-        """生成输出摘要"""
-        if not output:
-            return "无输出"
-        
-        lines = output.strip().split('\n')
-        
-        # 如果输出很短，直接返回
-        if len(lines) <= 5:
-            return output
-        
-        # 提取关键行
-        summary_lines = []
-        
-        # 保留前两行和后三行
-        summary_lines.extend(lines[:2])
-        summary_lines.append("...")
-        summary_lines.extend(lines[-3:])
-        
-        return "\n".join(summary_lines)
-    
-    def _create_output_callback(self, task_id: str):
-        """创建输出回调函数"""
+    def _create_output_callback(self, task_id: str, collector: Optional[ContextCollector] = None):
+        """创建输出回调函数，同时把每行输出交给上下文收集器"""
         def callback(task_id: str, output: str):
             # 这里可以添加WebSocket推送等实时更新逻辑
             logger.debug(f"Task {task_id}: {output}")
+            if collector is not None:
+                collector.feed(output)
         return callback
\ No newline at end of file
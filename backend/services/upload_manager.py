@@ -0,0 +1,303 @@
+"""
+分块上传服务 - 支持断点续传、分块校验、流式写入临时文件后原子替换，
+以及基于内容哈希的去重
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional, Union
+
+from services.file_hash_cache import FileHashCache, compute_digests
+
+logger = logging.getLogger(__name__)
+
+# 默认分块大小，需小于 MAX_CONTENT_LENGTH
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+# 从请求流中读取的缓冲区大小
+STREAM_BUFFER_SIZE = 1024 * 1024
+# 未完成的上传会话保留时间（秒）
+UPLOAD_EXPIRE_SECONDS = 24 * 3600
+
+
+class UploadError(Exception):
+    """上传请求无效（校验失败、分块越界、会话不存在等）"""
+
+
+class UploadManager:
+    """分块上传管理器
+
+    每个上传会话在上传目录下对应两个文件：
+    - ``<upload_id>.json``：会话清单（目标路径、大小、分块大小、已接收分块及其校验和）
+    - ``<upload_id>.part``：按偏移写入的数据文件
+
+    清单落盘，因此服务重启或客户端断线后可以通过状态接口查询缺失的分块继续上传。
+    """
+
+    def __init__(self, upload_dir: Union[str, Path],
+                 hash_cache: Optional[FileHashCache] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 max_size: Optional[int] = None):
+        self.upload_dir = Path(upload_dir) / 'chunked'
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        self.hash_cache = hash_cache or FileHashCache()
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _manifest_path(self, upload_id: str) -> Path:
+        return self.upload_dir / f'{upload_id}.json'
+
+    def _part_path(self, upload_id: str) -> Path:
+        return self.upload_dir / f'{upload_id}.part'
+
+    def _lock(self, upload_id: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def _load(self, upload_id: str) -> Dict:
+        # upload_id 来自 URL，只接受 uuid 格式，避免路径穿越
+        try:
+            uuid.UUID(hex=upload_id)
+        except ValueError:
+            raise UploadError('Invalid upload id')
+
+        manifest_path = self._manifest_path(upload_id)
+        if not manifest_path.exists():
+            raise UploadError('Upload not found')
+        with manifest_path.open('r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save(self, manifest: Dict):
+        manifest['updated_at'] = time.time()
+        manifest_path = self._manifest_path(manifest['upload_id'])
+        tmp_path = manifest_path.with_suffix('.json.tmp')
+        with tmp_path.open('w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+
+    @staticmethod
+    def _status(manifest: Dict) -> Dict:
+        received = {int(index) for index in manifest['chunks']}
+        missing = [index for index in range(manifest['total_chunks']) if index not in received]
+        return {
+            'upload_id': manifest['upload_id'],
+            'filename': Path(manifest['target']).name,
+            'size': manifest['size'],
+            'chunk_size': manifest['chunk_size'],
+            'total_chunks': manifest['total_chunks'],
+            'received_chunks': len(received),
+            'received_bytes': sum(min(manifest['chunk_size'], manifest['size'] - index * manifest['chunk_size'])
+                                  for index in received),
+            'missing_chunks': missing,
+            'status': manifest['status']
+        }
+
+    def init_upload(self, target: Union[str, Path], size: int,
+                    sha256: Optional[str] = None,
+                    chunk_size: Optional[int] = None,
+                    dedupe_within: Optional[Union[str, Path]] = None) -> Dict:
+        """创建上传会话
+
+        如果提供了 sha256 且服务器上已经存在相同内容的文件，直接在服务器端复制，
+        返回 ``status == 'completed'``，客户端无需再上传任何分块。
+        """
+        if size < 0:
+            raise UploadError('Invalid file size')
+        if self.max_size is not None and size > self.max_size:
+            raise UploadError(f'File too large (max {self.max_size} bytes)')
+
+        chunk_size = min(chunk_size or self.chunk_size, self.chunk_size)
+        if chunk_size <= 0:
+            raise UploadError('Invalid chunk size')
+
+        target = Path(target)
+        if sha256:
+            sha256 = sha256.lower()
+            existing = self.hash_cache.find_by_digest(sha256, within=dedupe_within)
+            if existing is not None and existing.stat().st_size == size:
+                info = self._place_copy(existing, target, sha256)
+                info['deduplicated'] = True
+                return info
+
+        upload_id = uuid.uuid4().hex
+        # 预分配数据文件，分块可以按任意顺序写入
+        with self._part_path(upload_id).open('wb') as f:
+            f.truncate(size)
+
+        manifest = {
+            'upload_id': upload_id,
+            'target': str(target),
+            'size': size,
+            'sha256': sha256,
+            'chunk_size': chunk_size,
+            'total_chunks': max(1, -(-size // chunk_size)),
+            'chunks': {},
+            'status': 'uploading',
+            'created_at': time.time()
+        }
+        self._save(manifest)
+        return self._status(manifest)
+
+    def put_chunk(self, upload_id: str, index: int, stream: BinaryIO,
+                  checksum: Optional[str] = None) -> Dict:
+        """流式写入一个分块，校验长度和（可选的）sha256"""
+        with self._lock(upload_id):
+            manifest = self._load(upload_id)
+            if manifest['status'] != 'uploading':
+                raise UploadError(f"Upload is {manifest['status']}")
+            if index < 0 or index >= manifest['total_chunks']:
+                raise UploadError(f'Chunk index {index} out of range')
+
+            offset = index * manifest['chunk_size']
+            expected = min(manifest['chunk_size'], manifest['size'] - offset)
+            hasher = hashlib.sha256()
+            written = 0
+
+            with self._part_path(upload_id).open('r+b') as f:
+                f.seek(offset)
+                while written <= expected:
+                    data = stream.read(min(STREAM_BUFFER_SIZE, expected - written + 1))
+                    if not data:
+                        break
+                    written += len(data)
+                    if written > expected:
+                        break
+                    f.write(data)
+                    hasher.update(data)
+
+            if written != expected:
+                raise UploadError(f'Chunk {index} size mismatch: expected {expected} bytes, got {written}')
+
+            digest = hasher.hexdigest()
+            if checksum and checksum.lower() != digest:
+                raise UploadError(f'Chunk {index} checksum mismatch')
+
+            manifest['chunks'][str(index)] = digest
+            self._save(manifest)
+            return self._status(manifest)
+
+    def get_status(self, upload_id: str) -> Dict:
+        """获取上传进度和缺失的分块，用于断点续传"""
+        return self._status(self._load(upload_id))
+
+    def complete(self, upload_id: str) -> Dict:
+        """所有分块到齐后校验整体哈希，并原子地移动到目标位置"""
+        with self._lock(upload_id):
+            manifest = self._load(upload_id)
+            status = self._status(manifest)
+            if status['missing_chunks']:
+                raise UploadError(f"Missing chunks: {status['missing_chunks'][:20]}")
+
+            part_path = self._part_path(upload_id)
+            digests = compute_digests(part_path)
+            if manifest['sha256'] and manifest['sha256'] != digests['sha256']:
+                manifest['status'] = 'failed'
+                self._save(manifest)
+                raise UploadError('File checksum mismatch')
+
+            with part_path.open('rb+') as f:
+                os.fsync(f.fileno())
+
+            target = Path(manifest['target'])
+            target.parent.mkdir(parents=True, exist_ok=True)
+            # 上传目录与项目目录可能不在同一文件系统，先复制到目标目录下的临时文件再原子替换
+            tmp_target = target.parent / f'.{target.name}.{upload_id}.tmp'
+            try:
+                os.replace(part_path, tmp_target)
+            except OSError:
+                shutil.copyfile(part_path, tmp_target)
+                part_path.unlink()
+            os.replace(tmp_target, target)
+
+            self.hash_cache.record(target, digests)
+            self._cleanup(upload_id)
+            logger.info(f"Chunked upload {upload_id} completed: {target} ({manifest['size']} bytes)")
+
+            return {
+                'upload_id': upload_id,
+                'status': 'completed',
+                'path': str(target),
+                'size': manifest['size'],
+                'md5': digests['md5'],
+                'sha256': digests['sha256'],
+                'deduplicated': False
+            }
+
+    def abort(self, upload_id: str):
+        """取消上传并删除临时数据"""
+        with self._lock(upload_id):
+            self._load(upload_id)
+            self._cleanup(upload_id)
+
+    def cleanup_expired(self, max_age: int = UPLOAD_EXPIRE_SECONDS) -> int:
+        """清理长时间未更新的上传会话"""
+        removed = 0
+        now = time.time()
+        for manifest_path in self.upload_dir.glob('*.json'):
+            try:
+                with manifest_path.open('r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if now - manifest.get('updated_at', 0) > max_age:
+                self._cleanup(manifest['upload_id'])
+                removed += 1
+        return removed
+
+    def _cleanup(self, upload_id: str):
+        for path in (self._part_path(upload_id), self._manifest_path(upload_id)):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+        with self._locks_guard:
+            self._locks.pop(upload_id, None)
+
+    def _place_copy(self, source: Path, target: Path, sha256: str) -> Dict:
+        """服务器端复制已有的相同内容文件，同样先写临时文件再原子替换"""
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_target = target.parent / f'.{target.name}.{uuid.uuid4().hex}.tmp'
+        shutil.copyfile(source, tmp_target)
+
+        digests = compute_digests(tmp_target)
+        if digests['sha256'] != sha256:
+            # 源文件在查找之后被修改，复制结果不可信
+            tmp_target.unlink()
+            raise UploadError('Deduplication source changed, please upload the file')
+
+        os.replace(tmp_target, target)
+        self.hash_cache.record(target, digests)
+
+        return {
+            'upload_id': None,
+            'status': 'completed',
+            'path': str(target),
+            'size': target.stat().st_size,
+            'md5': digests['md5'],
+            'sha256': digests['sha256']
+        }
+
+
+# Global upload manager instance
+upload_manager = None
+
+def get_upload_manager() -> UploadManager:
+    """Get or create the global upload manager."""
+    global upload_manager
+    if upload_manager is None:
+        from config import Config
+        from services.file_hash_cache import get_hash_cache
+        upload_manager = UploadManager(
+            Config.UPLOAD_FOLDER,
+            hash_cache=get_hash_cache(),
+            chunk_size=Config.UPLOAD_CHUNK_SIZE,
+            max_size=Config.MAX_UPLOAD_SIZE
+        )
+    return upload_manager
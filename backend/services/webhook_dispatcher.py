@@ -0,0 +1,125 @@
+"""
+Webhook 后台处理 - 从收件箱领取事件并在线程池中处理，失败时按指数退避重试
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from models.webhook_inbox import WebhookInbox
+from services.github_webhook import WebhookPayload
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+# 没有新事件通知时轮询收件箱的间隔（秒），也用于发现到期的重试
+POLL_INTERVAL = 1.0
+MAX_ATTEMPTS = 5
+# 第 n 次失败后等待 RETRY_BASE_DELAY * 2 ** (n - 1) 秒，最多 RETRY_MAX_DELAY 秒
+RETRY_BASE_DELAY = 5
+RETRY_MAX_DELAY = 600
+
+
+def retry_delay(attempts: int) -> float:
+    return min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** max(0, attempts - 1))
+
+
+class WebhookDispatcher:
+    """收件箱调度线程 + 处理线程池
+
+    processor(delivery_id, event_type, payload) 抛出异常即视为处理失败；payload 为延迟解析的
+    WebhookPayload，处理器读取字段时才解析 JSON。
+    """
+
+    def __init__(self, inbox: WebhookInbox, processor: Callable[[str, str, WebhookPayload], None],
+                 workers: int = DEFAULT_WORKERS, max_attempts: int = MAX_ATTEMPTS,
+                 poll_interval: float = POLL_INTERVAL):
+        self.inbox = inbox
+        self.processor = processor
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._slots = threading.Semaphore(workers)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        # 上次进程退出时正在处理的事件重新入队
+        requeued = self.inbox.requeue_stale()
+        if requeued:
+            logger.info(f"Requeued {requeued} webhook events left in processing")
+        self._stopping.clear()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='webhook')
+        self._thread = threading.Thread(target=self._run, daemon=True, name='webhook-dispatcher')
+        self._thread.start()
+
+    def stop(self, wait: bool = True):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join()
+        if self._pool:
+            self._pool.shutdown(wait=wait)
+
+    def notify(self):
+        """有新事件入队时唤醒调度线程"""
+        self._wakeup.set()
+
+    @property
+    def in_flight(self) -> int:
+        with self._lock:
+            return self._in_flight
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.clear()
+            try:
+                dispatched = self._dispatch()
+            except Exception as e:
+                logger.error(f"Failed to claim webhook events: {e}")
+                dispatched = 0
+            if not dispatched:
+                self._wakeup.wait(self.poll_interval)
+
+    def _dispatch(self) -> int:
+        # 只领取空闲线程能立即处理的数量，其余事件留在收件箱中
+        free = 0
+        while self._slots.acquire(blocking=False):
+            free += 1
+        events = self.inbox.claim(free)
+        for _ in range(free - len(events)):
+            self._slots.release()
+        for event in events:
+            with self._lock:
+                self._in_flight += 1
+            self._pool.submit(self._process, event)
+        return len(events)
+
+    def _process(self, event: Dict):
+        try:
+            payload = WebhookPayload(event['payload'])
+            self.processor(event['delivery_id'], event['event_type'], payload)
+            self.inbox.complete(event['id'])
+        except Exception as e:
+            attempts = event['attempts']
+            # payload 无法解析（ValueError）时重试也不会成功
+            retryable = not isinstance(e, ValueError) and attempts < self.max_attempts
+            retry_in = retry_delay(attempts) if retryable else None
+            logger.error(f"Webhook {event['event_type']} delivery {event['delivery_id']} failed "
+                         f"(attempt {attempts}): {e}")
+            try:
+                self.inbox.fail(event['id'], str(e), retry_in)
+            except Exception as db_error:
+                logger.error(f"Failed to record webhook failure: {db_error}")
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+            # 同一仓库的下一个事件现在可以领取了
+            self._wakeup.set()
@@ -0,0 +1,282 @@
+"""
+Git worktree 池 - 每个分支一个可复用的 worktree，不同分支的任务可以在同一个仓库上并行执行
+
+所有 worktree 共享仓库的对象库，不需要额外克隆；空闲的 worktree 按 LRU 淘汰，
+有未提交修改的 worktree 不会被自动删除。
+"""
+import hashlib
+import logging
+import re
+import shutil
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# 池中最多保留的 worktree 数量（超过时淘汰最久未使用的空闲 worktree）
+DEFAULT_MAX_WORKTREES = 16
+# 空闲超过该秒数的 worktree 在 cleanup() 时删除
+DEFAULT_IDLE_TTL = 24 * 3600
+# 等待同一分支的 worktree 释放的默认秒数
+DEFAULT_ACQUIRE_TIMEOUT = 30
+
+
+class WorktreeError(Exception):
+    """worktree 创建或租用失败"""
+
+
+class _Worktree:
+    def __init__(self, repo_path: str, branch: str, path: Path):
+        self.repo_path = repo_path
+        self.branch = branch
+        self.path = path
+        self.in_use = False
+        self.last_used = time.time()
+        # 分支正好是主工作区当前检出的分支时直接使用主工作区，不会被删除
+        self.is_main = False
+
+
+def _git(args: List[str], cwd: Union[str, Path], check: bool = True) -> subprocess.CompletedProcess:
+    result = subprocess.run(['git'] + args, cwd=str(cwd), capture_output=True, text=True)
+    if check and result.returncode != 0:
+        raise WorktreeError(f"git {' '.join(args)} failed: {result.stderr.strip() or result.stdout.strip()}")
+    return result
+
+
+class WorktreeManager:
+    """按 (仓库, 分支) 管理 worktree 的租用、复用和淘汰"""
+
+    def __init__(self, root_dir: Union[str, Path], max_worktrees: int = DEFAULT_MAX_WORKTREES,
+                 idle_ttl: float = DEFAULT_IDLE_TTL):
+        self.root_dir = Path(root_dir)
+        self.max_worktrees = max_worktrees
+        self.idle_ttl = idle_ttl
+        self._worktrees: Dict[Tuple[str, str], _Worktree] = {}
+        self._condition = threading.Condition()
+        # 同一仓库的 git worktree add/remove 修改共享的 .git 元数据，按仓库串行执行
+        self._repo_locks: Dict[str, threading.Lock] = {}
+
+    def _repo_lock(self, repo_path: str) -> threading.Lock:
+        with self._condition:
+            return self._repo_locks.setdefault(repo_path, threading.Lock())
+
+    def _worktree_path(self, repo_path: str, branch: str) -> Path:
+        repo_key = f"{Path(repo_path).name}-{hashlib.md5(repo_path.encode()).hexdigest()[:8]}"
+        # 替换字符后 feature/x 与 feature_x 同名，追加原分支名的哈希区分
+        branch_key = f"{re.sub(r'[^A-Za-z0-9._-]', '_', branch)}-{hashlib.md5(branch.encode()).hexdigest()[:8]}"
+        return self.root_dir / repo_key / branch_key
+
+    @staticmethod
+    def branch_exists(repo_path: Union[str, Path], branch: str) -> bool:
+        return _git(['rev-parse', '--verify', '--quiet', f'refs/heads/{branch}'],
+                    repo_path, check=False).returncode == 0
+
+    @staticmethod
+    def create_branch(repo_path: Union[str, Path], branch: str, base_branch: str = 'main'):
+        """在不切换工作区的情况下创建分支"""
+        _git(['branch', branch, base_branch], repo_path)
+
+    def acquire(self, repo_path: Union[str, Path], branch: str, base_branch: Optional[str] = None,
+                timeout: float = DEFAULT_ACQUIRE_TIMEOUT) -> str:
+        """租用分支的 worktree，返回其路径
+
+        分支不存在且提供了 base_branch 时从 base_branch 创建。同一分支同时只能被一个任务租用，
+        其他请求最多等待 timeout 秒。
+        """
+        self.reserve(repo_path, branch, timeout=timeout)
+        return self.prepare(repo_path, branch, base_branch=base_branch)
+
+    def reserve(self, repo_path: Union[str, Path], branch: str,
+                timeout: float = DEFAULT_ACQUIRE_TIMEOUT):
+        """只在内存中占用分支，不执行 git 命令；之后调用 prepare() 创建 worktree
+
+        请求线程可以用 timeout=0 立即得知分支是否被占用，把 git 操作留给后台作业。
+        """
+        repo_path = str(Path(repo_path).resolve())
+        key = (repo_path, branch)
+        deadline = time.monotonic() + timeout
+
+        with self._condition:
+            while True:
+                worktree = self._worktrees.get(key)
+                if worktree is None or not worktree.in_use:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise WorktreeError(f"Branch {branch} is busy in another task")
+                self._condition.wait(remaining)
+            if worktree is None:
+                worktree = _Worktree(repo_path, branch, self._worktree_path(repo_path, branch))
+                self._worktrees[key] = worktree
+            worktree.in_use = True
+            worktree.last_used = time.time()
+
+    def prepare(self, repo_path: Union[str, Path], branch: str,
+                base_branch: Optional[str] = None) -> str:
+        """为已占用的分支创建或校验 worktree，返回其路径；失败时解除占用"""
+        key = (str(Path(repo_path).resolve()), branch)
+        with self._condition:
+            worktree = self._worktrees.get(key)
+        if worktree is None or not worktree.in_use:
+            raise WorktreeError(f"Branch {branch} is not reserved")
+
+        try:
+            self._ensure_worktree(worktree, base_branch)
+        except Exception:
+            with self._condition:
+                self._worktrees.pop(key, None)
+                self._condition.notify_all()
+            raise
+
+        self._evict()
+        return str(worktree.path)
+
+    def release(self, repo_path: Union[str, Path], branch: str):
+        """归还 worktree，保留在池中供下次复用"""
+        key = (str(Path(repo_path).resolve()), branch)
+        with self._condition:
+            worktree = self._worktrees.get(key)
+            if worktree:
+                worktree.in_use = False
+                worktree.last_used = time.time()
+            self._condition.notify_all()
+
+    @contextmanager
+    def lease(self, repo_path: Union[str, Path], branch: str, base_branch: Optional[str] = None,
+              timeout: float = DEFAULT_ACQUIRE_TIMEOUT):
+        """with 语句形式的租用"""
+        path = self.acquire(repo_path, branch, base_branch=base_branch, timeout=timeout)
+        try:
+            yield path
+        finally:
+            self.release(repo_path, branch)
+
+    def _ensure_worktree(self, worktree: _Worktree, base_branch: Optional[str]):
+        path = worktree.path
+        with self._repo_lock(worktree.repo_path):
+            if worktree.is_main:
+                return
+            if (path / '.git').exists():
+                head = _git(['symbolic-ref', '--quiet', '--short', 'HEAD'], path, check=False)
+                if head.returncode == 0 and head.stdout.strip() == worktree.branch:
+                    # 复用已有 worktree（包括服务重启前创建的）
+                    return
+                # 目录中检出的不是请求的分支（被手动切换过或是别的分支留下的），不能直接复用
+                if self._is_dirty(worktree):
+                    raise WorktreeError(f"Worktree {path} has {head.stdout.strip() or 'a detached HEAD'} "
+                                        f"checked out with uncommitted changes, not {worktree.branch}")
+                _git(['worktree', 'remove', '--force', str(path)], worktree.repo_path, check=False)
+
+            current = _git(['symbolic-ref', '--quiet', '--short', 'HEAD'], worktree.repo_path, check=False)
+            if current.stdout.strip() == worktree.branch:
+                # git 不允许同一分支检出到两个 worktree
+                worktree.path = Path(worktree.repo_path)
+                worktree.is_main = True
+                return
+
+            if path.exists():
+                shutil.rmtree(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # 清理目录已被删除的 worktree 记录
+            _git(['worktree', 'prune'], worktree.repo_path, check=False)
+
+            if self.branch_exists(worktree.repo_path, worktree.branch):
+                _git(['worktree', 'add', str(path), worktree.branch], worktree.repo_path)
+            elif base_branch:
+                _git(['worktree', 'add', '-b', worktree.branch, str(path), base_branch], worktree.repo_path)
+            else:
+                raise WorktreeError(f"Branch {worktree.branch} does not exist")
+            logger.info(f"Created worktree for {worktree.branch} at {path}")
+
+    def _is_dirty(self, worktree: _Worktree) -> bool:
+        result = _git(['status', '--porcelain'], worktree.path, check=False)
+        return result.returncode != 0 or bool(result.stdout.strip())
+
+    def _remove(self, worktree: _Worktree):
+        if worktree.is_main:
+            return
+        with self._repo_lock(worktree.repo_path):
+            result = _git(['worktree', 'remove', '--force', str(worktree.path)],
+                          worktree.repo_path, check=False)
+            if result.returncode != 0 and worktree.path.exists():
+                shutil.rmtree(worktree.path, ignore_errors=True)
+                _git(['worktree', 'prune'], worktree.repo_path, check=False)
+        logger.info(f"Removed worktree for {worktree.branch} at {worktree.path}")
+
+    def _idle(self, predicate) -> List[_Worktree]:
+        """满足条件的空闲 worktree（最久未使用的在前）"""
+        with self._condition:
+            return sorted((w for w in self._worktrees.values() if not w.in_use and predicate(w)),
+                          key=lambda w: w.last_used)
+
+    def _evict(self):
+        """超出容量时淘汰最久未使用且没有未提交修改的空闲 worktree"""
+        with self._condition:
+            excess = len(self._worktrees) - self.max_worktrees
+        if excess <= 0:
+            return
+        for worktree in self._idle(lambda w: True):
+            if excess <= 0:
+                break
+            if self._is_dirty(worktree):
+                continue
+            if self._discard(worktree):
+                excess -= 1
+
+    def _discard(self, worktree: _Worktree) -> bool:
+        key = (worktree.repo_path, worktree.branch)
+        with self._condition:
+            # 取出后可能又被租用
+            if self._worktrees.get(key) is not worktree or worktree.in_use:
+                return False
+            del self._worktrees[key]
+        self._remove(worktree)
+        return True
+
+    def cleanup(self, idle_seconds: Optional[float] = None, force: bool = False) -> int:
+        """删除空闲超过 idle_seconds 的 worktree，返回删除的数量
+
+        force 为 False 时跳过有未提交修改的 worktree。
+        """
+        idle_seconds = self.idle_ttl if idle_seconds is None else idle_seconds
+        cutoff = time.time() - idle_seconds
+        removed = 0
+        for worktree in self._idle(lambda w: w.last_used <= cutoff):
+            if not force and self._is_dirty(worktree):
+                continue
+            if self._discard(worktree):
+                removed += 1
+        return removed
+
+    def remove_branch(self, repo_path: Union[str, Path], branch: str) -> bool:
+        """删除分支对应的 worktree（例如分支合并或删除后）"""
+        key = (str(Path(repo_path).resolve()), branch)
+        with self._condition:
+            worktree = self._worktrees.get(key)
+        return bool(worktree) and self._discard(worktree)
+
+    def list_worktrees(self) -> List[Dict]:
+        with self._condition:
+            return [{
+                'repo_path': w.repo_path,
+                'branch': w.branch,
+                'path': str(w.path),
+                'in_use': w.in_use,
+                'last_used': w.last_used
+            } for w in sorted(self._worktrees.values(), key=lambda w: w.last_used, reverse=True)]
+
+
+# Global worktree manager
+worktree_manager = None
+
+def get_worktree_manager() -> WorktreeManager:
+    """Get or create the global worktree manager."""
+    global worktree_manager
+    if worktree_manager is None:
+        from config import Config
+        worktree_manager = WorktreeManager(Config.WORKTREE_ROOT, max_worktrees=Config.MAX_WORKTREES)
+    return worktree_manager
@@ -17,10 +17,77 @@ def calculate_monthly_metrics():
     except Exception as e:
         print(f"[{datetime.now()}] 月度Agent指标计算失败: {str(e)}")
 
+def rollup_usage_events():
+    """汇总尚未处理的使用事件（写入时汇总失败的事件在这里补上）"""
+    try:
+        count = AgentMetricsManager().db.rollup()
+        if count:
+            print(f"[{datetime.now()}] 已汇总 {count} 条使用事件")
+    except Exception as e:
+        print(f"[{datetime.now()}] 使用事件汇总失败: {str(e)}")
+
+def prune_task_timeseries():
+    """清理过期的任务时序数据"""
+    try:
+        from models.task_timeseries import TaskTimeSeriesDB
+        deleted = TaskTimeSeriesDB().prune()
+        print(f"[{datetime.now()}] 已清理 {deleted} 条过期时序数据")
+    except Exception as e:
+        print(f"[{datetime.now()}] 时序数据清理失败: {str(e)}")
+
+def prune_webhook_inbox():
+    """清理已处理完的 webhook 投递"""
+    try:
+        from models.webhook_inbox import WebhookInbox
+        deleted = WebhookInbox().prune()
+        print(f"[{datetime.now()}] 已清理 {deleted} 条 webhook 投递")
+    except Exception as e:
+        print(f"[{datetime.now()}] webhook 投递清理失败: {str(e)}")
+
+def compact_webhook_events():
+    """压缩 webhook 事件日志：清空过期 payload，删除保留期外的月分表"""
+    try:
+        from models.webhook_event_log import WebhookEventLog
+        event_log = WebhookEventLog()
+        imported = event_log.import_legacy()
+        if imported:
+            print(f"[{datetime.now()}] 已迁移 {imported} 条旧 webhook 事件")
+        compacted = event_log.compact()
+        dropped = event_log.prune()
+        print(f"[{datetime.now()}] webhook 事件日志：清空 {compacted} 条 payload，删除 {dropped} 个月分表")
+    except Exception as e:
+        print(f"[{datetime.now()}] webhook 事件日志压缩失败: {str(e)}")
+
+def prune_github_etag_cache():
+    """清理长期未更新的 GitHub ETag 缓存"""
+    try:
+        from services.github_client import ETagCache
+        deleted = ETagCache(db_path="tasks.db").prune()
+        print(f"[{datetime.now()}] 已清理 {deleted} 条 GitHub ETag 缓存")
+    except Exception as e:
+        print(f"[{datetime.now()}] GitHub ETag 缓存清理失败: {str(e)}")
+
+def cleanup_expired_uploads():
+    """清理长时间未更新的分块上传会话（清单和预分配的 .part 文件）"""
+    try:
+        from services.upload_manager import get_upload_manager
+        removed = get_upload_manager().cleanup_expired()
+        print(f"[{datetime.now()}] 已清理 {removed} 个过期上传会话")
+    except Exception as e:
+        print(f"[{datetime.now()}] 过期上传会话清理失败: {str(e)}")
+
 def run_scheduler():
     """运行定时任务调度器"""
     # 每天凌晨1点运行
     schedule.every().day.at("01:00").do(calculate_monthly_metrics)
+    # 每5分钟汇总一次使用事件
+    schedule.every(5).minutes.do(rollup_usage_events)
+    # 每天清理过期时序数据
+    schedule.every().day.at("01:30").do(prune_task_timeseries)
+    schedule.every().day.at("01:45").do(prune_webhook_inbox)
+    schedule.every().day.at("02:00").do(compact_webhook_events)
+    schedule.every().day.at("02:15").do(prune_github_etag_cache)
+    schedule.every().day.at("02:30").do(cleanup_expired_uploads)
     
     # 立即运行一次
     calculate_monthly_metrics()
@@ -31,5 +98,21 @@ def run_scheduler():
         schedule.run_pending()
         time.sleep(60)  # 每分钟检查一次
 
+def backfill_metrics(start_month: str, end_month: str = None):
+    """回填指定月份区间的Agent指标"""
+    metrics_manager = AgentMetricsManager()
+    updated = metrics_manager.calculate_monthly_metrics(start_month, end_month)
+    print(f"[{datetime.now()}] 已回填 {start_month} ~ {end_month or start_month}，写入 {updated} 条记录")
+
 if __name__ == "__main__":
-    run_scheduler()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="月度Agent指标计算")
+    parser.add_argument('--backfill', nargs='+', metavar='YYYY-MM',
+                        help="回填月份区间：起始月份 [结束月份]，完成后退出")
+    args = parser.parse_args()
+
+    if args.backfill:
+        backfill_metrics(*args.backfill[:2])
+    else:
+        run_scheduler()
\ No newline at end of file
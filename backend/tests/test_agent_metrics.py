@@ -0,0 +1,204 @@
+import pytest
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+from models.task import Task, TaskDB
+from models.agent_metrics import AgentMetricsDB, AgentMetricsManager, RankingsCache
+from models.user import UserManager
+
+class TestAgentMetricsEvents:
+    """Test event-sourced agent metrics."""
+
+    @pytest.fixture
+    def metrics_db(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            yield AgentMetricsDB(str(Path(tmpdir) / "tasks.db"))
+
+    def test_events_roll_up(self, metrics_db):
+        """Test monthly and all-time aggregates after rollup."""
+        metrics_db.record_usage_event("u1", 1.0, month="2024-01")
+        metrics_db.record_usage_event("u1", 2.0, month="2024-02")
+        metrics_db.record_usage_event("u2", 0.5, month="2024-02")
+
+        assert metrics_db.rollup() == 3
+        assert metrics_db.rollup() == 0
+
+        february = metrics_db.get_monthly_rankings("2024-02")
+        assert [(r['user_id'], r['total_hours']) for r in february] == [("u1", 2.0), ("u2", 0.5)]
+        assert february[0]['cumulative_hours'] == 3.0
+
+        all_time = metrics_db.get_all_time_rankings()
+        assert all_time[0]['user_id'] == "u1"
+        assert all_time[0]['total_hours'] == 3.0
+        assert all_time[0]['total_tasks'] == 2
+
+    def test_cumulative_hours_stay_current(self, metrics_db):
+        """Test that a late event for an earlier month updates later cumulative values."""
+        metrics_db.update_user_metrics("u1", "2024-02", 2.0, 1)
+        metrics_db.update_user_metrics("u1", "2024-01", 1.0, 1)
+
+        assert metrics_db.get_user_metrics("u1", "2024-01")['cumulative_hours'] == 1.0
+        assert metrics_db.get_user_metrics("u1", "2024-02")['cumulative_hours'] == 3.0
+
+    def test_duplicate_task_reports_count_once(self, metrics_db):
+        """Test that the task ID deduplicates completion reports."""
+        manager = AgentMetricsManager(metrics_db.db_path)
+        manager.update_task_metrics("u1", 3600, task_id="t1")
+        manager.update_task_metrics("u1", 3600, task_id="t1")
+
+        assert manager.db.get_all_time_rankings()[0]['total_tasks'] == 1
+
+    def test_concurrent_completions_do_not_lose_increments(self, metrics_db):
+        """Test many threads recording and rolling up at once."""
+        manager = AgentMetricsManager(metrics_db.db_path)
+
+        def complete(worker):
+            for i in range(20):
+                manager.update_task_metrics("u1", 36, task_id=f"{worker}-{i}")
+
+        threads = [threading.Thread(target=complete, args=(w,)) for w in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        manager.db.rollup()
+
+        totals = manager.db.get_all_time_rankings()[0]
+        assert totals['total_tasks'] == 160
+        assert totals['total_hours'] == pytest.approx(1.6)
+
+    def test_existing_monthly_rows_seed_totals(self):
+        """Test migration of databases that only have agent_metrics rows."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = str(Path(tmpdir) / "tasks.db")
+            with sqlite3.connect(db_path) as conn:
+                conn.execute('''
+                    CREATE TABLE agent_metrics (
+                        user_id TEXT NOT NULL, month TEXT NOT NULL,
+                        total_hours REAL DEFAULT 0, total_tasks INTEGER DEFAULT 0,
+                        cumulative_hours REAL DEFAULT 0, agent_load REAL DEFAULT 0,
+                        rank INTEGER DEFAULT 0, updated_at TEXT NOT NULL,
+                        PRIMARY KEY (user_id, month)
+                    )
+                ''')
+                conn.execute("INSERT INTO agent_metrics VALUES ('u1', '2024-01', 4, 2, 4, 0, 0, '')")
+                conn.execute("INSERT INTO agent_metrics VALUES ('u1', '2024-02', 1, 1, 5, 0, 0, '')")
+
+            rankings = AgentMetricsDB(db_path).get_all_time_rankings()
+            assert rankings[0]['total_hours'] == 5.0
+            assert rankings[0]['total_tasks'] == 3
+
+
+class TestMonthlyRecalculation:
+    """Test set-based recomputation from the tasks table."""
+
+    @pytest.fixture
+    def db_path(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            yield str(Path(tmpdir) / "tasks.db")
+
+    def _save(self, task_db, task_id, user_id, completed_at, seconds, status='completed'):
+        task = Task(task_id, "prompt", "/tmp/project", user_id=user_id)
+        task.status = status
+        task.completed_at = completed_at
+        task.execution_time = seconds
+        task_db.save_task(task)
+
+    def test_recalculate_months(self, db_path):
+        """Test grouped aggregation over a month range."""
+        task_db = TaskDB(db_path)
+        self._save(task_db, "t1", "u1", datetime(2024, 1, 5), 3600)
+        self._save(task_db, "t2", "u1", "2024-01-31T23:30:00", 1800)
+        self._save(task_db, "t3", "u1", datetime(2024, 2, 1), 7200)
+        self._save(task_db, "t4", "u2", datetime(2024, 2, 10), 3600)
+        self._save(task_db, "t5", "u2", datetime(2024, 2, 11), 3600, status='failed')
+        self._save(task_db, "t6", "u2", datetime(2024, 3, 1), 3600)
+
+        manager = AgentMetricsManager(db_path)
+        assert manager.calculate_monthly_metrics("2024-01", "2024-02") == 3
+
+        january = manager.db.get_user_metrics("u1", "2024-01")
+        assert january['total_hours'] == 1.5
+        assert january['total_tasks'] == 2
+        assert manager.db.get_user_metrics("u1", "2024-02")['cumulative_hours'] == 3.5
+        assert manager.db.get_user_metrics("u2", "2024-02")['total_tasks'] == 1
+        assert manager.db.get_user_metrics("u2", "2024-03") is None
+
+    def test_recalculate_is_idempotent(self, db_path):
+        """Test that rerunning replaces rather than adds to the monthly totals."""
+        task_db = TaskDB(db_path)
+        self._save(task_db, "t1", "u1", datetime(2024, 1, 5), 3600)
+        manager = AgentMetricsManager(db_path)
+
+        manager.calculate_monthly_metrics("2024-01")
+        manager.calculate_monthly_metrics("2024-01")
+
+        assert manager.db.get_user_metrics("u1", "2024-01")['total_hours'] == 1.0
+        assert manager.db.get_all_time_rankings()[0]['total_tasks'] == 1
+
+    def test_invalid_range(self, db_path):
+        """Test month validation."""
+        manager = AgentMetricsManager(db_path)
+        with pytest.raises(ValueError):
+            manager.calculate_monthly_metrics("2024-13")
+        with pytest.raises(ValueError):
+            manager.calculate_monthly_metrics("2024-05", "2024-01")
+
+
+class TestRankingsCache:
+    """Test cached leaderboard snapshots."""
+
+    @pytest.fixture
+    def db_path(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            yield str(Path(tmpdir) / "tasks.db")
+
+    def test_rankings_enriched_and_limited(self, db_path):
+        """Test user info, employee index and limit on the snapshot."""
+        user_manager = UserManager(db_path)
+        alice = user_manager.create_user("alice@example.com", "pw")
+        bob = user_manager.create_user("bob@example.com", "pw")
+        metrics_db = AgentMetricsDB(db_path)
+        metrics_db.update_user_metrics(alice.id, "2024-01", 72.0, 3)
+        metrics_db.update_user_metrics(bob.id, "2024-01", 36.0, 1)
+        metrics_db.update_user_metrics("ghost", "2024-01", 1.0, 1)
+
+        cache = RankingsCache(metrics_db)
+        rankings = cache.get_rankings('monthly', 2, month="2024-01")
+
+        assert [r['email'] for r in rankings] == ["alice@example.com", "bob@example.com"]
+        assert rankings[0]['employee_index'] == 0.1
+        assert metrics_db.get_monthly_rankings("2024-01", limit=1)[0]['user_id'] == alice.id
+        assert cache.get_rankings('monthly', 3, month="2024-01")[2]['user_email'] == 'unknown@example.com'
+
+    def test_snapshot_invalidated_by_rollup(self, db_path):
+        """Test that cached rankings refresh after new events are rolled up."""
+        metrics_db = AgentMetricsDB(db_path)
+        metrics_db.update_user_metrics("u1", "2024-01", 1.0, 1)
+        cache = RankingsCache(metrics_db, ttl=3600)
+
+        assert cache.get_rankings('monthly', month="2024-01")[0]['total_hours'] == 1.0
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("UPDATE agent_metrics SET total_hours = 99")
+        # 外部修改在 TTL 内不可见
+        assert cache.get_rankings('monthly', month="2024-01")[0]['total_hours'] == 1.0
+
+        metrics_db.update_user_metrics("u1", "2024-01", 1.0, 1)
+        assert cache.get_rankings('monthly', month="2024-01")[0]['total_hours'] == 100.0
+
+    def test_user_history_single_query(self, db_path):
+        """Test per-month metrics and ranks over a month range."""
+        metrics_db = AgentMetricsDB(db_path)
+        metrics_db.update_user_metrics("u1", "2024-01", 5.0, 1)
+        metrics_db.update_user_metrics("u2", "2024-01", 9.0, 1)
+        metrics_db.update_user_metrics("u1", "2024-03", 2.0, 1)
+        metrics_db.update_user_metrics("u1", "2024-06", 2.0, 1)
+
+        history = metrics_db.get_user_history("u1", "2024-01", "2024-04")
+
+        assert set(history) == {"2024-01", "2024-03"}
+        assert history["2024-01"]['rank'] == 2
+        assert history["2024-03"]['rank'] == 1
+        assert metrics_db.get_user_metrics("u1", "2024-01")['rank'] == 2
@@ -266,4 +266,102 @@ class TestAPIRoutes:
         
         # Test directory instead of file
         response = client.get('/api/files/test_project')
-        assert response.status_code == 400
\ No newline at end of file
+        assert response.status_code == 400
+    
+    def test_get_file_content_streaming(self, client, tmp_path, monkeypatch):
+        """Test range, conditional and line window reads."""
+        from config import Config
+        projects_dir = tmp_path / 'projects'
+        (projects_dir / 'test_project').mkdir(parents=True)
+        (projects_dir / 'test_project' / 'log.txt').write_text(
+            ''.join(f'line {i}\n' for i in range(100)))
+        monkeypatch.setattr(Config, 'PROJECTS_DIR', projects_dir)
+        
+        response = client.get('/api/files/test_project/log.txt')
+        assert response.status_code == 200
+        etag = response.headers['ETag']
+        assert json.loads(response.data)['content'].startswith('line 0\n')
+        
+        # Conditional request
+        response = client.get('/api/files/test_project/log.txt',
+                              headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        
+        # Range request
+        response = client.get('/api/files/test_project/log.txt',
+                              headers={'Range': 'bytes=0-5'})
+        assert response.status_code == 206
+        assert response.data == b'line 0'
+        
+        # Line window
+        response = client.get('/api/files/test_project/log.txt?start_line=10&max_lines=5')
+        data = json.loads(response.data)
+        assert data['lines'] == [f'line {i}' for i in range(10, 15)]
+        assert data['has_more'] is True
+    
+    def test_save_file_if_match(self, client, tmp_path, monkeypatch):
+        """Test that saves with a stale If-Match are rejected."""
+        from config import Config
+        projects_dir = tmp_path / 'projects'
+        (projects_dir / 'test_project').mkdir(parents=True)
+        (projects_dir / 'test_project' / 'a.txt').write_text('v1')
+        monkeypatch.setattr(Config, 'PROJECTS_DIR', projects_dir)
+        
+        etag = json.loads(client.get('/api/files/test_project/a.txt').data)['etag']
+        response = client.put('/api/files/test_project/a.txt', json={'content': 'v2'},
+                              headers={'If-Match': f'"{etag}"'})
+        assert response.status_code == 200
+        new_etag = json.loads(response.data)['etag']
+        assert new_etag != etag
+        
+        # Stale validator
+        response = client.put('/api/files/test_project/a.txt', json={'content': 'v3'},
+                              headers={'If-Match': f'"{etag}"'})
+        assert response.status_code == 412
+        assert (projects_dir / 'test_project' / 'a.txt').read_text() == 'v2'
+        
+        # No If-Match: unconditional save
+        response = client.put('/api/files/test_project/a.txt', json={'content': 'v3'})
+        assert response.status_code == 200
+    
+    def test_chunked_upload_dedupes_within_project(self, client, tmp_path, monkeypatch):
+        """Test that content dedupe never copies a file from another project."""
+        import hashlib
+        import services.upload_manager
+        from config import Config
+        from services.file_hash_cache import FileHashCache
+        from services.upload_manager import UploadManager
+        projects_dir = tmp_path / 'projects'
+        data = b'secret data'
+        sha256 = hashlib.sha256(data).hexdigest()
+        cache = FileHashCache(db_path=str(tmp_path / 'hashes.db'))
+        for name in ('private', 'mine'):
+            (projects_dir / name).mkdir(parents=True)
+        (projects_dir / 'private' / 'key.txt').write_bytes(data)
+        cache.record(projects_dir / 'private' / 'key.txt',
+                     {'md5': hashlib.md5(data).hexdigest(), 'sha256': sha256})
+        monkeypatch.setattr(Config, 'PROJECTS_DIR', projects_dir)
+        monkeypatch.setattr(services.upload_manager, 'upload_manager',
+                            UploadManager(tmp_path / 'uploads', hash_cache=cache))
+        
+        body = {'project': 'mine', 'filename': 'copy.txt', 'size': len(data), 'sha256': sha256}
+        response = client.post('/api/files/uploads', json=body)
+        assert response.status_code == 201
+        assert json.loads(response.data)['status'] != 'completed'
+        assert not (projects_dir / 'mine' / 'copy.txt').exists()
+        
+        # Same project: copied on the server
+        response = client.post('/api/files/uploads', json=dict(body, project='private'))
+        assert json.loads(response.data)['status'] == 'completed'
+        assert (projects_dir / 'private' / 'copy.txt').read_bytes() == data
+    
+    def test_task_chain_rejects_bad_numeric_options(self, client, tmp_path):
+        """Test that invalid max_parallel/max_retries are a 400 before anything is created."""
+        body = {'project_path': str(tmp_path), 'tasks': [{'prompt': 'a'}, {'prompt': 'b'}]}
+        for options in ({'max_retries': 'abc'}, {'max_parallel': 'x'}, {'max_parallel': 0},
+                        {'max_retries': -1}, {'max_parallel': None}):
+            with patch('routes.api.get_executor') as mock_get_executor:
+                response = client.post('/api/task-chains', json=dict(body, **options))
+            assert response.status_code == 400, options
+            mock_get_executor.assert_not_called()
+
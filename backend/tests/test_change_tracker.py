@@ -0,0 +1,99 @@
+import pytest
+import subprocess
+import tempfile
+from pathlib import Path
+from services.change_tracker import WorkspaceSnapshot, compute_changes, summarize_changes
+
+
+def git(args, cwd):
+    result = subprocess.run(['git'] + args, cwd=str(cwd), capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return result.stdout.strip()
+
+
+@pytest.fixture
+def repo():
+    """A repository with two committed files and one pre-existing uncommitted edit."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir)
+        git(['init', '-q', '-b', 'main'], path)
+        git(['config', 'user.name', 'test'], path)
+        git(['config', 'user.email', 'test@example.com'], path)
+        (path / 'keep.py').write_text('a\nb\n')
+        (path / 'edit.py').write_text('one\ntwo\n')
+        (path / 'dirty.py').write_text('x\n')
+        git(['add', '.'], path)
+        git(['commit', '-q', '-m', 'init'], path)
+        (path / 'dirty.py').write_text('x\ny\n')
+        yield path
+
+
+def by_path(changes):
+    return {change['path']: change for change in changes}
+
+
+class TestGitChanges:
+    """Test change detection in git repositories."""
+
+    def test_working_tree_changes(self, repo):
+        """Test that only files touched after the snapshot are reported."""
+        snapshot = WorkspaceSnapshot.take(repo)
+        assert snapshot.is_git
+
+        (repo / 'edit.py').write_text('one\n2\nthree\n')
+        (repo / 'new dir').mkdir()
+        (repo / 'new dir' / 'new.txt').write_text('l1\nl2\nl3\n')
+        (repo / 'keep.py').unlink()
+
+        changes = by_path(compute_changes(snapshot))
+        assert set(changes) == {'edit.py', 'new dir/new.txt', 'keep.py'}
+        assert changes['edit.py']['status'] == 'M'
+        assert (changes['edit.py']['additions'], changes['edit.py']['deletions']) == (2, 1)
+        assert changes['new dir/new.txt']['status'] == 'A'
+        assert changes['new dir/new.txt']['additions'] == 3
+        assert changes['keep.py']['status'] == 'D'
+        assert changes['keep.py']['deletions'] == 2
+
+    def test_committed_changes(self, repo):
+        """Test that changes the task committed itself are included."""
+        snapshot = WorkspaceSnapshot.take(repo)
+        (repo / 'added.py').write_text('print(1)\n')
+        git(['add', 'added.py'], repo)
+        git(['commit', '-q', '-m', 'task commit'], repo)
+
+        changes = by_path(compute_changes(snapshot))
+        assert set(changes) == {'added.py'}
+        assert changes['added.py']['status'] == 'A'
+        assert changes['added.py']['additions'] == 1
+
+    def test_no_changes(self, repo):
+        """Test that a task that touches nothing reports nothing."""
+        snapshot = WorkspaceSnapshot.take(repo)
+        assert compute_changes(snapshot) == []
+
+
+class TestManifestChanges:
+    """Test change detection in plain directories."""
+
+    def test_plain_directory(self):
+        """Test the stat manifest for directories that are not repositories."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            root = Path(tmpdir)
+            (root / 'a.txt').write_text('a')
+            (root / 'b.txt').write_text('b')
+            (root / 'node_modules').mkdir()
+            snapshot = WorkspaceSnapshot.take(root)
+            assert not snapshot.is_git
+
+            (root / 'a.txt').write_text('changed')
+            (root / 'b.txt').unlink()
+            (root / 'c.txt').write_text('1\n2\n')
+            (root / 'node_modules' / 'ignored.js').write_text('x')
+
+            changes = compute_changes(snapshot)
+            assert [(c['path'], c['status']) for c in changes] == [
+                ('a.txt', 'M'), ('b.txt', 'D'), ('c.txt', 'A')]
+
+            stats = summarize_changes(changes)
+            assert stats['files_count'] == 3
+            assert stats['additions'] == 2
@@ -172,6 +172,30 @@ class TestClaudeExecutor:
         assert task.status in ['running', 'completed']
         assert mock_popen.called
         
+    def test_overlapping_runs_are_ambiguous(self, executor, tmp_path):
+        """Test that changes of tasks running in the same tree at the same time are flagged."""
+        (tmp_path / "sub").mkdir()
+        first = Task('t1', 'first', str(tmp_path))
+        second = Task('t2', 'second', str(tmp_path / "sub"))
+        first_snapshot = executor._take_snapshot(first)
+        second_snapshot = executor._take_snapshot(second)
+        (tmp_path / "a.txt").write_text("a\n")
+        (tmp_path / "sub" / "b.txt").write_text("b\n")
+        
+        executor._record_changes(first, first_snapshot)
+        executor._record_changes(second, second_snapshot)
+        assert sorted(first.files_changed) == ['a.txt', 'sub/b.txt']
+        assert first.diff_stats['ambiguous'] is True
+        assert second.diff_stats['ambiguous'] is True
+        
+        # A later run on its own is not ambiguous
+        third = Task('t3', 'third', str(tmp_path))
+        third_snapshot = executor._take_snapshot(third)
+        (tmp_path / "c.txt").write_text("c\n")
+        executor._record_changes(third, third_snapshot)
+        assert third.files_changed == ['c.txt']
+        assert 'ambiguous' not in third.diff_stats
+        
     def test_cleanup(self, executor):
         """Test executor cleanup."""
         # Add a task
@@ -0,0 +1,75 @@
+import pytest
+import tempfile
+from pathlib import Path
+from services.context_builder import (
+    ContextCollector, TaskContextStore, format_upstream_context, record_from_output,
+    CONTEXT_BYTE_BUDGET, MAX_SALIENT_LINES
+)
+
+class TestContextCollector:
+    """Test streaming context collection."""
+
+    def test_summary_head_and_tail(self):
+        """Test that the summary keeps the first two and last three lines."""
+        collector = ContextCollector("t1")
+        for i in range(1000):
+            collector.feed(f"line {i}\n")
+
+        assert collector.summary() == "line 0\nline 1\n...\nline 997\nline 998\nline 999"
+        assert collector.line_count == 1000
+
+    def test_short_output_is_kept_whole(self):
+        """Test outputs of up to five lines."""
+        record = record_from_output("t1", "a\nb\nc\n")
+        assert record['summary'] == "a\nb\nc"
+        assert record_from_output("t2", "")['summary'] == "无输出"
+
+    def test_salient_lines_are_bounded(self):
+        """Test that only the most recent salient lines are kept."""
+        collector = ContextCollector("t1")
+        for i in range(50):
+            collector.feed(f"Created file_{i}.py")
+            collector.feed("noise " * 10)
+        collector.feed("Build FAILED: missing module")
+
+        salient = collector.salient()
+        assert len(salient) == MAX_SALIENT_LINES
+        assert salient[-1] == "错误: Build FAILED: missing module"
+        assert salient[0] == "Created file_41.py"
+
+    def test_record_respects_byte_budget(self):
+        """Test that long lines are clipped and the record stays within budget."""
+        collector = ContextCollector("t1")
+        for i in range(20):
+            collector.feed(f"wrote {'x' * 5000} {i}")
+
+        record = collector.to_record()
+        size = len(record['summary'].encode()) + sum(len(line.encode()) + 1 for line in record['salient'])
+        assert size <= CONTEXT_BYTE_BUDGET
+        assert record['salient'][-1].startswith("wrote")
+
+    def test_upstream_budget_keeps_most_recent(self):
+        """Test that older upstream records are dropped first."""
+        records = [{'label': f"子任务 {i}", 'summary': 's' * 100, 'salient': []} for i in range(10)]
+        parts = format_upstream_context(records, budget=500)
+
+        assert "省略" in parts[0]
+        assert parts[-1].startswith("\n子任务 9")
+
+
+class TestTaskContextStore:
+    """Test persisted context records."""
+
+    def test_save_and_load(self):
+        """Test upsert and batch lookup."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = TaskContextStore(str(Path(tmpdir) / "tasks.db"))
+            store.save(record_from_output("a", "Created a.py\ndone"))
+            store.save(record_from_output("a", "Created b.py\ndone"))
+            store.save(record_from_output("b", "ok"))
+
+            records = store.get_many(["a", "b", "missing"])
+            assert set(records) == {"a", "b"}
+            assert records["a"]['salient'] == ["Created b.py"]
+            assert store.get("b")['summary'] == "ok"
+            assert store.get("missing") is None
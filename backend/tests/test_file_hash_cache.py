@@ -0,0 +1,84 @@
+import hashlib
+import os
+import pytest
+from pathlib import Path
+from services import file_hash_cache
+from services.file_hash_cache import FileHashCache, compute_digests
+
+
+class TestFileHashCache:
+    """Test FileHashCache service."""
+    
+    @pytest.fixture
+    def cache(self, tmp_path):
+        """Create a persistent hash cache."""
+        return FileHashCache(db_path=str(tmp_path / 'hashes.db'))
+    
+    def _age(self, path: Path):
+        """Push mtime outside the racy window so results get persisted."""
+        old = path.stat().st_mtime - 60
+        os.utime(path, (old, old))
+    
+    def test_compute_digests(self, tmp_path, monkeypatch):
+        """Test single-pass digests match hashlib for both read paths."""
+        data = os.urandom(300 * 1024)
+        test_file = tmp_path / 'data.bin'
+        test_file.write_bytes(data)
+        expected = {
+            'md5': hashlib.md5(data).hexdigest(),
+            'sha256': hashlib.sha256(data).hexdigest()
+        }
+        
+        assert compute_digests(test_file) == expected
+        
+        # Force the mmap path
+        monkeypatch.setattr(file_hash_cache, 'MMAP_THRESHOLD', 1)
+        assert compute_digests(test_file) == expected
+    
+    def test_cache_hit_for_unchanged_file(self, cache, tmp_path, monkeypatch):
+        """Test unchanged files are not re-read."""
+        test_file = tmp_path / 'a.txt'
+        test_file.write_text('content')
+        self._age(test_file)
+        
+        first = cache.get_digests(test_file)
+        assert cache.misses == 1
+        
+        def fail(*args, **kwargs):
+            raise AssertionError('file should not be hashed again')
+        monkeypatch.setattr(file_hash_cache, 'compute_digests', fail)
+        
+        assert cache.get_digests(test_file) == first
+        
+        # A fresh instance still hits through the persistent table
+        reopened = FileHashCache(db_path=cache.db_path)
+        assert reopened.get_digests(test_file) == first
+        assert reopened.misses == 0
+    
+    def test_cache_invalidated_on_change(self, cache, tmp_path):
+        """Test modified files are hashed again."""
+        test_file = tmp_path / 'a.txt'
+        test_file.write_text('v1')
+        self._age(test_file)
+        first = cache.get_digests(test_file)
+        
+        test_file.write_text('version 2')
+        second = cache.get_digests(test_file)
+        assert second['sha256'] != first['sha256']
+        assert second['sha256'] == hashlib.sha256(b'version 2').hexdigest()
+    
+    def test_find_by_digest(self, cache, tmp_path):
+        """Test content lookup used by dedupe."""
+        test_file = tmp_path / 'project' / 'a.txt'
+        test_file.parent.mkdir()
+        test_file.write_text('shared content')
+        self._age(test_file)
+        digests = cache.get_digests(test_file)
+        
+        assert cache.find_by_digest(digests['sha256']) == test_file.resolve()
+        assert cache.find_by_digest(digests['sha256'], within=tmp_path / 'project') is not None
+        assert cache.find_by_digest(digests['sha256'], within=tmp_path / 'other') is None
+        
+        # Stale entries are ignored
+        test_file.write_text('changed')
+        assert cache.find_by_digest(digests['sha256']) is None
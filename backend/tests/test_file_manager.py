@@ -1,7 +1,10 @@
 import pytest
+import codecs
 import tempfile
 from pathlib import Path
-from services.file_manager import FileManager
+import services.file_hash_cache
+from services.file_hash_cache import FileHashCache
+from services.file_manager import FileManager, detect_encoding
 
 class TestFileManager:
     """Test FileManager service."""
@@ -12,6 +15,13 @@ class TestFileManager:
         with tempfile.TemporaryDirectory() as tmpdir:
             yield Path(tmpdir)
     
+    @pytest.fixture(autouse=True)
+    def shared_hash_cache(self, temp_dir, monkeypatch):
+        """Keep the global hash cache out of the working directory."""
+        cache = FileHashCache()
+        monkeypatch.setattr(services.file_hash_cache, 'hash_cache', cache)
+        return cache
+    
     @pytest.fixture
     def file_manager(self, temp_dir):
         """Create FileManager instance."""
@@ -23,6 +33,14 @@ class TestFileManager:
         assert fm.base_path == temp_dir.resolve()
         assert fm.base_path.exists()
     
+    def test_hash_cache_shared_across_instances(self, temp_dir, shared_hash_cache):
+        """Test that per-request FileManagers reuse the global hash cache."""
+        (temp_dir / "data.bin").write_bytes(b"payload")
+        first = FileManager(temp_dir)
+        assert first.hash_cache is shared_hash_cache
+        digests = first.hash_cache.get_digests(temp_dir / "data.bin")
+        assert FileManager(temp_dir).hash_cache.get_digests(temp_dir / "data.bin") == digests
+    
     def test_validate_path(self, file_manager, temp_dir):
         """Test path validation."""
         # Valid paths
@@ -286,4 +304,97 @@ class TestFileManager:
         # Export with max depth
         tree = file_manager.export_directory_tree(max_depth=1)
         dir1 = next(c for c in tree['children'] if c['name'] == 'dir1')
-        assert 'children' not in dir1 or len(dir1.get('children', [])) == 0
\ No newline at end of file
+        assert 'children' not in dir1 or len(dir1.get('children', [])) == 0
+    
+    def test_detect_encoding(self):
+        """Test encoding detection from a prefix sample."""
+        assert detect_encoding('héllo'.encode('utf-8'), at_eof=True) == 'utf-8'
+        assert detect_encoding('中文内容'.encode('gbk'), at_eof=True) == 'gbk'
+        assert detect_encoding(codecs.BOM_UTF8 + b'abc', at_eof=True) == 'utf-8-sig'
+        assert detect_encoding('abc'.encode('utf-16'), at_eof=True) == 'utf-16'
+        
+        # A sample cut in the middle of a multi-byte character is still utf-8
+        truncated = 'ab中'.encode('utf-8')[:-1]
+        assert detect_encoding(truncated) == 'utf-8'
+    
+    def test_read_text(self, file_manager, temp_dir):
+        """Test single-pass text read with detected encoding."""
+        (temp_dir / "gbk.txt").write_bytes('你好，世界'.encode('gbk'))
+        
+        result = file_manager.read_text("gbk.txt")
+        assert result['encoding'] == 'gbk'
+        assert result['content'] == '你好，世界'
+        
+        with pytest.raises(FileNotFoundError):
+            file_manager.read_text("nonexistent.txt")
+    
+    def test_read_line_window(self, file_manager, temp_dir):
+        """Test paged line window reads."""
+        (temp_dir / "log.txt").write_text(
+            "".join(f"line {i}\n" for i in range(25)))
+        
+        page = file_manager.read_line_window("log.txt", max_lines=10)
+        assert page['lines'][0] == 'line 0'
+        assert page['end_line'] == 10
+        assert page['has_more'] is True
+        
+        # Continue from the byte cursor
+        page = file_manager.read_line_window(
+            "log.txt", start_line=10, max_lines=10, offset=page['next_offset'])
+        assert page['lines'][0] == 'line 10'
+        assert page['lines'][-1] == 'line 19'
+        
+        # Line-number addressing gives the same result
+        by_line = file_manager.read_line_window("log.txt", start_line=20, max_lines=10)
+        assert by_line['lines'] == [f'line {i}' for i in range(20, 25)]
+        assert by_line['has_more'] is False
+        assert by_line['next_offset'] is None
+    
+    def test_get_etag(self, file_manager, temp_dir):
+        """Test entity tag changes with content."""
+        test_file = temp_dir / "etag.txt"
+        test_file.write_text("v1")
+        etag = file_manager.get_etag("etag.txt")
+        
+        assert etag == file_manager.get_etag("etag.txt")
+        
+        test_file.write_text("version 2")
+        assert etag != file_manager.get_etag("etag.txt")
+    
+    def test_recursive_listing_prunes_hidden_and_ignored(self, temp_dir):
+        """Test hidden and ignored directories are pruned."""
+        (temp_dir / "src").mkdir()
+        (temp_dir / "src/app.py").write_text("app")
+        (temp_dir / ".git").mkdir()
+        (temp_dir / ".git/config").write_text("cfg")
+        (temp_dir / "node_modules/pkg").mkdir(parents=True)
+        (temp_dir / "node_modules/pkg/index.js").write_text("js")
+        
+        fm = FileManager(temp_dir, ignore_dirs=['node_modules'], max_workers=4)
+        paths = {item['path'] for item in fm.list_directory(recursive=True)}
+        assert paths == {'src', 'src/app.py'}
+        
+        paths = {item['path'] for item in fm.list_directory(recursive=True, show_hidden=True)}
+        assert '.git/config' in paths
+        assert not any(p.startswith('node_modules') for p in paths)
+        
+        results = fm.search_files("APP")
+        assert [r['path'] for r in results] == ['src/app.py']
+    
+    def test_directory_size_cache_invalidation(self, file_manager, temp_dir):
+        """Test cached directory sizes follow writes."""
+        (temp_dir / "a/b").mkdir(parents=True)
+        (temp_dir / "a/b/file.txt").write_text("12345")
+        assert file_manager.get_directory_size() == 5
+        
+        # In-place writes through the manager invalidate the cache
+        file_manager.write_file("a/b/file.txt", "1234567890")
+        assert file_manager.get_directory_size() == 10
+        
+        # New entries change the directory mtime
+        (temp_dir / "a/new.txt").write_text("123")
+        assert file_manager.get_directory_size() == 13
+        assert file_manager.get_directory_size("a/b") == 10
+        
+        file_manager.delete("a/b", recursive=True)
+        assert file_manager.get_directory_size() == 3
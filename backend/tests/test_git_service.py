@@ -0,0 +1,145 @@
+import pytest
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from services.git_service import GitService, GitError, parse_status
+
+
+def git(args, cwd):
+    result = subprocess.run(['git'] + args, cwd=str(cwd), capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return result.stdout.strip()
+
+
+@pytest.fixture
+def repo():
+    """A repository with one commit on main."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / 'repo'
+        path.mkdir()
+        git(['init', '-q', '-b', 'main'], path)
+        git(['config', 'user.name', 'test'], path)
+        git(['config', 'user.email', 'test@example.com'], path)
+        (path / 'README.md').write_text('hello\n')
+        git(['add', '.'], path)
+        git(['commit', '-q', '-m', 'init'], path)
+        yield path
+
+
+@pytest.fixture
+def service():
+    service = GitService(max_workers=2, status_ttl=60)
+    yield service
+    service._pool.shutdown(wait=True)
+
+
+class TestParseStatus:
+    """Test porcelain v2 parsing."""
+
+    def test_parse_branch_and_changes(self):
+        """Test branch headers and changed entries."""
+        output = '\n'.join([
+            '# branch.oid abc123',
+            '# branch.head feature',
+            '# branch.upstream origin/feature',
+            '# branch.ab +2 -1',
+            '1 M. N... 100644 100644 100644 aaa bbb staged.py',
+            '1 .M N... 100644 100644 100644 aaa bbb edited file.py',
+            '? new.txt',
+        ])
+        status = parse_status(output)
+        assert status['branch'] == 'feature'
+        assert status['head'] == 'abc123'
+        assert (status['ahead'], status['behind']) == (2, 1)
+        assert status['staged'] == ['staged.py']
+        assert status['modified'] == ['edited file.py']
+        assert status['untracked'] == ['new.txt']
+        assert status['dirty'] is True
+
+
+class TestGitService:
+    """Test jobs, locking and the status cache."""
+
+    def test_commit_job(self, repo, service):
+        """Test that commits run as jobs and return the new SHA."""
+        (repo / 'a.txt').write_text('a')
+        job = service.submit(repo, 'commit', service.commit, repo, 'add a')
+        assert job.wait(10)
+        assert job.status == 'completed'
+        assert job.result == git(['rev-parse', 'HEAD'], repo)
+        assert service.get_job(job.id) is job
+
+        empty = service.submit(repo, 'commit', service.commit, repo, 'nothing')
+        assert empty.wait(10)
+        assert empty.result is None
+
+    def test_commit_selected_paths(self, repo, service):
+        """Test that only the given paths are staged."""
+        (repo / 'a.txt').write_text('a')
+        (repo / 'b.txt').write_text('b')
+        (repo / 'README.md').unlink()
+        service.commit(repo, 'add a', paths=['a.txt', 'README.md'])
+
+        assert git(['show', '--name-status', '--format=', 'HEAD'], repo).split('\n') == [
+            'D\tREADME.md', 'A\ta.txt']
+        assert git(['status', '--porcelain'], repo) == '?? b.txt'
+
+    def test_failed_job_records_error(self, repo, service):
+        """Test that git failures mark the job failed."""
+        job = service.submit(repo, 'pull', service.pull, repo, 'main')
+        assert job.wait(10)
+        assert job.status == 'failed'
+        assert 'git pull' in job.error
+
+        with pytest.raises(GitError):
+            service.run(repo, ['rev-parse', 'missing-ref'])
+
+    def test_jobs_on_same_repo_are_serialized(self, repo, service):
+        """Test that the per-repository lock keeps jobs from overlapping."""
+        active = []
+        overlaps = []
+        lock = threading.Lock()
+
+        def work():
+            with lock:
+                active.append(1)
+                overlaps.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.pop()
+
+        jobs = [service.submit(repo, 'work', work) for _ in range(4)]
+        assert all(job.wait(10) for job in jobs)
+        assert max(overlaps) == 1
+
+    def test_status_cache_and_invalidation(self, repo, service):
+        """Test that cached status is reused until git metadata changes."""
+        status, job = service.get_cached_status(repo)
+        assert status is None
+        assert job.wait(10)
+
+        status, job = service.get_cached_status(repo)
+        assert job is None
+        assert status['branch'] == 'main'
+        assert status['dirty'] is False
+
+        # 服务外的提交改变 HEAD 引用，缓存失效
+        (repo / 'b.txt').write_text('b')
+        git(['add', '.'], repo)
+        git(['commit', '-q', '-m', 'add b'], repo)
+        stale, job = service.get_cached_status(repo)
+        assert stale is status
+        assert job.wait(10)
+        assert service.status(repo)['head'] == git(['rev-parse', 'HEAD'], repo)
+
+    def test_status_ttl(self, repo):
+        """Test that working tree edits show up after the TTL."""
+        service = GitService(max_workers=1, status_ttl=0)
+        try:
+            assert service.status(repo)['dirty'] is False
+            (repo / 'c.txt').write_text('c')
+            assert service.status(repo)['untracked'] == ['c.txt']
+        finally:
+            service._pool.shutdown(wait=True)
@@ -0,0 +1,202 @@
+import pytest
+import json
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+from services.github_client import ETagCache, GitHubAPIError, GitHubClient, RateLimitExceeded
+
+BRANCHES = [{'name': f'branch-{i}'} for i in range(5)]
+
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+    """A tiny stand-in for api.github.com with pagination, ETags and rate limits."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        self._handle()
+
+    def _handle(self):
+        server = self.server
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        with server.lock:
+            server.requests.append((self.command, url.path, dict(self.headers)))
+            server.connections.add(self.client_address)
+            hits = server.hits[url.path] = server.hits.get(url.path, 0) + 1
+
+        headers = {'X-RateLimit-Limit': '5000', 'X-RateLimit-Remaining': '4999',
+                   'X-RateLimit-Reset': str(int(time.time()) + 3600)}
+
+        if url.path == '/repos/o/r/branches':
+            per_page = int(query.get('per_page', 30))
+            page = int(query.get('page', 1))
+            items = BRANCHES[(page - 1) * per_page:page * per_page]
+            if page * per_page < len(BRANCHES):
+                base = f"http://{self.headers['Host']}{url.path}"
+                headers['Link'] = f'<{base}?per_page={per_page}&page={page + 1}>; rel="next"'
+            etag = f'"branches-{page}"'
+            if self.headers.get('If-None-Match') == etag:
+                return self._reply(304, None, headers)
+            headers['ETag'] = etag
+            return self._reply(200, items, headers)
+
+        if url.path == '/flaky' and hits == 1:
+            return self._reply(502, {'message': 'bad gateway'}, headers)
+
+        if url.path == '/limited' and hits == 1:
+            headers.update({'X-RateLimit-Remaining': '0',
+                            'X-RateLimit-Reset': str(int(time.time()) + server.reset_in)})
+            return self._reply(403, {'message': 'API rate limit exceeded'}, headers)
+
+        if url.path == '/last-call':
+            headers.update({'X-RateLimit-Remaining': '0',
+                            'X-RateLimit-Reset': str(int(time.time()) + 2)})
+
+        if url.path == '/missing':
+            return self._reply(404, {'message': 'Not Found'}, headers)
+
+        return self._reply(201 if self.command == 'POST' else 200, {'path': url.path}, headers)
+
+    def _reply(self, status, data, headers):
+        body = json.dumps(data).encode() if data is not None else b''
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGitHubHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.connections = set()
+    server.hits = {}
+    server.reset_in = 1
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def sleeps():
+    return []
+
+
+@pytest.fixture
+def client(server, sleeps):
+    client = GitHubClient('token', api_base=f'http://127.0.0.1:{server.server_address[1]}',
+                          retry_backoff=0.5, sleep=sleeps.append)
+    yield client
+    client.close()
+
+
+class TestGitHubClient:
+    """Test the GitHub client against a local fake server."""
+
+    def test_pagination_is_lazy(self, server, client):
+        """Test that pages are followed through Link headers only as items are consumed."""
+        items = client.paginate('repos/o/r/branches', per_page=2)
+        assert next(items) == BRANCHES[0]
+        assert len(server.requests) == 1
+
+        assert [BRANCHES[0]] + list(items) == BRANCHES
+        assert len(server.requests) == 3
+        assert server.requests[0][2]['Authorization'] == 'token token'
+
+    def test_conditional_requests(self, server, client):
+        """Test that unchanged pages are served from the ETag cache after a 304."""
+        first = list(client.paginate('repos/o/r/branches', per_page=2))
+        second = list(client.paginate('repos/o/r/branches', per_page=2))
+        assert first == second == BRANCHES
+
+        revalidations = server.requests[3:]
+        assert len(revalidations) == 3
+        assert revalidations[0][2]['If-None-Match'] == '"branches-1"'
+        assert client.get('repos/o/r/branches', params={'per_page': 2}).from_cache
+
+    def test_etag_cache_persists(self, server, sleeps):
+        """Test that a new client reuses ETags stored in SQLite."""
+        base = f'http://127.0.0.1:{server.server_address[1]}'
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = str(Path(tmpdir) / 'tasks.db')
+            GitHubClient('token', api_base=base, cache=ETagCache(db_path)).get('repos/o/r/branches')
+            response = GitHubClient('token', api_base=base, cache=ETagCache(db_path)).get(
+                'repos/o/r/branches')
+        assert response.status_code == 304
+        assert response.data == BRANCHES
+
+        # 其他 token 的缓存不共用
+        other = GitHubClient('other', api_base=base, cache=ETagCache())
+        assert other.get('repos/o/r/branches').status_code == 200
+
+    def test_etag_cache_prune(self):
+        """Test that persisted entries not updated within the retention are deleted."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = ETagCache(str(Path(tmpdir) / 'tasks.db'))
+            cache.set('old', '"o"', '[]')
+            cache.set('new', '"n"', '[]')
+            with cache.get_connection() as conn:
+                conn.execute("UPDATE github_etag_cache SET updated_at = '2020-01-01T00:00:00' "
+                             "WHERE cache_key = 'old'")
+                conn.commit()
+
+            assert cache.prune(retention_days=30) == 1
+            fresh = ETagCache(cache.db_path)
+            assert fresh.get('old') is None
+            assert fresh.get('new') == ('"n"', '[]', None)
+        assert ETagCache().prune() == 0
+
+    def test_connection_reuse(self, server, client):
+        """Test that keep-alive reuses one pooled connection."""
+        for _ in range(5):
+            client.get('ping', use_cache=False)
+        assert len(server.connections) == 1
+
+    def test_retries_server_errors(self, server, client, sleeps):
+        """Test exponential backoff on 5xx responses."""
+        assert client.get('flaky').data == {'path': '/flaky'}
+        assert server.hits['/flaky'] == 2
+        assert sleeps == [0.5]
+
+        with pytest.raises(GitHubAPIError) as error:
+            client.get('missing')
+        assert error.value.status_code == 404
+        assert server.hits['/missing'] == 1
+
+    def test_rate_limit_backoff(self, server, client, sleeps):
+        """Test that a rate-limited request waits for the reset and is retried."""
+        assert client.post('limited', json_data={'a': 1}).status_code == 201
+        assert server.hits['/limited'] == 2
+        assert len(sleeps) == 1 and 0 <= sleeps[0] <= 1
+
+    def test_rate_limit_too_long(self, server, client, sleeps):
+        """Test that long waits raise instead of blocking the caller."""
+        server.reset_in = 3600
+        with pytest.raises(RateLimitExceeded):
+            client.get('limited')
+        assert sleeps == []
+
+    def test_waits_before_request_when_exhausted(self, server, client, sleeps):
+        """Test that the next request waits when the last response used up the quota."""
+        client.get('last-call')
+        assert client.rate_limit['remaining'] == 0
+        client.get('ping')
+        assert len(sleeps) == 1 and 0 < sleeps[0] <= 2
@@ -0,0 +1,146 @@
+import pytest
+import sqlite3
+import tempfile
+from pathlib import Path
+from models.repository import Repository
+from services.github_sync import GitHubSyncEngine
+
+MIGRATION = Path(__file__).resolve().parent.parent / 'migrations' / 'github_architecture.sql'
+
+
+class FakeClient:
+    """Serves branches and issues the way GitHubClient.paginate would."""
+
+    def __init__(self):
+        self.branches = {}
+        self.issues = {}
+        self.calls = []
+
+    def paginate(self, path, params=None):
+        self.calls.append((path, dict(params or {})))
+        if path.endswith('/branches'):
+            for name, sha in self.branches.items():
+                yield {'name': name, 'commit': {'sha': sha}}
+            return
+        since = (params or {}).get('since')
+        for issue in sorted(self.issues.values(), key=lambda i: i['updated_at']):
+            if not since or issue['updated_at'] >= since:
+                yield issue
+
+    def set_issue(self, number, title, updated_at, state='open', labels=(), pull_request=False):
+        issue = {'number': number, 'title': title, 'body': f'body {number}', 'state': state,
+                 'created_at': '2026-01-01T00:00:00Z', 'updated_at': updated_at,
+                 'closed_at': updated_at if state == 'closed' else None,
+                 'labels': [{'name': label, 'color': 'ff0000'} for label in labels]}
+        if pull_request:
+            issue['pull_request'] = {}
+        self.issues[number] = issue
+
+
+@pytest.fixture
+def engine():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = str(Path(tmpdir) / 'tasks.db')
+        with sqlite3.connect(db_path) as conn:
+            conn.executescript(MIGRATION.read_text())
+        yield GitHubSyncEngine(FakeClient(), db_path)
+
+
+@pytest.fixture
+def repo():
+    return Repository(id='r1', name='demo', owner_id='u1')
+
+
+def rows(engine, sql):
+    with engine.get_connection() as conn:
+        return [tuple(row) for row in conn.execute(sql).fetchall()]
+
+
+class TestGitHubSyncEngine:
+    """Test batched branch and issue sync."""
+
+    def test_initial_sync(self, engine, repo):
+        """Test that the first sync inserts branches, issues and labels but skips pull requests."""
+        engine.client.branches = {'main': 'a1', 'feature': 'b1'}
+        engine.client.set_issue(1, 'First', '2026-01-02T00:00:00Z', labels=['bug'])
+        engine.client.set_issue(2, 'Done', '2026-01-03T00:00:00Z', state='closed')
+        engine.client.set_issue(3, 'A PR', '2026-01-04T00:00:00Z', pull_request=True)
+
+        stats = engine.sync_repository(repo, 'o', 'demo')
+        assert stats['branches'] == {'created': 2, 'updated': 0, 'removed': 0, 'total': 2}
+        assert stats['issues'] == {'created': 2, 'updated': 0, 'unchanged': 0}
+
+        assert rows(engine, 'SELECT name FROM branches ORDER BY name') == [('feature',), ('main',)]
+        assert rows(engine, 'SELECT number, title, status FROM issues ORDER BY number') == [
+            (1, 'First', 'open'), (2, 'Done', 'closed')]
+        assert rows(engine, 'SELECT label, color FROM issue_labels') == [('bug', '#ff0000')]
+        assert engine.get_cursor('r1', 'issues') == '2026-01-04T00:00:00Z'
+
+    def test_incremental_sync(self, engine, repo):
+        """Test that later syncs ask for issues since the cursor and only write real changes."""
+        engine.client.branches = {'main': 'a1', 'feature': 'b1'}
+        engine.client.set_issue(1, 'First', '2026-01-02T00:00:00Z')
+        engine.client.set_issue(2, 'Second', '2026-01-03T00:00:00Z')
+        engine.sync_repository(repo, 'o', 'demo')
+
+        with engine.get_connection() as conn:
+            conn.execute("UPDATE issues SET status = 'in_progress' WHERE number = 2")
+            conn.commit()
+
+        engine.client.branches = {'main': 'a2', 'hotfix': 'c1'}
+        engine.client.set_issue(1, 'First (renamed)', '2026-01-05T00:00:00Z')
+        engine.client.set_issue(2, 'Second', '2026-01-05T00:00:01Z')
+        stats = engine.sync_repository(repo, 'o', 'demo')
+
+        assert engine.client.calls[-1][1]['since'] == '2026-01-03T00:00:00Z'
+        assert stats['branches'] == {'created': 1, 'updated': 1, 'removed': 1, 'total': 2}
+        assert stats['issues'] == {'created': 0, 'updated': 1, 'unchanged': 1}
+        assert rows(engine, 'SELECT name, status FROM branches ORDER BY name') == [
+            ('feature', 'closed'), ('hotfix', 'draft'), ('main', 'draft')]
+        assert rows(engine, 'SELECT number, title, status FROM issues ORDER BY number') == [
+            (1, 'First (renamed)', 'open'), (2, 'Second', 'in_progress')]
+
+    def test_local_issues_are_not_overwritten(self, engine, repo):
+        """Test that local subtasks keep their numbers and GitHub issues get their own rows."""
+        with engine.get_connection() as conn:
+            conn.execute('''
+                INSERT INTO issues (id, number, title, description, repository_id, created_by)
+                VALUES ('local', 1, 'Local subtask: fix login', 'local body', 'r1', 'u1')
+            ''')
+            conn.commit()
+        engine.client.set_issue(1, 'GitHub: add docs', '2026-01-02T00:00:00Z')
+        assert engine.sync_repository(repo, 'o', 'demo')['issues']['created'] == 1
+
+        engine.client.set_issue(1, 'GitHub: add docs (edited)', '2026-01-03T00:00:00Z')
+        assert engine.sync_repository(repo, 'o', 'demo')['issues'] == {
+            'created': 0, 'updated': 1, 'unchanged': 0}
+        assert rows(engine, 'SELECT id, number, github_number, title FROM issues ORDER BY number') == [
+            ('local', 1, None, 'Local subtask: fix login'),
+            (rows(engine, 'SELECT id FROM issues WHERE github_number = 1')[0][0], 2, 1,
+             'GitHub: add docs (edited)')]
+
+    def test_local_branches_are_kept(self, engine, repo):
+        """Test that branches never seen on GitHub are not closed."""
+        with engine.get_connection() as conn:
+            conn.execute('''
+                INSERT INTO branches (id, name, repository_id, status, created_by)
+                VALUES ('b', 'local-only', 'r1', 'in_progress', 'u1')
+            ''')
+            conn.commit()
+        engine.client.branches = {'main': 'a1'}
+        engine.sync_repository(repo, 'o', 'demo')
+        assert rows(engine, "SELECT status FROM branches WHERE name = 'local-only'") == [('in_progress',)]
+
+    def test_failed_sync_writes_nothing(self, engine, repo, monkeypatch):
+        """Test that a failure while applying rolls back every change and cursor."""
+        engine.client.branches = {'main': 'a1'}
+        engine.client.set_issue(1, 'First', '2026-01-02T00:00:00Z')
+
+        def fail(*args):
+            raise RuntimeError('boom')
+
+        monkeypatch.setattr(engine, '_apply_issues', fail)
+        with pytest.raises(RuntimeError):
+            engine.sync_repository(repo, 'o', 'demo')
+        assert rows(engine, 'SELECT COUNT(*) FROM branches') == [(0,)]
+        assert engine.get_cursor('r1', 'branches') is None
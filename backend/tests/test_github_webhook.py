@@ -0,0 +1,60 @@
+import pytest
+import hashlib
+import hmac
+from services.github_webhook import GitHubWebhookHandler, WebhookPayload
+
+SECRET = 'test-secret'
+
+
+def sign(body: bytes) -> str:
+    return 'sha256=' + hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+
+class TestSignature:
+    """Test HMAC verification over the raw request body."""
+
+    def test_raw_bytes_are_verified_as_sent(self):
+        """Test that formatting GitHub sends (spaces, key order) does not break verification."""
+        handler = GitHubWebhookHandler(SECRET)
+        body = b'{"zen": "Keep it simple.",  "hook_id": 1}'
+        assert handler.verify_signature(body, sign(body))
+        assert not handler.verify_signature(body + b' ', sign(body))
+
+    def test_missing_signature_is_rejected_when_secret_is_set(self):
+        """Test that unsigned deliveries are rejected once a secret is configured."""
+        handler = GitHubWebhookHandler(SECRET)
+        assert not handler.verify_signature(b'{}', None)
+        result = handler.process_webhook('push', b'{}', None)
+        assert result['status'] == 'rejected'
+
+
+class TestWebhookPayload:
+    """Test lazy payload parsing."""
+
+    def test_ignored_events_are_not_parsed(self):
+        """Test that events without a handler never decode the payload."""
+        handler = GitHubWebhookHandler(SECRET)
+        payload = WebhookPayload(b'not even json')
+        result = handler.handle_event('watch', payload)
+        assert result['status'] == 'ignored'
+        assert not payload.parsed
+
+    def test_handled_events_parse_once(self):
+        """Test field access and handler results from raw bytes."""
+        body = b'{"ref": "refs/heads/main", "repository": {"full_name": "o/r"}, "commits": []}'
+        handler = GitHubWebhookHandler(SECRET)
+        result = handler.process_webhook('push', body, sign(body))
+        assert result['status'] == 'processed'
+        assert result['result']['repository'] == 'o/r'
+        assert result['result']['branch'] == 'main'
+
+        payload = WebhookPayload(body)
+        assert payload.field('repository', 'full_name') == 'o/r'
+        assert payload.field('repository', 'missing', default='x') == 'x'
+        assert payload.get('ref') == 'refs/heads/main'
+
+    def test_invalid_payload_raises_value_error(self):
+        """Test that unparsable payloads surface as ValueError rather than handler errors."""
+        handler = GitHubWebhookHandler(SECRET)
+        with pytest.raises(ValueError):
+            handler.handle_event('push', WebhookPayload(b'[1, 2]'))
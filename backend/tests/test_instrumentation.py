@@ -0,0 +1,110 @@
+import pytest
+from flask import Flask
+from utils.instrumentation import MetricsRegistry, instrument_socketio, get_registry
+
+class TestMetricsRegistry:
+    """Test counters, gauges, histograms and text exposition."""
+
+    def test_counter_and_gauge_render(self):
+        """Test sample lines for labelled counters and callback gauges."""
+        registry = MetricsRegistry()
+        counter = registry.counter('jobs_total', 'Jobs processed', ['status'])
+        counter.inc(status='ok')
+        counter.inc(2, status='failed')
+        queue = []
+        registry.gauge('queue_length', 'Queued jobs').set_function(lambda: len(queue))
+        queue.extend([1, 2, 3])
+
+        text = registry.render()
+
+        assert '# TYPE jobs_total counter' in text
+        assert 'jobs_total{status="failed"} 2' in text
+        assert 'jobs_total{status="ok"} 1' in text
+        assert 'queue_length 3' in text
+        assert registry.counter('jobs_total', 'Jobs processed', ['status']) is counter
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test bucket, sum and count lines."""
+        registry = MetricsRegistry()
+        histogram = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value)
+
+        text = registry.render()
+
+        assert 'latency_seconds_bucket{le="0.1"} 1' in text
+        assert 'latency_seconds_bucket{le="1"} 3' in text
+        assert 'latency_seconds_bucket{le="+Inf"} 4' in text
+        assert 'latency_seconds_sum 6.05' in text
+        assert 'latency_seconds_count 4' in text
+
+    def test_label_validation(self):
+        """Test wrong labels and conflicting registrations."""
+        registry = MetricsRegistry()
+        counter = registry.counter('c_total', 'c', ['a'])
+        with pytest.raises(ValueError):
+            counter.inc(b='x')
+        with pytest.raises(ValueError):
+            registry.gauge('c_total', 'c', ['a'])
+        with pytest.raises(ValueError):
+            counter.inc(-1, a='x')
+
+    def test_label_values_are_escaped(self):
+        """Test quoting in label values."""
+        registry = MetricsRegistry()
+        registry.counter('e_total', 'e', ['path']).inc(path='a"b\\c')
+        assert 'e_total{path="a\\"b\\\\c"} 1' in registry.render()
+
+    def test_socketio_emit_counter(self):
+        """Test that emits are counted at the server, including flask_socketio.emit in handlers."""
+        from flask import Flask
+        from flask_socketio import SocketIO, emit
+
+        app = Flask(__name__)
+        socketio = SocketIO(app, async_mode='threading')
+        instrument_socketio(socketio)
+        instrument_socketio(socketio)
+        counter = get_registry().counter('socketio_emits_total', '', ['event'])
+
+        @socketio.on('ping')
+        def handle_ping():
+            emit('pong', {'ok': True})
+
+        client = socketio.test_client(app)
+        before = counter.get(event='pong'), counter.get(event='task_output')
+        client.emit('ping')
+        socketio.emit('task_output', {'line': 'x'})
+
+        assert [message['name'] for message in client.get_received()] == ['pong', 'task_output']
+        assert counter.get(event='pong') == before[0] + 1
+        assert counter.get(event='task_output') == before[1] + 1
+
+    def test_socketio_not_initialized(self):
+        """Test that an uninitialized SocketIO is left alone."""
+        from flask_socketio import SocketIO
+        instrument_socketio(SocketIO())
+
+
+class TestMetricsEndpoint:
+    """Test the /metrics blueprint."""
+
+    def test_metrics_endpoint_records_requests(self):
+        """Test exposition output and per-endpoint request counters."""
+        from routes.metrics_api import metrics_bp, HTTP_REQUESTS
+
+        app = Flask(__name__)
+        app.register_blueprint(metrics_bp)
+
+        @app.route('/ping')
+        def ping():
+            return 'pong'
+
+        client = app.test_client()
+        before = HTTP_REQUESTS.get(method='GET', endpoint='ping', status='200')
+        client.get('/ping')
+        response = client.get('/metrics')
+
+        assert response.status_code == 200
+        assert response.mimetype == 'text/plain'
+        assert HTTP_REQUESTS.get(method='GET', endpoint='ping', status='200') == before + 1
+        assert 'http_request_duration_seconds_bucket' in response.get_data(as_text=True)
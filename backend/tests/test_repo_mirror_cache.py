@@ -0,0 +1,108 @@
+import pytest
+import subprocess
+import tempfile
+from pathlib import Path
+from services.repo_mirror_cache import RepoMirrorCache, normalize_url
+
+
+def git(args, cwd):
+    result = subprocess.run(['git'] + args, cwd=str(cwd), capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return result.stdout.strip()
+
+
+def commit_file(work, name, content):
+    (work / name).write_text(content)
+    git(['add', name], work)
+    git(['-c', 'user.name=test', '-c', 'user.email=test@example.com',
+         'commit', '-q', '-m', f'add {name}'], work)
+    git(['push', '-q', 'origin', 'main'], work)
+
+
+@pytest.fixture
+def remote():
+    """A local bare repository standing in for the GitHub remote, plus a working copy to push from."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp = Path(tmpdir)
+        origin = tmp / 'origin.git'
+        git(['init', '-q', '--bare', '-b', 'main', str(origin)], tmp)
+        work = tmp / 'work'
+        git(['clone', '-q', str(origin), str(work)], tmp)
+        git(['checkout', '-q', '-b', 'main'], work)
+        commit_file(work, 'README.md', 'hello\n')
+        yield tmp, origin, work
+
+
+class TestRepoMirrorCache:
+    """Test the bare-mirror cache against a local remote."""
+
+    def test_normalize_url(self):
+        """Test that credentials and .git suffixes do not change the mirror key."""
+        assert normalize_url('https://token@github.com/a/b.git') == 'https://github.com/a/b'
+        assert normalize_url('https://github.com/a/b/') == 'https://github.com/a/b'
+
+    def test_shared_clone_and_incremental_fetch(self, remote):
+        """Test that the mirror is created once and later clones fetch new commits."""
+        tmp, origin, work = remote
+        cache = RepoMirrorCache(tmp / 'mirrors', fetch_interval=0)
+
+        first = cache.clone(str(origin), tmp / 'clones' / 'a')
+        assert (first / 'README.md').read_text() == 'hello\n'
+        assert (first / '.git' / 'objects' / 'info' / 'alternates').exists()
+        mirror = cache.mirror_path(str(origin))
+        assert git(['config', 'gc.auto'], mirror) == '0'
+
+        commit_file(work, 'second.txt', 'more\n')
+        second = cache.clone(str(origin), tmp / 'clones' / 'b')
+        assert (second / 'second.txt').exists()
+        assert len(list((tmp / 'mirrors').iterdir())) == 1
+
+    def test_reclone_refreshes_existing_copy(self, remote):
+        """Test that re-importing into an existing clone updates it in place."""
+        tmp, origin, work = remote
+        cache = RepoMirrorCache(tmp / 'mirrors', fetch_interval=0)
+        local = cache.clone(str(origin), tmp / 'clone')
+        marker = local / '.git' / 'marker'
+        marker.write_text('kept')
+        (local / 'scratch.txt').write_text('untracked')
+
+        commit_file(work, 'second.txt', 'more\n')
+        cache.clone(str(origin), local)
+
+        assert marker.exists()
+        assert (local / 'second.txt').exists()
+        assert not (local / 'scratch.txt').exists()
+
+    def test_shallow_clone(self, remote):
+        """Test depth-limited clones from the mirror."""
+        tmp, origin, work = remote
+        commit_file(work, 'second.txt', 'more\n')
+        cache = RepoMirrorCache(tmp / 'mirrors')
+
+        local = cache.clone(str(origin), tmp / 'clone', depth=1)
+        assert git(['rev-list', '--count', 'HEAD'], local) == '1'
+        assert git(['remote', 'get-url', 'origin'], local) == str(origin)
+
+    def test_pull_fast_forwards_through_mirror(self, remote):
+        """Test syncing an existing clone through its mirror."""
+        tmp, origin, work = remote
+        cache = RepoMirrorCache(tmp / 'mirrors')
+        local = cache.clone(str(origin), tmp / 'clone')
+
+        commit_file(work, 'second.txt', 'more\n')
+        assert cache.pull(local) is True
+        assert (local / 'second.txt').exists()
+
+        unrelated = tmp / 'unrelated'
+        git(['init', '-q', str(unrelated)], tmp)
+        assert cache.pull(unrelated) is False
+
+    def test_credentials_not_stored_in_mirror(self, remote):
+        """Test that the auth URL is only used on the command line."""
+        tmp, origin, work = remote
+        cache = RepoMirrorCache(tmp / 'mirrors')
+        auth_url = f'file://{origin}'
+        cache.ensure_mirror(str(origin), auth_url=auth_url)
+
+        mirror_config = (cache.mirror_path(str(origin)) / 'config').read_text()
+        assert auth_url not in mirror_config
@@ -0,0 +1,177 @@
+import pytest
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+import services.search_index as search_index
+from models.repository import Repository, RepositoryManager
+from services.git_service import GitService
+from services.repo_mirror_cache import RepoMirrorCache
+from services.repo_sync import RepoRefSync, RepoSyncScheduler, changed_refs
+from services.search_index import SearchIndexManager
+
+MIGRATION = Path(__file__).resolve().parent.parent / 'migrations' / 'github_architecture.sql'
+
+
+def git(args, cwd):
+    result = subprocess.run(['git'] + args, cwd=str(cwd), capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return result.stdout.strip()
+
+
+def commit_file(work, name, content, branch='main'):
+    (work / name).write_text(content)
+    git(['add', name], work)
+    git(['-c', 'user.name=test', '-c', 'user.email=test@example.com',
+         'commit', '-q', '-m', f'add {name}'], work)
+    git(['push', '-q', 'origin', branch], work)
+
+
+@pytest.fixture
+def setup(monkeypatch):
+    """A local remote, its mirror, a shared clone and a repository row pointing at them."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp = Path(tmpdir)
+        origin = tmp / 'origin.git'
+        git(['init', '-q', '--bare', '-b', 'main', str(origin)], tmp)
+        work = tmp / 'work'
+        git(['clone', '-q', str(origin), str(work)], tmp)
+        git(['checkout', '-q', '-b', 'main'], work)
+        commit_file(work, 'README.md', 'hello\n')
+
+        mirrors = RepoMirrorCache(tmp / 'mirrors')
+        clone = mirrors.clone(str(origin), tmp / 'clone')
+
+        db_path = str(tmp / 'tasks.db')
+        with sqlite3.connect(db_path) as conn:
+            conn.executescript(MIGRATION.read_text())
+        manager = RepositoryManager(db_path, workspace_path=str(tmp / 'workspace'))
+        repo = Repository(id='r1', name='demo', github_url=str(origin),
+                          local_path=str(clone), owner_id='u1')
+        with manager.get_connection() as conn:
+            conn.execute('''
+                INSERT INTO repositories (id, name, github_url, local_path, owner_id)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (repo.id, repo.name, repo.github_url, repo.local_path, repo.owner_id))
+            conn.commit()
+
+        indexes = SearchIndexManager(tmp / 'indexes')
+        monkeypatch.setattr(search_index, 'search_manager', indexes)
+        service = GitService(max_workers=2)
+        yield RepoRefSync(manager, service, mirrors), work, mirrors.mirror_path(str(origin)), clone
+        service._pool.shutdown(wait=True)
+        indexes._pool.shutdown(wait=True)
+
+
+def branch_rows(ref_sync):
+    with ref_sync.repo_manager.get_connection() as conn:
+        rows = conn.execute('SELECT name, status FROM branches WHERE repository_id = ?', ('r1',))
+        return {row['name']: row['status'] for row in rows.fetchall()}
+
+
+class TestChangedRefs:
+    """Test mapping webhook results to refs."""
+
+    def test_event_refs(self):
+        """Test push, branch deletion and tag creation events."""
+        assert changed_refs('push', {'ref': 'refs/heads/main', 'deleted': False}) == (
+            ['refs/heads/main'], [])
+        assert changed_refs('push', {'ref': 'refs/heads/old', 'deleted': True}) == (
+            [], ['refs/heads/old'])
+        assert changed_refs('create', {'ref_type': 'tag', 'ref_name': 'v1'}) == (
+            ['refs/tags/v1'], [])
+        assert changed_refs('delete', {'ref_type': 'branch', 'ref_name': 'x'}) == (
+            [], ['refs/heads/x'])
+        assert changed_refs('issues', {}) == ([], [])
+
+
+class TestRepoSyncScheduler:
+    """Test debouncing and coalescing of sync requests."""
+
+    def test_coalesces_per_repo(self):
+        """Test that bursts of requests become one call per repository with the last action per ref."""
+        calls = []
+        done = threading.Event()
+
+        def handler(repo_id, updated, deleted):
+            calls.append((repo_id, updated, deleted))
+            if len(calls) == 2:
+                done.set()
+
+        scheduler = RepoSyncScheduler(handler, debounce=0.1, max_delay=5)
+        scheduler.start()
+        try:
+            scheduler.request('a', ['refs/heads/main'])
+            scheduler.request('a', ['refs/heads/feature'])
+            scheduler.request('a', deleted=['refs/heads/feature'])
+            scheduler.request('b', ['refs/heads/main'])
+            assert calls == []
+            assert done.wait(5)
+        finally:
+            scheduler.stop()
+
+        assert sorted(calls) == [('a', ['refs/heads/main'], ['refs/heads/feature']),
+                                 ('b', ['refs/heads/main'], [])]
+
+    def test_max_delay(self):
+        """Test that continuous requests still sync after max_delay."""
+        calls = []
+        scheduler = RepoSyncScheduler(lambda *args: calls.append(args), debounce=0.2, max_delay=0.3)
+        scheduler.start()
+        try:
+            deadline = time.monotonic() + 1
+            while not calls and time.monotonic() < deadline:
+                scheduler.request('a', ['refs/heads/main'])
+                time.sleep(0.05)
+        finally:
+            scheduler.stop()
+        assert calls
+
+
+class TestRepoRefSync:
+    """Test syncing refs into the mirror, the working copy and the branches table."""
+
+    def test_push_fast_forwards_clone(self, setup):
+        """Test that a pushed branch updates the mirror and the checked-out branch."""
+        ref_sync, work, mirror, clone = setup
+        commit_file(work, 'new.txt', 'new\n')
+        head = git(['rev-parse', 'HEAD'], work)
+
+        job = ref_sync.submit('r1', ['refs/heads/main'], [])
+        assert job.wait(10)
+        assert job.status == 'completed', job.error
+        assert job.result['fast_forwarded'] is True
+        assert git(['rev-parse', 'refs/heads/main'], mirror) == head
+        assert git(['rev-parse', 'HEAD'], clone) == head
+        assert (clone / 'new.txt').exists()
+
+    def test_branch_created_and_deleted(self, setup):
+        """Test that only the affected branch is fetched and tracked in the branches table."""
+        ref_sync, work, mirror, clone = setup
+        git(['checkout', '-q', '-b', 'feature'], work)
+        commit_file(work, 'f.txt', 'f\n', branch='feature')
+
+        result = ref_sync.sync(ref_sync.repo_manager.get_repository('r1'), ['refs/heads/feature'], [])
+        assert result['fast_forwarded'] is False
+        assert git(['rev-parse', 'refs/remotes/origin/feature'], clone) == git(['rev-parse', 'HEAD'], work)
+        assert branch_rows(ref_sync) == {'feature': 'draft'}
+
+        git(['push', '-q', 'origin', '--delete', 'feature'], work)
+        ref_sync.sync(ref_sync.repo_manager.get_repository('r1'), [], ['refs/heads/feature'])
+        assert git(['branch', '-r', '--list', 'origin/feature'], clone) == ''
+        assert git(['for-each-ref', 'refs/heads/feature'], mirror) == ''
+        assert branch_rows(ref_sync) == {'feature': 'closed'}
+
+    def test_dirty_clone_is_not_moved(self, setup):
+        """Test that uncommitted changes keep the working copy where it is."""
+        ref_sync, work, mirror, clone = setup
+        before = git(['rev-parse', 'HEAD'], clone)
+        (clone / 'README.md').write_text('local edit\n')
+        commit_file(work, 'new.txt', 'new\n')
+
+        result = ref_sync.sync(ref_sync.repo_manager.get_repository('r1'), ['refs/heads/main'], [])
+        assert result['fast_forwarded'] is False
+        assert git(['rev-parse', 'HEAD'], clone) == before
+        assert git(['rev-parse', 'refs/remotes/origin/main'], clone) == git(['rev-parse', 'HEAD'], work)
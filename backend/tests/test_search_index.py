@@ -0,0 +1,99 @@
+import os
+import pytest
+import tempfile
+from pathlib import Path
+from services.search_index import ProjectSearchIndex, SearchIndexManager
+
+class TestProjectSearchIndex:
+    """Test ProjectSearchIndex."""
+
+    @pytest.fixture
+    def temp_dir(self):
+        """Create temporary directory for testing."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            yield Path(tmpdir)
+
+    @pytest.fixture
+    def project(self, temp_dir):
+        """Create a small project tree."""
+        project = temp_dir / "project"
+        (project / "src").mkdir(parents=True)
+        (project / "node_modules" / "lib").mkdir(parents=True)
+        (project / "src" / "app.py").write_text("def handle_request():\n    return 'ok'\n")
+        (project / "src" / "utils.py").write_text("# helpers for handle_request\n")
+        (project / "README.md").write_text("项目说明：支持中文搜索\n", encoding="gbk")
+        (project / "logo.png").write_bytes(b"\x89PNG\x00\x00handle_request")
+        (project / "node_modules" / "lib" / "index.js").write_text("handle_request")
+        return project
+
+    @pytest.fixture
+    def index(self, temp_dir, project):
+        """Create and build an index."""
+        index = ProjectSearchIndex(project, temp_dir / "indexes" / "project.db")
+        index.update()
+        return index
+
+    def test_content_search_ranks_name_matches(self, index):
+        """Test content search with ranking and snippets."""
+        results = index.search("handle_request")
+        paths = [r['path'] for r in results]
+
+        assert set(paths) == {os.path.join("src", "app.py"), os.path.join("src", "utils.py")}
+        assert '<mark>' in results[0]['snippet']
+
+    def test_binary_and_ignored_files(self, index):
+        """Test that binary content and ignored directories are not indexed."""
+        assert index.search("handle_request", mode='content')
+        assert all(r['name'] != 'logo.png' for r in index.search("handle_request"))
+        assert index.search("logo", mode='name')[0]['name'] == 'logo.png'
+        assert not any('node_modules' in r['path'] for r in index.search("index"))
+
+    def test_non_utf8_content(self, index):
+        """Test that GBK content is decoded before indexing."""
+        results = index.search("中文搜索", mode='content')
+        assert [r['path'] for r in results] == ["README.md"]
+
+    def test_short_query_falls_back_to_name(self, index):
+        """Test queries shorter than a trigram."""
+        results = index.search("ap")
+        assert [r['name'] for r in results] == ["app.py"]
+        assert index.search("ap", mode='content') == []
+
+    def test_incremental_update(self, index, project):
+        """Test that only changed files are re-indexed."""
+        stats = index.update()
+        assert stats['unchanged'] == 4
+        assert stats['added'] == stats['updated'] == stats['removed'] == 0
+
+        app = project / "src" / "app.py"
+        app.write_text("def process_payment():\n    pass\n")
+        os.utime(app, ns=(app.stat().st_atime_ns, app.stat().st_mtime_ns + 1_000_000_000))
+        (project / "src" / "utils.py").unlink()
+        (project / "new.txt").write_text("process_payment docs")
+
+        stats = index.update()
+        assert (stats['added'], stats['updated'], stats['removed']) == (1, 1, 1)
+        assert index.search("handle_request") == []
+        assert {r['name'] for r in index.search("process_payment")} == {"app.py", "new.txt"}
+        assert index.get_status()['files'] == 4
+
+
+class TestSearchIndexManager:
+    """Test SearchIndexManager."""
+
+    def test_background_build(self):
+        """Test that searches schedule a background update."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            project = Path(tmpdir) / "project"
+            project.mkdir()
+            (project / "main.go").write_text("package main")
+            manager = SearchIndexManager(Path(tmpdir) / "indexes")
+
+            future = manager.schedule_update(project)
+            future.result(timeout=10)
+
+            result = manager.search(project, "package")
+            assert [r['name'] for r in result['results']] == ["main.go"]
+            assert result['index']['files'] == 1
+            # 刚更新过，不会重复调度
+            assert manager.schedule_update(project) is None
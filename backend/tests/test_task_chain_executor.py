@@ -0,0 +1,191 @@
+import pytest
+import tempfile
+import threading
+import time
+from pathlib import Path
+from models.task import Task, TaskManager
+from services.task_chain_executor import TaskChainExecutor
+
+class FakeExecutor:
+    """Runs each task on its own thread and reports the outcome via callback."""
+
+    def __init__(self, outcomes=None, duration=0.05):
+        self.outcomes = outcomes or {}
+        self.duration = duration
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def execute(self, prompt, project_path, output_callback=None,
+                completion_callback=None, user_id=None, task_id=None):
+        with self.lock:
+            self.calls.append((task_id, prompt))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            attempt = sum(1 for call_id, _ in self.calls if call_id == task_id)
+
+        def run():
+            time.sleep(self.duration)
+            task = Task(task_id, prompt, project_path)
+            outcome = self.outcomes.get(task_id, 'completed')
+            if callable(outcome):
+                outcome = outcome(attempt)
+            task.status = outcome
+            task.output = f"output of {task_id}"
+            with self.lock:
+                self.active -= 1
+            completion_callback(task)
+
+        threading.Thread(target=run, daemon=True).start()
+        return task_id
+
+
+class TestTaskChainExecutor:
+    """Test DAG execution of task chains."""
+
+    @pytest.fixture
+    def task_manager(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            yield TaskManager(db_path=str(Path(tmpdir) / "tasks.db"))
+
+    def _chain(self, task_manager, executor, children, **kwargs):
+        chain_executor = TaskChainExecutor(executor, task_manager)
+        parent = chain_executor.create_task_chain(
+            "set up project", children, "/tmp/project", user_id="u1", **kwargs
+        )
+        return chain_executor, parent
+
+    def _run(self, chain_executor, parent):
+        run = chain_executor.execute_chain(parent)
+        assert run.finished.wait(timeout=10)
+        return chain_executor.chain_db.get_chain(parent.id)
+
+    def test_independent_children_run_in_parallel(self, task_manager):
+        """Test that children depending only on the parent overlap."""
+        executor = FakeExecutor()
+        chain_executor, parent = self._chain(
+            task_manager, executor, ["a", "b", "c", "d"],
+            dependencies=[[], [], [], [0, 1, 2]], max_parallel=3
+        )
+
+        chain = self._run(chain_executor, parent)
+
+        assert chain['status'] == 'completed'
+        assert executor.max_active == 3
+        order = [call[0] for call in executor.calls]
+        assert order[0] == parent.id
+        assert order[-1] == parent.children[3].id
+        # 汇总节点的提示包含全部上游结果
+        assert executor.calls[-1][1].count("结果摘要") == 4
+
+    def test_default_chain_is_sequential(self, task_manager):
+        """Test that chains without dependencies keep the old ordering."""
+        executor = FakeExecutor(duration=0.01)
+        chain_executor, parent = self._chain(task_manager, executor, ["a", "b", "c"])
+
+        chain = self._run(chain_executor, parent)
+
+        assert chain['status'] == 'completed'
+        assert executor.max_active == 1
+        assert [call[0] for call in executor.calls] == [parent.id] + [c.id for c in parent.children]
+
+    def test_fail_fast(self, task_manager):
+        """Test that a failure stops scheduling remaining nodes."""
+        executor = FakeExecutor()
+        chain_executor, parent = self._chain(
+            task_manager, executor, ["a", "b", "c"],
+            dependencies=[[], [0], []], max_parallel=1
+        )
+        executor.outcomes[parent.children[0].id] = 'failed'
+
+        chain = self._run(chain_executor, parent)
+        statuses = {node['task_id']: node['status'] for node in chain['nodes']}
+
+        assert chain['status'] == 'failed'
+        assert statuses[parent.children[0].id] == 'failed'
+        assert statuses[parent.children[1].id] == 'skipped'
+        assert statuses[parent.children[2].id] == 'skipped'
+
+    def test_continue_skips_only_dependents(self, task_manager):
+        """Test that other branches keep running under the continue policy."""
+        executor = FakeExecutor()
+        chain_executor, parent = self._chain(
+            task_manager, executor, ["a", "b", "c"],
+            dependencies=[[], [0], []], failure_policy='continue'
+        )
+        executor.outcomes[parent.children[0].id] = 'failed'
+
+        chain = self._run(chain_executor, parent)
+        statuses = {node['task_id']: node['status'] for node in chain['nodes']}
+
+        assert chain['status'] == 'failed'
+        assert statuses[parent.children[1].id] == 'skipped'
+        assert statuses[parent.children[2].id] == 'completed'
+
+    def test_retry(self, task_manager):
+        """Test that failed nodes are retried before failing the chain."""
+        executor = FakeExecutor(duration=0.01)
+        chain_executor, parent = self._chain(
+            task_manager, executor, ["flaky"], failure_policy='retry', max_retries=2
+        )
+        flaky_id = parent.children[0].id
+        executor.outcomes[flaky_id] = lambda attempt: 'completed' if attempt == 3 else 'failed'
+
+        chain = self._run(chain_executor, parent)
+        node = next(n for n in chain['nodes'] if n['task_id'] == flaky_id)
+
+        assert chain['status'] == 'completed'
+        assert node['attempts'] == 3
+
+    def test_error_while_completing_node_fails_chain(self, task_manager, monkeypatch):
+        """Test that an error in completion handling fails the chain instead of leaving it running."""
+        chain_executor, parent = self._chain(task_manager, FakeExecutor(duration=0.01), ["a", "b"])
+
+        def broken(*args):
+            raise TypeError("boom")
+
+        monkeypatch.setattr(chain_executor, '_save_context', broken)
+        chain = self._run(chain_executor, parent)
+        statuses = {node['task_id']: node['status'] for node in chain['nodes']}
+        assert chain['status'] == 'failed'
+        assert statuses[parent.id] == 'failed'
+        assert {statuses[c.id] for c in parent.children} == {'skipped'}
+
+    def test_invalid_dependencies(self, task_manager):
+        """Test cycle and index validation."""
+        chain_executor = TaskChainExecutor(FakeExecutor(), task_manager)
+        with pytest.raises(ValueError):
+            chain_executor.create_task_chain("p", ["a", "b"], "/tmp", user_id="u1",
+                                             dependencies=[[1], [0]])
+        with pytest.raises(ValueError):
+            chain_executor.create_task_chain("p", ["a"], "/tmp", user_id="u1",
+                                             dependencies=[[5]])
+        with pytest.raises(ValueError):
+            chain_executor.create_task_chain("p", ["a"], "/tmp", user_id="u1", max_retries="abc")
+        with pytest.raises(ValueError):
+            chain_executor.create_task_chain("p", ["a"], "/tmp", user_id="u1", max_parallel=0)
+
+    def test_resume_after_restart(self, task_manager):
+        """Test that persisted node state lets a chain resume."""
+        executor = FakeExecutor(duration=0.01)
+        chain_executor, parent = self._chain(task_manager, executor, ["a", "b"])
+        chain_executor.chain_db.update_node(parent.id, parent.id, status='completed')
+        chain_executor.chain_db.update_node(parent.id, parent.children[0].id, status='running')
+
+        resumed = TaskChainExecutor(executor, task_manager).resume_unfinished_chains()
+        assert [run.chain_id for run in resumed] == [parent.id]
+        assert resumed[0].finished.wait(timeout=10)
+
+        assert [call[0] for call in executor.calls] == [c.id for c in parent.children]
+        assert chain_executor.chain_db.get_chain(parent.id)['status'] == 'completed'
+        assert chain_executor.chain_db.get_unfinished_chains() == []
+
+    def test_resume_without_parent_task_fails_chain(self, task_manager, tmp_path):
+        """Test that a chain whose parent task is gone is marked failed instead of staying running."""
+        chain_executor, parent = self._chain(task_manager, FakeExecutor(), ["a"])
+        other_tasks = TaskManager(db_path=str(tmp_path / "other.db"))
+
+        restarted = TaskChainExecutor(FakeExecutor(), other_tasks, chain_db=chain_executor.chain_db)
+        assert restarted.resume_unfinished_chains() == []
+        assert chain_executor.chain_db.get_chain(parent.id)['status'] == 'failed'
@@ -0,0 +1,116 @@
+import pytest
+import tempfile
+from pathlib import Path
+from models.task import TaskDB
+from models.task_filesystem import TaskFileSystem
+
+class TestTaskFileSystem:
+    """Test TaskFileSystem."""
+
+    @pytest.fixture
+    def task_fs(self):
+        """Create TaskFileSystem on a fresh database."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = str(Path(tmpdir) / "tasks.db")
+            TaskDB(db_path)
+            yield TaskFileSystem(db_path)
+
+    @pytest.fixture
+    def populated(self, task_fs):
+        """Create a small task hierarchy."""
+        task_fs.create_task_folder("/", "proj")
+        task_fs.create_task_folder("/", "other")
+        task_fs.create_task_folder("/proj", "b-feature")
+        task_fs.create_task_folder("/proj", "a-feature")
+        task_fs.create_task_folder("/proj/a-feature", "step1")
+        task_fs.create_task_folder("/proj/a-feature/step1", "deep")
+        # 前缀相同但不在子树中的兄弟节点
+        task_fs.create_task_folder("/", "proj-archive")
+        task_fs.create_task_folder("/proj-archive", "old")
+        return task_fs
+
+    def _recursive_tree(self, task_fs, path, max_depth, depth=0):
+        """Reference implementation that walks list_directory level by level."""
+        if max_depth >= 0 and depth >= max_depth:
+            return []
+        children = []
+        for task in task_fs.list_directory(path):
+            task_dict = task.to_dict()
+            if task.is_folder:
+                task_dict['children'] = self._recursive_tree(task_fs, task.path, max_depth, depth + 1)
+            children.append(task_dict)
+        return children
+
+    def _names(self, nodes):
+        return [(node['name'], self._names(node.get('children', []))) for node in nodes]
+
+    @pytest.mark.parametrize("root_path", ["/", "/proj", "/proj/a-feature"])
+    @pytest.mark.parametrize("max_depth", [-1, 0, 1, 2])
+    def test_tree_matches_recursive_listing(self, populated, root_path, max_depth):
+        """Test that the single-query tree matches the per-level walk."""
+        tree = populated.get_task_tree(root_path, max_depth)
+        expected = self._recursive_tree(populated, root_path, max_depth)
+
+        assert self._names(tree['children']) == self._names(expected)
+
+    def test_subtree_excludes_prefix_siblings(self, populated):
+        """Test that /proj does not pick up /proj-archive."""
+        tree = populated.get_task_tree("/proj")
+        assert [child['name'] for child in tree['children']] == ["a-feature", "b-feature"]
+        assert tree['children'][0]['children'][0]['children'][0]['name'] == "deep"
+
+    def test_missing_root(self, task_fs):
+        """Test tree for a path that does not exist."""
+        assert task_fs.get_task_tree("/missing") is None
+
+    def test_cached_snapshot_invalidation(self, populated):
+        """Test that snapshots are reused until the structure changes."""
+        first = populated.get_task_tree("/", use_cache=True)
+        assert populated.get_task_tree("/", use_cache=True) is first
+
+        version = populated.version
+        populated.create_task_folder("/other", "new")
+        assert populated.version == version + 1
+
+        refreshed = populated.get_task_tree("/", use_cache=True)
+        assert refreshed is not first
+        other = next(child for child in refreshed['children'] if child['name'] == "other")
+        assert [child['name'] for child in other['children']] == ["new"]
+
+    def test_move_subtree(self, populated):
+        """Test that moving a folder rewrites paths and depths of descendants."""
+        assert populated.move_task("/proj/a-feature", "/other", "renamed")
+
+        deep = populated.get_task_by_path("/other/renamed/step1/deep")
+        assert deep is not None
+        assert deep.depth == 4
+        assert populated.get_task_by_path("/proj/a-feature/step1") is None
+        assert populated.get_task_by_path("/other/renamed").depth == 2
+
+        # 移回根目录，深度随之减少
+        assert populated.move_task("/other/renamed", "/")
+        assert populated.get_task_by_path("/renamed/step1/deep").depth == 3
+
+    def test_move_only_rewrites_leading_prefix(self, task_fs):
+        """Test paths containing the old prefix twice or LIKE wildcards."""
+        task_fs.create_task_folder("/", "a_b")
+        task_fs.create_task_folder("/a_b", "a_b")
+        task_fs.create_task_folder("/", "aXb")
+        task_fs.create_task_folder("/aXb", "child")
+
+        assert task_fs.move_task("/a_b", "/", "c")
+
+        assert task_fs.get_task_by_path("/c/a_b") is not None
+        assert task_fs.get_task_by_path("/aXb/child") is not None
+
+    def test_move_into_own_subtree(self, populated):
+        """Test that a folder cannot be moved under itself."""
+        with pytest.raises(ValueError):
+            populated.move_task("/proj", "/proj/a-feature")
+        with pytest.raises(ValueError):
+            populated.move_task("/proj", "/proj")
+        assert populated.get_task_by_path("/proj/a-feature") is not None
+
+    def test_move_onto_existing_path(self, populated):
+        """Test that a move does not overwrite an existing task path."""
+        assert not populated.move_task("/proj/a-feature", "/proj", "b-feature")
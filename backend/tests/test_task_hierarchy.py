@@ -0,0 +1,126 @@
+import pytest
+import sqlite3
+import tempfile
+from pathlib import Path
+from models.task import Task, TaskDB
+from models.task_filesystem import TaskFileSystem
+from models.task_hierarchy import TaskHierarchy
+
+class TestTaskHierarchy:
+    """Test the task closure table."""
+
+    @pytest.fixture
+    def db_path(self):
+        """Create a fresh tasks database."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_path = str(Path(tmpdir) / "tasks.db")
+            yield db_path
+
+    @pytest.fixture
+    def task_db(self, db_path):
+        return TaskDB(db_path)
+
+    def _save(self, task_db, task_id, parent_id=None, status='pending'):
+        task = Task(task_id, f"prompt {task_id}", "/tmp/project", parent_task_id=parent_id)
+        task.status = status
+        task_db.save_task(task)
+        return task
+
+    def _closure(self, db_path):
+        with sqlite3.connect(db_path) as conn:
+            return set(conn.execute('SELECT ancestor_id, descendant_id, depth FROM task_closure'))
+
+    def test_save_task_maintains_closure(self, task_db):
+        """Test ancestors and descendants after saving a chain."""
+        self._save(task_db, "root")
+        self._save(task_db, "a", "root")
+        self._save(task_db, "b", "a")
+        self._save(task_db, "c", "root")
+
+        hierarchy = task_db.hierarchy
+        assert hierarchy.get_ancestor_ids("b") == ["root", "a"]
+        assert [d['id'] for d in hierarchy.get_descendants("root")][:2] == ["a", "c"]
+        assert {d['id'] for d in hierarchy.get_descendants("root")} == {"a", "b", "c"}
+        assert [d['id'] for d in hierarchy.get_descendants("root", max_depth=1)] == ["a", "c"]
+
+        # 重复保存（例如更新状态）不产生重复记录
+        before = self._closure(task_db.db_path)
+        self._save(task_db, "b", "a", status='running')
+        assert self._closure(task_db.db_path) == before
+
+    def test_out_of_order_inserts(self, task_db):
+        """Test children saved before their parent are linked later."""
+        self._save(task_db, "leaf", "mid")
+        self._save(task_db, "mid", "top")
+        self._save(task_db, "top")
+
+        assert task_db.hierarchy.get_ancestor_ids("leaf") == ["top", "mid"]
+        assert self._closure(task_db.db_path) == self._rebuilt(task_db)
+
+    def test_reparent_via_save(self, task_db):
+        """Test that changing parent_task_id moves the subtree."""
+        for task_id, parent in [("r1", None), ("r2", None), ("x", "r1"), ("y", "x")]:
+            self._save(task_db, task_id, parent)
+
+        self._save(task_db, "x", "r2")
+
+        assert task_db.hierarchy.get_ancestor_ids("y") == ["r2", "x"]
+        assert task_db.hierarchy.get_descendants("r1") == []
+        assert self._closure(task_db.db_path) == self._rebuilt(task_db)
+
+    def test_rollup(self, task_db):
+        """Test subtree status aggregation."""
+        self._save(task_db, "root")
+        self._save(task_db, "a", "root", status='completed')
+        self._save(task_db, "b", "a", status='completed')
+        self._save(task_db, "c", "root", status='running')
+
+        rollup = task_db.hierarchy.get_rollup("root")
+        assert rollup['total'] == 3
+        assert rollup['by_status'] == {'completed': 2, 'running': 1}
+        assert rollup['status'] == 'running'
+        assert rollup['max_depth'] == 2
+
+        assert task_db.hierarchy.get_rollup("a")['status'] == 'completed'
+        assert task_db.hierarchy.get_rollup("b")['total'] == 0
+
+    def test_backfill_existing_tasks(self, task_db, db_path):
+        """Test that an empty closure table is rebuilt from parent_task_id."""
+        self._save(task_db, "p")
+        self._save(task_db, "q", "p")
+        with sqlite3.connect(db_path) as conn:
+            conn.execute('DELETE FROM task_closure')
+
+        hierarchy = TaskHierarchy(db_path)
+        assert hierarchy.get_ancestor_ids("q") == ["p"]
+
+    def test_filesystem_operations(self, task_db, db_path):
+        """Test closure maintenance through TaskFileSystem."""
+        task_fs = TaskFileSystem(db_path)
+        task_fs.create_task_folder("/", "proj")
+        task_fs.create_task_folder("/proj", "feature")
+        task_fs.create_task_folder("/proj/feature", "step")
+        task_fs.create_task_folder("/", "other")
+
+        step = task_fs.get_task_by_path("/proj/feature/step")
+        assert [a['name'] for a in task_fs.hierarchy.get_ancestors(step.id)] == ["proj", "feature"]
+
+        task_fs.move_task("/proj/feature", "/other")
+        assert [a['name'] for a in task_fs.hierarchy.get_ancestors(step.id)] == ["other", "feature"]
+        assert self._closure(db_path) == self._rebuilt(task_db)
+
+        other = task_fs.get_task_by_path("/other")
+        task_fs.delete_task("/other", recursive=True)
+        assert task_fs.hierarchy.get_descendants(other.id) == []
+        assert all(step.id not in row for row in self._closure(db_path))
+
+    def _rebuilt(self, task_db):
+        """Closure rows computed from scratch with the recursive CTE."""
+        hierarchy = task_db.hierarchy
+        with hierarchy.get_connection() as conn:
+            cursor = conn.cursor()
+            hierarchy._rebuild(cursor)
+            rows = set(tuple(row) for row in cursor.execute(
+                'SELECT ancestor_id, descendant_id, depth FROM task_closure'))
+            conn.rollback()
+        return rows
@@ -0,0 +1,79 @@
+import pytest
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from models.task_timeseries import (
+    TaskTimeSeriesDB, bucket_index, bucket_bounds,
+    QUEUE_WAIT, RUN_DURATION, OUTPUT_BYTES, HISTOGRAM_BUCKETS
+)
+
+class TestTaskTimeSeries:
+    """Test the per-minute task metrics store."""
+
+    @pytest.fixture
+    def store(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            yield TaskTimeSeriesDB(str(Path(tmpdir) / "tasks.db"))
+
+    def test_bucket_bounds_contain_value(self):
+        """Test that every value lands in a bucket whose bounds contain it."""
+        for value in (0.0005, 0.01, 1.0, 59.9, 3600, 1e9):
+            low, high = bucket_bounds(bucket_index(value))
+            assert low <= value <= high
+        assert bucket_index(1e30) == HISTOGRAM_BUCKETS - 1
+
+    def test_percentiles_over_window(self, store):
+        """Test p50/p95/p99 estimates across several minutes."""
+        start = datetime(2024, 1, 1, 12, 0)
+        for i in range(100):
+            store.record_task({RUN_DURATION: i + 1}, 'completed', 0,
+                              project_path="/p", user_id="u1",
+                              timestamp=start + timedelta(seconds=i * 6))
+
+        result = store.get_percentiles(RUN_DURATION, start, start + timedelta(minutes=10))
+
+        assert result['count'] == 100
+        assert result['min'] == 1 and result['max'] == 100
+        assert result['mean'] == pytest.approx(50.5)
+        assert result['p50'] == pytest.approx(50, rel=0.1)
+        assert result['p95'] == pytest.approx(95, rel=0.1)
+        assert result['p99'] == pytest.approx(99, rel=0.1)
+
+    def test_filters_and_series(self, store):
+        """Test project/user filters and per-step series."""
+        start = datetime(2024, 1, 1, 12, 0)
+        store.record_task({QUEUE_WAIT: 1.0}, 'completed', 0, "/a", "u1", start)
+        store.record_task({QUEUE_WAIT: 9.0}, 'completed', 0, "/b", "u2", start + timedelta(minutes=5))
+
+        window_end = start + timedelta(minutes=10)
+        assert store.get_percentiles(QUEUE_WAIT, start, window_end, project_path="/a")['max'] == 1.0
+        assert store.get_percentiles(QUEUE_WAIT, start, window_end, user_id="u2")['count'] == 1
+
+        series = store.get_percentiles(QUEUE_WAIT, start, window_end, step_minutes=5)['series']
+        assert [point['count'] for point in series] == [1, 1]
+
+        empty = store.get_percentiles(QUEUE_WAIT, start - timedelta(hours=1), start)
+        assert empty['count'] == 0 and empty['p99'] is None
+
+    def test_outcomes_and_missing_values(self, store):
+        """Test status counts, throughput, and skipped None values."""
+        start = datetime(2024, 1, 1, 12, 0)
+        store.record_task({RUN_DURATION: 2.0, OUTPUT_BYTES: None}, 'completed', 0, timestamp=start)
+        store.record_task({RUN_DURATION: 3.0}, 'failed', 1, timestamp=start)
+        store.record_task({RUN_DURATION: 4.0}, 'failed', 1, timestamp=start)
+
+        outcomes = store.get_outcomes(start, start + timedelta(minutes=2))
+        assert outcomes['total'] == 3
+        assert outcomes['by_status'] == {'completed': 1, 'failed': 2}
+        assert outcomes['throughput_per_minute'] == 1.5
+        assert store.get_percentiles(OUTPUT_BYTES, start, start + timedelta(minutes=2))['count'] == 0
+
+    def test_prune(self, store):
+        """Test retention cleanup."""
+        store.record_task({RUN_DURATION: 1.0}, 'completed', 0,
+                          timestamp=datetime.now() - timedelta(days=60))
+        store.record_task({RUN_DURATION: 1.0}, 'completed', 0)
+
+        assert store.prune(retention_days=30) == 2
+        now = datetime.now()
+        assert store.get_percentiles(RUN_DURATION, now - timedelta(hours=1), now + timedelta(minutes=1))['count'] == 1
@@ -0,0 +1,139 @@
+import hashlib
+import io
+import json
+import pytest
+import tempfile
+from pathlib import Path
+from services.file_hash_cache import FileHashCache
+from services.upload_manager import UploadManager, UploadError
+
+class TestUploadManager:
+    """Test UploadManager service."""
+
+    @pytest.fixture
+    def temp_dir(self):
+        """Create temporary directory for testing."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            yield Path(tmpdir)
+
+    @pytest.fixture
+    def manager(self, temp_dir):
+        """Create UploadManager with a small chunk size."""
+        cache = FileHashCache(db_path=str(temp_dir / "hashes.db"))
+        return UploadManager(temp_dir / "uploads", hash_cache=cache, chunk_size=10)
+
+    def test_chunked_upload_out_of_order(self, manager, temp_dir):
+        """Test uploading chunks in any order and completing."""
+        data = b"0123456789abcdefghijKLMNO"
+        target = temp_dir / "project" / "artifact.bin"
+
+        session = manager.init_upload(target, len(data), sha256=hashlib.sha256(data).hexdigest())
+        assert session['total_chunks'] == 3
+        assert session['missing_chunks'] == [0, 1, 2]
+
+        for index in (2, 0, 1):
+            chunk = data[index * 10:(index + 1) * 10]
+            status = manager.put_chunk(session['upload_id'], index, io.BytesIO(chunk),
+                                       checksum=hashlib.sha256(chunk).hexdigest())
+        assert status['missing_chunks'] == []
+        assert status['received_bytes'] == len(data)
+
+        result = manager.complete(session['upload_id'])
+        assert target.read_bytes() == data
+        assert result['sha256'] == hashlib.sha256(data).hexdigest()
+        assert list((temp_dir / "uploads" / "chunked").iterdir()) == []
+
+    def test_resume_reports_missing_chunks(self, manager, temp_dir):
+        """Test that a new manager instance can resume an upload."""
+        data = b"x" * 25
+        session = manager.init_upload(temp_dir / "out.bin", len(data))
+        manager.put_chunk(session['upload_id'], 1, io.BytesIO(data[10:20]))
+
+        resumed = UploadManager(temp_dir / "uploads", hash_cache=manager.hash_cache, chunk_size=10)
+        status = resumed.get_status(session['upload_id'])
+        assert status['missing_chunks'] == [0, 2]
+
+        with pytest.raises(UploadError):
+            resumed.complete(session['upload_id'])
+
+    def test_chunk_validation(self, manager, temp_dir):
+        """Test checksum, size and index validation."""
+        session = manager.init_upload(temp_dir / "out.bin", 15)
+        upload_id = session['upload_id']
+
+        with pytest.raises(UploadError, match="checksum"):
+            manager.put_chunk(upload_id, 0, io.BytesIO(b"0123456789"), checksum="0" * 64)
+        with pytest.raises(UploadError, match="size"):
+            manager.put_chunk(upload_id, 1, io.BytesIO(b"too long chunk"))
+        with pytest.raises(UploadError, match="range"):
+            manager.put_chunk(upload_id, 5, io.BytesIO(b""))
+        with pytest.raises(UploadError):
+            manager.get_status("../../etc/passwd")
+
+        assert manager.get_status(upload_id)['received_chunks'] == 0
+
+    def test_whole_file_checksum_mismatch(self, manager, temp_dir):
+        """Test that a wrong final checksum does not replace the target."""
+        target = temp_dir / "out.bin"
+        target.write_bytes(b"original")
+        session = manager.init_upload(target, 5, sha256="0" * 64)
+        manager.put_chunk(session['upload_id'], 0, io.BytesIO(b"hello"))
+
+        with pytest.raises(UploadError, match="checksum"):
+            manager.complete(session['upload_id'])
+        assert target.read_bytes() == b"original"
+
+    def test_dedupe_by_content_hash(self, manager, temp_dir):
+        """Test that known content is copied on the server."""
+        data = b"same content everywhere"
+        existing = temp_dir / "project" / "a.bin"
+        existing.parent.mkdir(parents=True)
+        existing.write_bytes(data)
+        manager.hash_cache.record(existing, {
+            'md5': hashlib.md5(data).hexdigest(),
+            'sha256': hashlib.sha256(data).hexdigest()
+        })
+
+        target = temp_dir / "project" / "b.bin"
+        result = manager.init_upload(target, len(data), sha256=hashlib.sha256(data).hexdigest(),
+                                     dedupe_within=temp_dir / "project")
+        assert result['status'] == 'completed'
+        assert result['deduplicated'] is True
+        assert target.read_bytes() == data
+
+    def test_abort(self, manager, temp_dir):
+        """Test aborting an upload removes its temporary files."""
+        session = manager.init_upload(temp_dir / "out.bin", 100)
+        manager.abort(session['upload_id'])
+
+        assert list((temp_dir / "uploads" / "chunked").iterdir()) == []
+        with pytest.raises(UploadError):
+            manager.get_status(session['upload_id'])
+
+    def _backdate(self, manager, upload_id, seconds):
+        manifest_path = manager.upload_dir / f"{upload_id}.json"
+        manifest = json.loads(manifest_path.read_text())
+        manifest['updated_at'] -= seconds
+        manifest_path.write_text(json.dumps(manifest))
+
+    def test_cleanup_expired(self, manager, temp_dir):
+        """Test that stale sessions lose their manifest and part file, active ones are kept."""
+        stale = manager.init_upload(temp_dir / "stale.bin", 100)
+        active = manager.init_upload(temp_dir / "active.bin", 100)
+        self._backdate(manager, stale['upload_id'], 2 * 24 * 3600)
+
+        assert manager.cleanup_expired() == 1
+        remaining = sorted(p.name for p in manager.upload_dir.iterdir())
+        assert remaining == [f"{active['upload_id']}.json", f"{active['upload_id']}.part"]
+
+    def test_daily_cleanup_job(self, manager, temp_dir, monkeypatch):
+        """Test that the maintenance job cleans up through the global upload manager."""
+        pytest.importorskip("schedule")
+        import services.upload_manager
+        from tasks.monthly_metrics import cleanup_expired_uploads
+        monkeypatch.setattr(services.upload_manager, 'upload_manager', manager)
+        session = manager.init_upload(temp_dir / "stale.bin", 100)
+        self._backdate(manager, session['upload_id'], 2 * 24 * 3600)
+
+        cleanup_expired_uploads()
+        assert list(manager.upload_dir.iterdir()) == []
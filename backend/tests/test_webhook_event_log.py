@@ -0,0 +1,131 @@
+import pytest
+import json
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from models.webhook_event_log import WebhookEventLog, decode_cursor, partition_name
+from services.github_webhook import summarize_result
+
+
+@pytest.fixture
+def event_log():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        yield WebhookEventLog(str(Path(tmpdir) / "tasks.db"))
+
+
+def months_ago(count):
+    month = datetime.now().replace(day=15, hour=12, minute=0, second=0, microsecond=0)
+    for _ in range(count):
+        month = (month.replace(day=1) - timedelta(days=1)).replace(day=15)
+    return month
+
+
+class TestWebhookEventLog:
+    """Test the partitioned webhook event log."""
+
+    def test_record_is_idempotent(self, event_log):
+        """Test that retried deliveries are stored once, even across a month boundary."""
+        last_month = months_ago(1)
+        assert event_log.record('d1', 'r1', 'push', 'pushed', {'n': 1}, processed_at=last_month)
+        assert not event_log.record('d1', 'r1', 'push', 'pushed', {'n': 1})
+        assert not event_log.record('d1', 'r1', 'push', 'pushed', {'n': 1}, processed_at=last_month)
+
+        with event_log.get_connection() as conn:
+            assert event_log._partitions(conn) == [partition_name(last_month)]
+
+    def test_keyset_pagination_across_partitions(self, event_log):
+        """Test that pages walk back through monthly tables without gaps or repeats."""
+        expected = []
+        for month in range(3):
+            for i in range(3):
+                processed_at = months_ago(month) - timedelta(minutes=i)
+                event_log.record(f'm{month}-{i}', 'r1', 'push', f'event {month}-{i}', {},
+                                 processed_at=processed_at)
+                expected.append(f'm{month}-{i}')
+
+        seen, cursor = [], None
+        while True:
+            events, cursor = event_log.list_events(limit=4, cursor=cursor)
+            seen += [event['id'] for event in events]
+            if not cursor:
+                break
+        assert seen == expected
+        assert 'payload' not in events[0]
+
+        with pytest.raises(ValueError):
+            event_log.list_events(cursor='not-a-cursor')
+
+    def test_filters(self, event_log):
+        """Test filtering by repository and event type."""
+        now = datetime.now()
+        event_log.record('a', 'r1', 'push', 's', {}, processed_at=now)
+        event_log.record('b', 'r2', 'push', 's', {}, processed_at=now - timedelta(seconds=1))
+        event_log.record('c', 'r1', 'issues', 's', {}, processed_at=now - timedelta(seconds=2))
+
+        events, cursor = event_log.list_events(repository_id='r1')
+        assert [event['id'] for event in events] == ['a', 'c']
+        assert cursor is None
+        events, _ = event_log.list_events(repository_id='r1', event_type='issues')
+        assert [event['id'] for event in events] == ['c']
+
+        events, cursor = event_log.list_events(limit=1, event_type='push')
+        assert [event['id'] for event in events] == ['a']
+        assert decode_cursor(cursor)[1] == 'a'
+        events, _ = event_log.list_events(limit=1, cursor=cursor, event_type='push')
+        assert [event['id'] for event in events] == ['b']
+
+    def test_lazy_payload_and_compaction(self, event_log):
+        """Test that payloads are read by id and dropped after the payload retention."""
+        event_log.record('old', 'r1', 'push', 'old push', {'commits': [1, 2]},
+                         processed_at=datetime.now() - timedelta(days=40))
+        event_log.record('new', 'r1', 'push', 'new push', {'commits': [3]})
+
+        assert event_log.get_event('old')['payload'] == {'commits': [1, 2]}
+        assert event_log.compact(payload_retention_days=30) == 1
+
+        old = event_log.get_event('old')
+        assert old['payload'] is None
+        assert old['has_payload'] is False
+        assert old['summary'] == 'old push'
+        assert event_log.get_event('new')['payload'] == {'commits': [3]}
+        assert event_log.get_event('missing') is None
+
+    def test_prune_drops_old_partitions(self, event_log):
+        """Test that retention drops whole monthly tables."""
+        for month in range(4):
+            event_log.record(f'd{month}', 'r1', 'push', 's', {}, processed_at=months_ago(month))
+
+        assert event_log.prune(retention_months=2) == 2
+        events, _ = event_log.list_events()
+        assert [event['id'] for event in events] == ['d0', 'd1']
+
+    def test_import_legacy(self, event_log):
+        """Test moving rows from the old single webhook_events table."""
+        with event_log.get_connection() as conn:
+            conn.execute('''
+                CREATE TABLE webhook_events (
+                    id TEXT PRIMARY KEY, repository_id TEXT NOT NULL, event_type VARCHAR(50) NOT NULL,
+                    payload TEXT, processed_at TIMESTAMP NOT NULL
+                )
+            ''')
+            conn.execute("INSERT INTO webhook_events VALUES ('x', 'r1', 'push', ?, '2026-01-05 10:00:00')",
+                         (json.dumps({'branch': 'main'}),))
+            conn.commit()
+
+        assert event_log.import_legacy(batch_size=1) == 1
+        assert event_log.get_event('x')['payload'] == {'branch': 'main'}
+        assert event_log.import_legacy() == 0
+
+
+class TestSummarizeResult:
+    """Test list summaries."""
+
+    def test_summaries(self):
+        """Test summaries for common event types."""
+        assert summarize_result('push', {'pusher': 'ann', 'commits_count': 2, 'branch': 'main'}) == \
+            'ann pushed 2 commits to main'
+        assert summarize_result('pull_request', {'pr_number': 3, 'action': 'opened', 'pr_title': 'Fix'}) == \
+            'PR #3 opened: Fix'
+        assert summarize_result('delete', {'pusher': 'ann', 'ref_type': 'branch', 'ref_name': 'x'}) == \
+            'ann deleted branch x'
+        assert summarize_result('star', {'action': 'created'}) == 'star created'
@@ -0,0 +1,112 @@
+import pytest
+import json
+import tempfile
+import threading
+import time
+from pathlib import Path
+from models.webhook_inbox import WebhookInbox, DONE, FAILED, PENDING, PROCESSING
+import services.webhook_dispatcher as webhook_dispatcher
+from services.webhook_dispatcher import WebhookDispatcher
+
+
+@pytest.fixture
+def inbox():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        yield WebhookInbox(str(Path(tmpdir) / "tasks.db"))
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class TestWebhookInbox:
+    """Test the webhook inbox table."""
+
+    def test_enqueue_dedupes_by_delivery(self, inbox):
+        """Test that redelivered webhooks are stored once."""
+        assert inbox.enqueue('d1', 'push', 'o/a', '{}') is True
+        assert inbox.enqueue('d1', 'push', 'o/a', '{}') is False
+        assert inbox.get_stats()[PENDING] == 1
+
+    def test_claim_keeps_per_repo_order(self, inbox):
+        """Test that only the oldest open event of each repository is claimed."""
+        inbox.enqueue('a1', 'push', 'o/a', '{}')
+        inbox.enqueue('a2', 'push', 'o/a', '{}')
+        inbox.enqueue('b1', 'push', 'o/b', '{}')
+
+        claimed = inbox.claim(10)
+        assert [event['delivery_id'] for event in claimed] == ['a1', 'b1']
+        assert inbox.claim(10) == []
+
+        inbox.complete(claimed[0]['id'])
+        assert [event['delivery_id'] for event in inbox.claim(10)] == ['a2']
+
+    def test_retry_blocks_later_events(self, inbox):
+        """Test that an event waiting for retry holds back later events of its repository."""
+        inbox.enqueue('a1', 'push', 'o/a', '{}')
+        inbox.enqueue('a2', 'push', 'o/a', '{}')
+        first = inbox.claim(10)[0]
+        inbox.fail(first['id'], 'boom', retry_in=60)
+
+        assert inbox.claim(10) == []
+        inbox.fail(first['id'], 'boom', retry_in=None)
+        assert [event['delivery_id'] for event in inbox.claim(10)] == ['a2']
+        assert inbox.get_stats()[FAILED] == 1
+
+    def test_requeue_stale(self, inbox):
+        """Test recovery of events claimed by a process that died."""
+        inbox.enqueue('a1', 'push', 'o/a', '{}')
+        inbox.claim(1)
+        assert inbox.get_stats()[PROCESSING] == 1
+        assert inbox.requeue_stale() == 1
+        assert inbox.claim(1)[0]['attempts'] == 2
+
+
+class TestWebhookDispatcher:
+    """Test background processing."""
+
+    def test_processes_and_retries(self, inbox, monkeypatch):
+        """Test that failed events are retried and then completed."""
+        monkeypatch.setattr(webhook_dispatcher, 'RETRY_BASE_DELAY', 0)
+        calls = []
+
+        def processor(delivery_id, event_type, payload):
+            calls.append((delivery_id, payload['n']))
+            if delivery_id == 'flaky' and len([c for c in calls if c[0] == 'flaky']) < 2:
+                raise RuntimeError('temporary')
+
+        dispatcher = WebhookDispatcher(inbox, processor, workers=2, poll_interval=0.01)
+        dispatcher.start()
+        try:
+            inbox.enqueue('flaky', 'push', 'o/a', json.dumps({'n': 1}))
+            inbox.enqueue('next', 'push', 'o/a', json.dumps({'n': 2}))
+            inbox.enqueue('other', 'push', 'o/b', json.dumps({'n': 3}))
+            dispatcher.notify()
+
+            assert wait_for(lambda: inbox.get_stats()[DONE] == 3)
+        finally:
+            dispatcher.stop()
+
+        repo_a = [call for call in calls if call[0] in ('flaky', 'next')]
+        assert repo_a == [('flaky', 1), ('flaky', 1), ('next', 2)]
+
+    def test_gives_up_after_max_attempts(self, inbox, monkeypatch):
+        """Test that permanently failing events end up failed."""
+        monkeypatch.setattr(webhook_dispatcher, 'RETRY_BASE_DELAY', 0)
+
+        def processor(delivery_id, event_type, payload):
+            raise RuntimeError('broken')
+
+        dispatcher = WebhookDispatcher(inbox, processor, workers=1, max_attempts=3,
+                                       poll_interval=0.01)
+        dispatcher.start()
+        try:
+            inbox.enqueue('bad', 'push', 'o/a', '{}')
+            assert wait_for(lambda: inbox.get_stats()[FAILED] == 1)
+        finally:
+            dispatcher.stop()
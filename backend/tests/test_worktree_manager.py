@@ -0,0 +1,139 @@
+import pytest
+import subprocess
+import tempfile
+import threading
+from pathlib import Path
+from services.worktree_manager import WorktreeManager, WorktreeError
+
+def git(*args, cwd):
+    return subprocess.run(['git', *args], cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+class TestWorktreeManager:
+    """Test pooled per-branch worktrees."""
+
+    @pytest.fixture
+    def repo(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            repo_path = Path(tmpdir) / "repo"
+            repo_path.mkdir()
+            git('init', '-q', '-b', 'main', cwd=repo_path)
+            git('config', 'user.email', 'test@example.com', cwd=repo_path)
+            git('config', 'user.name', 'Test', cwd=repo_path)
+            (repo_path / "README.md").write_text("hello\n")
+            git('add', '.', cwd=repo_path)
+            git('commit', '-q', '-m', 'init', cwd=repo_path)
+            yield repo_path
+
+    @pytest.fixture
+    def manager(self, repo):
+        return WorktreeManager(repo.parent / "worktrees", max_worktrees=2)
+
+    def test_branches_get_separate_checkouts(self, repo, manager):
+        """Test that two branches are checked out side by side without touching the main tree."""
+        WorktreeManager.create_branch(repo, "feature/a", "main")
+        path_a = manager.acquire(repo, "feature/a")
+        path_b = manager.acquire(repo, "feature/b", base_branch="main")
+
+        assert path_a != path_b
+        assert git('rev-parse', '--abbrev-ref', 'HEAD', cwd=path_a) == "feature/a"
+        assert git('rev-parse', '--abbrev-ref', 'HEAD', cwd=path_b) == "feature/b"
+        assert git('rev-parse', '--abbrev-ref', 'HEAD', cwd=repo) == "main"
+
+        (Path(path_a) / "a.txt").write_text("a\n")
+        git('add', '.', cwd=path_a)
+        git('commit', '-q', '-m', 'a', cwd=path_a)
+        assert not (Path(path_b) / "a.txt").exists()
+        assert "a.txt" in git('ls-tree', '--name-only', 'feature/a', cwd=repo)
+
+    def test_release_and_reuse(self, repo, manager):
+        """Test that a released worktree is reused for the same branch."""
+        with manager.lease(repo, "feature/x", base_branch="main") as first:
+            pass
+        with manager.lease(repo, "feature/x") as second:
+            assert second == first
+
+    def test_similar_branch_names_get_separate_paths(self, repo, manager):
+        """Test that branch names that sanitize to the same string do not share a directory."""
+        with manager.lease(repo, "feature/x", base_branch="main") as slash:
+            pass
+        with manager.lease(repo, "feature_x", base_branch="main") as underscore:
+            assert underscore != slash
+            assert git('rev-parse', '--abbrev-ref', 'HEAD', cwd=underscore) == "feature_x"
+        assert git('rev-parse', '--abbrev-ref', 'HEAD', cwd=slash) == "feature/x"
+
+    def test_reuse_checks_head(self, repo, manager):
+        """Test that a reused worktree whose HEAD was switched is recreated on the requested branch."""
+        with manager.lease(repo, "feature/x", base_branch="main") as path:
+            git('checkout', '-q', '-b', 'other', cwd=path)
+
+        restarted = WorktreeManager(manager.root_dir)
+        with restarted.lease(repo, "feature/x") as reused:
+            assert reused == path
+            assert git('rev-parse', '--abbrev-ref', 'HEAD', cwd=reused) == "feature/x"
+
+        git('checkout', '-q', 'other', cwd=path)
+        (Path(path) / "wip.txt").write_text("uncommitted\n")
+        with pytest.raises(WorktreeError):
+            WorktreeManager(manager.root_dir).acquire(repo, "feature/x")
+
+    def test_same_branch_is_exclusive(self, repo, manager):
+        """Test that a busy branch blocks until released or times out."""
+        manager.acquire(repo, "feature/x", base_branch="main")
+        with pytest.raises(WorktreeError):
+            manager.acquire(repo, "feature/x", timeout=0.1)
+
+        threading.Timer(0.2, manager.release, args=(repo, "feature/x")).start()
+        assert manager.acquire(repo, "feature/x", timeout=5)
+
+    def test_reserve_then_prepare(self, repo, manager):
+        """Test that reserving is in-memory only and fails fast when the branch is busy."""
+        manager.reserve(repo, "feature/x")
+        assert manager.list_worktrees()[0]['in_use']
+        assert not Path(manager.list_worktrees()[0]['path']).exists()
+        with pytest.raises(WorktreeError):
+            manager.reserve(repo, "feature/x", timeout=0)
+
+        path = manager.prepare(repo, "feature/x", base_branch="main")
+        assert git('rev-parse', '--abbrev-ref', 'HEAD', cwd=path) == "feature/x"
+        manager.release(repo, "feature/x")
+
+        with pytest.raises(WorktreeError):
+            manager.prepare(repo, "not-reserved")
+        manager.reserve(repo, "missing")
+        with pytest.raises(WorktreeError):
+            manager.prepare(repo, "missing")
+        assert manager.reserve(repo, "missing", timeout=0) is None
+
+    def test_lru_eviction_skips_dirty(self, repo, manager):
+        """Test that the least recently used clean worktree is evicted first."""
+        with manager.lease(repo, "b1", base_branch="main") as b1:
+            (Path(b1) / "wip.txt").write_text("uncommitted\n")
+        with manager.lease(repo, "b2", base_branch="main") as b2:
+            pass
+        with manager.lease(repo, "b3", base_branch="main"):
+            pass
+
+        branches = {w['branch'] for w in manager.list_worktrees()}
+        assert branches == {"b1", "b3"}
+        assert Path(b1).exists()
+        assert not Path(b2).exists()
+
+    def test_main_checkout_branch_uses_repo(self, repo, manager):
+        """Test that the branch checked out in the main tree is served from it."""
+        with manager.lease(repo, "main") as path:
+            assert Path(path) == repo.resolve()
+        assert manager.cleanup(idle_seconds=0) == 1
+        assert repo.exists()
+
+    def test_cleanup_and_missing_branch(self, repo, manager):
+        """Test idle cleanup and errors for unknown branches."""
+        with manager.lease(repo, "old", base_branch="main") as path:
+            pass
+        assert manager.cleanup(idle_seconds=0) == 1
+        assert not Path(path).exists()
+        assert "old" in git('branch', '--list', 'old', cwd=repo)
+
+        with pytest.raises(WorktreeError):
+            manager.acquire(repo, "missing")
+        assert manager.list_worktrees() == []
@@ -1,7 +1,10 @@
 import React, { useState } from 'react';
 import { Upload, Button, message } from 'antd';
 import { InboxOutlined, UploadOutlined } from '@ant-design/icons';
-import { uploadFile } from '../services/api';
+import { uploadFile, uploadFileChunked } from '../services/api';
+
+// 超过该大小的文件使用分块上传（服务端单个请求上限为 16MB）
+const CHUNKED_UPLOAD_THRESHOLD = 8 * 1024 * 1024;
 
 const { Dragger } = Upload;
 
@@ -20,6 +23,16 @@ const FileUpload = ({ projectName, onUploadSuccess, mode = 'button' }) => {
     }
     
     try {
+      if (file.size > CHUNKED_UPLOAD_THRESHOLD) {
+        const result = await uploadFileChunked(file, { project: projectName, onProgress });
+        message.success(`${file.name} 上传成功`);
+        onSuccess(result);
+        if (onUploadSuccess) {
+          onUploadSuccess(result);
+        }
+        return;
+      }
+
       // 创建 FormData
       const formData = new FormData();
       formData.append('file', file);
@@ -57,10 +70,10 @@ const FileUpload = ({ projectName, onUploadSuccess, mode = 'button' }) => {
       showRemoveIcon: true,
     },
     beforeUpload: (file) => {
-      // 文件大小限制 (16MB)
-      const isLt16M = file.size / 1024 / 1024 < 16;
-      if (!isLt16M) {
-        message.error('文件大小不能超过 16MB!');
+      // 文件大小限制 (4GB)，大文件走分块上传
+      const isLt4G = file.size / 1024 / 1024 / 1024 < 4;
+      if (!isLt4G) {
+        message.error('文件大小不能超过 4GB!');
         return false;
       }
       return true;
@@ -75,7 +88,7 @@ const FileUpload = ({ projectName, onUploadSuccess, mode = 'button' }) => {
         </p>
         <p className="ant-upload-text">点击或拖拽文件到此区域上传</p>
         <p className="ant-upload-hint">
-          支持单个或批量上传，文件大小限制为 16MB
+          支持单个或批量上传，大文件自动分块上传并支持断点续传
         </p>
       </Dragger>
     );
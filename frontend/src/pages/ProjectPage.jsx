@@ -175,7 +175,12 @@ const ProjectPage = () => {
       setCurrentFile({
         path: file.path,
         content: content.content,
-        language: getLanguageFromPath(file.path)
+        language: getLanguageFromPath(file.path),
+        etag: content.etag,
+        // 大文件只返回了开头的一页，全部加载完之前不能编辑，否则保存会截断文件
+        truncated: Boolean(content.truncated),
+        endLine: content.end_line,
+        nextOffset: content.next_offset
       })
       setEditedContent(content.content)
       setEditMode(false)
@@ -185,20 +190,46 @@ const ProjectPage = () => {
     }
   }
   
+  const loadMoreLines = async () => {
+    if (!currentFile?.truncated) return
+    
+    try {
+      const page = await projectApi.getFileLines(
+        currentFile.path, currentFile.endLine, undefined, currentFile.nextOffset
+      )
+      const content = currentFile.content + page.content
+      setCurrentFile({
+        ...currentFile,
+        content,
+        truncated: page.has_more,
+        endLine: page.end_line,
+        nextOffset: page.next_offset
+      })
+      setEditedContent(content)
+    } catch (error) {
+      message.error('Failed to load file')
+    }
+  }
+  
   const handleSaveFile = async () => {
-    if (!currentFile) return
+    if (!currentFile || currentFile.truncated) return
     
     try {
-      await projectApi.updateFileContent(currentFile.path, editedContent)
+      const result = await projectApi.updateFileContent(currentFile.path, editedContent, currentFile.etag)
       message.success('文件保存成功')
       setCurrentFile({
         ...currentFile,
-        content: editedContent
+        content: editedContent,
+        etag: result.etag
       })
       setHasUnsavedChanges(false)
       setEditMode(false)
     } catch (error) {
-      message.error('保存文件失败: ' + (error.response?.data?.error || error.message))
+      if (error.response?.status === 412) {
+        message.error('文件已被修改，请重新打开后再保存')
+      } else {
+        message.error('保存文件失败: ' + (error.response?.data?.error || error.message))
+      }
     }
   }
   
@@ -361,6 +392,17 @@ const ProjectPage = () => {
                       取消
                     </Button>
                   </>
+                ) : currentFile.truncated ? (
+                  <>
+                    <Button size="small" onClick={loadMoreLines}>
+                      加载更多（已显示 {currentFile.endLine} 行）
+                    </Button>
+                    <Tooltip title="文件较大，只加载了一部分，全部加载后才能编辑">
+                      <Button size="small" icon={<EditOutlined />} disabled>
+                        编辑
+                      </Button>
+                    </Tooltip>
+                  </>
                 ) : (
                   <Button
                     size="small"
@@ -379,7 +421,7 @@ const ProjectPage = () => {
                 onChange={editMode ? handleContentChange : undefined}
                 language={currentFile.language}
                 path={currentFile.path}
-                readOnly={!editMode}
+                readOnly={!editMode || currentFile.truncated}
                 options={{
                   fontSize: 14,
                   minimap: { enabled: false },
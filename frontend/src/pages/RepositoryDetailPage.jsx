@@ -129,7 +129,8 @@ const RepositoryDetailPage = () => {
     
     setSyncing(true)
     try {
-      const result = await repositoryApi.syncRepository(id)
+      const { job_id } = await repositoryApi.syncRepository(id)
+      await repositoryApi.waitForGitJob(job_id)
       message.success('仓库同步成功')
       // 重新加载数据
       loadRepository()
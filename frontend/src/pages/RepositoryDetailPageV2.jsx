@@ -61,7 +61,8 @@ const RepositoryDetailPageV2 = () => {
   const handleSyncRepository = async () => {
     setSyncing(true);
     try {
-      await repositoryApi.syncRepository(id);
+      const { job_id } = await repositoryApi.syncRepository(id);
+      await repositoryApi.waitForGitJob(job_id);
       message.success('仓库同步成功');
       loadRepository();
     } catch (error) {
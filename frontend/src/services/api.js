@@ -71,11 +71,33 @@ export const projectApi = {
   updateProject: (projectName, newPath) => apiClient.put(`/projects/${projectName}`, { new_path: newPath }),
   deleteProject: (projectName) => apiClient.delete(`/projects/${projectName}`),
   getFileContent: (filePath) => apiClient.get(`/files/${filePath}`),
-  updateFileContent: (filePath, content) => apiClient.put(`/files/${filePath}`, { content }),
+  // 按行分页读取大文件，offset 为上一页返回的 next_offset
+  getFileLines: (filePath, startLine = 0, maxLines = 1000, offset = null) =>
+    apiClient.get(`/files/${filePath}`, {
+      params: { start_line: startLine, max_lines: maxLines, ...(offset !== null && { offset }) }
+    }),
+  // etag 为读取时返回的 etag，文件已被修改时服务端返回 412
+  updateFileContent: (filePath, content, etag = null) =>
+    apiClient.put(`/files/${filePath}`, { content }, {
+      headers: etag ? { 'If-Match': `"${etag}"` } : {}
+    }),
   deleteFile: (filePath) => apiClient.delete(`/files/${filePath}`),
+  searchProject: (projectName, query, mode = 'all', limit = 50) =>
+    apiClient.get(`/projects/${projectName}/search`, { params: { q: query, mode, limit } }),
   uploadFile: (formData) => apiClient.post('/files/upload', formData, {
     headers: { 'Content-Type': 'multipart/form-data' }
   }),
+  // 分块上传
+  initUpload: (data) => apiClient.post('/files/uploads', data),
+  getUploadStatus: (uploadId) => apiClient.get(`/files/uploads/${uploadId}`),
+  uploadChunk: (uploadId, index, blob, checksum, config = {}) =>
+    apiClient.put(`/files/uploads/${uploadId}/chunks/${index}`, blob, {
+      ...config,
+      timeout: 0,
+      headers: { 'Content-Type': 'application/octet-stream', 'X-Chunk-SHA256': checksum }
+    }),
+  completeUpload: (uploadId) => apiClient.post(`/files/uploads/${uploadId}/complete`),
+  abortUpload: (uploadId) => apiClient.delete(`/files/uploads/${uploadId}`),
   // 权限管理
   getProjectPermissions: (projectId) => apiClient.get(`/projects/${projectId}/permissions`),
   grantProjectPermission: (projectId, userId, role) => 
@@ -87,16 +109,49 @@ export const projectApi = {
 // Export individual functions for convenience
 export const uploadFile = projectApi.uploadFile
 
+const sha256Hex = async (buffer) => {
+  const digest = await crypto.subtle.digest('SHA-256', buffer)
+  return Array.from(new Uint8Array(digest)).map((b) => b.toString(16).padStart(2, '0')).join('')
+}
+
+// 分块上传大文件；传入 uploadId 时只补传服务器缺失的分块（断点续传）
+export const uploadFileChunked = async (file, { project, path = '', uploadId = null, onProgress } = {}) => {
+  const session = uploadId
+    ? await projectApi.getUploadStatus(uploadId)
+    : await projectApi.initUpload({ project, path, filename: file.name, size: file.size })
+  if (session.status === 'completed') {
+    return session
+  }
+
+  let uploaded = session.received_bytes
+  for (const index of session.missing_chunks) {
+    const start = index * session.chunk_size
+    const blob = file.slice(start, Math.min(start + session.chunk_size, file.size))
+    const checksum = await sha256Hex(await blob.arrayBuffer())
+    await projectApi.uploadChunk(session.upload_id, index, blob, checksum)
+    uploaded += blob.size
+    if (onProgress) {
+      onProgress({ percent: Math.round((uploaded * 100) / (file.size || 1)), uploadId: session.upload_id })
+    }
+  }
+
+  return projectApi.completeUpload(session.upload_id)
+}
+
 export const taskApi = {
   executeTask: (prompt, projectPath) => 
     apiClient.post('/execute', { prompt, project_path: projectPath }),
   listTasks: () => apiClient.get('/tasks'),
   listAllTasks: () => apiClient.get('/admin/tasks'),  // 管理员接口
   getTask: (taskId) => apiClient.get(`/tasks/${taskId}`),
+  getTaskChanges: (taskId) => apiClient.get(`/tasks/${taskId}/changes`),
   cancelTask: (taskId) => apiClient.post(`/tasks/${taskId}/cancel`),
   // 任务链相关
   createTaskChain: (data) => apiClient.post('/task-chains', data),
+  getTaskChain: (chainId) => apiClient.get(`/task-chains/${chainId}`),
   getTaskChildren: (taskId) => apiClient.get(`/tasks/${taskId}/children`),
+  getTaskHierarchy: (taskId, maxDepth = -1) =>
+    apiClient.get(`/tasks/${taskId}/hierarchy`, { params: { max_depth: maxDepth } }),
   addChildTask: (taskId, prompt) => apiClient.post(`/tasks/${taskId}/add-child`, { prompt }),
   // 本地执行相关
   launchLocalExecution: (taskId) => apiClient.post(`/tasks/${taskId}/launch-local`),
@@ -104,12 +159,17 @@ export const taskApi = {
     apiClient.post('/execute-local', { prompt, project_path: projectPath }),
   // Agent指标相关
   getAgentMetrics: () => apiClient.get('/metrics/agent'),
+  getTaskTimeseries: (params) => apiClient.get('/metrics/tasks', { params }),
 }
 
 export const taskFileSystemApi = {
   // 任务文件系统API
   getTaskTree: (path = '/', maxDepth = -1) => 
     apiClient.get('/taskfs/tree', { params: { path, max_depth: maxDepth } }),
+  getAncestors: (path) => apiClient.get('/taskfs/ancestors', { params: { path } }),
+  getDescendants: (path, maxDepth = -1) =>
+    apiClient.get('/taskfs/descendants', { params: { path, max_depth: maxDepth } }),
+  getRollup: (path) => apiClient.get('/taskfs/rollup', { params: { path } }),
   listDirectory: (path = '/') => 
     apiClient.get('/taskfs/list', { params: { path } }),
   getTask: (path) => 
@@ -132,7 +192,10 @@ export const agentApi = {
   getRankings: (period = 'monthly') => apiClient.get(`/agent/rankings?period=${period}`),
   getUserHistory: (userId, months = 6) => apiClient.get(`/agent/history/${userId}?months=${months}`),
   getCompanyStats: () => apiClient.get('/agent/company-stats'),
-  updateMetrics: () => apiClient.post('/agent/update-metrics')
+  updateMetrics: (startMonth, endMonth) => apiClient.post('/agent/update-metrics', {
+    start_month: startMonth,
+    end_month: endMonth
+  })
 }
 
 export const authApi = {
@@ -197,6 +260,17 @@ export const repositoryApi = {
   commitChanges: (repoId, data) => apiClient.post(`/repos/${repoId}/commit`, data),
   pushToRemote: (repoId) => apiClient.post(`/repos/${repoId}/push`),
   pullFromRemote: (repoId) => apiClient.post(`/repos/${repoId}/pull`),
+  getRepositoryStatus: (repoId) => apiClient.get(`/repos/${repoId}/status`),
+  getGitJob: (jobId) => apiClient.get(`/git/jobs/${jobId}`),
+  // 轮询后台 git 作业直到完成，失败时抛出错误
+  waitForGitJob: async (jobId, interval = 1000) => {
+    for (;;) {
+      const job = await apiClient.get(`/git/jobs/${jobId}`)
+      if (job.status === 'completed') return job
+      if (job.status === 'failed') throw new Error(job.error || 'Git operation failed')
+      await new Promise((resolve) => setTimeout(resolve, interval))
+    }
+  },
   createPullRequest: (branchId, data) => apiClient.post(`/branches/${branchId}/pr`, data),
 }
 